@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Geração em lote do SevenX Studio em vários processos (ver src/core/batch_workers.py)
+"""
+
+import sys
+import os
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.core.batch_workers import main
+
+if __name__ == "__main__":
+    sys.exit(main())
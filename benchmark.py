@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inferência do SevenX Studio (ver src/core/benchmark.py)
+"""
+
+import sys
+import os
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.core.benchmark import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Daemon de inferência do SevenX Studio (ver src/core/daemon.py)
+"""
+
+import sys
+import os
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.core.daemon import main
+
+if __name__ == "__main__":
+    sys.exit(main())
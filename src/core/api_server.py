@@ -0,0 +1,466 @@
+"""
+Arquivo: api_server.py
+Descrição: Servidor HTTP local compatível com a API da OpenAI, na porta `api_port`.
+
+Scripts e ferramentas locais usam os modelos já carregados no app em vez de
+cada um carregar a sua cópia. Rotas: `GET /v1/models`, `POST /v1/chat/completions`
+e `POST /v1/completions`, com e sem streaming (Server-Sent Events). Modelos
+instalados no SevenX são atendidos pelo `SevenXEngine`; os demais, pelo
+servidor Ollama, quando configurado.
+
+O servidor roda em um loop asyncio próprio, em uma thread separada da
+interface: conexões ociosas ou esperando tokens não ocupam threads. Só a
+geração, que bloqueia, roda em um pool de threads limitado; cada token chega
+ao loop por uma fila. Se o cliente desconectar, a geração é cancelada no
+passo seguinte.
+
+A API vem desligada (`api_enabled`). Ligada, só atende requisições endereçadas
+ao próprio computador: cabeçalhos `Host` e `Origin` de outros nomes são
+recusados, o que impede páginas da web de alcançá-la por DNS rebinding ou POST
+entre sites. Com `api_key` configurada, cada requisição também precisa do
+cabeçalho `Authorization: Bearer <api_key>`.
+
+Falhas da geração voltam como 500 (ou, no streaming já iniciado, como um evento
+de erro), e `finish_reason` é "length" quando a resposta para em `max_tokens`.
+
+As gerações do SevenX entram na fila de admissão do motor com prioridade
+"normal" (abaixo do chat do app; o campo `priority` da requisição pode pedir
+"background"). Pedidos recusados pela fila voltam como 429 (fila cheia) ou
+503 (prazo de espera esgotado), com o cabeçalho `Retry-After`.
+"""
+
+import asyncio
+import hmac
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import logging
+
+from .cancellation import CancellationToken
+from .request_scheduler import PRIORITIES, PRIORITY_NORMAL, AdmissionRejected, QueueFull
+
+if TYPE_CHECKING:
+    from .sevenx_engine import SevenXEngine
+    from .ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+                405: "Method Not Allowed",
+                413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+# Parâmetros da OpenAI repassados como opções de geração (o resto é ignorado)
+OPENAI_OPTIONS = ("max_tokens", "temperature", "top_p", "top_k", "presence_penalty", "frequency_penalty",
+                  "repeat_penalty")
+# Nomes aceitos nos cabeçalhos Host e Origin, além do `host` em que o servidor escuta
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+WILDCARD_HOSTS = {"", "0.0.0.0", "::"}
+_DONE = object()
+
+
+class ApiError(Exception):
+    """Erro devolvido ao cliente no formato de erro da OpenAI."""
+
+    def __init__(self, status: int, message: str, error_type: str = "invalid_request_error",
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+        self.headers = headers or {}
+
+
+def rejection_error(rejection: AdmissionRejected) -> ApiError:
+    """Recusa da fila de admissão como erro HTTP com `Retry-After`."""
+    if isinstance(rejection, QueueFull):
+        return ApiError(429, str(rejection), "queue_full", {"Retry-After": str(rejection.retry_after)})
+    return ApiError(503, str(rejection), "queue_timeout", {"Retry-After": str(rejection.retry_after)})
+
+
+def generation_options(body: Dict) -> Dict:
+    """Converte os parâmetros de uma requisição da OpenAI nas opções do motor."""
+    options = {key: body[key] for key in OPENAI_OPTIONS if body.get(key) is not None}
+    if body.get("max_completion_tokens") is not None:
+        options["max_tokens"] = body["max_completion_tokens"]
+    return options
+
+
+def header_hostname(value: str) -> str:
+    """Nome do host de um cabeçalho Host (`nome[:porta]`) ou Origin (URL), sem a porta."""
+    if "://" in value:
+        return (urlsplit(value).hostname or "").lower()
+    if value.startswith("["):
+        return value[1:].partition("]")[0].lower()
+    return value.rsplit(":", 1)[0].lower() if value.count(":") == 1 else value.lower()
+
+
+def message_text(content) -> str:
+    """Conteúdo de uma mensagem: texto ou lista de partes (só as partes de texto são usadas)."""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class ApiServer:
+    """Servidor HTTP compatível com a OpenAI sobre o SevenXEngine e o OllamaClient."""
+
+    def __init__(self, engine: "SevenXEngine", ollama_client: Optional["OllamaClient"] = None,
+                 host: str = "127.0.0.1", port: int = 8080, max_workers: int = 8, api_key: str = ""):
+        self.engine = engine
+        self.ollama_client = ollama_client
+        self.host = host
+        self.port = port
+        self.api_key = api_key or ""
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="sevenx-api")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[Thread] = None
+        self._ready = Event()
+        self._start_error: Optional[BaseException] = None
+        self.stats = {"requests": 0, "active_streams": 0, "disconnects": 0, "rejected": 0}
+
+    # --- Ciclo de vida ---
+    def start(self) -> bool:
+        """Inicia o servidor em segundo plano. Retorna False se a porta não puder ser usada."""
+        self._thread = Thread(target=self._run_loop, name="sevenx-api-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            logger.error(f"API local não iniciada em {self.host}:{self.port}: {self._start_error}")
+            return False
+        logger.info(f"API local compatível com OpenAI em http://{self.host}:{self.port}/v1")
+        return True
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port)
+            )
+            # Porta 0: o sistema escolhe uma livre
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self._start_error = e
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def stop(self):
+        """Para de aceitar conexões e cancela as gerações em andamento."""
+        if self._loop is not None and self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+
+    # --- HTTP ---
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ApiError as e:
+                    await self._send_error(writer, e)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                self.stats["requests"] += 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    self._authorize(headers)
+                    keep_alive = await self._dispatch(method, path, body, writer) and keep_alive
+                except ApiError as e:
+                    await self._send_error(writer, e)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    logger.error(f"Erro na API local em {method} {path}: {e}")
+                    await self._send_error(writer, ApiError(500, str(e), "server_error"))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise ApiError(400, "Content-Length inválido.")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, f"Corpo da requisição maior que {MAX_BODY_BYTES // (1024 * 1024)} MB.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    def _authorize(self, headers: Dict[str, str]):
+        """Recusa requisições endereçadas a outro nome (DNS rebinding), vindas de outro site ou sem a chave."""
+        # Escutando em todas as interfaces, o Host é o endereço da máquina na rede: aceito só com a chave
+        if not (self.api_key and self.host in WILDCARD_HOSTS):
+            allowed = LOOPBACK_HOSTS | ({self.host.lower()} - WILDCARD_HOSTS)
+            for name in ("host", "origin"):
+                value = headers.get(name)
+                if value is not None and header_hostname(value) not in allowed:
+                    self.stats["rejected"] += 1
+                    raise ApiError(403, f"Cabeçalho {name.capitalize()} recusado pela API local: {value}",
+                                   "forbidden")
+        if self.api_key:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.api_key.encode()):
+                self.stats["rejected"] += 1
+                raise ApiError(401, "Chave da API ausente ou inválida.", "invalid_api_key",
+                               {"WWW-Authenticate": "Bearer"})
+
+    @staticmethod
+    def _headers(status: int, extra: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in extra.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                         headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(self._headers(status, dict({"Content-Type": "application/json",
+                                                 "Content-Length": str(len(data))}, **(headers or {}))))
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, error: ApiError):
+        await self._send_json(writer, error.status, {"error": {
+            "message": str(error), "type": error.error_type, "code": error.status}}, error.headers)
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        """Atende uma requisição. Retorna False se a conexão deve ser fechada (respostas SSE)."""
+        routes = {"/v1/models": "GET", "/v1/chat/completions": "POST", "/v1/completions": "POST"}
+        path = path.rstrip("/")
+        if path not in routes:
+            raise ApiError(404, f"Rota não encontrada: {path}")
+        if method != routes[path]:
+            raise ApiError(405, f"Método {method} não permitido em {path}")
+        if path == "/v1/models":
+            await self._send_json(writer, 200, {"object": "list", "data": await self._run(self.list_models)})
+            return True
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Corpo da requisição não é um JSON válido.")
+        if not isinstance(request, dict) or not request.get("model"):
+            raise ApiError(400, "O campo 'model' é obrigatório.")
+        if request.get("priority", PRIORITY_NORMAL) not in PRIORITIES:
+            raise ApiError(400, f"O campo 'priority' deve ser um de: {', '.join(PRIORITIES)}.")
+        chat = path == "/v1/chat/completions"
+        messages = self._request_messages(request, chat)
+        backend = await self._run(self._resolve_backend, request["model"])
+        if request.get("stream"):
+            await self._stream_response(writer, backend, request, messages, chat)
+            return False
+        await self._complete_response(writer, backend, request, messages, chat)
+        return True
+
+    @staticmethod
+    async def _run(function: Callable, *args):
+        # Consultas rápidas usam o executor padrão do loop: não esperam atrás das gerações
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    # --- Modelos ---
+    def _ollama_models(self) -> List[Dict]:
+        if self.ollama_client is None or not self.engine.config.get("ollama_host"):
+            return []
+        try:
+            return self.ollama_client.list_models()
+        except Exception as e:
+            logger.debug(f"Modelos do Ollama indisponíveis para a API: {e}")
+            return []
+
+    def list_models(self) -> List[Dict]:
+        """Modelos instalados no SevenX e no Ollama, no formato de `/v1/models`."""
+        models = [{"id": model.name, "object": "model", "created": int(time.time()), "owned_by": "sevenx"}
+                  for model in self.engine.list_installed_models()]
+        local = {model["id"] for model in models}
+        models += [{"id": model["id"], "object": "model", "created": int(time.time()), "owned_by": "ollama"}
+                   for model in self._ollama_models() if model["id"] not in local]
+        return models
+
+    def _resolve_backend(self, model_id: str) -> str:
+        if any(model.name == model_id for model in self.engine.list_installed_models()):
+            return "sevenx"
+        if any(model["id"] == model_id for model in self._ollama_models()):
+            return "ollama"
+        raise ApiError(404, f"Modelo '{model_id}' não encontrado.", "model_not_found")
+
+    @staticmethod
+    def _request_messages(request: Dict, chat: bool) -> List[Dict]:
+        if chat:
+            messages = request.get("messages")
+            if not isinstance(messages, list) or not messages:
+                raise ApiError(400, "O campo 'messages' deve ser uma lista não vazia.")
+            return [{"role": m.get("role", "user"), "content": message_text(m.get("content"))} for m in messages]
+        prompt = request.get("prompt")
+        if isinstance(prompt, list):
+            if len(prompt) != 1:
+                raise ApiError(400, "Só um prompt por requisição é suportado.")
+            prompt = prompt[0]
+        if not isinstance(prompt, str):
+            raise ApiError(400, "O campo 'prompt' é obrigatório.")
+        # O motor sempre aplica o template de chat: o prompt vira a mensagem do usuário
+        return [{"role": "user", "content": prompt}]
+
+    # --- Geração ---
+    def _generator(self, backend: str, request: Dict, messages: List[Dict], options: Dict,
+                   cancel_token: CancellationToken) -> Iterator[str]:
+        if backend == "ollama":
+            return self.ollama_client.chat_stream(request["model"], messages, options, cancel_token=cancel_token)
+        return self.engine.generate_stream(request["model"], messages, options, cancel_token=cancel_token,
+                                           priority=request.get("priority", PRIORITY_NORMAL))
+
+    async def _tokens(self, backend: str, request: Dict, messages: List[Dict],
+                      cancel_token: CancellationToken) -> AsyncIterator[str]:
+        """Roda a geração (bloqueante) no pool e entrega os pedaços ao loop por uma fila."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        options = generation_options(request)
+
+        def pump():
+            generator = None
+            try:
+                generator = self._generator(backend, request, messages, options, cancel_token)
+                for piece in generator:
+                    if cancel_token.error is not None:
+                        # O texto é a mensagem de erro do motor, não parte da resposta
+                        raise ApiError(500, cancel_token.error, "server_error")
+                    if cancel_token.is_cancelled:
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+            except BaseException as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                if hasattr(generator, "close"):
+                    # Fecha já o gerador do motor, que registra o cancelamento e libera o modelo
+                    generator.close()
+                loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+        future = loop.run_in_executor(self._executor, pump)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, AdmissionRejected):
+                    raise rejection_error(item)
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Cliente desconectou ou a resposta terminou: a geração para no próximo passo
+            cancel_token.cancel()
+            await asyncio.shield(future)
+
+    @staticmethod
+    def _envelope(request: Dict, chat: bool, completion_id: str) -> Dict:
+        return {"id": completion_id, "created": int(time.time()), "model": request["model"],
+                "object": ("chat.completion" if chat else "text_completion")}
+
+    @staticmethod
+    def _finish_reason(request: Dict, cancel_token: CancellationToken) -> str:
+        """"length" se a geração parou por atingir o `max_tokens` pedido, senão "stop"."""
+        max_tokens = generation_options(request).get("max_tokens")
+        return "length" if max_tokens and cancel_token.generated_tokens >= max_tokens else "stop"
+
+    async def _complete_response(self, writer: asyncio.StreamWriter, backend: str, request: Dict,
+                                 messages: List[Dict], chat: bool):
+        cancel_token = CancellationToken()
+        tokens = self._tokens(backend, request, messages, cancel_token)
+        try:
+            pieces = [piece async for piece in tokens]
+        finally:
+            await tokens.aclose()
+        text = "".join(pieces).strip()
+        finish_reason = self._finish_reason(request, cancel_token)
+        payload = self._envelope(request, chat, f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex}")
+        if chat:
+            payload["choices"] = [{"index": 0, "message": {"role": "assistant", "content": text},
+                                   "finish_reason": finish_reason}]
+        else:
+            payload["choices"] = [{"index": 0, "text": text, "logprobs": None, "finish_reason": finish_reason}]
+        await self._send_json(writer, 200, payload)
+
+    async def _stream_response(self, writer: asyncio.StreamWriter, backend: str, request: Dict,
+                               messages: List[Dict], chat: bool):
+        envelope = self._envelope(request, chat, f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex}")
+        if chat:
+            envelope["object"] = "chat.completion.chunk"
+
+        def chunk(content: Optional[str], finish_reason: Optional[str] = None, role: bool = False) -> bytes:
+            if chat:
+                delta = {"role": "assistant"} if role else {}
+                if content is not None:
+                    delta["content"] = content
+                choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+            else:
+                choice = {"index": 0, "text": content or "", "logprobs": None, "finish_reason": finish_reason}
+            return f"data: {json.dumps(dict(envelope, choices=[choice]), ensure_ascii=False)}\n\n".encode("utf-8")
+
+        cancel_token = CancellationToken()
+        tokens = self._tokens(backend, request, messages, cancel_token)
+        self.stats["active_streams"] += 1
+        try:
+            # O primeiro pedaço vem antes dos cabeçalhos: uma recusa da fila ainda vira 429/503
+            try:
+                pending = [await tokens.__anext__()]
+            except StopAsyncIteration:
+                pending = []
+            writer.write(self._headers(200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                             "Connection": "close"}))
+            if chat:
+                writer.write(chunk(None, role=True))
+            for piece in pending:
+                writer.write(chunk(piece))
+            await writer.drain()
+
+            try:
+                async for piece in tokens:
+                    writer.write(chunk(piece))
+                    await writer.drain()
+            except ApiError as e:
+                # Os cabeçalhos (200) já foram enviados: a falha vai como evento de erro
+                error = {"error": {"message": str(e), "type": e.error_type, "code": e.status}}
+                writer.write(f"data: {json.dumps(error, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await writer.drain()
+                return
+            writer.write(chunk(None if chat else "", self._finish_reason(request, cancel_token)))
+            writer.write(b"data: [DONE]\n\n")
+            await writer.drain()
+        except ConnectionError:
+            self.stats["disconnects"] += 1
+            logger.info(f"Cliente da API desconectou durante a geração de {request['model']}; geração cancelada.")
+        finally:
+            # Fecha o gerador na hora (e não na coleta de lixo) para cancelar a geração
+            await tokens.aclose()
+            self.stats["active_streams"] -= 1
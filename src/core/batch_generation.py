@@ -0,0 +1,78 @@
+"""
+Arquivo: batch_generation.py
+Descrição: Utilitários da geração offline em lote (avaliação, rotulagem de datasets).
+
+Os prompts são agrupados em baldes de comprimento parecido, para que o padding
+à esquerda dentro de cada lote desperdice pouco processamento, e cada lote
+roda em um único `model.generate`.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from .lazy_imports import LazyModule
+
+torch = LazyModule("torch")
+
+
+@dataclass
+class BatchItemResult:
+    """Resultado de um prompt da geração em lote."""
+    index: int
+    text: str
+    prompt_tokens: int
+    generated_tokens: int
+    batch_id: int
+    batch_size: int
+    queue_seconds: float       # Espera desde o início do job até o lote do item começar
+    generation_seconds: float  # Duração do `generate` do lote do item
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.generated_tokens / self.generation_seconds if self.generation_seconds > 0 else 0.0
+
+
+def make_length_buckets(lengths: Sequence[int], batch_size: int,
+                        max_batch_tokens: Optional[int] = None) -> List[List[int]]:
+    """
+    Agrupa os índices dos prompts em lotes de comprimento parecido.
+
+    Os prompts são ordenados do mais longo para o mais curto (um lote grande
+    demais falha logo no início do job) e cortados em lotes de até `batch_size`
+    itens. Com `max_batch_tokens`, o lote também é fechado quando os tokens com
+    padding (itens × maior prompt) passariam do limite.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    buckets, current = [], []
+    for index in order:
+        if current:
+            # Ordem decrescente: o primeiro item do lote é o mais longo
+            padded_tokens = (len(current) + 1) * lengths[current[0]]
+            if len(current) >= batch_size or (max_batch_tokens and padded_tokens > max_batch_tokens):
+                buckets.append(current)
+                current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def left_pad(sequences: Sequence[Sequence[int]], pad_token_id: int) -> Tuple["torch.Tensor", "torch.Tensor"]:
+    """Monta input_ids e attention_mask com padding à esquerda, como o `generate` espera para decoders."""
+    width = max(len(ids) for ids in sequences)
+    input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+    for row, ids in enumerate(sequences):
+        if ids:
+            input_ids[row, width - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, width - len(ids):] = 1
+    return input_ids, attention_mask
+
+
+def count_generated_tokens(tokens: Sequence[int], eos_token_ids: Sequence[int]) -> int:
+    """Conta os tokens gerados até o primeiro EOS (inclusive), ignorando o padding depois dele."""
+    for position, token in enumerate(tokens):
+        if token in eos_token_ids:
+            return position + 1
+    return len(tokens)
@@ -0,0 +1,385 @@
+"""
+Arquivo: batch_scheduler.py
+Descrição: Escalonador de continuous batching para modelos Transformers.
+
+Em vez de cada requisição rodar o seu próprio `model.generate` em uma thread,
+um único loop por modelo junta todas as requisições ativas em um batch de
+decodificação. Requisições novas entram e requisições concluídas saem a cada
+passo, e os tokens são devolvidos ao stream de cada chamador.
+"""
+
+import itertools
+import queue
+import time
+from dataclasses import dataclass, field
+from threading import Condition, Event, Thread
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import logging
+
+import torch
+import torch.nn.functional as F
+
+try:
+    from transformers import DynamicCache
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+from .cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+# Opções de geração que o escalonador não sabe executar passo a passo
+UNSUPPORTED_OPTIONS = {"num_beams", "num_beam_groups", "penalty_alpha", "constraints", "force_words_ids",
+                       "num_return_sequences", "assistant_model", "prompt_lookup_num_tokens"}
+
+
+def supports_batching(options: Dict) -> bool:
+    """Indica se as opções de geração podem ser atendidas pelo escalonador."""
+    for key in UNSUPPORTED_OPTIONS:
+        value = options.get(key)
+        if value not in (None, False, 0, 1):
+            return False
+    return True
+
+
+@dataclass
+class SamplingParams:
+    """Parâmetros de amostragem aplicados a uma requisição."""
+    max_new_tokens: int = 256
+    do_sample: bool = False
+    temperature: float = 1.0
+    top_k: int = 0
+    top_p: float = 1.0
+    repetition_penalty: float = 1.0
+    eos_token_ids: Set[int] = field(default_factory=set)
+
+    @classmethod
+    def from_options(cls, options: Dict, generation_config=None) -> "SamplingParams":
+        """Cria os parâmetros a partir das opções já filtradas para o Transformers."""
+        def pick(name, default):
+            # Opções explícitas primeiro, depois o generation_config do modelo
+            for value in (options.get(name), getattr(generation_config, name, None)):
+                if value is not None:
+                    return value
+            return default
+
+        eos = pick("eos_token_id", None)
+        if eos is None:
+            eos_ids = set()
+        elif isinstance(eos, (list, tuple, set)):
+            eos_ids = set(eos)
+        else:
+            eos_ids = {eos}
+
+        temperature = float(pick("temperature", 1.0))
+        do_sample = bool(pick("do_sample", False)) and temperature > 0
+        return cls(
+            max_new_tokens=int(pick("max_new_tokens", 256)),
+            do_sample=do_sample,
+            temperature=temperature,
+            top_k=int(pick("top_k", 0) or 0),
+            top_p=float(pick("top_p", 1.0)),
+            repetition_penalty=float(pick("repetition_penalty", 1.0)),
+            eos_token_ids=eos_ids,
+        )
+
+
+class BatchRequest:
+    """Uma requisição em andamento no escalonador. Iterar sobre ela devolve os pedaços de texto."""
+
+    _END = object()
+
+    def __init__(self, request_id: int, input_ids: List[int], params: SamplingParams,
+                 past_key_values: Any = None, keep_cache: bool = False,
+                 cancel_token: Optional[CancellationToken] = None):
+        self.request_id = request_id
+        self.input_ids = list(input_ids)
+        self.params = params
+        self.past_key_values = past_key_values
+        self.keep_cache = keep_cache
+        self.generated: List[int] = []
+        self.error: Optional[Exception] = None
+        self.finished = Event()
+        self.submitted_at = time.perf_counter()
+        # Preenchidos ao final quando keep_cache=True, para reaproveitamento pelo KVCacheStore
+        self.cache_token_ids: List[int] = []
+        self.final_cache: Any = None
+        self.cancel_token = cancel_token or CancellationToken()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._printed = 0
+
+    def cancel(self):
+        """Pede ao escalonador que remova a requisição no próximo passo."""
+        self.cancel_token.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token.is_cancelled
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def _push_text(self, tokenizer, final: bool = False):
+        text = tokenizer.decode(self.generated, skip_special_tokens=True)
+        # Segura caracteres incompletos (bytes parciais de UTF-8) até o próximo token
+        if text.endswith("�") and not final:
+            return
+        if len(text) > self._printed:
+            self._queue.put(text[self._printed:])
+            self._printed = len(text)
+
+    def _finish(self, error: Optional[Exception] = None):
+        self.error = error
+        self._queue.put(self._END)
+        self.finished.set()
+
+
+class ContinuousBatchScheduler:
+    """
+    Loop de decodificação compartilhado por todas as requisições de um modelo.
+
+    O KV cache do batch fica alinhado à direita (padding à esquerda): cada linha
+    guarda os seus tokens reais no final e a máscara de atenção zera o padding.
+    """
+
+    def __init__(self, model, tokenizer, device: str, max_batch_size: int = 8):
+        if not TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("Transformers não disponível para o escalonador de batching.")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.stats = {"steps": 0, "tokens": 0, "max_batch": 0}
+
+        self._ids = itertools.count(1)
+        self._waiting: List[BatchRequest] = []
+        self._condition = Condition()
+        self._running = True
+
+        # Estado do batch ativo
+        self._active: List[BatchRequest] = []
+        self._cache = None
+        self._mask: Optional[torch.Tensor] = None
+        self._positions: Optional[torch.Tensor] = None
+        self._next_tokens: List[int] = []
+
+        self._thread = Thread(target=self._loop, name="sevenx-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, input_ids: List[int], params: SamplingParams, past_key_values: Any = None,
+               keep_cache: bool = False, cancel_token: Optional[CancellationToken] = None) -> BatchRequest:
+        """
+        Enfileira uma requisição. `past_key_values` pode trazer o cache de um prefixo
+        de `input_ids` já processado, e então só o restante passa pelo prefill.
+        """
+        request = BatchRequest(next(self._ids), input_ids, params, past_key_values, keep_cache, cancel_token)
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Escalonador encerrado.")
+            self._waiting.append(request)
+            self._condition.notify()
+        return request
+
+    def shutdown(self):
+        """Encerra o loop e finaliza as requisições pendentes."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=5)
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    # --- Loop principal ---
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self._running and not self._waiting and not self._active:
+                    self._condition.wait()
+                if not self._running:
+                    break
+                free = self.max_batch_size - len(self._active)
+                admitted, self._waiting = self._waiting[:free], self._waiting[free:]
+
+            try:
+                with torch.inference_mode():
+                    for request in admitted:
+                        self._admit(request)
+                    self._drop_finished()
+                    if self._active:
+                        self._decode_step()
+                        self._drop_finished()
+            except Exception as e:
+                logger.error(f"Erro no escalonador de batching: {e}")
+                for request in self._active + admitted:
+                    if not request.finished.is_set():
+                        request._finish(e)
+                self._reset_batch()
+
+        for request in self._active + self._waiting:
+            request._finish(RuntimeError("Escalonador encerrado."))
+        self._reset_batch()
+        self._waiting = []
+
+    def _admit(self, request: BatchRequest):
+        """Faz o prefill da requisição e a junta ao batch ativo."""
+        past = request.past_key_values
+        reused = past.get_seq_length() if past is not None else 0
+        if past is None:
+            past = self._new_cache()
+        suffix = torch.tensor([request.input_ids[reused:]], device=self.device)
+        positions = torch.arange(reused, len(request.input_ids), device=self.device).unsqueeze(0)
+        output = self.model(input_ids=suffix, position_ids=positions, past_key_values=past, use_cache=True)
+        request.past_key_values = None
+
+        token = self._sample(output.logits[0, -1], request)
+        self._merge(request, self._cache_layers(past), token)
+        self._emit(len(self._active) - 1, token)
+
+    def _decode_step(self):
+        """Executa um passo de decodificação para todas as linhas ativas."""
+        batch = len(self._active)
+        input_ids = torch.tensor(self._next_tokens, device=self.device).unsqueeze(1)
+        self._mask = torch.cat([self._mask, self._mask.new_ones((batch, 1))], dim=1)
+        output = self.model(input_ids=input_ids, attention_mask=self._mask,
+                            position_ids=self._positions.unsqueeze(1), past_key_values=self._cache, use_cache=True)
+        self._positions = self._positions + 1
+
+        logits = output.logits[:, -1]
+        for row, request in enumerate(self._active):
+            self._emit(row, self._sample(logits[row], request))
+
+        self.stats["steps"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], batch)
+
+    def _emit(self, row: int, token: int):
+        request = self._active[row]
+        request.generated.append(token)
+        # O loop do batch atende todas as requisições: uma pausa aqui travaria as demais
+        request.cancel_token.record_token(checkpoint=False)
+        self._next_tokens[row] = token
+        self.stats["tokens"] += 1
+        if token not in request.params.eos_token_ids:
+            request._push_text(self.tokenizer)
+
+    # --- Manipulação do batch ---
+    def _merge(self, request: BatchRequest, layers: List[Tuple[torch.Tensor, torch.Tensor]], token: int):
+        length = layers[0][0].shape[2]
+        row_mask = torch.ones((1, length), dtype=torch.long, device=self.device)
+        if not self._active:
+            self._cache, self._mask = self._build_cache(layers), row_mask
+            self._positions = torch.tensor([length], device=self.device)
+        else:
+            current = self._mask.shape[1]
+            target = max(current, length)
+            self._cache = self._build_cache([
+                (torch.cat([self._pad_left(k, target - current), self._pad_left(nk, target - length)]),
+                 torch.cat([self._pad_left(v, target - current), self._pad_left(nv, target - length)]))
+                for (k, v), (nk, nv) in zip(self._cache_layers(self._cache), layers)
+            ])
+            self._mask = torch.cat([F.pad(self._mask, (target - current, 0)), F.pad(row_mask, (target - length, 0))])
+            self._positions = torch.cat([self._positions, torch.tensor([length], device=self.device)])
+        self._active.append(request)
+        self._next_tokens.append(token)
+
+    def _drop_finished(self):
+        """Remove do batch as requisições concluídas ou canceladas."""
+        keep = []
+        for row, request in enumerate(self._active):
+            params = request.params
+            done = (request.cancelled or request.generated[-1] in params.eos_token_ids
+                    or len(request.generated) >= params.max_new_tokens)
+            if not done:
+                keep.append(row)
+                continue
+            if request.keep_cache:
+                self._export_cache(row, request)
+            request._push_text(self.tokenizer, final=True)
+            request._finish()
+
+        if len(keep) == len(self._active):
+            return
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, device=self.device)
+        self._active = [self._active[i] for i in keep]
+        self._next_tokens = [self._next_tokens[i] for i in keep]
+        self._mask = self._mask.index_select(0, index)
+        self._positions = self._positions.index_select(0, index)
+        # Colunas que são padding em todas as linhas restantes podem ser descartadas
+        start = int((self._mask.sum(dim=0) == 0).long().cumprod(dim=0).sum().item())
+        self._mask = self._mask[:, start:]
+        self._cache = self._build_cache([(k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+                                         for k, v in self._cache_layers(self._cache)])
+
+    def _export_cache(self, row: int, request: BatchRequest):
+        """Copia o KV cache da linha (sem padding) para reaproveitamento no próximo turno."""
+        real = int(self._mask[row].sum().item())
+        layers = [(k[row:row + 1, :, -real:].clone(), v[row:row + 1, :, -real:].clone())
+                  for k, v in self._cache_layers(self._cache)]
+        request.final_cache = self._build_cache(layers)
+        request.cache_token_ids = (request.input_ids + request.generated)[:real]
+
+    def _reset_batch(self):
+        self._active, self._next_tokens = [], []
+        self._cache = None
+        self._mask = None
+        self._positions = None
+
+    # --- Utilitários ---
+    def _sample(self, logits: torch.Tensor, request: BatchRequest) -> int:
+        params = request.params
+        logits = logits.float()
+        if params.repetition_penalty != 1.0:
+            seen = torch.tensor(sorted(set(request.input_ids + request.generated)), device=logits.device)
+            scores = logits[seen]
+            logits[seen] = torch.where(scores < 0, scores * params.repetition_penalty,
+                                       scores / params.repetition_penalty)
+        if not params.do_sample:
+            return int(torch.argmax(logits).item())
+
+        logits = logits / params.temperature
+        if 0 < params.top_k < logits.shape[-1]:
+            threshold = torch.topk(logits, params.top_k).values[-1]
+            logits = logits.masked_fill(logits < threshold, float("-inf"))
+        if params.top_p < 1.0:
+            sorted_logits, sorted_indices = torch.sort(logits, descending=True)
+            cumulative = torch.softmax(sorted_logits, dim=-1).cumsum(dim=-1)
+            remove = cumulative > params.top_p
+            remove[1:] = remove[:-1].clone()
+            remove[0] = False
+            logits[sorted_indices[remove]] = float("-inf")
+        probs = torch.softmax(logits, dim=-1)
+        return int(torch.multinomial(probs, 1).item())
+
+    def _new_cache(self):
+        try:
+            return DynamicCache(config=self.model.config)
+        except TypeError:
+            return DynamicCache()
+
+    @staticmethod
+    def _pad_left(tensor: torch.Tensor, amount: int) -> torch.Tensor:
+        return F.pad(tensor, (0, 0, amount, 0)) if amount > 0 else tensor
+
+    @staticmethod
+    def _cache_layers(cache) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        if hasattr(cache, "layers"):
+            return [(layer.keys, layer.values) for layer in cache.layers]
+        return list(zip(cache.key_cache, cache.value_cache))
+
+    @staticmethod
+    def _build_cache(layers: List[Tuple[torch.Tensor, torch.Tensor]]):
+        if hasattr(DynamicCache, "from_legacy_cache"):
+            return DynamicCache.from_legacy_cache(tuple(layers))
+        return DynamicCache(ddp_cache_data=layers)
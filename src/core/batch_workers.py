@@ -0,0 +1,348 @@
+"""
+Arquivo: batch_workers.py
+Descrição: Pool de processos para jobs em lote offline, com paralelismo de dados entre núcleos.
+
+Com modelos pequenos, um único processo não escala em máquinas com dezenas de
+núcleos: o GIL, o overhead do Python por passo e um único pool intra-op do
+torch deixam a maior parte da CPU ociosa. O `ProcessBatchPool` inicia N
+processos, cada um fixado em um conjunto disjunto de núcleos (sem atravessar
+nós NUMA quando possível) e com uma cópia do modelo carregada por mapeamento de
+memória: as páginas dos pesos vêm do page cache e são compartilhadas entre os
+processos, então a RAM não cresce N vezes.
+
+Os prompts (de um JSONL, por exemplo) são lidos sob demanda e distribuídos em
+fatias para os processos; cada processo roda `generate_batch` na sua fatia e os
+resultados voltam em ordem de entrada, mesmo que as fatias terminem fora de
+ordem.
+
+Uso:
+    python batch.py --model-id org/modelo --input prompts.jsonl --output respostas.jsonl --workers 8
+"""
+
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+from .batch_generation import BatchItemResult
+from .thread_tuning import ThreadConfig, apply_thread_config, cpu_topology
+
+logger = logging.getLogger(__name__)
+
+# Fatias em andamento por processo: mantém todos ocupados sem ler o JSONL inteiro de uma vez
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+# Intervalo em que o pool confere se algum processo morreu enquanto espera resultados
+WORKER_CHECK_SECONDS = 1.0
+# Configurações aplicadas a todos os processos: o cache de respostas em disco não é
+# compartilhado com segurança entre processos e as threads são fixadas pelo pool
+WORKER_SETTINGS = {"engine_settings.response_cache": False, "engine_settings.thread_autotune": False}
+
+
+def _split(cpus: List[int], parts: int) -> List[List[int]]:
+    size, extra = divmod(len(cpus), parts)
+    chunks, start = [], 0
+    for index in range(parts):
+        end = start + size + (1 if index < extra else 0)
+        chunks.append(cpus[start:end])
+        start = end
+    return chunks
+
+
+def partition_cpus(workers: int, topology: Optional[Dict] = None) -> List[List[int]]:
+    """
+    Conjuntos disjuntos de CPUs, um por processo: um lógico por núcleo físico e,
+    com vários nós NUMA e processos múltiplos do número de nós, sem atravessar nós.
+
+    Raises:
+        ValueError: Se há mais processos que CPUs.
+    """
+    topology = topology or cpu_topology()
+    physical = topology["physical"]
+    cpus = physical if workers <= len(physical) else topology["logical"]
+    if workers < 1 or workers > len(cpus):
+        raise ValueError(f"Número de processos inválido: {workers} (há {len(cpus)} CPUs disponíveis)")
+
+    nodes = topology.get("numa") or {}
+    if cpus is physical and len(nodes) > 1 and workers % len(nodes) == 0:
+        physical_set = set(physical)
+        node_cpus = [[cpu for cpu in node if cpu in physical_set] for _, node in sorted(nodes.items())]
+        if all(len(node) >= workers // len(nodes) for node in node_cpus):
+            return [chunk for node in node_cpus for chunk in _split(node, workers // len(nodes))]
+    return _split(cpus, workers)
+
+
+def default_workers(topology: Optional[Dict] = None) -> int:
+    """Um processo por nó NUMA ou, em um único nó, um a cada 4 núcleos físicos."""
+    topology = topology or cpu_topology()
+    if len(topology.get("numa") or {}) > 1:
+        return len(topology["numa"])
+    return max(1, len(topology["physical"]) // 4)
+
+
+def read_prompts_jsonl(path: Path) -> Iterator[Tuple[Any, Any]]:
+    """
+    Lê (id, prompt) de um JSONL. Cada linha é um texto ou um objeto com "prompt"
+    (texto) ou "messages" (lista de mensagens) e, opcionalmente, "id".
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield None, record
+                continue
+            prompt = record.get("messages") or record.get("prompt") if isinstance(record, dict) else None
+            if not prompt:
+                raise ValueError(f"Linha {line_number} de {path} sem 'prompt' nem 'messages'.")
+            yield record.get("id"), prompt
+
+
+def _worker_main(worker_id: int, cpus: List[int], model_id: str, options: Dict, batch_size: int,
+                 max_batch_tokens: Optional[int], settings: Dict, tasks, results):
+    """Processo de trabalho: fixa as CPUs, carrega o modelo e atende fatias até receber None."""
+    # Antes de importar o torch: o pool de threads nasce com o tamanho e a afinidade certos
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(len(cpus))
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            logger.warning(f"Processo {worker_id}: não foi possível fixar as CPUs {cpus}: {e}")
+
+    from .config import Config
+    from .sevenx_engine import SevenXEngine
+
+    try:
+        config = Config()
+        for key, value in dict(WORKER_SETTINGS, **settings).items():
+            config.set(key, value)
+        engine = SevenXEngine(config)
+        # Processos por núcleos da CPU: N cópias na mesma GPU não fariam sentido
+        engine._device = "cpu"
+        started = time.perf_counter()
+        if not engine.load_model(model_id):
+            raise RuntimeError(f"Falha ao carregar o modelo {model_id}.")
+        thread_config = ThreadConfig(len(cpus), f"processo{worker_id}", list(cpus))
+        engine.model_pool[model_id]["threads"] = thread_config
+        apply_thread_config(thread_config)
+        results.put(("ready", worker_id, time.perf_counter() - started))
+    except Exception as e:
+        results.put(("failed", worker_id, str(e)))
+        return
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            shard_id, indices, prompts = task
+            started = time.perf_counter()
+            try:
+                items = engine.generate_batch(model_id, prompts, options, batch_size, max_batch_tokens)
+                error = None
+            except Exception as e:
+                items, error = [None] * len(prompts), str(e)
+            shard = [dataclasses.replace(item, index=index) if item is not None else
+                     BatchItemResult(index, "", 0, 0, -1, 0, 0.0, 0.0, error=error or "Prompt não processado.")
+                     for index, item in zip(indices, items)]
+            results.put(("shard", worker_id, shard_id, shard, time.perf_counter() - started))
+    finally:
+        engine.cleanup()
+
+
+class ProcessBatchPool:
+    """Processos de geração em lote, um por conjunto de núcleos, com resultados em ordem de entrada."""
+
+    def __init__(self, model_id: str, workers: int = 0, options: Optional[Dict] = None, batch_size: int = 8,
+                 max_batch_tokens: Optional[int] = None, shard_size: int = 0, settings: Optional[Dict] = None,
+                 topology: Optional[Dict] = None):
+        """
+        Args:
+            workers: Número de processos (0 = `default_workers`).
+            shard_size: Prompts por fatia enviada a um processo (0 = 4 lotes).
+            settings: Configurações aplicadas a cada processo (ex.: {"models_directory": ...}).
+        """
+        topology = topology or cpu_topology()
+        self.model_id = model_id
+        self.cpu_sets = partition_cpus(workers or default_workers(topology), topology)
+        self.options = options or {}
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.shard_size = shard_size or batch_size * 4
+        self.settings = settings or {}
+        # "spawn": um fork depois de o torch criar threads pode travar o processo filho
+        self._context = multiprocessing.get_context("spawn")
+        self._tasks = None
+        self._results = None
+        self._processes: List = []
+        self.stats: Dict = {}
+
+    @property
+    def workers(self) -> int:
+        return len(self.cpu_sets)
+
+    def start(self, timeout: float = 600.0) -> List[float]:
+        """
+        Inicia os processos e espera todos carregarem o modelo. Retorna o tempo de carga de cada um.
+
+        Raises:
+            RuntimeError: Se algum processo falhar ao carregar o modelo.
+        """
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        for worker_id, cpus in enumerate(self.cpu_sets):
+            process = self._context.Process(
+                target=_worker_main, name=f"sevenx-batch-{worker_id}", daemon=True,
+                args=(worker_id, cpus, self.model_id, self.options, self.batch_size, self.max_batch_tokens,
+                      self.settings, self._tasks, self._results)
+            )
+            process.start()
+            self._processes.append(process)
+
+        load_seconds = [0.0] * self.workers
+        deadline = time.perf_counter() + timeout
+        for _ in range(self.workers):
+            message = self._next_message(deadline)
+            if message[0] == "failed":
+                self.close()
+                raise RuntimeError(f"Processo {message[1]} falhou ao carregar o modelo: {message[2]}")
+            load_seconds[message[1]] = message[2]
+        self.stats = {"workers": self.workers, "cpu_sets": self.cpu_sets, "load_seconds": load_seconds,
+                      "busy_seconds": [0.0] * self.workers, "prompts": 0, "generated_tokens": 0}
+        logger.info(f"Pool de {self.workers} processos pronto para {self.model_id} "
+                    f"({', '.join(str(len(cpus)) for cpus in self.cpu_sets)} CPUs cada)")
+        return load_seconds
+
+    def _next_message(self, deadline: Optional[float] = None) -> Tuple:
+        while True:
+            try:
+                return self._results.get(timeout=WORKER_CHECK_SECONDS)
+            except queue.Empty:
+                dead = [(index, p.exitcode) for index, p in enumerate(self._processes) if not p.is_alive()]
+                if dead:
+                    self.close()
+                    raise RuntimeError(f"Processo {dead[0][0]} terminou inesperadamente (código {dead[0][1]}).")
+                if deadline is not None and time.perf_counter() > deadline:
+                    self.close()
+                    raise RuntimeError("Os processos não ficaram prontos a tempo.")
+
+    def run(self, prompts: Iterable) -> Iterator[BatchItemResult]:
+        """
+        Gera as respostas dos prompts (textos ou listas de mensagens), lidos sob demanda,
+        e as produz na ordem de entrada.
+        """
+        if not self._processes:
+            self.start()
+        source = iter(prompts)
+        next_index = shard_id = in_flight = 0
+        exhausted = False
+        pending: Dict[int, BatchItemResult] = {}
+        max_in_flight = self.workers * SHARDS_IN_FLIGHT_PER_WORKER
+        started = time.perf_counter()
+
+        while in_flight or not exhausted:
+            while not exhausted and in_flight < max_in_flight:
+                shard = []
+                for prompt in source:
+                    shard.append(prompt)
+                    if len(shard) == self.shard_size:
+                        break
+                if len(shard) < self.shard_size:
+                    exhausted = True
+                if shard:
+                    first = self.stats["prompts"]
+                    self._tasks.put((shard_id, list(range(first, first + len(shard))), shard))
+                    self.stats["prompts"] += len(shard)
+                    shard_id += 1
+                    in_flight += 1
+            if not in_flight:
+                break
+
+            _, worker_id, _, results, busy = self._next_message()
+            in_flight -= 1
+            self.stats["busy_seconds"][worker_id] += busy
+            for result in results:
+                self.stats["generated_tokens"] += result.generated_tokens
+                pending[result.index] = result
+            # Fatias terminam fora de ordem: só sai o que já tem todos os anteriores
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+
+        elapsed = time.perf_counter() - started
+        self.stats["seconds"] = round(elapsed, 3)
+        self.stats["tokens_per_second"] = round(self.stats["generated_tokens"] / elapsed, 2) if elapsed else 0.0
+
+    def close(self, timeout: float = 30.0):
+        """Encerra os processos (os que não saírem a tempo são terminados)."""
+        for process in self._processes:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def __enter__(self) -> "ProcessBatchPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_jsonl(input_path: Path, output_path: Path, model_id: str, workers: int = 0, options: Optional[Dict] = None,
+              batch_size: int = 8, shard_size: int = 0, settings: Optional[Dict] = None) -> Dict:
+    """Gera as respostas de um JSONL de prompts e grava um JSONL de resultados na mesma ordem."""
+    ids = []
+
+    def prompts():
+        for record_id, prompt in read_prompts_jsonl(input_path):
+            ids.append(record_id)
+            yield prompt
+
+    with ProcessBatchPool(model_id, workers, options, batch_size, shard_size=shard_size, settings=settings) as pool, \
+            open(output_path, 'w', encoding='utf-8') as f:
+        for result in pool.run(prompts()):
+            record = {"index": result.index, "text": result.text, "prompt_tokens": result.prompt_tokens,
+                      "generated_tokens": result.generated_tokens}
+            if ids[result.index] is not None:
+                record["id"] = ids[result.index]
+            if result.error:
+                record["error"] = result.error
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return pool.stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Geração em lote do SevenX Studio em vários processos")
+    parser.add_argument("--model-id", required=True, help="Modelo instalado a usar")
+    parser.add_argument("--input", type=Path, required=True, help="JSONL de prompts")
+    parser.add_argument("--output", type=Path, required=True, help="JSONL de saída, na ordem da entrada")
+    parser.add_argument("--workers", default=0, type=int, help="Processos (0 = um por nó NUMA ou a cada 4 núcleos)")
+    parser.add_argument("--batch-size", default=8, type=int)
+    parser.add_argument("--shard-size", default=0, type=int, help="Prompts por fatia (0 = 4 lotes)")
+    parser.add_argument("--max-new-tokens", default=256, type=int)
+    parser.add_argument("--models-dir", type=Path, help="Diretório de modelos (padrão: o configurado)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = {"models_directory": str(args.models_dir)} if args.models_dir else {}
+    stats = run_jsonl(args.input, args.output, args.model_id, args.workers, {"max_new_tokens": args.max_new_tokens},
+                      args.batch_size, args.shard_size, settings)
+    print(f"{stats['prompts']} prompts em {stats['seconds']:.1f}s com {stats['workers']} processos: "
+          f"{stats['tokens_per_second']:.1f} tokens/s")
+    print(f"Resultados salvos em: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
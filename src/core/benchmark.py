@@ -0,0 +1,562 @@
+"""
+Arquivo: benchmark.py
+Descrição: Suíte de benchmark de inferência do SevenXEngine.
+
+Mede tempo de carga, time-to-first-token (TTFT), latência entre tokens,
+tokens/s e pico de RSS em combinações de dtype, threads e tamanho de lote.
+Com `--load-modes`, compara também a carga copiando os pesos com a carga por
+mapeamento de memória e com o formato preparado na instalação (tempo frio e
+quente, RSS e memória anônima). Com `--workers`, mede a curva de escala do
+pool de processos para jobs em lote (tokens/s por número de processos).
+Por padrão usa um modelo Llama minúsculo com pesos aleatórios, criado na
+hora, para rodar offline; os resultados são gravados em JSON para comparar
+execuções e detectar regressões.
+
+Uso:
+    python benchmark.py --dtypes float32,bfloat16 --threads 1,4 --batch-sizes 1,4
+    python benchmark.py --compare benchmark_results/anterior.json
+    python benchmark.py --load-modes copy,mmap
+    python benchmark.py --load-modes copy,prepared
+    python benchmark.py --workers 1,2,4 --batch-sizes 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Thread
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from .lazy_imports import LazyModule
+from .tiny_model import TINY_MODEL_WORDS, create_tiny_model
+
+torch = LazyModule("torch")
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_MODEL_ID = "bench/tiny-llama"
+# Tamanho do modelo minúsculo usado sem `--model-id`
+BENCHMARK_MODEL_SIZE = {"hidden_size": 256, "num_layers": 4, "max_position_embeddings": 2048}
+# Palavras dos prompts sintéticos: o vocabulário do modelo minúsculo, que não conhece outras
+PROMPT_WORDS = TINY_MODEL_WORDS
+# Métricas em que um valor maior é pior, usadas na comparação entre execuções
+LOWER_IS_BETTER = ("load_seconds", "ttft_ms.p50", "itl_ms.p50", "peak_rss_mb")
+HIGHER_IS_BETTER = ("tokens_per_second", "offline_tokens_per_second")
+LOAD_METRICS = ("cold_seconds", "warm_seconds", "anon_mb")
+
+
+def _create_benchmark_model(models_dir: Path, model_size: Optional[Dict] = None, **kwargs) -> str:
+    """Cria em `models_dir` o modelo minúsculo de pesos aleatórios e retorna o seu ID."""
+    create_tiny_model(models_dir / BENCHMARK_MODEL_ID.replace('/', '__'), BENCHMARK_MODEL_ID,
+                      **(model_size or BENCHMARK_MODEL_SIZE), **kwargs)
+    return BENCHMARK_MODEL_ID
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """Resumo estatístico (p50/p90/p99, média, máximo) com interpolação linear."""
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ordered = sorted(values)
+
+    def at(q):
+        position = (len(ordered) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {"p50": round(at(0.5), 3), "p90": round(at(0.9), 3), "p99": round(at(0.99), 3),
+            "mean": round(sum(ordered) / len(ordered), 3), "max": round(ordered[-1], 3)}
+
+
+class PeakRSSSampler:
+    """Amostra o RSS do processo em uma thread e guarda o pico (context manager)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def _sample(self):
+        if PSUTIL_AVAILABLE:
+            self.peak_bytes = max(self.peak_bytes, psutil.Process().memory_info().rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = Thread(target=self._run, name="sevenx-rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak_bytes / (1024 ** 2), 1)
+
+
+def _make_prompts(count: int, words: int) -> List[List[Dict]]:
+    prompts = []
+    for index in range(count):
+        text = " ".join(PROMPT_WORDS[2 + (index + offset) % (len(PROMPT_WORDS) - 2)] for offset in range(words))
+        prompts.append([{"role": "user", "content": text}])
+    return prompts
+
+
+def _timed_stream(engine, model_id: str, messages: List[Dict], options: Dict, record: Dict):
+    """Consome um stream registrando o instante de cada chunk e o total de tokens gerados."""
+    from .cancellation import CancellationToken
+
+    token = CancellationToken()
+    start = time.perf_counter()
+    arrivals = []
+    for _ in engine.generate_stream(model_id, messages, options, cancel_token=token):
+        arrivals.append(time.perf_counter())
+    record.update({"start": start, "arrivals": arrivals, "tokens": token.generated_tokens})
+
+
+def run_scenario(engine, model_id: str, batch_size: int, max_new_tokens: int, repeats: int,
+                 prompt_words: int) -> Dict:
+    """
+    Mede um cenário com o modelo já carregado.
+
+    Cada repetição dispara `batch_size` streams simultâneos (continuous batching
+    quando maior que 1) e mede TTFT e intervalos entre chunks de cada stream;
+    depois roda `generate_batch` com os mesmos prompts para medir a vazão offline.
+    """
+    # eos_token_id=-1 força respostas com max_new_tokens tokens, comparáveis entre execuções
+    options = {"max_new_tokens": max_new_tokens, "do_sample": False, "eos_token_id": -1}
+    ttfts: List[float] = []
+    gaps: List[float] = []
+    stream_rates: List[float] = []
+    total_tokens, total_seconds = 0, 0.0
+
+    for repeat in range(repeats):
+        prompts = _make_prompts(batch_size, prompt_words + repeat)
+        records: List[Dict[str, Any]] = [{} for _ in prompts]
+        threads = [Thread(target=_timed_stream, args=(engine, model_id, messages, options, record))
+                   for messages, record in zip(prompts, records)]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total_seconds += time.perf_counter() - wall_start
+
+        for record in records:
+            arrivals = record.get("arrivals") or []
+            total_tokens += record.get("tokens", 0)
+            if not arrivals:
+                continue
+            ttfts.append((arrivals[0] - record["start"]) * 1000)
+            gaps.extend((b - a) * 1000 for a, b in zip(arrivals, arrivals[1:]))
+            duration = arrivals[-1] - record["start"]
+            if duration > 0:
+                stream_rates.append(record["tokens"] / duration)
+
+    offline_prompts = _make_prompts(batch_size * repeats, prompt_words)
+    offline_start = time.perf_counter()
+    offline = engine.generate_batch(model_id, offline_prompts, options, batch_size=batch_size)
+    offline_seconds = time.perf_counter() - offline_start
+    offline_tokens = sum(r.generated_tokens for r in offline if r is not None)
+
+    return {
+        "ttft_ms": percentiles(ttfts),
+        "itl_ms": percentiles(gaps),
+        "tokens_per_second": round(total_tokens / total_seconds, 2) if total_seconds else 0.0,
+        "per_stream_tokens_per_second": percentiles(stream_rates),
+        "offline_tokens_per_second": round(offline_tokens / offline_seconds, 2) if offline_seconds else 0.0,
+        "generated_tokens": total_tokens,
+    }
+
+
+def environment_info() -> Dict:
+    """Dados do ambiente gravados junto com os resultados."""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "cuda": torch.cuda.is_available(),
+    }
+    try:
+        import transformers
+        info["transformers"] = transformers.__version__
+    except ImportError:
+        pass
+    try:
+        info["git_commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                            cwd=Path(__file__).parent, timeout=5).stdout.strip()
+    except Exception:
+        pass
+    return info
+
+
+def run_benchmark(dtypes: Sequence[str] = ("float32",), threads: Sequence[int] = (0,),
+                  batch_sizes: Sequence[int] = (1,), max_new_tokens: int = 32, repeats: int = 3,
+                  prompt_words: int = 16, model_id: Optional[str] = None, models_dir: Optional[Path] = None,
+                  model_size: Optional[Dict] = None) -> Dict:
+    """
+    Roda todas as combinações de dtype × threads × tamanho de lote.
+
+    Sem `model_id`, cria o modelo minúsculo em um diretório temporário; com
+    `model_id`, usa um modelo instalado em `models_dir` (ou no diretório configurado).
+    """
+    from .config import Config
+    from .sevenx_engine import SevenXEngine
+
+    default_threads = torch.get_num_threads()
+    results: Dict[str, Any] = {
+        "created_at": datetime.now().isoformat(), "environment": environment_info(),
+        "settings": {"max_new_tokens": max_new_tokens, "repeats": repeats, "prompt_words": prompt_words,
+                     "model_id": model_id or BENCHMARK_MODEL_ID},
+        "scenarios": []}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if model_id is None:
+            models_dir = Path(temp_dir)
+            model_id = _create_benchmark_model(models_dir, model_size)
+
+        for dtype, thread_count, batch_size in itertools.product(dtypes, threads, batch_sizes):
+            torch.set_num_threads(thread_count or default_threads)
+            config = Config()
+            if models_dir is not None:
+                config.set("models_directory", str(models_dir))
+            config.set("engine_settings.torch_dtype", dtype)
+            config.set("engine_settings.response_cache", False)
+            # As threads do cenário são fixadas aqui; o ajuste automático as trocaria
+            config.set("engine_settings.thread_autotune", False)
+            config.set("engine_settings.continuous_batching", batch_size > 1)
+            config.set("engine_settings.max_batch_size", batch_size)
+            engine = SevenXEngine(config)
+
+            scenario = {"dtype": dtype, "threads": torch.get_num_threads(), "batch_size": batch_size}
+            logger.info(f"Benchmark: {scenario}")
+            try:
+                with PeakRSSSampler() as rss:
+                    load_start = time.perf_counter()
+                    if not engine.load_model(model_id):
+                        raise RuntimeError(f"Falha ao carregar o modelo {model_id}.")
+                    scenario["load_seconds"] = round(time.perf_counter() - load_start, 3)
+                    # Aquecimento: a primeira geração inclui inicializações preguiçosas do PyTorch
+                    engine.generate_response(model_id, _make_prompts(1, 4)[0], {"max_new_tokens": 2})
+                    scenario.update(run_scenario(engine, model_id, batch_size, max_new_tokens, repeats, prompt_words))
+                scenario["peak_rss_mb"] = rss.peak_mb
+            except Exception as e:
+                logger.error(f"Cenário {scenario} falhou: {e}")
+                scenario["error"] = str(e)
+            finally:
+                engine.cleanup()
+            results["scenarios"].append(scenario)
+
+    torch.set_num_threads(default_threads)
+    return results
+
+
+def _memory_mb() -> Dict[str, float]:
+    """RSS e memória anônima (RSS menos páginas de arquivo, que o kernel pode descartar)."""
+    if not PSUTIL_AVAILABLE:
+        return {"rss_mb": 0.0, "anon_mb": 0.0}
+    info = psutil.Process().memory_info()
+    shared = getattr(info, "shared", 0)
+    return {"rss_mb": round(info.rss / (1024 ** 2), 1), "anon_mb": round((info.rss - shared) / (1024 ** 2), 1)}
+
+
+def measure_load(models_dir: Path, model_id: str, mmap_weights: bool, dtype: str = "float32",
+                 prepared: bool = False) -> Dict:
+    """
+    Carrega o modelo duas vezes neste processo: a primeira carga (fria) inclui a
+    leitura dos arquivos e a inicialização do PyTorch; a segunda (quente), feita
+    depois de descarregar, mede o custo da carga em si com os arquivos no page cache.
+    Com `prepared`, converte antes o modelo para o formato preparado (o tempo da
+    conversão, feita uma única vez na instalação, vai em `prepare_seconds`).
+    """
+    from .config import Config
+    from .sevenx_engine import SevenXEngine
+
+    config = Config()
+    config.set("models_directory", str(models_dir))
+    config.set("engine_settings.torch_dtype", dtype)
+    config.set("engine_settings.response_cache", False)
+    config.set("engine_settings.mmap_weights", mmap_weights)
+    config.set("engine_settings.thread_autotune", False)
+    config.set("engine_settings.prepared_format", prepared)
+    engine = SevenXEngine(config)
+    engine._device = "cpu"
+    result: Dict[str, Any] = {"mode": "prepared" if prepared else "mmap" if mmap_weights else "copy", "dtype": dtype}
+    try:
+        if prepared:
+            start = time.perf_counter()
+            engine.prepare_model(model_id)
+            result["prepare_seconds"] = round(time.perf_counter() - start, 3)
+        before = _memory_mb()
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            if not engine.load_model(model_id):
+                raise RuntimeError(f"Falha ao carregar o modelo {model_id}.")
+            result[f"{label}_seconds"] = round(time.perf_counter() - start, 3)
+            if label == "cold":
+                after = _memory_mb()
+                result["rss_mb"] = round(after["rss_mb"] - before["rss_mb"], 1)
+                result["anon_mb"] = round(after["anon_mb"] - before["anon_mb"], 1)
+                result["mmapped"] = bool(engine.model_pool[model_id].get("mmap"))
+                result["prepared"] = bool(engine.model_pool[model_id].get("prepared"))
+                engine.unload_model(model_id)
+    except Exception as e:
+        logger.error(f"Medição de carga {result['mode']} falhou: {e}")
+        result["error"] = str(e)
+    finally:
+        engine.cleanup()
+    return result
+
+
+def run_load_benchmark(modes: Sequence[str] = ("copy", "mmap"), dtype: str = "float32",
+                       model_id: Optional[str] = None, models_dir: Optional[Path] = None,
+                       model_size: Optional[Dict] = None) -> List[Dict]:
+    """
+    Compara a carga copiando os pesos, por mapeamento de memória e pelo formato
+    preparado. Cada modo roda em um interpretador novo para que o RSS de um não
+    contamine o outro. Com o modo "prepared" e o modelo minúsculo, os pesos são
+    gravados em pickle (.bin), o caso que a preparação resolve.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if model_id is None:
+            models_dir = Path(temp_dir)
+            model_id = _create_benchmark_model(models_dir, model_size, safe_serialization="prepared" not in modes)
+        if models_dir is None:
+            from .config import Config
+            models_dir = Path(Config().get("models_directory"))
+
+        for mode in modes:
+            code = (
+                "import json\n"
+                "from pathlib import Path\n"
+                "from src.core.benchmark import measure_load\n"
+                f"result = measure_load(Path({str(models_dir)!r}), {model_id!r}, {mode != 'copy'!r}, {dtype!r}, "
+                f"{mode == 'prepared'!r})\n"
+                "print('LOAD=' + json.dumps(result))\n"
+            )
+            process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                     cwd=Path(__file__).resolve().parents[2])
+            lines = [line for line in process.stdout.splitlines() if line.startswith("LOAD=")]
+            if not lines:
+                error = (process.stderr.strip().splitlines() or ["sem saída"])[-1]
+                results.append({"mode": mode, "dtype": dtype, "error": error})
+                continue
+            results.append(json.loads(lines[-1][len("LOAD="):]))
+    return results
+
+
+def run_scaling_benchmark(worker_counts: Sequence[int] = (1, 2), model_id: Optional[str] = None,
+                          models_dir: Optional[Path] = None, prompts: int = 64, max_new_tokens: int = 32,
+                          batch_size: int = 8, prompt_words: int = 16, model_size: Optional[Dict] = None) -> List[Dict]:
+    """
+    Curva de escala do pool de processos: vazão de um job em lote offline com
+    cada número de processos, com a aceleração e a eficiência em relação a um processo.
+    """
+    from .batch_workers import ProcessBatchPool
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if model_id is None:
+            models_dir = Path(temp_dir)
+            model_id = _create_benchmark_model(models_dir, model_size)
+        settings = {"models_directory": str(models_dir)} if models_dir is not None else {}
+        options = {"max_new_tokens": max_new_tokens, "do_sample": False, "eos_token_id": -1}
+        messages = _make_prompts(prompts, prompt_words)
+
+        for workers in worker_counts:
+            entry: Dict[str, Any] = {"workers": workers}
+            logger.info(f"Benchmark de escala: {workers} processos")
+            try:
+                with ProcessBatchPool(model_id, workers, options, batch_size, settings=settings) as pool:
+                    entry["load_seconds"] = round(max(pool.start()), 3)
+                    # Tempo de carga fica de fora: a curva mede a vazão em regime
+                    start = time.perf_counter()
+                    items = list(pool.run(messages))
+                    elapsed = time.perf_counter() - start
+                errors = [item.error for item in items if item.error]
+                if errors:
+                    raise RuntimeError(errors[0])
+                entry["cpus_per_worker"] = [len(cpus) for cpus in pool.cpu_sets]
+                entry["seconds"] = round(elapsed, 3)
+                entry["tokens_per_second"] = round(sum(item.generated_tokens for item in items) / elapsed, 2)
+            except Exception as e:
+                logger.error(f"Escala com {workers} processos falhou: {e}")
+                entry["error"] = str(e)
+            results.append(entry)
+
+    base = next((entry for entry in results if entry["workers"] == 1 and "error" not in entry), None)
+    for entry in results:
+        if base is not None and "error" not in entry:
+            entry["speedup"] = round(entry["tokens_per_second"] / base["tokens_per_second"], 2)
+            entry["efficiency"] = round(entry["speedup"] / entry["workers"], 2)
+    return results
+
+
+def _scenario_key(scenario: Dict):
+    return scenario["dtype"], scenario["threads"], scenario["batch_size"]
+
+
+def _metric(scenario: Dict, path: str) -> Optional[float]:
+    value: Any = scenario
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float = 0.15) -> List[str]:
+    """Lista as métricas que pioraram mais que `tolerance` em relação à execução de referência."""
+    regressions = []
+    previous = {_scenario_key(s): s for s in baseline.get("scenarios", []) if "error" not in s}
+    for scenario in current.get("scenarios", []):
+        reference = previous.get(_scenario_key(scenario))
+        if reference is None or "error" in scenario:
+            continue
+        for path in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = _metric(reference, path), _metric(scenario, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if path in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f"{_scenario_key(scenario)} {path}: {old} -> {new} ({change:+.0%})")
+    previous_loads = {s["mode"]: s for s in baseline.get("load", []) if "error" not in s}
+    for entry in current.get("load", []):
+        reference = previous_loads.get(entry["mode"])
+        if reference is None or "error" in entry:
+            continue
+        for path in LOAD_METRICS:
+            old, new = reference.get(path), entry.get(path)
+            if not old or new is None or old <= 0:
+                continue
+            change = (new - old) / old
+            if change > tolerance:
+                regressions.append(f"carga {entry['mode']} {path}: {old} -> {new} ({change:+.0%})")
+    previous_scaling = {s["workers"]: s for s in baseline.get("scaling", []) if "error" not in s}
+    for entry in current.get("scaling", []):
+        reference = previous_scaling.get(entry["workers"])
+        if reference is None or "error" in entry:
+            continue
+        old, new = reference.get("tokens_per_second"), entry.get("tokens_per_second")
+        if old and new is not None and (new - old) / old < -tolerance:
+            regressions.append(f"escala {entry['workers']} processos tokens_per_second: {old} -> {new} "
+                               f"({(new - old) / old:+.0%})")
+    return regressions
+
+
+def format_summary(results: Dict) -> str:
+    """Tabela resumida dos cenários para o terminal."""
+    lines = [f"{'dtype':<10}{'threads':>8}{'batch':>7}{'carga s':>9}{'TTFT p50':>10}{'ITL p50':>9}"
+             f"{'ITL p99':>9}{'tok/s':>9}{'offline':>9}{'RSS MB':>9}"]
+    for s in results["scenarios"]:
+        if "error" in s:
+            lines.append(f"{s['dtype']:<10}{s['threads']:>8}{s['batch_size']:>7}  erro: {s['error']}")
+            continue
+        lines.append(f"{s['dtype']:<10}{s['threads']:>8}{s['batch_size']:>7}{s['load_seconds']:>9.2f}"
+                     f"{s['ttft_ms']['p50']:>10.1f}{s['itl_ms']['p50']:>9.1f}{s['itl_ms']['p99']:>9.1f}"
+                     f"{s['tokens_per_second']:>9.1f}{s['offline_tokens_per_second']:>9.1f}{s['peak_rss_mb']:>9.0f}")
+    if results.get("load"):
+        lines.append("")
+        lines.append(f"{'carga':<10}{'dtype':>10}{'fria s':>9}{'quente s':>10}{'RSS MB':>9}{'anôn. MB':>10}")
+        for s in results["load"]:
+            if "error" in s:
+                lines.append(f"{s['mode']:<10}{s['dtype']:>10}  erro: {s['error']}")
+                continue
+            lines.append(f"{s['mode']:<10}{s['dtype']:>10}{s['cold_seconds']:>9.3f}{s['warm_seconds']:>10.3f}"
+                         f"{s['rss_mb']:>9.0f}{s['anon_mb']:>10.0f}")
+    if results.get("scaling"):
+        lines.append("")
+        lines.append(f"{'processos':<10}{'carga s':>9}{'tok/s':>9}{'acelera':>9}{'eficiência':>12}")
+        for s in results["scaling"]:
+            if "error" in s:
+                lines.append(f"{s['workers']:<10}  erro: {s['error']}")
+                continue
+            lines.append(f"{s['workers']:<10}{s['load_seconds']:>9.2f}{s['tokens_per_second']:>9.1f}"
+                         f"{s.get('speedup', 0.0):>9.2f}{s.get('efficiency', 0.0):>12.0%}")
+    return "\n".join(lines)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de inferência do SevenX Studio")
+    parser.add_argument("--dtypes", default="float32", help="Lista separada por vírgulas (float32,bfloat16,float16)")
+    parser.add_argument("--threads", default="0", type=_int_list, help="Threads do PyTorch (0 = padrão)")
+    parser.add_argument("--batch-sizes", default="1", type=_int_list, help="Streams simultâneos / tamanho do lote")
+    parser.add_argument("--max-new-tokens", default=32, type=int)
+    parser.add_argument("--repeats", default=3, type=int)
+    parser.add_argument("--prompt-words", default=16, type=int)
+    parser.add_argument("--model-id", help="Usa um modelo instalado em vez do modelo minúsculo aleatório")
+    parser.add_argument("--models-dir", type=Path, help="Diretório de modelos (padrão: o configurado)")
+    parser.add_argument("--load-modes", default="",
+                        help="Compara também a carga dos pesos: lista separada por vírgulas (copy,mmap,prepared)")
+    parser.add_argument("--workers", default="", type=_int_list,
+                        help="Curva de escala do pool de processos em lote: lista de números de processos (1,2,4)")
+    parser.add_argument("--output", type=Path, help="Arquivo JSON de saída (padrão: benchmark_results/<data>.json)")
+    parser.add_argument("--compare", type=Path, help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", default=0.15, type=float, help="Piora relativa tolerada na comparação")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_benchmark(
+        dtypes=[d for d in args.dtypes.split(',') if d], threads=args.threads, batch_sizes=args.batch_sizes,
+        max_new_tokens=args.max_new_tokens, repeats=args.repeats, prompt_words=args.prompt_words,
+        model_id=args.model_id, models_dir=args.models_dir
+    )
+    load_modes = [m for m in args.load_modes.split(',') if m]
+    if load_modes:
+        dtype = next((d for d in args.dtypes.split(',') if d), "float32")
+        results["load"] = run_load_benchmark(load_modes, dtype, model_id=args.model_id, models_dir=args.models_dir)
+    if args.workers:
+        results["scaling"] = run_scaling_benchmark(args.workers, args.model_id, args.models_dir,
+                                                   max_new_tokens=args.max_new_tokens,
+                                                   batch_size=max(args.batch_sizes), prompt_words=args.prompt_words)
+
+    output = args.output or Path("benchmark_results") / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(format_summary(results))
+    print(f"\nResultados salvos em: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        if regressions:
+            print("\nRegressões em relação a", args.compare)
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nSem regressões em relação a {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
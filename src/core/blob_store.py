@@ -0,0 +1,175 @@
+"""
+Arquivo: blob_store.py
+Descrição: Armazenamento por conteúdo dos arquivos de modelo, com deduplicação por hardlinks.
+
+Fine-tunes de um mesmo modelo base repetem tokenizer, config e às vezes shards
+inteiros, e cada modelo tinha a sua cópia. Os arquivos passam a ser guardados
+uma única vez em `<models_directory>/.blobs/sha256/<xx>/<hash>`. O diretório de
+cada modelo continua com a estrutura de sempre, mas seus arquivos são
+hardlinks para os blobs, e um `_sevenx_manifest.json` registra o hash de cada
+arquivo. Quem lê os modelos não precisa saber do armazenamento.
+
+A contagem de links do sistema de arquivos diz quantos modelos usam cada blob:
+um blob com um único link não pertence a nenhum modelo e é apagado pela
+coleta de lixo (rodada ao remover um modelo). Em sistemas de arquivos sem
+hardlinks, os arquivos ficam como cópias, como antes.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = ".blobs"
+MANIFEST_FILE = "_sevenx_manifest.json"
+READ_SIZE = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_private(relative_name: str) -> bool:
+    """Arquivos do próprio SevenX (info, manifesto, caches, formato preparado) não são deduplicados."""
+    path = Path(relative_name)
+    return (any(part.startswith("_sevenx") for part in path.parts)
+            or path.name.endswith((".part", ".part.json", ".tmp")))
+
+
+class BlobStore:
+    """Blobs nomeados pelo sha256, compartilhados entre os modelos por hardlinks."""
+
+    def __init__(self, models_dir: Path):
+        self.root = Path(models_dir) / BLOBS_DIR / "sha256"
+        self._lock = Lock()
+        self._links_supported = True
+
+    def blob_path(self, sha256: str) -> Path:
+        sha256 = sha256.lower()
+        return self.root / sha256[:2] / sha256
+
+    def has(self, sha256: str) -> bool:
+        return self.blob_path(sha256).exists()
+
+    def _link_into_place(self, blob: Path, target: Path):
+        """Troca `target` por um hardlink para `blob` sem deixar o arquivo ausente no meio."""
+        tmp_path = target.with_name(target.name + ".dedup.tmp")
+        tmp_path.unlink(missing_ok=True)
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, target)
+
+    def materialize(self, sha256: str, target: Path) -> bool:
+        """Cria `target` a partir do blob, se ele já estiver guardado (ex.: antes de um download)."""
+        blob = self.blob_path(sha256)
+        if not blob.exists() or not self._links_supported:
+            return False
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._link_into_place(blob, target)
+            return True
+        except OSError as e:
+            logger.debug(f"Não foi possível reaproveitar o blob {sha256[:12]} em {target}: {e}")
+            return False
+
+    def ingest(self, path: Path, sha256: Optional[str] = None) -> str:
+        """
+        Guarda o arquivo no armazenamento e o troca por um hardlink para o blob. Se
+        o conteúdo já existia, a cópia é liberada. Retorna o sha256 do arquivo.
+        """
+        path = Path(path)
+        sha256 = (sha256 or file_sha256(path)).lower()
+        if not self._links_supported:
+            return sha256
+        blob = self.blob_path(sha256)
+        with self._lock:
+            try:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                if not blob.exists():
+                    os.link(path, blob)
+                elif not os.path.samefile(blob, path):
+                    self._link_into_place(blob, path)
+            except FileExistsError:
+                # Outro processo guardou o mesmo conteúdo ao mesmo tempo
+                self._link_into_place(blob, path)
+            except OSError as e:
+                # Sistema de arquivos sem hardlinks (FAT, alguns compartilhamentos de rede): fica a cópia
+                self._links_supported = False
+                logger.warning(f"Deduplicação de modelos desativada, hardlinks não suportados em {self.root}: {e}")
+        return sha256
+
+    def link_model(self, model_dir: Path, known_hashes: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Deduplica todos os arquivos de um modelo e grava o manifesto (nome relativo ->
+        sha256). Hashes já conferidos no download evitam ler os arquivos de novo.
+        """
+        model_dir = Path(model_dir)
+        known_hashes = known_hashes or {}
+        manifest_path = model_dir / MANIFEST_FILE
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+
+        manifest = {}
+        for root, _, names in os.walk(model_dir):
+            for name in names:
+                path = Path(root) / name
+                relative = path.relative_to(model_dir).as_posix()
+                if _is_private(relative):
+                    continue
+                known = known_hashes.get(relative)
+                if known is None and relative in previous and self.has(previous[relative]) \
+                        and os.path.samefile(self.blob_path(previous[relative]), path):
+                    known = previous[relative]
+                manifest[relative] = self.ingest(path, known)
+
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        tmp_path.replace(manifest_path)
+        return manifest
+
+    def collect_garbage(self) -> int:
+        """Apaga os blobs que nenhum modelo usa mais (um único link). Retorna os bytes liberados."""
+        freed = 0
+        with self._lock:
+            if not self.root.exists():
+                return 0
+            for prefix_dir in self.root.iterdir():
+                for blob in prefix_dir.iterdir():
+                    try:
+                        stat = blob.stat()
+                        if stat.st_nlink <= 1:
+                            blob.unlink()
+                            freed += stat.st_size
+                    except OSError as e:
+                        logger.warning(f"Não foi possível apagar o blob {blob.name}: {e}")
+                try:
+                    prefix_dir.rmdir()
+                except OSError:
+                    pass
+        if freed:
+            logger.info(f"Coleta de lixo dos modelos liberou {freed / 1024 ** 2:.1f} MB")
+        return freed
+
+    def stats(self) -> Dict:
+        """Blobs guardados, bytes em disco e bytes economizados pelos links extras."""
+        blobs = stored = saved = 0
+        if self.root.exists():
+            for blob in self.root.glob("*/*"):
+                stat = blob.stat()
+                blobs += 1
+                stored += stat.st_size
+                # Um link é do próprio armazenamento e outro do primeiro modelo
+                saved += stat.st_size * max(0, stat.st_nlink - 2)
+        return {"blobs": blobs, "stored_bytes": stored, "saved_bytes": saved}
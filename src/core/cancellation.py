@@ -0,0 +1,104 @@
+"""
+Arquivo: cancellation.py
+Descrição: Cancelamento cooperativo de gerações em andamento.
+"""
+
+import time
+from threading import Event
+from typing import Callable, Optional
+
+from .lazy_imports import is_installed
+
+# O Ollama também usa o token: o transformers só é importado quando o critério de parada é pedido
+TRANSFORMERS_AVAILABLE = is_installed("transformers")
+
+
+class CancellationToken:
+    """
+    Sinal de cancelamento compartilhado entre quem pede a geração e o loop que a executa.
+
+    O loop de decodificação consulta o token a cada passo; ao ser cancelado, a
+    geração termina no passo seguinte e libera a CPU/GPU. Os tokens produzidos
+    depois do pedido de cancelamento são contados como desperdiçados.
+
+    O token também é o ponto de preempção: o escalonador de pedidos instala um
+    `checkpoint` chamado entre tokens, que pode pausar a geração até a sua vez.
+
+    Falhas da geração chegam ao chat como texto; `error` guarda a mesma falha
+    para quem precisa distingui-la de uma resposta (a API devolve 5xx).
+    """
+
+    def __init__(self):
+        self._event = Event()
+        self.cancelled_at: Optional[float] = None
+        self.generated_tokens = 0
+        self.wasted_tokens = 0
+        self.error: Optional[str] = None
+        self._checkpoint: Optional[Callable[[], None]] = None
+
+    def cancel(self):
+        if not self._event.is_set():
+            self.cancelled_at = time.perf_counter()
+            self._event.set()
+
+    def fail(self, message: str):
+        """Registra a falha da geração, antes de o texto do erro ser entregue ao consumidor."""
+        self.error = message
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def set_checkpoint(self, checkpoint: Optional[Callable[[], None]]):
+        """Instala (ou remove, com None) a função chamada entre tokens por `record_token`."""
+        self._checkpoint = checkpoint
+
+    def record_token(self, count: int = 1, checkpoint: bool = True) -> bool:
+        """
+        Registra tokens produzidos pelo loop. Retorna True se a geração deve parar.
+        Com `checkpoint`, pode bloquear enquanto a geração está pausada pelo escalonador;
+        loops que atendem várias gerações ao mesmo tempo passam False.
+        """
+        self.generated_tokens += count
+        if self._event.is_set():
+            self.wasted_tokens += count
+            return True
+        if checkpoint and self._checkpoint is not None:
+            self._checkpoint()
+            return self._event.is_set()
+        return False
+
+
+def _make_stopping_criteria_class():
+    import torch
+    from transformers import StoppingCriteria
+
+    class CancellationStoppingCriteria(StoppingCriteria):
+        """StoppingCriteria do Transformers que encerra `generate` quando o token é cancelado."""
+
+        def __init__(self, token: CancellationToken, prompt_length: Optional[int] = None):
+            self.token = token
+            self._length = prompt_length
+
+        def __call__(self, input_ids, scores, **kwargs):
+            if scores is None:
+                # A decodificação especulativa também consulta o critério nos candidatos, antes da
+                # verificação (sem scores): ainda não são tokens gerados
+                return torch.full((input_ids.shape[0],), self.token.is_cancelled, dtype=torch.bool,
+                                  device=input_ids.device)
+            # A decodificação especulativa aceita vários tokens por passo: conta pelo crescimento da sequência
+            new_tokens = 1 if self._length is None else max(1, input_ids.shape[1] - self._length)
+            self._length = input_ids.shape[1]
+            stop = self.token.record_token(input_ids.shape[0] * new_tokens)
+            return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+    return CancellationStoppingCriteria
+
+
+def __getattr__(name: str):
+    # Cria a subclasse de StoppingCriteria no primeiro acesso (PEP 562)
+    if name == "CancellationStoppingCriteria":
+        cls = _make_stopping_criteria_class()
+        globals()[name] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
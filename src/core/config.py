@@ -16,6 +16,7 @@ class Config:
         self.default_models_path = self.config_dir / "models"
         self.logs_dir = self.config_dir / "logs"
         self.conversations_dir = self.config_dir / "conversations"
+        self.cache_dir = self.config_dir / "cache"
         
         self._create_directories()
         self.settings = self._load_from_file()
@@ -29,6 +30,13 @@ class Config:
             "hf_token": "",
             "ollama_host": "http://localhost:11434",
             "api_port": 8080,
+            "api_enabled": False,
+            "api_host": "127.0.0.1",
+            "api_key": "",
+            "api_workers": 8,
+            "daemon_mode": False,
+            "daemon_socket": "",
+            "daemon_port": 8766,
             "auto_save": True,
             "chat_settings": {
                 "temperature": 0.7,
@@ -37,13 +45,43 @@ class Config:
                 "top_k": 40,
                 "repeat_penalty": 1.1
             },
+            "engine_settings": {
+                "kv_cache_reuse": True,
+                "kv_cache_sessions": 4,
+                "continuous_batching": False,
+                "max_batch_size": 8,
+                "max_concurrent_requests": 0,
+                "max_queue_depth": 16,
+                "queue_timeout_seconds": 120,
+                "ram_budget_mb": 0,
+                "vram_budget_mb": 0,
+                "model_idle_ttl": 1800,
+                "gguf_context_length": 0,
+                "gguf_max_context_length": 4096,
+                "response_cache": True,
+                "response_cache_mb": 256,
+                "torch_dtype": "auto",
+                "mmap_weights": True,
+                "speculative_decoding": True,
+                "prompt_lookup_num_tokens": 0,
+                "thread_autotune": True,
+                "thread_autotune_tokens": 8,
+                "download_workers": 4,
+                "download_chunk_mb": 64,
+                "deduplicate_models": True,
+                "prepared_format": True,
+                "metrics_history": 256,
+                "prewarm_ml_stack": True,
+                "model_job_workers": 2
+            },
             "ui_settings": {
                 "window_width": 1200,
                 "window_height": 800,
                 "sidebar_width": 250,
                 "font_size": 12,
                 "show_system_info": True,
-                "lite_mode": False
+                "lite_mode": False,
+                "cold_start_target_ms": 2000
             }
         }
 
@@ -112,5 +150,6 @@ class Config:
         return Path(self.get("models_directory"))
 
     def _create_directories(self):
-        for directory in [self.config_dir, self.default_models_path, self.logs_dir, self.conversations_dir]:
+        for directory in [self.config_dir, self.default_models_path, self.logs_dir, self.conversations_dir,
+                          self.cache_dir]:
             directory.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,198 @@
+"""
+Arquivo: context_window.py
+Descrição: Gerenciamento da janela de contexto na montagem do prompt.
+
+Mantém o prompt dentro do contexto real do modelo: preserva as mensagens de
+sistema e os turnos mais recentes (nunca a última pergunta do usuário) e
+descarta os turnos mais antigos.
+"""
+
+import hashlib
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Atributos de config que guardam o contexto máximo, conforme a arquitetura
+CONTEXT_LENGTH_ATTRIBUTES = ("max_position_embeddings", "n_positions", "max_seq_len", "seq_length", "n_ctx",
+                             "max_sequence_length")
+
+# Tipos de valor do formato GGUF e seus tamanhos em bytes (strings e arrays são tratados à parte)
+_GGUF_SCALARS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d"}
+_GGUF_STRING, _GGUF_ARRAY = 8, 9
+
+
+def read_gguf_metadata(path: Path, wanted_suffixes: Tuple[str, ...] = ("general.architecture", ".context_length")) -> Dict:
+    """
+    Lê do cabeçalho de um arquivo GGUF os metadados cujas chaves terminam com os sufixos pedidos.
+    Arrays (vocabulário etc.) são pulados sem serem carregados.
+    """
+    metadata = {}
+
+    def read(f, fmt):
+        return struct.unpack(fmt, f.read(struct.calcsize(fmt)))[0]
+
+    def read_string(f):
+        return f.read(read(f, "<Q")).decode("utf-8", errors="replace")
+
+    def read_value(f, value_type, keep):
+        if value_type == _GGUF_STRING:
+            return read_string(f)
+        if value_type == _GGUF_ARRAY:
+            item_type, count = read(f, "<I"), read(f, "<Q")
+            if item_type in _GGUF_SCALARS and not keep:
+                f.seek(struct.calcsize(_GGUF_SCALARS[item_type]) * count, 1)
+                return None
+            return [read_value(f, item_type, keep) for _ in range(count)]
+        return read(f, _GGUF_SCALARS[value_type])
+
+    try:
+        with open(path, 'rb') as f:
+            if f.read(4) != b"GGUF":
+                return {}
+            version = read(f, "<I")
+            if version < 2:
+                return {}
+            read(f, "<Q")  # Número de tensores
+            kv_count = read(f, "<Q")
+            for _ in range(kv_count):
+                key = read_string(f)
+                keep = key.endswith(wanted_suffixes)
+                value = read_value(f, read(f, "<I"), keep)
+                if keep:
+                    metadata[key] = value
+    except Exception as e:
+        logger.warning(f"Não foi possível ler os metadados GGUF de {path}: {e}")
+    return metadata
+
+
+def get_context_length(model_data: Dict, default: int = 2048) -> int:
+    """Descobre o tamanho real da janela de contexto de um modelo carregado."""
+    if model_data.get("context_length"):
+        return int(model_data["context_length"])
+
+    model = model_data.get("model")
+    if model_data.get("type") == "gguf":
+        return int(getattr(model, "context_length", None) or default)
+
+    config = getattr(model, "config", None)
+    for attribute in CONTEXT_LENGTH_ATTRIBUTES:
+        value = getattr(config, attribute, None)
+        if isinstance(value, int) and value > 0:
+            return value
+
+    # Tokenizers sem limite definido usam um valor enorme como sentinela
+    tokenizer_limit = getattr(model_data.get("tokenizer"), "model_max_length", None)
+    if isinstance(tokenizer_limit, int) and 0 < tokenizer_limit < 1_000_000:
+        return tokenizer_limit
+    return default
+
+
+class ContextWindowManager:
+    """
+    Escolhe quais mensagens do histórico cabem no orçamento de tokens do prompt.
+
+    A contagem de tokens de cada mensagem fica em cache, então cada turno só
+    tokeniza as mensagens novas. Quando uma sessão é informada, o ponto de
+    corte do histórico é mantido entre turnos e, ao estourar o orçamento, é
+    avançado de uma vez até `low_water` do orçamento; assim o início do prompt
+    muda raramente e o KV cache da conversa continua reaproveitável.
+    """
+
+    def __init__(self, low_water: float = 0.75, max_cached_counts: int = 8192, max_sessions: int = 64):
+        self.low_water = low_water
+        self.max_cached_counts = max_cached_counts
+        self.max_sessions = max_sessions
+        self._counts: "OrderedDict[Tuple[str, str, str], int]" = OrderedDict()
+        self._session_starts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = Lock()
+        self.stats = {"dropped_messages": 0, "truncated_messages": 0}
+
+    def count_tokens(self, model_id: str, message: Dict, count_fn: Callable[[str], int]) -> int:
+        """Conta (com cache) os tokens do conteúdo de uma mensagem."""
+        content = message.get("content", "")
+        key = (model_id, message.get("role", ""), hashlib.sha1(content.encode("utf-8")).hexdigest())
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        count = count_fn(content)
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_cached_counts:
+                self._counts.popitem(last=False)
+        return count
+
+    def fit(self, model_id: str, messages: List[Dict], budget: int, count_fn: Callable[[str], int],
+            session_id: Optional[str] = None, per_message_overhead: int = 4) -> List[Dict]:
+        """
+        Retorna as mensagens que cabem em `budget` tokens.
+
+        As mensagens de sistema do início são sempre mantidas, assim como a última
+        mensagem; turnos antigos são descartados a partir do mais velho e o histórico
+        mantido sempre recomeça em uma mensagem do usuário.
+        """
+        if not messages:
+            return messages
+
+        head = 0
+        while head < len(messages) - 1 and messages[head].get("role") == "system":
+            head += 1
+        system, history = messages[:head], messages[head:]
+
+        costs = [self.count_tokens(model_id, m, count_fn) + per_message_overhead for m in messages]
+        system_cost = sum(costs[:head])
+        history_costs = costs[head:]
+        available = budget - system_cost
+
+        session_key = (model_id, session_id) if session_id else None
+        start = 0
+        if session_key:
+            with self._lock:
+                start = self._session_starts.get(session_key, 0)
+            if start >= len(history):
+                start = 0
+        previous_start = start
+
+        if sum(history_costs[start:]) > available:
+            # Estourou: avança o corte até o nível baixo (ou o mínimo necessário, sem sessão)
+            target = available * self.low_water if session_key else available
+            start = self._advance_start(history, history_costs, start, target)
+        start = self._align_to_user(history, start)
+
+        if session_key:
+            with self._lock:
+                self._session_starts[session_key] = start
+                self._session_starts.move_to_end(session_key)
+                while len(self._session_starts) > self.max_sessions:
+                    self._session_starts.popitem(last=False)
+
+        if start > previous_start:
+            self.stats["dropped_messages"] += start - previous_start
+            logger.info(f"Janela de contexto: {start} mensagens antigas fora do prompt para caber em {budget} tokens.")
+        return system + history[start:]
+
+    def reset_session(self, session_id: str):
+        with self._lock:
+            for key in [k for k in self._session_starts if k[1] == session_id]:
+                del self._session_starts[key]
+
+    @staticmethod
+    def _advance_start(history: List[Dict], costs: List[int], start: int, target: float) -> int:
+        total = sum(costs[start:])
+        # A última mensagem nunca é descartada
+        while start < len(history) - 1 and total > target:
+            total -= costs[start]
+            start += 1
+        return start
+
+    @staticmethod
+    def _align_to_user(history: List[Dict], start: int) -> int:
+        """Garante que o histórico mantido comece com uma mensagem do usuário (exigido por vários templates)."""
+        while start < len(history) - 1 and history[start].get("role") != "user":
+            start += 1
+        return start
@@ -0,0 +1,632 @@
+"""
+Arquivo: daemon.py
+Descrição: Daemon de inferência em um processo separado, compartilhado por vários clientes.
+
+Cada processo que cria um `SevenXEngine` (o app e cada script) carrega a sua
+cópia dos modelos: com o app e um script rodando, a RAM e o tempo de carga
+dobram. No modo daemon, um único processo de longa duração mantém o motor e os
+modelos carregados; o app e os scripts usam o `DaemonEngine`, um cliente leve
+com a mesma interface do motor. Se o app travar, o modelo continua quente no
+daemon.
+
+A comunicação é por um socket de domínio Unix (no Windows, que não os tem no
+Python, por TCP em 127.0.0.1), com um protocolo de quadros compacto: 1 byte de
+tipo, 4 bytes de tamanho e o conteúdo (JSON nos comandos, UTF-8 puro nos tokens).
+Cada chamada usa uma conexão própria: o cliente manda `CALL`, recebe `PROGRESS`
+e `TOKEN` enquanto o daemon trabalha e termina com `RESULT`, `END` ou `ERROR`.
+O cliente pode mandar `CANCEL` a qualquer momento; fechar a conexão também
+cancela a geração no próximo passo.
+
+O socket Unix só é acessível ao próprio usuário (0o600). A porta TCP, não: qualquer
+processo da máquina conecta nela. Por isso, no TCP o daemon sorteia um token a
+cada início e o grava em um arquivo legível só pelo usuário; todo `CALL` precisa
+trazê-lo.
+
+Uso:
+    python daemon.py                 # sobe o daemon com a configuração do app
+    python daemon.py --stop          # pede ao daemon em execução que encerre
+"""
+
+import argparse
+import hmac
+import json
+import os
+import secrets
+import socket
+import struct
+import subprocess
+import sys
+import time
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+import logging
+
+from .cancellation import CancellationToken
+from .config import Config
+from .download_plan import DownloadPlan
+from .metrics import MetricsRing
+from .model_jobs import ModelJobManager
+from .request_scheduler import PRIORITY_INTERACTIVE, QueueFull, QueueTimeout
+from .sevenx_engine import ModelInfo, SevenXEngine
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+DAEMON_SOCKET_NAME = "sevenx-daemon.sock"
+DAEMON_TOKEN_NAME = "sevenx-daemon.token"
+UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+
+# Quadro: tipo (1 byte) + tamanho do conteúdo (4 bytes, big-endian)
+FRAME_HEADER = struct.Struct("!cI")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+CALL, RESULT, TOKEN, END, ERROR, PROGRESS, CANCEL = b"C", b"R", b"T", b"E", b"X", b"P", b"K"
+# Intervalo em que o cliente, esperando o daemon, confere o próprio cancelamento
+CANCEL_POLL_SECONDS = 0.2
+
+# Métodos do motor que o daemon atende (geração em streaming é tratada à parte)
+ENGINE_METHODS = {"list_installed_models", "load_model", "unload_model", "delete_model", "reset_session",
+                  "set_draft_model", "set_model_load_mode", "get_pool_report", "is_available",
+                  "generate_response", "download_model", "prepare_model", "plan_download",
+                  "search_online_models"}
+STREAM_METHODS = {"generate_stream"}
+PROGRESS_METHODS = {"load_model", "download_model", "prepare_model"}
+CANCELLABLE_METHODS = {"load_model", "download_model", "generate_response"}
+# Erros do motor recriados no cliente com o mesmo tipo
+REMOTE_ERRORS = {"QueueFull": QueueFull, "QueueTimeout": QueueTimeout, "ValueError": ValueError}
+
+Address = Union[str, Tuple[str, int]]
+
+
+class DaemonError(Exception):
+    """Falha de comunicação com o daemon ou erro do motor sem tipo correspondente no cliente."""
+
+
+# --- Protocolo ---
+def send_frame(sock: socket.socket, kind: bytes, payload: bytes = b""):
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int, on_idle: Optional[Callable[[], None]]) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        try:
+            chunk = sock.recv(min(size - len(data), 1024 * 1024))
+        except socket.timeout:
+            if on_idle is None:
+                raise
+            # O que já chegou fica em `data`: a leitura continua do mesmo ponto
+            on_idle()
+            continue
+        if not chunk:
+            raise ConnectionError("Conexão com o daemon fechada.")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket, on_idle: Optional[Callable[[], None]] = None) -> Tuple[bytes, bytes]:
+    """Lê um quadro. Com `on_idle` e um timeout no socket, chama-o a cada timeout sem perder dados."""
+    kind, length = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size, on_idle))
+    if length > MAX_FRAME_BYTES:
+        raise DaemonError(f"Quadro de {length} bytes excede o limite do protocolo.")
+    return kind, _recv_exact(sock, length, on_idle)
+
+
+def _jsonable(value: Any) -> Any:
+    return asdict(value) if is_dataclass(value) else str(value)
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_jsonable, ensure_ascii=False).encode("utf-8")
+
+
+def daemon_address(config: Config) -> Address:
+    """Socket do daemon: `daemon_socket` (padrão no cache), ou 127.0.0.1:`daemon_port` sem sockets Unix."""
+    if not UNIX_SOCKETS:
+        return ("127.0.0.1", int(config.get("daemon_port", 8766)))
+    return config.get("daemon_socket") or str(config.cache_dir / DAEMON_SOCKET_NAME)
+
+
+def daemon_token_path(config: Config) -> Path:
+    """Arquivo com o token que autentica as chamadas ao daemon por TCP."""
+    return config.cache_dir / DAEMON_TOKEN_NAME
+
+
+def _write_private(path: Path, text: str):
+    """Grava `text` em um arquivo que só o usuário lê (recriado, para não herdar permissões antigas)."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _connect(address: Address, timeout: Optional[float] = None) -> socket.socket:
+    sock = socket.socket(socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+# --- Servidor ---
+class DaemonServer:
+    """Atende chamadas ao motor vindas de vários processos, uma conexão (e uma thread) por chamada."""
+
+    def __init__(self, engine, address: Address, token_path: Optional[Path] = None):
+        self.engine = engine
+        self.address = address
+        self.token_path = Path(token_path) if token_path is not None else None
+        # Exigido só no TCP; o socket Unix já é restrito ao usuário
+        self.token: Optional[str] = None
+        self._sock: Optional[socket.socket] = None
+        self._stopped = Event()
+        self._started_at = time.time()
+        self.stats = {"calls": 0, "streams": 0, "active": 0, "cancelled": 0}
+        # Os contadores são atualizados pelas threads das conexões
+        self._stats_lock = Lock()
+
+    def start(self):
+        """Abre o socket e passa a aceitar conexões em segundo plano."""
+        if isinstance(self.address, tuple):
+            if self.token_path is None:
+                raise DaemonError("O daemon por TCP exige um arquivo de token (token_path).")
+            self.token = secrets.token_hex(32)
+            _write_private(self.token_path, self.token)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(self.address)
+            self.address = sock.getsockname()[:2]
+        else:
+            self._remove_stale_socket()
+            Path(self.address).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # Só o próprio usuário conversa com o daemon: o socket já nasce sem acesso
+            # para os outros, sem a janela entre o bind e o chmod
+            old_umask = os.umask(0o077)
+            try:
+                sock.bind(self.address)
+            finally:
+                os.umask(old_umask)
+            os.chmod(self.address, 0o600)
+        sock.listen(64)
+        self._sock = sock
+        Thread(target=self._accept_loop, name="sevenx-daemon-accept", daemon=True).start()
+        logger.info(f"Daemon do SevenX atendendo em {self.address}")
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.address):
+            return
+        try:
+            _connect(self.address, timeout=1).close()
+        except OSError:
+            # Sobrou de um daemon que não encerrou direito
+            os.unlink(self.address)
+            return
+        raise DaemonError(f"Já há um daemon atendendo em {self.address}.")
+
+    def serve_forever(self):
+        self._stopped.wait()
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._sock is not None:
+            self._sock.close()
+        stale = self.token_path if isinstance(self.address, tuple) else self.address
+        if stale is not None:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+
+    def status(self) -> Dict:
+        return {"pid": os.getpid(), "protocol": PROTOCOL_VERSION, "uptime_seconds": round(time.time() - self._started_at, 1),
+                "loaded_models": list(self.engine.model_pool.keys()), "requests": self.engine.request_scheduler.stats(),
+                **self._stats_snapshot()}
+
+    def _count(self, name: str, delta: int = 1):
+        with self._stats_lock:
+            self.stats[name] += delta
+
+    def _stats_snapshot(self) -> Dict:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            Thread(target=self._serve, args=(conn,), name="sevenx-daemon-call", daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        send_lock = Lock()
+
+        def send(kind: bytes, payload: bytes = b""):
+            # Callbacks de progresso podem vir de outras threads (ex.: o download em pedaços)
+            with send_lock:
+                send_frame(conn, kind, payload)
+
+        cancel_token = CancellationToken()
+        done = Event()
+        self._count("active")
+        try:
+            kind, payload = recv_frame(conn)
+            if kind != CALL:
+                raise DaemonError("Esperava um quadro CALL.")
+            request = json.loads(payload)
+            self._authenticate(request)
+            method, kwargs = request.get("method"), request.get("kwargs") or {}
+            Thread(target=self._watch, args=(conn, cancel_token, done), daemon=True).start()
+            if method in STREAM_METHODS:
+                self._count("streams")
+                self._stream(send, kwargs, cancel_token)
+            else:
+                self._count("calls")
+                send(RESULT, _dumps(self._call(method, kwargs, send, cancel_token)))
+        except (ConnectionError, BrokenPipeError):
+            pass
+        except Exception as e:
+            logger.debug(f"Erro em chamada ao daemon: {e}")
+            try:
+                send(ERROR, _dumps({"type": type(e).__name__, "message": str(e),
+                                    "retry_after": getattr(e, "retry_after", None)}))
+            except OSError:
+                pass
+        finally:
+            done.set()
+            self._count("active", -1)
+            try:
+                # Acorda a thread que vigia a conexão
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def _authenticate(self, request: Dict):
+        if self.token is None:
+            return
+        if not hmac.compare_digest(str(request.get("token") or "").encode("utf-8"), self.token.encode("utf-8")):
+            raise DaemonError("Token do daemon ausente ou inválido.")
+
+    def _watch(self, conn: socket.socket, cancel_token: CancellationToken, done: Event):
+        """Cancela a chamada quando o cliente manda CANCEL ou desconecta antes do fim."""
+        try:
+            kind, _ = recv_frame(conn)
+            if kind != CANCEL:
+                return
+        except (OSError, DaemonError):
+            pass
+        if not done.is_set() and not cancel_token.is_cancelled:
+            cancel_token.cancel()
+            self._count("cancelled")
+
+    def _call(self, method: str, kwargs: Dict, send: Callable, cancel_token: CancellationToken) -> Any:
+        if method == "ping":
+            return {"pid": os.getpid(), "protocol": PROTOCOL_VERSION}
+        if method == "status":
+            return self.status()
+        if method == "shutdown":
+            Thread(target=self.stop, daemon=True).start()
+            return True
+        if method not in ENGINE_METHODS:
+            raise DaemonError(f"Método desconhecido: {method}")
+        if method in PROGRESS_METHODS:
+            kwargs["progress_callback"] = lambda *args: send(PROGRESS, _dumps(args))
+        if method in CANCELLABLE_METHODS:
+            kwargs["cancel_token"] = cancel_token
+        return getattr(self.engine, method)(**kwargs)
+
+    def _stream(self, send: Callable, kwargs: Dict, cancel_token: CancellationToken):
+        generator = self.engine.generate_stream(cancel_token=cancel_token, **kwargs)
+        try:
+            for piece in generator:
+                send(TOKEN, piece.encode("utf-8"))
+        finally:
+            # Cliente desconectado (envio falhou): fechar o gerador cancela a geração
+            generator.close()
+        send(END, _dumps({"generated_tokens": cancel_token.generated_tokens, "cancelled": cancel_token.is_cancelled}))
+
+
+# --- Cliente ---
+class _Call:
+    """Uma chamada em andamento: lê os quadros e repassa ao daemon o cancelamento do token local."""
+
+    def __init__(self, address: Address, method: str, kwargs: Dict, cancel_token: Optional[CancellationToken],
+                 token: Optional[str] = None):
+        self.cancel_token = cancel_token
+        self._cancel_sent = False
+        try:
+            self.sock = _connect(address, timeout=5)
+        except OSError as e:
+            raise DaemonError(f"Daemon do SevenX indisponível em {address}: {e}")
+        send_frame(self.sock, CALL, _dumps({"method": method, "kwargs": kwargs, "token": token}))
+        self.sock.settimeout(CANCEL_POLL_SECONDS)
+
+    def cancel(self):
+        if not self._cancel_sent:
+            self._cancel_sent = True
+            try:
+                send_frame(self.sock, CANCEL)
+            except OSError:
+                pass
+
+    def _on_idle(self):
+        if self.cancel_token is not None and self.cancel_token.is_cancelled:
+            self.cancel()
+
+    def recv(self) -> Tuple[bytes, bytes]:
+        return recv_frame(self.sock, self._on_idle)
+
+    def close(self):
+        self.sock.close()
+
+
+def remote_error(payload: bytes) -> Exception:
+    error = json.loads(payload)
+    cls = REMOTE_ERRORS.get(error.get("type"))
+    if cls in (QueueFull, QueueTimeout):
+        return cls(error["message"], error.get("retry_after") or 1)
+    if cls is not None:
+        return cls(error["message"])
+    return DaemonError(f"{error.get('type')}: {error.get('message')}")
+
+
+class DaemonClient:
+    """Chamadas ao daemon: `call` para resultados e `stream` para a geração token a token."""
+
+    def __init__(self, address: Address, token_path: Optional[Path] = None):
+        self.address = address
+        self.token_path = token_path
+
+    def _token(self) -> Optional[str]:
+        # Lido a cada chamada: o daemon sorteia outro token quando reinicia
+        if self.token_path is None:
+            return None
+        try:
+            return Path(self.token_path).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+
+    def call(self, method: str, progress_callback: Optional[Callable] = None,
+             cancel_token: Optional[CancellationToken] = None, **kwargs) -> Any:
+        call = _Call(self.address, method, kwargs, cancel_token, self._token())
+        try:
+            while True:
+                kind, payload = call.recv()
+                if kind == RESULT:
+                    return json.loads(payload)
+                if kind == ERROR:
+                    raise remote_error(payload)
+                if kind == PROGRESS and progress_callback is not None:
+                    progress_callback(*json.loads(payload))
+        finally:
+            call.close()
+
+    def stream(self, method: str, cancel_token: Optional[CancellationToken] = None,
+               **kwargs) -> Generator[str, None, None]:
+        call = _Call(self.address, method, kwargs, cancel_token, self._token())
+        finished = False
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.is_cancelled:
+                    break
+                kind, payload = call.recv()
+                if kind == TOKEN:
+                    yield payload.decode("utf-8")
+                elif kind == END:
+                    finished = True
+                    if cancel_token is not None:
+                        # Tokens do modelo (não pedaços de texto), contados no daemon
+                        cancel_token.generated_tokens = json.loads(payload)["generated_tokens"]
+                    return
+                elif kind == ERROR:
+                    finished = True
+                    raise remote_error(payload)
+        finally:
+            if not finished:
+                # Consumidor parou ou cancelou: o daemon para a geração no próximo passo
+                call.cancel()
+            call.close()
+
+    def ping(self, timeout: float = 1.0) -> bool:
+        try:
+            sock = _connect(self.address, timeout=timeout)
+        except OSError:
+            return False
+        try:
+            send_frame(sock, CALL, _dumps({"method": "ping", "token": self._token()}))
+            return recv_frame(sock)[0] == RESULT
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+
+class DaemonEngine:
+    """
+    Cliente leve com a interface do `SevenXEngine` usada pelo app e pelos scripts.
+    Os modelos ficam carregados no daemon; aqui só há o socket, as métricas do
+    lado do cliente e os jobs de modelo (que chamam o daemon).
+    """
+
+    def __init__(self, config: Config, address: Optional[Address] = None, token_path: Optional[Path] = None):
+        self.config = config
+        address = address or daemon_address(config)
+        if token_path is None and isinstance(address, tuple):
+            token_path = daemon_token_path(config)
+        self.client = DaemonClient(address, token_path)
+        self.metrics = MetricsRing(config.get("engine_settings.metrics_history", 256))
+        self.jobs = ModelJobManager(self, max_workers=config.get("engine_settings.model_job_workers", 2))
+
+    @property
+    def loaded_models(self) -> Dict[str, Dict]:
+        """Modelos carregados no daemon (model_id -> entrada do relatório do pool)."""
+        return {entry["model_id"]: entry for entry in self.get_pool_report()["models"]}
+
+    def generate_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None,
+                        session_id: Optional[str] = None, cancel_token: Optional[CancellationToken] = None,
+                        priority: str = PRIORITY_INTERACTIVE) -> Generator[str, None, None]:
+        cancel_token = cancel_token or CancellationToken()
+        tracker = self.metrics.start(model_id, "daemon", cancel_token)
+        stream = self.client.stream("generate_stream", cancel_token, model_id=model_id, messages=messages,
+                                    options=options, session_id=session_id, priority=priority)
+        error = None
+        try:
+            for piece in stream:
+                tracker.first_token()
+                yield piece
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            stream.close()
+            tracker.finish(error)
+
+    def generate_response(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None,
+                          session_id: Optional[str] = None, cancel_token: Optional[CancellationToken] = None,
+                          priority: str = PRIORITY_INTERACTIVE) -> str:
+        return self.client.call("generate_response", cancel_token=cancel_token, model_id=model_id,
+                                messages=messages, options=options, session_id=session_id, priority=priority)
+
+    def load_model(self, model_id: str, force_reload: bool = False, progress_callback: Optional[Callable] = None,
+                   cancel_token: Optional[CancellationToken] = None) -> bool:
+        return self.client.call("load_model", progress_callback, cancel_token,
+                                model_id=model_id, force_reload=force_reload)
+
+    def download_model(self, model_id: str, progress_callback: Optional[Callable] = None,
+                       cancel_token: Optional[CancellationToken] = None, quantization: Optional[str] = None) -> bool:
+        return self.client.call("download_model", progress_callback, cancel_token,
+                                model_id=model_id, quantization=quantization)
+
+    def prepare_model(self, model_id: str, progress_callback: Optional[Callable] = None) -> bool:
+        return self.client.call("prepare_model", progress_callback, model_id=model_id)
+
+    def plan_download(self, model_id: str, quantization: Optional[str] = None) -> DownloadPlan:
+        return DownloadPlan(**self.client.call("plan_download", model_id=model_id, quantization=quantization))
+
+    def list_installed_models(self) -> List[ModelInfo]:
+        return [ModelInfo(**model) for model in self.client.call("list_installed_models")]
+
+    def search_online_models(self, query: str = "", model_type: str = "text-generation", limit: int = 50) -> List[Dict]:
+        return self.client.call("search_online_models", query=query, model_type=model_type, limit=limit)
+
+    def unload_model(self, model_id: str, reason: str = "descarregado pelo usuário") -> bool:
+        return self.client.call("unload_model", model_id=model_id, reason=reason)
+
+    def delete_model(self, model_id: str) -> bool:
+        return self.client.call("delete_model", model_id=model_id)
+
+    def reset_session(self, session_id: str):
+        self.client.call("reset_session", session_id=session_id)
+
+    def set_draft_model(self, model_id: str, draft_model_id: Optional[str]) -> bool:
+        return self.client.call("set_draft_model", model_id=model_id, draft_model_id=draft_model_id)
+
+    def set_model_load_mode(self, model_id: str, load_mode: str) -> bool:
+        return self.client.call("set_model_load_mode", model_id=model_id, load_mode=load_mode)
+
+    def get_pool_report(self) -> Dict:
+        return self.client.call("get_pool_report")
+
+    def is_available(self) -> bool:
+        try:
+            return self.client.call("is_available")
+        except DaemonError:
+            return False
+
+    def status(self) -> Dict:
+        return self.client.call("status")
+
+    def cleanup(self):
+        """Encerra só o lado do cliente: o daemon e os modelos carregados continuam."""
+        self.jobs.shutdown()
+
+
+def _daemon_script() -> Path:
+    return Path(__file__).resolve().parents[2] / "daemon.py"
+
+
+def connect_daemon(config: Config, start: bool = True, timeout: float = 30.0) -> DaemonEngine:
+    """
+    Conecta ao daemon, iniciando-o em segundo plano se ainda não estiver rodando.
+
+    Raises:
+        DaemonError: Se o daemon não responder dentro de `timeout` segundos.
+    """
+    engine = DaemonEngine(config)
+    if engine.client.ping():
+        return engine
+    if not start:
+        raise DaemonError(f"Daemon do SevenX não está rodando em {engine.client.address}.")
+
+    logger.info("Iniciando o daemon do SevenX...")
+    options = {"start_new_session": True} if os.name != "nt" else \
+        {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+    # Processo independente: sobrevive ao app que o iniciou
+    subprocess.Popen([sys.executable, str(_daemon_script())], stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True, **options)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if engine.client.ping():
+            return engine
+        time.sleep(0.2)
+    raise DaemonError(f"O daemon do SevenX não respondeu em {timeout:.0f}s.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Daemon de inferência do SevenX Studio")
+    parser.add_argument("--socket", help="Caminho do socket Unix (padrão: daemon_socket da configuração)")
+    parser.add_argument("--no-api", action="store_true", help="Não inicia a API compatível com OpenAI")
+    parser.add_argument("--stop", action="store_true", help="Encerra o daemon em execução")
+    parser.add_argument("--status", action="store_true", help="Mostra o estado do daemon em execução")
+    args = parser.parse_args(argv)
+
+    from .logger import setup_logger
+    setup_logger()
+    config = Config()
+    address = args.socket or daemon_address(config)
+    if args.stop or args.status:
+        client = DaemonClient(address, daemon_token_path(config))
+        try:
+            print(json.dumps(client.call("shutdown" if args.stop else "status"), indent=2, ensure_ascii=False))
+        except DaemonError as e:
+            print(e)
+            return 1
+        return 0
+
+    from .api_server import ApiServer
+    engine = SevenXEngine(config)
+    server = DaemonServer(engine, address, daemon_token_path(config))
+    server.start()
+    api_server = None
+    if config.get("api_enabled", False) and not args.no_api:
+        # A API local também passa a servir os modelos do daemon
+        api_server = ApiServer(engine, host=config.get("api_host", "127.0.0.1"), port=config.get("api_port", 8080),
+                               max_workers=config.get("api_workers", 8), api_key=config.get("api_key", ""))
+        if not api_server.start():
+            api_server = None
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if api_server is not None:
+            api_server.stop()
+        engine.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Arquivo: download_plan.py
+Descrição: Escolha do conjunto mínimo de arquivos de um repositório para carregar o modelo.
+
+Repositórios do Hub costumam trazer os mesmos pesos em vários formatos
+(safetensors e .bin, TensorFlow, Flax, ONNX, o checkpoint "original/") e, nos
+repositórios GGUF, uma variante por quantização. Baixar tudo custa de 5 a 10
+vezes o necessário. O plano fica com um único formato de pesos mais a
+configuração e o tokenizer; para GGUF, com a quantização pedida ou, sem pedido,
+a preferida entre as que cabem na RAM. O tamanho total é conhecido antes de o
+download começar.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Dict, Optional, Tuple
+
+# Extensões de arquivos de pesos (qualquer outro arquivo da raiz é configuração, tokenizer ou documentação)
+WEIGHT_SUFFIXES = {".safetensors", ".bin", ".pt", ".pth", ".ckpt", ".h5", ".msgpack", ".onnx", ".onnx_data",
+                   ".ot", ".tflite", ".gguf", ".ggml", ".mlmodel", ".npz"}
+
+# Ordem de preferência das quantizações GGUF na escolha automática: qualidade e
+# velocidade equilibradas primeiro, depois as maiores e por fim as mais agressivas
+GGUF_QUANT_PREFERENCE = ("Q4_K_M", "Q5_K_M", "Q4_K_S", "Q5_K_S", "Q4_0", "Q6_K", "Q8_0", "IQ4_XS", "IQ4_NL",
+                         "Q3_K_L", "Q3_K_M", "IQ3_M", "Q3_K_S", "IQ3_XS", "Q2_K", "IQ2_M", "IQ2_XS",
+                         "F16", "BF16", "F32")
+
+_QUANT_PATTERN = re.compile(r"(?<![A-Za-z0-9])(I?Q\d(?:_[A-Z0-9]+)*|BF16|F16|F32)(?![A-Za-z0-9])", re.IGNORECASE)
+
+# Memória além do arquivo GGUF: contexto, buffers do ctransformers e folga para o sistema
+GGUF_MEMORY_OVERHEAD = 1.2
+
+
+@dataclass
+class DownloadPlan:
+    """Arquivos escolhidos (nome -> tamanho) e o que ficou de fora."""
+    format: str
+    files: Dict[str, Optional[int]] = field(default_factory=dict)
+    skipped: Dict[str, Optional[int]] = field(default_factory=dict)
+    quantization: Optional[str] = None
+    quantizations: Dict[str, int] = field(default_factory=dict)
+    fits_in_memory: bool = True
+
+    @property
+    def total_size(self) -> int:
+        return sum(size or 0 for size in self.files.values())
+
+    @property
+    def skipped_size(self) -> int:
+        return sum(size or 0 for size in self.skipped.values())
+
+    def describe(self) -> str:
+        """Resumo para a interface: formato, quantização, tamanho e economia."""
+        label = f"{self.format} {self.quantization}" if self.quantization else self.format
+        text = (f"{label}: {len(self.files)} arquivos, {self.total_size / 1024 ** 3:.2f} GB "
+                f"({self.skipped_size / 1024 ** 3:.2f} GB de outros formatos não serão baixados)")
+        if not self.fits_in_memory:
+            text += ". Atenção: pode não caber na RAM disponível"
+        return text
+
+
+def gguf_quantization(file_name: str) -> Optional[str]:
+    """Quantização no nome de um arquivo GGUF (ex.: 'llama-7b.Q4_K_M.gguf' -> 'Q4_K_M')."""
+    matches = _QUANT_PATTERN.findall(PurePosixPath(file_name).stem)
+    return matches[-1].upper() if matches else None
+
+
+def _is_weight(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in WEIGHT_SUFFIXES
+
+
+def _support_files(siblings: Dict[str, Optional[int]]) -> Dict[str, Optional[int]]:
+    """Configuração, tokenizer e documentação: arquivos da raiz que não são pesos nem índices de shards."""
+    return {name: size for name, size in siblings.items()
+            if '/' not in name and not _is_weight(name) and not name.endswith(".index.json")}
+
+
+def _transformers_weights(siblings: Dict[str, Optional[int]]) -> Tuple[str, Dict[str, Optional[int]]]:
+    """Um único formato de pesos: safetensors, senão .bin do PyTorch."""
+    root = {name: size for name, size in siblings.items() if '/' not in name}
+    for fmt, suffix, prefix in (("safetensors", ".safetensors", "model"), ("pytorch", ".bin", "pytorch_model")):
+        weights = {name: size for name, size in root.items() if name.endswith(suffix)}
+        if not weights:
+            continue
+        # "consolidated.safetensors" e afins repetem o checkpoint dos shards "model-0000X-of-0000Y"
+        standard = {name: size for name, size in weights.items() if name.startswith(prefix)}
+        chosen = standard or weights
+        index = f"{prefix}{suffix}.index.json"
+        if index in siblings:
+            chosen[index] = siblings[index]
+        return fmt, chosen
+    return "desconhecido", {}
+
+
+def plan_download(siblings: Dict[str, Optional[int]], quantization: Optional[str] = None,
+                  memory_budget: int = 0) -> DownloadPlan:
+    """
+    Monta o plano a partir dos arquivos do repositório (nome -> tamanho em bytes).
+
+    Args:
+        quantization: Quantização GGUF pedida pelo usuário (ex.: "Q4_K_M").
+        memory_budget: RAM disponível para o modelo, em bytes (0 = sem limite).
+
+    Raises:
+        ValueError: Se a quantização pedida não existe no repositório.
+    """
+    gguf_files = {name: size for name, size in siblings.items()
+                  if name.lower().endswith(".gguf") and not PurePosixPath(name).name.lower().startswith("mmproj")}
+    if not gguf_files:
+        fmt, weights = _transformers_weights(siblings)
+        files = dict(_support_files(siblings), **weights)
+        return DownloadPlan(format=fmt, files=files,
+                            skipped={name: size for name, size in siblings.items() if name not in files})
+
+    # GGUF: uma quantização, com todos os seus arquivos (modelos divididos em "-0000X-of-0000Y")
+    groups: Dict[str, Dict[str, Optional[int]]] = {}
+    for name, size in gguf_files.items():
+        groups.setdefault(gguf_quantization(name) or PurePosixPath(name).stem, {})[name] = size
+    sizes = {quant: sum(size or 0 for size in group.values()) for quant, group in groups.items()}
+
+    fits_in_memory = True
+    if quantization:
+        chosen = next((quant for quant in groups if quant.upper() == quantization.upper()), None)
+        if chosen is None:
+            raise ValueError(f"Quantização {quantization} não encontrada. Disponíveis: {', '.join(sorted(groups))}")
+        fits_in_memory = not memory_budget or sizes[chosen] * GGUF_MEMORY_OVERHEAD <= memory_budget
+    else:
+        def rank(quant):
+            return GGUF_QUANT_PREFERENCE.index(quant) if quant in GGUF_QUANT_PREFERENCE else len(GGUF_QUANT_PREFERENCE)
+        fitting = [quant for quant in groups if not memory_budget or sizes[quant] * GGUF_MEMORY_OVERHEAD <= memory_budget]
+        if fitting:
+            chosen = min(fitting, key=lambda quant: (rank(quant), sizes[quant]))
+        else:
+            # Nada cabe: a menor é a que tem mais chance de carregar
+            chosen = min(groups, key=lambda quant: sizes[quant])
+            fits_in_memory = False
+
+    files = dict(_support_files(siblings), **groups[chosen])
+    return DownloadPlan(format="gguf", files=files,
+                        skipped={name: size for name, size in siblings.items() if name not in files},
+                        quantization=chosen, quantizations=sizes, fits_in_memory=fits_in_memory)
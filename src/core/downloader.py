@@ -0,0 +1,303 @@
+"""
+Arquivo: downloader.py
+Descrição: Download paralelo e retomável de arquivos de modelo, em pedaços por HTTP Range.
+
+Os arquivos de um repositório são baixados em paralelo (com limite de conexões)
+e os arquivos grandes são divididos em pedaços buscados com o cabeçalho Range.
+Cada arquivo é escrito em `<nome>.part`, com um `<nome>.part.json` ao lado
+registrando os pedaços concluídos: se a conexão cair, a próxima tentativa só
+busca o que falta. Ao terminar, o tamanho e o sha256 (quando conhecido) são
+conferidos antes de o arquivo receber o nome final. O progresso é informado em
+bytes e bytes/s.
+"""
+
+import hashlib
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from .cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Falha no download de um arquivo; os pedaços já baixados ficam para a próxima tentativa."""
+
+
+class DownloadCancelled(DownloadError):
+    """O download foi cancelado pelo usuário."""
+
+
+@dataclass
+class DownloadFile:
+    """Arquivo a baixar: nome relativo ao diretório de destino, URL e, se conhecidos, tamanho e sha256."""
+    name: str
+    url: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+class _StripAuthOnRedirect(urllib.request.HTTPRedirectHandler):
+    """Não repassa o token para outro host (o Hub redireciona arquivos LFS para a CDN)."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new_req = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new_req is not None and urllib.parse.urlsplit(newurl).netloc != urllib.parse.urlsplit(req.full_url).netloc:
+            new_req.remove_header("Authorization")
+        return new_req
+
+
+class ProgressTracker:
+    """Soma os bytes recebidos por todas as threads e calcula a taxa em uma janela recente."""
+
+    def __init__(self, total_bytes: int, callback: Optional[Callable[[int, int, float], None]],
+                 interval: float = 0.25):
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.callback = callback
+        self.interval = interval
+        self._lock = Lock()
+        self._started = time.perf_counter()
+        self._window = (self._started, 0)
+        self._last_report = 0.0
+        self.bytes_per_second = 0.0
+
+    def add(self, count: int, force: bool = False):
+        with self._lock:
+            self.done_bytes += count
+            now = time.perf_counter()
+            if not force and now - self._last_report < self.interval:
+                return
+            window_start, window_bytes = self._window
+            if now - window_start > 0:
+                self.bytes_per_second = (self.done_bytes - window_bytes) / (now - window_start)
+            if now - window_start > 2.0:
+                self._window = (now, self.done_bytes)
+            self._last_report = now
+            done, total, rate = self.done_bytes, self.total_bytes, self.bytes_per_second
+        if self.callback:
+            self.callback(done, total, rate)
+
+
+class ChunkedDownloader:
+    """Baixa uma lista de arquivos para um diretório, em paralelo e em pedaços retomáveis."""
+
+    def __init__(self, max_workers: int = 4, chunk_size: int = 64 * 1024 ** 2,
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 30.0, retries: int = 3):
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = max(READ_SIZE, chunk_size)
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self._opener = urllib.request.build_opener(_StripAuthOnRedirect)
+        self._state_lock = Lock()
+
+    def _open(self, url: str, method: str = "GET", byte_range: Optional[Tuple[int, int]] = None):
+        request = urllib.request.Request(url, method=method, headers=self.headers)
+        if byte_range is not None:
+            request.add_header("Range", f"bytes={byte_range[0]}-{byte_range[1] - 1}")
+        return self._opener.open(request, timeout=self.timeout)
+
+    def probe(self, file: DownloadFile) -> Tuple[Optional[int], bool]:
+        """Tamanho do arquivo e se o servidor aceita Range, via HEAD."""
+        try:
+            with self._open(file.url, "HEAD") as response:
+                length = response.headers.get("Content-Length")
+                accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                return (int(length) if length else None), accepts_ranges
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.debug(f"HEAD de {file.name} falhou: {e}")
+            return None, False
+
+    # --- Estado dos pedaços ---
+    @staticmethod
+    def _state_path(part_path: Path) -> Path:
+        return part_path.with_name(part_path.name + ".json")
+
+    def _load_done_chunks(self, part_path: Path, size: int) -> set:
+        state_path = self._state_path(part_path)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("size") == size and state.get("chunk_size") == self.chunk_size and part_path.exists():
+                return set(state.get("done", []))
+        except (OSError, ValueError):
+            pass
+        return set()
+
+    def _save_done_chunks(self, part_path: Path, size: int, done: set):
+        with self._state_lock:
+            with open(self._state_path(part_path), 'w', encoding='utf-8') as f:
+                json.dump({"size": size, "chunk_size": self.chunk_size, "done": sorted(done)}, f)
+
+    # --- Download ---
+    def download(self, files: List[DownloadFile], dest_dir: Path,
+                 progress: Optional[Callable[[int, int, float], None]] = None,
+                 cancel_token: Optional[CancellationToken] = None) -> List[Path]:
+        """
+        Baixa `files` para `dest_dir`. Arquivos já completos são pulados e
+        arquivos `.part` continuam de onde pararam. Levanta `DownloadError` (ou
+        `DownloadCancelled`) mantendo os pedaços baixados.
+        """
+        dest_dir = Path(dest_dir)
+        cancel_token = cancel_token or CancellationToken()
+        plans = []
+        for file in files:
+            size, accepts_ranges = (file.size, True) if file.size is not None else self.probe(file)
+            plans.append((file, size, accepts_ranges))
+        total = sum(size or 0 for _, size, _ in plans)
+        tracker = ProgressTracker(total, progress)
+
+        tasks = []
+        for file, size, accepts_ranges in plans:
+            target = dest_dir / file.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists() and (size is None or target.stat().st_size == size):
+                tracker.add(size or 0)
+                continue
+            part_path = target.with_name(target.name + ".part")
+            if size is None or not accepts_ranges or size <= self.chunk_size:
+                tasks.append((file, size, part_path, None))
+                continue
+            done = self._load_done_chunks(part_path, size)
+            if not part_path.exists():
+                with open(part_path, 'wb') as f:
+                    f.truncate(size)
+            chunks = [(i, (start, min(start + self.chunk_size, size)))
+                      for i, start in enumerate(range(0, size, self.chunk_size))]
+            tracker.add(sum(end - start for i, (start, end) in chunks if i in done))
+            state = {"done": done, "pending": len(chunks) - len(done)}
+            for index, byte_range in chunks:
+                if index not in done:
+                    tasks.append((file, size, part_path, (index, byte_range, state)))
+            if state["pending"] == 0:
+                self._finish_file(file, size, part_path, target)
+
+        tracker.add(0, force=True)
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sevenx-download") as executor:
+            futures = [executor.submit(self._run_task, task, dest_dir, tracker, cancel_token) for task in tasks]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except DownloadError as e:
+                    errors.append(e)
+                    # Sem uma parte, o modelo não carrega: não adianta continuar os outros arquivos
+                    cancel_token.cancel()
+        if errors:
+            cancelled = [e for e in errors if not isinstance(e, DownloadCancelled)]
+            raise cancelled[0] if cancelled else errors[0]
+        tracker.add(0, force=True)
+        return [dest_dir / file.name for file in files]
+
+    def _run_task(self, task, dest_dir: Path, tracker: ProgressTracker, cancel_token: CancellationToken):
+        file, size, part_path, chunk = task
+        target = dest_dir / file.name
+        if chunk is None:
+            self._with_retries(file, lambda: self._fetch_whole(file, size, part_path, tracker, cancel_token))
+            self._finish_file(file, size, part_path, target)
+            return
+        index, byte_range, state = chunk
+        self._with_retries(file, lambda: self._fetch_range(file, part_path, byte_range, tracker, cancel_token))
+        with self._state_lock:
+            state["done"].add(index)
+            state["pending"] -= 1
+            finished = state["pending"] == 0
+        self._save_done_chunks(part_path, size, state["done"])
+        if finished:
+            self._finish_file(file, size, part_path, target)
+
+    def _with_retries(self, file: DownloadFile, fetch: Callable[[], None]):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return fetch()
+            except DownloadCancelled:
+                raise
+            except (urllib.error.URLError, OSError, DownloadError) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"Falha ao baixar {file.name}: {e}") from e
+                logger.warning(f"Erro ao baixar {file.name} (tentativa {attempt}/{self.retries}): {e}")
+                time.sleep(min(2 ** attempt, 10) * 0.1)
+
+    def _copy(self, response, out, tracker: ProgressTracker, cancel_token: CancellationToken,
+              limit: Optional[int] = None) -> int:
+        received = 0
+        while limit is None or received < limit:
+            if cancel_token.is_cancelled:
+                raise DownloadCancelled("Download cancelado.")
+            data = response.read(READ_SIZE if limit is None else min(READ_SIZE, limit - received))
+            if not data:
+                break
+            out.write(data)
+            received += len(data)
+            tracker.add(len(data))
+        return received
+
+    def _fetch_range(self, file: DownloadFile, part_path: Path, byte_range: Tuple[int, int],
+                     tracker: ProgressTracker, cancel_token: CancellationToken):
+        start, end = byte_range
+        with self._open(file.url, byte_range=byte_range) as response:
+            if response.status != 206:
+                raise DownloadError(f"o servidor ignorou o Range (HTTP {response.status})")
+            with open(part_path, 'r+b') as out:
+                out.seek(start)
+                try:
+                    received = self._copy(response, out, tracker, cancel_token, end - start)
+                    if received != end - start:
+                        raise DownloadError(f"pedaço {start}-{end} incompleto ({received} bytes)")
+                except BaseException:
+                    # O pedaço é refeito inteiro: desconta do progresso o que veio dele
+                    tracker.add(-(out.tell() - start))
+                    raise
+
+    def _fetch_whole(self, file: DownloadFile, size: Optional[int], part_path: Path,
+                     tracker: ProgressTracker, cancel_token: CancellationToken):
+        """Arquivo pequeno ou servidor sem Range por pedaços: continua o .part do ponto em que parou."""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if size is not None and offset >= size:
+            offset = 0
+        byte_range = (offset, size) if offset and size else None
+        with self._open(file.url, byte_range=byte_range) as response:
+            if byte_range is not None and response.status != 206:
+                offset = 0
+            with open(part_path, 'r+b' if offset else 'wb') as out:
+                out.seek(offset)
+                out.truncate()
+                tracker.add(offset)
+                try:
+                    self._copy(response, out, tracker, cancel_token)
+                    if size is not None and out.tell() != size:
+                        raise DownloadError(f"{file.name} incompleto ({out.tell()} de {size} bytes)")
+                except BaseException:
+                    # O que foi gravado fica no .part e volta a ser contado na próxima tentativa
+                    tracker.add(-out.tell())
+                    raise
+
+    def _finish_file(self, file: DownloadFile, size: Optional[int], part_path: Path, target: Path):
+        """Confere tamanho e sha256 e dá ao arquivo o nome final."""
+        actual = part_path.stat().st_size
+        if size is not None and actual != size:
+            raise DownloadError(f"{file.name}: tamanho {actual}, esperado {size}")
+        if file.sha256:
+            digest = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(READ_SIZE), b""):
+                    digest.update(block)
+            if digest.hexdigest() != file.sha256.lower():
+                # Conteúdo corrompido: descarta para a próxima tentativa baixar de novo
+                part_path.unlink(missing_ok=True)
+                self._state_path(part_path).unlink(missing_ok=True)
+                raise DownloadError(f"{file.name}: sha256 não confere")
+        part_path.replace(target)
+        self._state_path(part_path).unlink(missing_ok=True)
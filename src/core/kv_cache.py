@@ -0,0 +1,115 @@
+"""
+Arquivo: kv_cache.py
+Descrição: Reaproveitamento do KV cache (past_key_values) entre turnos de uma conversa.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """Retorna o tamanho do maior prefixo comum entre duas sequências de tokens."""
+    limit = min(len(a), len(b))
+    for i in range(limit):
+        if a[i] != b[i]:
+            return i
+    return limit
+
+
+@dataclass
+class CachedConversation:
+    """KV cache de uma conversa e os tokens que ele representa."""
+    token_ids: List[int]
+    past_key_values: Any
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class KVCacheStore:
+    """
+    Guarda o KV cache de cada conversa (por modelo e sessão) para que o próximo
+    turno só precise fazer o prefill dos tokens novos.
+
+    O cache é retirado do store durante a geração (checkout) e devolvido ao
+    final (checkin), então duas gerações nunca compartilham o mesmo objeto.
+    """
+
+    def __init__(self, max_sessions: int = 4):
+        self.max_sessions = max(1, max_sessions)
+        self._entries: "OrderedDict[Tuple[str, str], CachedConversation]" = OrderedDict()
+        self._lock = Lock()
+        self.stats = {"hits": 0, "misses": 0, "reused_tokens": 0}
+
+    def checkout(self, model_id: str, session_id: str, input_ids: Sequence[int]) -> Tuple[Optional[Any], int]:
+        """
+        Retira o cache da sessão e o corta no maior prefixo comum com o novo prompt.
+
+        Returns:
+            Tuple[Optional[Any], int]: (past_key_values, tokens reaproveitados).
+            Retorna (None, 0) quando não há nada reaproveitável.
+        """
+        with self._lock:
+            entry = self._entries.pop((model_id, session_id), None)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None, 0
+
+        # Pelo menos um token precisa passar pelo modelo para gerar os logits
+        reuse = min(common_prefix_length(entry.token_ids, input_ids), len(input_ids) - 1)
+        past = entry.past_key_values
+        if reuse <= 0 or not self._crop(past, reuse):
+            self.stats["misses"] += 1
+            return None, 0
+
+        self.stats["hits"] += 1
+        self.stats["reused_tokens"] += reuse
+        logger.debug(f"KV cache reaproveitado para {model_id}/{session_id}: {reuse}/{len(input_ids)} tokens")
+        return past, reuse
+
+    def checkin(self, model_id: str, session_id: str, token_ids: List[int], past_key_values: Any):
+        """Devolve o cache ao store após a geração, descartando a sessão menos usada se necessário."""
+        if past_key_values is None or not token_ids:
+            return
+        with self._lock:
+            self._entries[(model_id, session_id)] = CachedConversation(list(token_ids), past_key_values)
+            self._entries.move_to_end((model_id, session_id))
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def drop_model(self, model_id: str):
+        """Remove todos os caches de um modelo (ex.: ao descarregá-lo)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_id]:
+                del self._entries[key]
+
+    def drop_session(self, session_id: str):
+        """Remove o cache de uma sessão em todos os modelos (ex.: nova conversa)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == session_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _crop(past_key_values: Any, length: int) -> bool:
+        """Corta o cache para `length` tokens. Retorna False se o cache não suporta corte."""
+        try:
+            current = past_key_values.get_seq_length()
+            if length < current:
+                # Valores negativos removem tokens do final (compatível com transformers 4.x e 5.x)
+                past_key_values.crop(length - current)
+            return past_key_values.get_seq_length() == length
+        except Exception as e:
+            logger.debug(f"KV cache não suporta corte: {e}")
+            return False
@@ -0,0 +1,185 @@
+"""
+Arquivo: lazy_imports.py
+Descrição: Importação sob demanda da pilha de ML (torch, transformers, huggingface_hub, ctransformers).
+
+Importar essas bibliotecas leva vários segundos, então o motor só as carrega quando
+um modelo local é carregado ou buscado. `LazyModule` mantém o código que as usa
+igual ao de um `import` normal; `prewarm` as importa em segundo plano depois que a
+janela aparece. Os tempos de cada importação e os marcos da inicialização ficam
+disponíveis em `import_report`, para acompanhar o cold start.
+
+Uso:
+    python -m src.core.lazy_imports --target-ms 1500
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from threading import Lock, Thread
+from types import ModuleType
+from typing import Dict, Optional, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bibliotecas pesadas, na ordem em que são pré-aquecidas
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "ctransformers")
+
+_lock = Lock()
+_import_seconds: Dict[str, float] = {}
+_import_errors: Dict[str, str] = {}
+_startup_marks: Dict[str, float] = {}
+_module_loaded_at = time.time()
+
+
+def _process_started_at() -> float:
+    """Instante (epoch) em que o processo começou, ou a importação deste módulo sem psutil."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).create_time()
+    except Exception:
+        return _module_loaded_at
+
+
+def is_installed(name: str) -> bool:
+    """Verifica se a biblioteca está instalada sem importá-la."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load(name: str) -> Optional[ModuleType]:
+    """Importa a biblioteca (uma única vez), registrando o tempo gasto. Retorna None se ela faltar."""
+    module = sys.modules.get(name)
+    if module is not None and name in _import_seconds:
+        return module
+    if name in _import_errors:
+        return None
+
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(name)
+    except ImportError as e:
+        with _lock:
+            _import_errors[name] = str(e)
+        logger.warning(f"Biblioteca {name} não disponível: {e}")
+        return None
+    with _lock:
+        # Com o pré-aquecimento, a primeira thread a importar fica com o tempo real
+        _import_seconds.setdefault(name, time.perf_counter() - started)
+    return module
+
+
+def require(name: str) -> ModuleType:
+    """Como `load`, mas levanta ImportError se a biblioteca não estiver instalada."""
+    module = load(name)
+    if module is None:
+        raise ImportError(f"Biblioteca {name} não instalada: {_import_errors.get(name, '')}")
+    return module
+
+
+class LazyModule:
+    """Substituto de um módulo que só o importa no primeiro acesso a um atributo."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = require(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = "importado" if self._module is not None else "não importado"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def prewarm(names: Sequence[str] = HEAVY_MODULES) -> Thread:
+    """Importa as bibliotecas em uma thread de segundo plano, sem travar a interface."""
+
+    def run():
+        started = time.perf_counter()
+        for name in names:
+            if is_installed(name):
+                load(name)
+        mark_startup("ml_stack_ready")
+        logger.info(f"Pilha de ML pré-carregada em {time.perf_counter() - started:.2f}s")
+
+    thread = Thread(target=run, name="sevenx-ml-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def mark_startup(label: str):
+    """Registra um marco da inicialização (segundos desde o início do processo)."""
+    with _lock:
+        _startup_marks.setdefault(label, time.time() - _process_started_at())
+
+
+def import_report(target_ms: Optional[float] = None) -> Dict:
+    """Tempos de importação das bibliotecas pesadas e marcos da inicialização, em ms."""
+    with _lock:
+        report = {
+            "imports_ms": {name: round(1000 * s, 1) for name, s in _import_seconds.items()},
+            "import_errors": dict(_import_errors),
+            "startup_ms": {label: round(1000 * s, 1) for label, s in _startup_marks.items()},
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+        }
+    if target_ms is not None and "window_shown" in report["startup_ms"]:
+        report["target_ms"] = target_ms
+        report["within_target"] = report["startup_ms"]["window_shown"] <= target_ms
+    return report
+
+
+def measure_cold_import(module: str = "src.ui.main_window", cwd: Optional[str] = None) -> Dict:
+    """
+    Importa `module` em um interpretador novo e informa o tempo gasto e quais
+    bibliotecas pesadas ele puxou junto (idealmente nenhuma).
+    """
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "print(json.dumps({'import_ms': round(1000 * elapsed, 1), 'heavy_modules_loaded': heavy}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=cwd)
+    if result.returncode != 0:
+        return {"module": module, "error": result.stderr.strip().splitlines()[-1:]}
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["module"] = module
+    return data
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Relatório de tempo de importação do SevenX Studio")
+    parser.add_argument("--module", default="src.ui.main_window", help="Módulo importado no cold start")
+    parser.add_argument("--target-ms", type=float, default=None, help="Falha se o cold start passar deste tempo")
+    args = parser.parse_args(argv)
+
+    report = measure_cold_import(args.module)
+    for name in HEAVY_MODULES:
+        if is_installed(name):
+            report.setdefault("heavy_imports_ms", {})[name] = measure_cold_import(name).get("import_ms")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if "error" in report:
+        return 1
+    if report["heavy_modules_loaded"]:
+        print(f"Aviso: {args.module} importa {', '.join(report['heavy_modules_loaded'])} na inicialização")
+    if args.target_ms is not None and report["import_ms"] > args.target_ms:
+        print(f"Cold start de {report['import_ms']:.0f} ms acima da meta de {args.target_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Arquivo: metrics.py
+Descrição: Métricas por geração (tokens do prompt, TTFT, velocidade de decodificação, tempo total).
+
+Cada geração produz um registro `GenerationMetrics`, guardado em um anel de
+tamanho limitado em memória. O tempo até o primeiro token mede o prefill, a
+velocidade depois dele mede a decodificação e o tempo que o gerador passa
+esperando o consumidor mede o custo da interface. A espera na fila de admissão
+fica fora do tempo total, em `queue_seconds`; as pausas por preempção ficam
+dentro dele, mas fora da decodificação.
+"""
+
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, List, Optional
+import logging
+
+from .cancellation import CancellationToken
+
+if TYPE_CHECKING:
+    from .request_scheduler import Ticket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationMetrics:
+    """Registro de uma geração."""
+    model_id: str
+    backend: str
+    started_at: float
+    prompt_tokens: int = 0
+    reused_prompt_tokens: int = 0    # Tokens do prompt aproveitados do KV cache (sem prefill)
+    generated_tokens: int = 0
+    load_seconds: float = 0.0        # Carga do modelo disparada por esta geração
+    priority: Optional[str] = None   # Classe de prioridade na fila de admissão
+    queue_seconds: float = 0.0       # Espera por uma vaga antes de a geração começar
+    preemptions: int = 0             # Vezes em que a geração cedeu a vaga a um pedido mais prioritário
+    preempted_seconds: float = 0.0   # Tempo pausado por preempção
+    ttft_seconds: Optional[float] = None
+    total_seconds: float = 0.0
+    consumer_seconds: float = 0.0    # Tempo em que o consumidor (ex.: a UI) segurou o stream
+    response_cache_hit: bool = False
+    cancelled: bool = False
+    error: Optional[str] = None
+    draft_model: Optional[str] = None   # Modelo de rascunho da decodificação especulativa
+    prompt_lookup_tokens: int = 0       # Candidatos por passo na busca de n-gramas no prompt
+    draft_tokens: int = 0               # Tokens candidatos propostos (rascunho ou prompt lookup)
+    accepted_draft_tokens: int = 0      # Candidatos que o modelo alvo aceitou
+    target_steps: int = 0               # Forwards do modelo alvo (verificações)
+
+    @property
+    def decode_seconds(self) -> float:
+        return max(0.0, self.total_seconds - (self.ttft_seconds or 0.0) - self.preempted_seconds)
+
+    @property
+    def decode_tokens_per_second(self) -> float:
+        """Velocidade de decodificação, sem o prefill (o primeiro token sai junto com ele)."""
+        if self.generated_tokens <= 1 or self.decode_seconds <= 0:
+            return 0.0
+        return (self.generated_tokens - 1) / self.decode_seconds
+
+    @property
+    def speculation(self) -> Optional[str]:
+        """Modo de decodificação especulativa usado: "draft", "prompt_lookup" ou None."""
+        if self.draft_model:
+            return "draft"
+        return "prompt_lookup" if self.prompt_lookup_tokens else None
+
+    @property
+    def draft_acceptance_rate(self) -> float:
+        return self.accepted_draft_tokens / self.draft_tokens if self.draft_tokens else 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["decode_seconds"] = round(self.decode_seconds, 4)
+        data["decode_tokens_per_second"] = round(self.decode_tokens_per_second, 2)
+        if self.speculation:
+            data["speculation"] = self.speculation
+            data["draft_acceptance_rate"] = round(self.draft_acceptance_rate, 3)
+        return data
+
+
+class GenerationTracker:
+    """Acompanha uma geração em andamento e a registra no anel ao terminar."""
+
+    def __init__(self, ring: "MetricsRing", model_id: str, backend: str,
+                 cancel_token: Optional[CancellationToken] = None, ticket: Optional["Ticket"] = None):
+        self.ring = ring
+        self.cancel_token = cancel_token or CancellationToken()
+        self.ticket = ticket
+        self.metrics = GenerationMetrics(model_id=model_id, backend=backend, started_at=time.time())
+        self._start = time.perf_counter()
+        self._first_token_at: Optional[float] = None
+        self._finished = False
+
+    def first_token(self):
+        if self._first_token_at is None:
+            self._first_token_at = time.perf_counter()
+            self.metrics.ttft_seconds = self._first_token_at - self._start
+
+    def live_tokens_per_second(self) -> float:
+        """Velocidade de decodificação até agora."""
+        if self._first_token_at is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._first_token_at
+        tokens = self.cancel_token.generated_tokens - 1
+        return tokens / elapsed if tokens > 0 and elapsed > 0 else 0.0
+
+    def finish(self, error: Optional[str] = None) -> GenerationMetrics:
+        if self._finished:
+            return self.metrics
+        self._finished = True
+        metrics = self.metrics
+        metrics.total_seconds = time.perf_counter() - self._start
+        metrics.generated_tokens = max(metrics.generated_tokens, self.cancel_token.generated_tokens)
+        metrics.cancelled = self.cancel_token.is_cancelled
+        metrics.error = error or metrics.error
+        if self.ticket is not None:
+            metrics.priority = self.ticket.priority
+            metrics.queue_seconds = self.ticket.wait_seconds
+            metrics.preemptions = self.ticket.preemptions
+            metrics.preempted_seconds = self.ticket.preempted_seconds
+        self.ring.record(metrics, self)
+        logger.debug(f"Geração {metrics.model_id}: {metrics.prompt_tokens} tokens de prompt, "
+                     f"TTFT {1000 * (metrics.ttft_seconds or 0):.0f} ms, {metrics.generated_tokens} tokens "
+                     f"a {metrics.decode_tokens_per_second:.1f} tok/s, total {metrics.total_seconds:.2f}s")
+        return metrics
+
+
+class MetricsRing:
+    """Anel em memória com os registros das últimas gerações e as gerações em andamento."""
+
+    def __init__(self, maxlen: int = 256):
+        self._records = deque(maxlen=maxlen)
+        self._active: List[GenerationTracker] = []
+        self._lock = Lock()
+
+    def start(self, model_id: str, backend: str, cancel_token: Optional[CancellationToken] = None,
+              ticket: Optional["Ticket"] = None) -> GenerationTracker:
+        tracker = GenerationTracker(self, model_id, backend, cancel_token, ticket)
+        with self._lock:
+            self._active.append(tracker)
+        return tracker
+
+    def record(self, metrics: GenerationMetrics, tracker: Optional[GenerationTracker] = None):
+        with self._lock:
+            self._records.append(metrics)
+            if tracker in self._active:
+                self._active.remove(tracker)
+
+    def records(self) -> List[GenerationMetrics]:
+        with self._lock:
+            return list(self._records)
+
+    def last(self) -> Optional[GenerationMetrics]:
+        with self._lock:
+            return self._records[-1] if self._records else None
+
+    @property
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def live_tokens_per_second(self) -> float:
+        """Soma da velocidade de decodificação das gerações em andamento."""
+        with self._lock:
+            active = list(self._active)
+        return sum(tracker.live_tokens_per_second() for tracker in active)
+
+    def snapshot(self) -> Dict:
+        """Resumo serializável: gerações ativas e os registros guardados."""
+        return {"active": self.active_count, "live_tokens_per_second": round(self.live_tokens_per_second(), 2),
+                "records": [m.to_dict() for m in self.records()]}
@@ -0,0 +1,109 @@
+"""
+Arquivo: mmap_loading.py
+Descrição: Carga zero-copy de checkpoints safetensors por mapeamento de memória.
+
+`from_pretrained` lê os pesos para a memória privada do processo. Aqui cada
+arquivo .safetensors é mapeado (`torch.UntypedStorage.from_file`, cópia na
+escrita) e os tensores do state_dict são visões sobre esse mapeamento, que o
+modelo recebe com `load_state_dict(assign=True)`. As páginas vêm do page cache:
+cargas repetidas não releem o disco e processos que servem o mesmo modelo
+compartilham a memória física. Só vale na CPU e quando o dtype do checkpoint é
+o dtype pedido, já que qualquer conversão faria a cópia que se quer evitar.
+"""
+
+import json
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .lazy_imports import LazyModule
+from .quantization import _no_init_weights
+
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+
+logger = logging.getLogger(__name__)
+
+# Tipos do formato safetensors -> nomes de dtype do torch
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+FLOAT_DTYPES = ("F64", "F32", "F16", "BF16")
+
+
+class MmapUnsupported(Exception):
+    """O checkpoint não pode ser carregado sem cópia; o motor usa o caminho normal."""
+
+
+def read_safetensors_header(path: Path) -> Tuple[Dict, int]:
+    """Lê o cabeçalho JSON de um arquivo safetensors. Retorna (cabeçalho, início dos dados)."""
+    with open(path, 'rb') as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return header, 8 + header_size
+
+
+def safetensors_files(model_dir: Path) -> List[Path]:
+    return sorted(Path(model_dir).glob("*.safetensors"))
+
+
+def checkpoint_dtype(files: List[Path]) -> Optional[str]:
+    """dtype dos tensores de ponto flutuante do checkpoint, ou None se houver mais de um."""
+    dtypes = set()
+    for path in files:
+        header, _ = read_safetensors_header(path)
+        dtypes.update(info["dtype"] for info in header.values() if info["dtype"] in FLOAT_DTYPES)
+    return SAFETENSORS_DTYPES[dtypes.pop()] if len(dtypes) == 1 else None
+
+
+def mmap_state_dict(files: List[Path]) -> Dict[str, "torch.Tensor"]:
+    """State_dict cujos tensores são visões sobre os arquivos mapeados, sem cópia."""
+    state_dict = {}
+    for path in files:
+        header, data_start = read_safetensors_header(path)
+        storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=path.stat().st_size)
+        for name, info in header.items():
+            dtype = getattr(torch, SAFETENSORS_DTYPES[info["dtype"]])
+            begin, end = info["data_offsets"]
+            offset = data_start + begin
+            element_size = torch.empty((), dtype=dtype).element_size()
+            if offset % element_size:
+                raise MmapUnsupported(f"{name} em {path.name} não está alinhado a {element_size} bytes")
+            tensor = torch.empty(0, dtype=dtype)
+            tensor.set_(storage, offset // element_size, tuple(info["shape"]))
+            if tensor.nelement() * element_size != end - begin:
+                raise MmapUnsupported(f"Tamanho inconsistente de {name} em {path.name}")
+            state_dict[name] = tensor
+    return state_dict
+
+
+def load_mmap_model(model_dir: Path, torch_dtype, attn_implementation: Optional[str] = None):
+    """
+    Monta o modelo a partir do config e atribui a ele os tensores mapeados.
+    Levanta MmapUnsupported se o checkpoint não permitir a carga sem cópia.
+    """
+    files = safetensors_files(model_dir)
+    if not files:
+        raise MmapUnsupported("nenhum arquivo .safetensors")
+    stored_dtype = checkpoint_dtype(files)
+    if stored_dtype is None or getattr(torch, stored_dtype) != torch_dtype:
+        raise MmapUnsupported(f"checkpoint em {stored_dtype}, pedido {torch_dtype}")
+
+    state_dict = mmap_state_dict(files)
+    config = transformers.AutoConfig.from_pretrained(str(model_dir))
+    extra = {"attn_implementation": attn_implementation} if attn_implementation else {}
+    # Sem inicializar: os parâmetros criados aqui são trocados pelos tensores mapeados
+    with _no_init_weights():
+        model = transformers.AutoModelForCausalLM.from_config(config, torch_dtype=torch_dtype, **extra)
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+    tied = set(getattr(model, "_tied_weights_keys", None) or [])
+    missing = [key for key in missing if key not in tied]
+    if missing or unexpected:
+        raise MmapUnsupported(f"chaves do checkpoint não batem com o modelo "
+                              f"({len(missing)} faltando, {len(unexpected)} sobrando)")
+    model.eval()
+    return model
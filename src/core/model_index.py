@@ -0,0 +1,175 @@
+"""
+Arquivo: model_index.py
+Descrição: Índice persistente dos modelos instalados, revalidado pelo mtime dos diretórios.
+
+Listar os modelos varrendo o diretório (`glob('**/_sevenx_info.json')` e
+`rglob('*')` com `stat()` em cada arquivo para somar o tamanho) custa milhares de
+chamadas ao sistema com dezenas de modelos de vários arquivos, e a lista é pedida
+a cada poucos segundos. O índice guarda por modelo o id, o tamanho, o formato e
+a lista de arquivos; a cada listagem só confere o mtime do diretório de modelos
+(modelos adicionados ou removidos), do diretório de cada modelo (arquivos
+criados, renomeados ou apagados) e do seu _sevenx_info.json. Apenas os modelos
+que mudaram são varridos de novo: listar custa O(modelos), não O(arquivos).
+Arquivos sobrescritos no mesmo lugar, sem passar por renomeação, não mudam o
+mtime do diretório; downloads e remoções feitos pelo motor atualizam o índice
+explicitamente.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+INFO_FILE = "_sevenx_info.json"
+INDEX_VERSION = 1
+
+
+def detect_format(file_names: List[str]) -> str:
+    """Formato dos pesos a partir dos nomes dos arquivos do modelo."""
+    suffixes = {Path(name).suffix for name in file_names}
+    if ".gguf" in suffixes:
+        return "gguf"
+    if ".safetensors" in suffixes:
+        return "safetensors"
+    if ".bin" in suffixes or ".pt" in suffixes:
+        return "pytorch"
+    return "desconhecido"
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ModelIndex:
+    """Índice em disco dos modelos de um diretório, atualizado de forma incremental."""
+
+    def __init__(self, models_dir: Path, index_dir: Path):
+        self.models_dir = Path(models_dir)
+        # Um arquivo por diretório de modelos: trocar o diretório nas configurações não mistura índices
+        digest = hashlib.sha1(str(self.models_dir.resolve()).encode()).hexdigest()[:12]
+        self.index_path = Path(index_dir) / f"model_index_{digest}.json"
+        self._lock = Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._models_dir_mtime: Optional[int] = None
+        self.stats = {"model_rescans": 0, "dir_listings": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("models_dir") == str(self.models_dir):
+                self._entries = data.get("entries", {})
+                self._models_dir_mtime = data.get("models_dir_mtime")
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        data = {"version": INDEX_VERSION, "models_dir": str(self.models_dir),
+                "models_dir_mtime": self._models_dir_mtime, "entries": self._entries}
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            tmp_path.replace(self.index_path)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o índice de modelos: {e}")
+
+    def _scan_model(self, model_dir: Path) -> Optional[Dict]:
+        """Varre um diretório de modelo (a única operação proporcional ao número de arquivos)."""
+        info_file = model_dir / INFO_FILE
+        try:
+            with open(info_file, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            files = []
+            for root, _, names in os.walk(model_dir):
+                for name in names:
+                    path = Path(root) / name
+                    files.append({"name": str(path.relative_to(model_dir)), "size": path.stat().st_size})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Erro ao indexar o modelo em {model_dir}: {e}")
+            return None
+        self.stats["model_rescans"] += 1
+        info_mtime = info_file.stat().st_mtime_ns
+        return {
+            "model_id": info.get("model_id", model_dir.name.replace('__', '/')),
+            "path": str(model_dir),
+            "size": sum(f["size"] for f in files),
+            "format": detect_format([f["name"] for f in files]),
+            "files": files,
+            "info": info,
+            "modified_at": datetime.fromtimestamp(info_mtime / 1e9).isoformat(),
+            "dir_mtime": _mtime_ns(model_dir),
+            "info_mtime": info_mtime,
+        }
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        model_dir = Path(entry["path"])
+        return (_mtime_ns(model_dir) == entry.get("dir_mtime")
+                and _mtime_ns(model_dir / INFO_FILE) == entry.get("info_mtime"))
+
+    def list(self) -> List[Dict]:
+        """Entradas dos modelos instalados, revalidando só o que mudou desde a última listagem."""
+        with self._lock:
+            changed = False
+            models_dir_mtime = _mtime_ns(self.models_dir)
+            if models_dir_mtime != self._models_dir_mtime:
+                # Modelos adicionados ou removidos: lista só o primeiro nível
+                self.stats["dir_listings"] += 1
+                present = set()
+                if models_dir_mtime is not None:
+                    with os.scandir(self.models_dir) as entries:
+                        present = {e.name for e in entries if e.is_dir() and (Path(e.path) / INFO_FILE).exists()}
+                for name in set(self._entries) - present:
+                    del self._entries[name]
+                for name in present - set(self._entries):
+                    self._entries[name] = {"path": str(self.models_dir / name)}
+                self._models_dir_mtime = models_dir_mtime
+                changed = True
+
+            for name, entry in list(self._entries.items()):
+                if self._is_fresh(entry):
+                    continue
+                scanned = self._scan_model(Path(entry["path"]))
+                if scanned is None:
+                    del self._entries[name]
+                else:
+                    self._entries[name] = scanned
+                changed = True
+
+            if changed:
+                self._save()
+            return [dict(entry) for entry in self._entries.values()]
+
+    def refresh(self, model_dir: Path):
+        """Reindexa um modelo (ex.: ao terminar um download)."""
+        model_dir = Path(model_dir)
+        with self._lock:
+            scanned = self._scan_model(model_dir)
+            if scanned is None:
+                self._entries.pop(model_dir.name, None)
+            else:
+                self._entries[model_dir.name] = scanned
+            self._save()
+
+    def remove(self, model_dir: Path):
+        """Tira um modelo do índice (ex.: ao ser removido do disco)."""
+        with self._lock:
+            if self._entries.pop(Path(model_dir).name, None) is not None:
+                self._save()
+
+    def files(self, model_dir: Path) -> List[Dict]:
+        """Arquivos indexados de um modelo (nome relativo e tamanho)."""
+        with self._lock:
+            entry = self._entries.get(Path(model_dir).name) or {}
+            return list(entry.get("files", []))
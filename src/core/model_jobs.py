@@ -0,0 +1,263 @@
+"""
+Arquivo: model_jobs.py
+Descrição: Operações de modelo (carregar, descarregar, remover, varrer o diretório, consultar o Hub, designar o rascunho) em threads de trabalho.
+
+Carregar um modelo de vários GB ou apagar seu diretório leva dezenas de segundos;
+feito na thread da interface, congela a janela. O `ModelJobManager` executa essas
+operações em um pool de threads e devolve um `ModelJob` com o progresso por etapa,
+que pode ser cancelado ou aguardado. Pedidos repetidos para o mesmo modelo e a
+mesma operação (com os mesmos parâmetros) reaproveitam o job em andamento, e
+operações diferentes sobre o mesmo modelo rodam em sequência (remover espera a
+carga ser cancelada).
+"""
+
+import itertools
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from .cancellation import CancellationToken
+
+if TYPE_CHECKING:
+    from .sevenx_engine import SevenXEngine
+
+logger = logging.getLogger(__name__)
+
+
+class LoadCancelled(Exception):
+    """Levantada entre as etapas de `SevenXEngine.load_model` quando a carga é cancelada."""
+
+
+@dataclass
+class ModelJob:
+    """Uma operação de modelo em andamento ou concluída."""
+    job_id: int
+    kind: str
+    model_id: Optional[str] = None
+    # Parâmetros que distinguem pedidos da mesma operação (ex.: a quantização do plano)
+    params: Any = None
+    status: str = "pending"          # pending, running, done, failed, cancelled
+    progress: int = 0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancel_token: CancellationToken = field(default_factory=CancellationToken, repr=False)
+    _done: Event = field(default_factory=Event, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+    _future: Optional[Future] = field(default=None, repr=False)
+    _progress_callbacks: List[Callable] = field(default_factory=list, repr=False)
+    _done_callbacks: List[Callable] = field(default_factory=list, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self):
+        """Pede o cancelamento; a carga para na próxima etapa e jobs pendentes nem começam."""
+        self.cancel_token.cancel()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera o job terminar. Retorna False se o tempo acabar antes."""
+        return self._done.wait(timeout)
+
+    def on_progress(self, callback: Callable[["ModelJob"], None]):
+        """Registra uma função chamada (na thread de trabalho) a cada etapa."""
+        with self._lock:
+            self._progress_callbacks.append(callback)
+
+    def on_done(self, callback: Callable[["ModelJob"], None]):
+        """Registra uma função chamada ao terminar; se o job já terminou, é chamada na hora."""
+        with self._lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def report(self, progress: int, message: str):
+        """Atualiza o progresso. Compatível com o `progress_callback` do motor."""
+        self.progress, self.message = int(progress), message
+        with self._lock:
+            callbacks = list(self._progress_callbacks)
+        for callback in callbacks:
+            self._safe_call(callback)
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.status, self.result, self.error = status, result, error
+            self.finished_at = time.time()
+            if status == "done":
+                self.progress = 100
+            self._done.set()
+            callbacks = list(self._done_callbacks)
+        for callback in callbacks:
+            self._safe_call(callback)
+
+    def _safe_call(self, callback: Callable):
+        try:
+            callback(self)
+        except Exception as e:
+            logger.error(f"Erro no callback do job {self.kind} de {self.model_id}: {e}")
+
+    def to_dict(self) -> Dict:
+        return {"job_id": self.job_id, "kind": self.kind, "model_id": self.model_id, "status": self.status,
+                "progress": self.progress, "message": self.message, "error": self.error}
+
+
+class ModelJobManager:
+    """Executa operações de modelo do SevenXEngine em threads de trabalho."""
+
+    def __init__(self, engine: "SevenXEngine", max_workers: int = 2):
+        self.engine = engine
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="sevenx-model-job")
+        self._ids = itertools.count(1)
+        self._active: Dict[Tuple[str, Optional[str]], ModelJob] = {}
+        self._model_locks: Dict[str, Lock] = {}
+        self._lock = Lock()
+        # Jobs concluídos recentemente, para relatórios
+        self.history = deque(maxlen=50)
+        self._closed = False
+
+    def submit_load(self, model_id: str, force_reload: bool = False) -> ModelJob:
+        """Carrega o modelo em segundo plano, informando as etapas (tokenizer, pesos, dispositivo)."""
+        def run(job: ModelJob):
+            loaded = self.engine.load_model(model_id, force_reload=force_reload,
+                                            progress_callback=job.report, cancel_token=job.cancel_token)
+            if not loaded and not job.cancel_token.is_cancelled:
+                raise RuntimeError(f"Falha ao carregar o modelo {model_id}.")
+            return loaded
+        return self._submit("load", model_id, run)
+
+    def submit_unload(self, model_id: str) -> ModelJob:
+        """Descarrega o modelo, cancelando antes uma carga em andamento."""
+        def run(job: ModelJob):
+            job.report(50, f"Descarregando {model_id}...")
+            return self.engine.unload_model(model_id)
+        return self._submit("unload", model_id, run)
+
+    def submit_delete(self, model_id: str) -> ModelJob:
+        """Remove o modelo do disco, cancelando antes uma carga em andamento."""
+        def run(job: ModelJob):
+            job.report(10, f"Removendo {model_id}...")
+            if not self.engine.delete_model(model_id):
+                raise RuntimeError(f"Falha ao remover o modelo {model_id}.")
+            return True
+        return self._submit("delete", model_id, run)
+
+    def submit_scan(self) -> ModelJob:
+        """Varre o diretório de modelos; o resultado é a lista de `ModelInfo`."""
+        def run(job: ModelJob):
+            job.report(10, "Procurando modelos instalados...")
+            return self.engine.list_installed_models()
+        return self._submit("scan", None, run)
+
+    def submit_plan(self, model_id: str, quantization: Optional[str] = None) -> ModelJob:
+        """Consulta o Hub e monta o plano de download; o resultado é o `DownloadPlan`."""
+        def run(job: ModelJob):
+            job.report(10, f"Consultando os arquivos de '{model_id}'...")
+            return self.engine.plan_download(model_id, quantization)
+        return self._submit("plan", model_id, run, params=quantization)
+
+    def submit_draft(self, model_id: str, draft_model_id: Optional[str]) -> ModelJob:
+        """
+        Designa o rascunho de `model_id`; compara os tokenizers dos dois modelos, o que leva segundos.
+        Um pedido com outro rascunho substitui o anterior ainda pendente: vale o último.
+        """
+        def run(job: ModelJob):
+            job.report(10, "Verificando a compatibilidade dos tokenizers...")
+            if not self.engine.set_draft_model(model_id, draft_model_id):
+                raise RuntimeError(f"Modelo {model_id} não encontrado.")
+            return draft_model_id
+        return self._submit("draft", model_id, run, params=draft_model_id)
+
+    def _submit(self, kind: str, model_id: Optional[str], run: Callable[[ModelJob], Any],
+                params: Any = None) -> ModelJob:
+        key = (kind, model_id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("O gerenciador de jobs foi encerrado.")
+            existing = self._active.get(key)
+            if (existing is not None and not existing.finished and not existing.cancel_token.is_cancelled
+                    and existing.params == params):
+                logger.debug(f"Job {kind} de {model_id} já em andamento; reaproveitando #{existing.job_id}")
+                return existing
+            if kind == "draft" and existing is not None and not existing.finished:
+                # A designação mais recente é a que vale; a pendente não deve rodar depois dela
+                existing.cancel()
+            if kind in ("unload", "delete"):
+                # Não adianta terminar de carregar um modelo que vai sair da memória
+                pending_load = self._active.get(("load", model_id))
+                if pending_load is not None and not pending_load.finished:
+                    pending_load.cancel()
+            job = ModelJob(next(self._ids), kind, model_id, params=params)
+            self._active[key] = job
+            job._future = self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job: ModelJob, run: Callable[[ModelJob], Any]):
+        try:
+            if job.cancel_token.is_cancelled:
+                job._finish("cancelled")
+                return
+            model_lock = self._model_lock(job.model_id)
+            # Operações sobre o mesmo modelo rodam uma de cada vez, na ordem de chegada
+            with model_lock:
+                if job.cancel_token.is_cancelled:
+                    job._finish("cancelled")
+                    return
+                job.status = "running"
+                started = time.perf_counter()
+                try:
+                    result = run(job)
+                except Exception as e:
+                    logger.error(f"Job {job.kind} de {job.model_id} falhou: {e}")
+                    job._finish("failed", error=str(e))
+                    return
+                status = "cancelled" if job.cancel_token.is_cancelled and job.kind == "load" else "done"
+                logger.info(f"Job {job.kind} de {job.model_id or 'modelos'}: {status} "
+                            f"em {time.perf_counter() - started:.2f}s")
+                job._finish(status, result=result)
+        finally:
+            with self._lock:
+                if self._active.get((job.kind, job.model_id)) is job:
+                    del self._active[(job.kind, job.model_id)]
+                self.history.append(job)
+
+    def _model_lock(self, model_id: Optional[str]) -> Lock:
+        with self._lock:
+            return self._model_locks.setdefault(model_id or "", Lock())
+
+    def active_jobs(self) -> List[ModelJob]:
+        with self._lock:
+            return [job for job in self._active.values() if not job.finished]
+
+    def find(self, kind: str, model_id: Optional[str] = None) -> Optional[ModelJob]:
+        """Job ativo de um tipo para o modelo, se houver."""
+        with self._lock:
+            job = self._active.get((kind, model_id))
+        return job if job is not None and not job.finished else None
+
+    def shutdown(self, wait: bool = False):
+        """Cancela os jobs pendentes e encerra o pool de threads."""
+        with self._lock:
+            self._closed = True
+            jobs = list(self._active.values())
+        for job in jobs:
+            job.cancel()
+            # Jobs ainda na fila do pool nem começam (cancel_futures só existe a partir do Python 3.9)
+            if job._future is not None and job._future.cancel():
+                with self._lock:
+                    if self._active.get((job.kind, job.model_id)) is job:
+                        del self._active[(job.kind, job.model_id)]
+                    self.history.append(job)
+        self._executor.shutdown(wait=wait)
+        for job in jobs:
+            if not job.finished and job.status == "pending":
+                job._finish("cancelled")
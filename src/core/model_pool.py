@@ -0,0 +1,173 @@
+"""
+Arquivo: model_pool.py
+Descrição: Pool de modelos carregados com orçamento de memória (RAM/VRAM), LRU e TTL de ociosidade.
+"""
+
+import time
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import RLock
+from typing import Dict, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledModel:
+    """Um modelo mantido em memória pelo pool."""
+    model_id: str
+    data: Dict
+    size_bytes: int
+    device: str
+    reason: str = "carregado sob demanda"
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+    @property
+    def memory_kind(self) -> str:
+        """Orçamento ao qual o modelo pertence: 'vram' para GPU, 'ram' para o resto."""
+        return "vram" if str(self.device).startswith("cuda") else "ram"
+
+
+class ModelPool(Mapping):
+    """
+    Guarda os modelos carregados respeitando um orçamento de memória.
+
+    O pool só faz a contabilidade e escolhe quem sai; quem libera de fato os
+    recursos é o SevenXEngine (ver `SevenXEngine.unload_model`). Como é um
+    Mapping de model_id para o dicionário do modelo, também substitui o
+    antigo `loaded_models`. Ler um item não conta como uso: o LRU só é
+    atualizado por `touch`/`acquire`.
+    """
+
+    def __init__(self, ram_budget_bytes: int = 0, vram_budget_bytes: int = 0, idle_ttl: float = 0):
+        self.budgets = {"ram": ram_budget_bytes, "vram": vram_budget_bytes}
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, PooledModel]" = OrderedDict()
+        self._lock = RLock()
+        # Histórico recente de carregamentos e descarregamentos, com o motivo
+        self.events = deque(maxlen=50)
+
+    # --- Interface de Mapping (compatível com o antigo dict loaded_models) ---
+    def __getitem__(self, model_id: str) -> Dict:
+        return self._entries[model_id].data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Contabilidade ---
+    def add(self, model_id: str, data: Dict, size_bytes: int, device: str, reason: str = "carregado sob demanda"):
+        """Registra um modelo recém-carregado como o mais recentemente usado."""
+        with self._lock:
+            self._entries[model_id] = PooledModel(model_id, data, size_bytes, device, reason)
+            self._entries.move_to_end(model_id)
+        self._record("carregado", model_id, reason)
+
+    def remove(self, model_id: str, reason: str = "descarregado") -> Optional[PooledModel]:
+        with self._lock:
+            entry = self._entries.pop(model_id, None)
+        if entry:
+            self._record("descarregado", model_id, reason)
+        return entry
+
+    def touch(self, model_id: str):
+        """Marca o modelo como usado agora."""
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(model_id)
+
+    @contextmanager
+    def acquire(self, model_id: str):
+        """Protege o modelo contra despejo enquanto estiver gerando."""
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry:
+                entry.in_use += 1
+        self.touch(model_id)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                if entry:
+                    entry.in_use -= 1
+                    entry.last_used = time.monotonic()
+
+    def used_bytes(self, kind: str = "ram") -> int:
+        with self._lock:
+            return sum(e.size_bytes for e in self._entries.values() if e.memory_kind == kind)
+
+    def select_victims(self, size_bytes: int, device: str) -> List[str]:
+        """
+        Escolhe os modelos menos usados recentemente que precisam sair para caber
+        um novo modelo de `size_bytes`. Modelos em uso nunca são escolhidos.
+        """
+        kind = "vram" if str(device).startswith("cuda") else "ram"
+        budget = self.budgets.get(kind) or 0
+        if budget <= 0:
+            return []
+
+        victims = []
+        with self._lock:
+            used = self.used_bytes(kind)
+            for entry in self._entries.values():  # Ordem LRU: do menos ao mais recente
+                if used + size_bytes <= budget:
+                    break
+                if entry.memory_kind != kind or entry.in_use:
+                    continue
+                victims.append(entry.model_id)
+                used -= entry.size_bytes
+
+        if used + size_bytes > budget:
+            logger.warning(f"Orçamento de {kind.upper()} insuficiente: {self._format_mb(size_bytes)} necessários, "
+                           f"{self._format_mb(budget - used)} livres mesmo após despejos.")
+        return victims
+
+    def idle_models(self) -> List[str]:
+        """Modelos ociosos há mais tempo que o TTL configurado."""
+        if self.idle_ttl <= 0:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            return [e.model_id for e in self._entries.values()
+                    if not e.in_use and now - e.last_used > self.idle_ttl]
+
+    def report(self) -> Dict:
+        """Resumo do que o pool mantém em memória e por quê."""
+        now = time.monotonic()
+        with self._lock:
+            models = [{
+                "model_id": e.model_id,
+                "size_mb": round(e.size_bytes / (1024 ** 2), 1),
+                "memory": e.memory_kind,
+                "device": e.device,
+                "in_use": e.in_use,
+                "idle_seconds": round(now - e.last_used, 1),
+                "loaded_at": datetime.fromtimestamp(e.loaded_at).isoformat(),
+                "reason": e.reason,
+            } for e in self._entries.values()]
+        return {
+            "budgets_mb": {k: round(v / (1024 ** 2), 1) for k, v in self.budgets.items()},
+            "used_mb": {k: round(self.used_bytes(k) / (1024 ** 2), 1) for k in self.budgets},
+            "idle_ttl": self.idle_ttl,
+            "models": models,
+            "events": list(self.events),
+        }
+
+    def _record(self, action: str, model_id: str, reason: str):
+        self.events.append({"time": datetime.now().isoformat(), "action": action,
+                            "model_id": model_id, "reason": reason})
+        logger.info(f"Pool de modelos: {model_id} {action} ({reason})")
+
+    @staticmethod
+    def _format_mb(size_bytes: int) -> str:
+        return f"{size_bytes / (1024 ** 2):.0f} MB"
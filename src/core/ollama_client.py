@@ -11,6 +11,8 @@ from threading import Lock
 import logging
 
 from .config import Config
+from .cancellation import CancellationToken
+from .metrics import GenerationMetrics, MetricsRing
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +29,15 @@ class OllamaClient:
         self._lock = Lock()  # Para garantir acesso thread-safe
         self._last_request_time = 0
         self._request_interval = 0.1  # Intervalo mínimo entre requisições (segundos)
+        # Registros das últimas gerações feitas pelo servidor Ollama
+        self.metrics = MetricsRing(self.config.get("engine_settings.metrics_history", 256))
+
+    @staticmethod
+    def _apply_server_stats(metrics: GenerationMetrics, result: Dict):
+        """Copia as contagens que o Ollama envia no último chunk (durações em nanossegundos)."""
+        metrics.prompt_tokens = result.get("prompt_eval_count", metrics.prompt_tokens)
+        metrics.generated_tokens = result.get("eval_count", metrics.generated_tokens)
+        metrics.load_seconds = result.get("load_duration", 0) / 1e9
 
     def _rate_limit(self):
         """Aplica rate limiting para evitar sobrecarga do servidor."""
@@ -83,9 +94,11 @@ class OllamaClient:
             logger.error(f"Erro inesperado ao buscar modelos do Ollama: {e}")
             return []
 
-    def chat_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None) -> Generator[str, None, None]:
+    def chat_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None,
+                    cancel_token: Optional[CancellationToken] = None) -> Generator[str, None, None]:
         """
         Envia uma requisição de chat para o Ollama e retorna a resposta em streaming.
+        Ao cancelar o token a conexão é fechada, o que faz o Ollama interromper a geração.
         """
         if not self.is_server_reachable():
             yield "Erro: Servidor Ollama não está acessível."
@@ -124,6 +137,9 @@ class OllamaClient:
             "options": options_payload
         }
 
+        cancel_token = cancel_token or CancellationToken()
+        tracker = self.metrics.start(model_id, "ollama", cancel_token)
+        error = None
         try:
             # Aplica rate limiting
             self._rate_limit()
@@ -144,17 +160,22 @@ class OllamaClient:
                             
                             # Verifica se há erro no chunk
                             if chunk.get("error"):
+                                error = chunk["error"]
                                 yield f"\rErro do Ollama: {chunk['error']}"
                                 return
                                 
                             content = chunk.get("message", {}).get("content", "")
+                            if cancel_token.record_token():
+                                break
                             
                             if content:
+                                tracker.first_token()
                                 content_buffer += content
                                 # Apenas yield quando temos conteúdo para enviar
                                 yield content
                             
                             if chunk.get("done"):
+                                self._apply_server_stats(tracker.metrics, chunk)
                                 break
                                 
                         except json.JSONDecodeError as e:
@@ -165,14 +186,20 @@ class OllamaClient:
                             continue
 
         except requests.exceptions.ReadTimeout:
+            error = "timeout"
             yield f"\rErro: Tempo de espera excedido para o modelo '{model_id}'. Tente novamente."
         except requests.exceptions.ConnectionError:
+            error = "conexão recusada"
             yield f"\rErro: Não foi possível conectar ao servidor Ollama em {self.host}. Verifique se o serviço está rodando."
         except requests.exceptions.RequestException as e:
+            error = str(e)
             yield f"\rErro de comunicação com o Ollama: {e}"
         except Exception as e:
+            error = str(e)
             logger.error(f"Erro inesperado ao processar resposta do Ollama: {e}")
             yield f"\rErro inesperado: {e}"
+        finally:
+            tracker.finish(error)
 
     def generate(self, model_id: str, prompt: str, options: Optional[Dict] = None) -> str:
         """
@@ -206,6 +233,8 @@ class OllamaClient:
             "options": options_payload
         }
 
+        tracker = self.metrics.start(model_id, "ollama")
+        error = None
         try:
             # Aplica rate limiting
             self._rate_limit()
@@ -214,17 +243,26 @@ class OllamaClient:
             response.raise_for_status()
             
             result = response.json()
+            self._apply_server_stats(tracker.metrics, result)
+            # Sem streaming o primeiro token só é visto pelo servidor: usa a carga + o prefill dele
+            tracker.metrics.ttft_seconds = (result.get("load_duration", 0) + result.get("prompt_eval_duration", 0)) / 1e9
             return result.get("response", "")
             
         except requests.exceptions.Timeout:
+            error = "timeout"
             return "Erro: Tempo de espera excedido."
         except requests.exceptions.RequestException as e:
+            error = str(e)
             return f"Erro de comunicação com o Ollama: {e}"
         except json.JSONDecodeError as e:
+            error = str(e)
             return f"Erro ao decodificar resposta do Ollama: {e}"
         except Exception as e:
+            error = str(e)
             logger.error(f"Erro inesperado ao gerar resposta: {e}")
             return f"Erro inesperado: {e}"
+        finally:
+            tracker.finish(error)
 
     def pull_model(self, model_id: str) -> bool:
         """
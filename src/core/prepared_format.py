@@ -0,0 +1,109 @@
+"""
+Arquivo: prepared_format.py
+Descrição: Conversão única do checkpoint para o formato de carga rápida do SevenX.
+
+Muitos repositórios só trazem `pytorch_model.bin`: cada carga desserializa o
+pickle inteiro, converte o dtype e ainda monta o tokenizer rápido a partir dos
+arquivos do tokenizer lento. Na instalação, o modelo é "preparado" uma vez:
+os pesos são regravados em shards safetensors já no dtype de carga e o
+tokenizer rápido é serializado (tokenizer.json) em `_sevenx_prepared/`. O
+artefato fica registrado em `prepared` no _sevenx_info.json, com o dtype e a
+impressão digital dos pesos originais; enquanto os dois baterem, o
+`load_model` carrega dessa pasta, com mapeamento de memória na CPU.
+"""
+
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+from .lazy_imports import LazyModule
+from .mmap_loading import checkpoint_dtype, safetensors_files
+
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+
+logger = logging.getLogger(__name__)
+
+PREPARED_DIR = "_sevenx_prepared"
+PREPARED_FORMAT_VERSION = 1
+# Shards menores que o padrão do transformers (5GB) mantêm o pico de memória da conversão baixo
+PREPARED_SHARD_SIZE = "2GB"
+
+
+class PrepareUnsupported(Exception):
+    """O modelo não pode ser convertido para o formato preparado."""
+
+
+def dtype_name(torch_dtype) -> str:
+    return str(torch_dtype).replace("torch.", "")
+
+
+def preparation_reason(model_dir: Path, torch_dtype) -> Optional[str]:
+    """Por que o modelo ganha com a preparação, ou None se já carrega pelo caminho rápido."""
+    model_dir = Path(model_dir)
+    files = safetensors_files(model_dir)
+    if not files:
+        return "pesos só em pickle (.bin)"
+    stored = checkpoint_dtype(files)
+    if stored != dtype_name(torch_dtype):
+        return f"checkpoint em {stored or 'dtypes mistos'}, carga em {dtype_name(torch_dtype)}"
+    if not (model_dir / "tokenizer.json").exists():
+        return "sem tokenizer rápido serializado"
+    return None
+
+
+def prepared_path(model_dir: Path, info: Dict, torch_dtype, fingerprint: str) -> Optional[Path]:
+    """Pasta preparada registrada no info, se ainda corresponder aos pesos e ao dtype de carga."""
+    prepared = info.get("prepared")
+    if not prepared:
+        return None
+    path = Path(model_dir) / prepared.get("path", PREPARED_DIR)
+    if (prepared.get("format") != PREPARED_FORMAT_VERSION or prepared.get("dtype") != dtype_name(torch_dtype)
+            or prepared.get("fingerprint") != fingerprint or not (path / "config.json").exists()):
+        return None
+    return path
+
+
+def prepare_model(model_dir: Path, torch_dtype, fingerprint: str, token: Optional[str] = None) -> Dict:
+    """
+    Converte o modelo para `_sevenx_prepared/` e retorna os metadados a registrar
+    em `prepared` no _sevenx_info.json. A pasta é escrita ao lado e só troca de
+    nome no fim: uma conversão interrompida não deixa um artefato pela metade.
+    """
+    model_dir = Path(model_dir)
+    config = transformers.AutoConfig.from_pretrained(str(model_dir), token=token)
+    if getattr(config, "auto_map", None):
+        # Código remoto não é regravado pelo save_pretrained de forma confiável
+        raise PrepareUnsupported("modelo com código remoto (trust_remote_code)")
+
+    tokenizer = transformers.AutoTokenizer.from_pretrained(str(model_dir), token=token, use_fast=True)
+    if not getattr(tokenizer, "is_fast", False):
+        raise PrepareUnsupported("tokenizer sem versão rápida")
+    model = transformers.AutoModelForCausalLM.from_pretrained(
+        str(model_dir), token=token, low_cpu_mem_usage=True, torch_dtype=torch_dtype
+    )
+
+    target = model_dir / PREPARED_DIR
+    tmp_dir = model_dir / f"{PREPARED_DIR}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        model.save_pretrained(tmp_dir, safe_serialization=True, max_shard_size=PREPARED_SHARD_SIZE)
+        tokenizer.save_pretrained(tmp_dir, legacy_format=False)
+        shutil.rmtree(target, ignore_errors=True)
+        tmp_dir.rename(target)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return {
+        "path": PREPARED_DIR,
+        "format": PREPARED_FORMAT_VERSION,
+        "dtype": dtype_name(torch_dtype),
+        "fingerprint": fingerprint,
+        "size": sum(f.stat().st_size for f in target.iterdir() if f.is_file()),
+        "torch_version": torch.__version__.split("+")[0],
+        "transformers_version": transformers.__version__,
+        "prepared_at": datetime.now().isoformat(),
+    }
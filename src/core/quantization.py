@@ -0,0 +1,173 @@
+"""
+Arquivo: quantization.py
+Descrição: Modo de carga INT8 dinâmico para CPU, com os pesos quantizados guardados em disco.
+
+As camadas Linear de um modelo Transformers são quantizadas para INT8
+(`torch.ao.quantization.quantize_dynamic`): os pesos ocupam 1/4 do float32 e a
+multiplicação de matrizes da decodificação fica mais rápida na CPU. O state_dict
+quantizado é salvo na pasta do modelo, só com tensores comuns e metadados em
+JSON; nas cargas seguintes o modelo é montado a partir do config e recebe esses
+pesos, sem ler os float32 nem quantizar de novo. O arquivo é refeito se os pesos
+originais ou a versão do torch mudarem.
+"""
+
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, Optional
+import json
+import logging
+
+from .lazy_imports import LazyModule
+
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+
+logger = logging.getLogger(__name__)
+
+# Modos de carga aceitos em `load_mode` no _sevenx_info.json
+LOAD_MODES = ("default", "int8")
+# Tensores comuns (os INT8 como inteiros, com escala e zero-point à parte), lidos com weights_only=True
+QUANTIZED_STATE_FILE = "_sevenx_int8.pt"
+# Metadados em JSON, conferidos antes de abrir os tensores; gravados por último
+QUANTIZED_METADATA_FILE = "_sevenx_int8.json"
+QUANTIZED_FORMAT_VERSION = 2
+
+
+def quantize_dynamic_int8(model):
+    """Quantiza dinamicamente as camadas Linear do modelo (float32, CPU) para INT8."""
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _no_init_weights():
+    """Evita inicializar pesos aleatórios que seriam sobrescritos pelo state_dict salvo."""
+    try:
+        from transformers.modeling_utils import no_init_weights
+        return no_init_weights()
+    except ImportError:
+        return nullcontext()
+
+
+def _artifact_metadata(fingerprint: str) -> Dict:
+    return {"format": QUANTIZED_FORMAT_VERSION, "fingerprint": fingerprint,
+            "torch_version": torch.__version__.split("+")[0]}
+
+
+def _quantized_linears(model) -> Dict[str, Any]:
+    return {name: module for name, module in model.named_modules()
+            if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)}
+
+
+def _plain_entries(model, linears: Dict[str, Any]) -> Dict[str, Any]:
+    """Tensores do state_dict fora das Linear quantizadas (embeddings, normalizações, buffers)."""
+    prefixes = tuple(f"{name}." for name in linears)
+    return {key: value for key, value in model.state_dict().items()
+            if torch.is_tensor(value) and not key.startswith(prefixes)}
+
+
+def _plain_state(model) -> Dict[str, Any]:
+    """
+    State_dict do modelo quantizado só com tensores comuns: cada peso INT8 vira o
+    tensor de inteiros, a escala e o zero-point. Assim o arquivo abre com
+    `torch.load(weights_only=True)`, sem executar pickle da pasta do modelo.
+    """
+    linears = _quantized_linears(model)
+    state = _plain_entries(model, linears)
+    for name, module in linears.items():
+        weight, bias = module._packed_params._weight_bias()
+        if weight.qscheme() not in (torch.per_tensor_affine, torch.per_tensor_symmetric):
+            raise ValueError(f"Esquema de quantização não suportado em {name}: {weight.qscheme()}")
+        state[f"{name}.weight_int8"] = weight.int_repr()
+        state[f"{name}.weight_scale"] = torch.tensor(weight.q_scale(), dtype=torch.float64)
+        state[f"{name}.weight_zero_point"] = torch.tensor(weight.q_zero_point(), dtype=torch.int64)
+        if bias is not None:
+            state[f"{name}.bias"] = bias
+    return state
+
+
+def _load_plain_state(model, state: Dict[str, Any]):
+    """Devolve ao modelo quantizado os tensores gravados por `_plain_state`."""
+    linears = _quantized_linears(model)
+    weights = {}
+    for name in linears:
+        weights[name] = (torch._make_per_tensor_quantized_tensor(state.pop(f"{name}.weight_int8"),
+                                                                 state.pop(f"{name}.weight_scale").item(),
+                                                                 state.pop(f"{name}.weight_zero_point").item()),
+                         state.pop(f"{name}.bias", None))
+    expected = _plain_entries(model, linears)
+    if set(state) != set(expected):
+        missing, unexpected = sorted(set(expected) - set(state)), sorted(set(state) - set(expected))
+        raise ValueError(f"Pesos INT8 não batem com o modelo (faltando: {missing[:3]}, sobrando: {unexpected[:3]})")
+    # As Linear quantizadas só se carregam pelo próprio state_dict; as demais chaves vêm do arquivo
+    full_state = model.state_dict()
+    full_state.update(state)
+    model.load_state_dict(full_state)
+    for name, module in linears.items():
+        module.set_weight_bias(*weights[name])
+
+
+def load_cached_int8(model_dir: Path, fingerprint: str):
+    """
+    Monta o modelo quantizado a partir dos pesos salvos, ou retorna None se
+    não houver cache válido para estes pesos e esta versão do torch.
+    """
+    model_dir = Path(model_dir)
+    path, metadata_path = model_dir / QUANTIZED_STATE_FILE, model_dir / QUANTIZED_METADATA_FILE
+    if not path.exists() or not metadata_path.exists():
+        return None
+    try:
+        if json.loads(metadata_path.read_text(encoding="utf-8")) != _artifact_metadata(fingerprint):
+            logger.info(f"Pesos INT8 em cache de {model_dir.name} desatualizados; quantizando de novo.")
+            return None
+        state = torch.load(path, map_location="cpu", weights_only=True)
+        config = transformers.AutoConfig.from_pretrained(str(model_dir))
+        with _no_init_weights():
+            model = transformers.AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32)
+        # Sem inicialização, os pesos são memória crua (às vezes NaN), e a quantização
+        # calcula a escala a partir deles; zerados, ela roda limpa até os pesos salvos chegarem
+        with torch.no_grad():
+            for param in model.parameters():
+                param.zero_()
+        model = quantize_dynamic_int8(model)
+        _load_plain_state(model, state)
+        return model
+    except Exception as e:
+        logger.warning(f"Não foi possível usar os pesos INT8 em cache de {model_dir.name}: {e}")
+        return None
+
+
+def save_int8(model, model_dir: Path, fingerprint: str):
+    """Grava os pesos quantizados e depois os metadados na pasta do modelo (escrita atômica)."""
+    model_dir = Path(model_dir)
+    path, metadata_path = model_dir / QUANTIZED_STATE_FILE, model_dir / QUANTIZED_METADATA_FILE
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        # Sem os metadados, um arquivo de tensores pela metade nunca é usado
+        metadata_path.unlink(missing_ok=True)
+        torch.save(_plain_state(model), tmp_path)
+        tmp_path.replace(path)
+        metadata_path.write_text(json.dumps(_artifact_metadata(fingerprint)), encoding="utf-8")
+    except Exception as e:
+        logger.warning(f"Não foi possível salvar os pesos INT8 de {model_dir.name}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
+def cached_int8_size(model_dir: Path) -> Optional[int]:
+    """Tamanho do state_dict INT8 salvo, usado para estimar a memória da carga."""
+    path = Path(model_dir) / QUANTIZED_STATE_FILE
+    return path.stat().st_size if path.exists() else None
+
+
+def state_dict_nbytes(model) -> int:
+    """
+    Memória dos tensores do state_dict. Os pesos quantizados ficam em parâmetros
+    empacotados, que não aparecem em `model.parameters()`.
+    """
+    def nbytes(value) -> int:
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        if torch.is_tensor(value):
+            return value.nelement() * value.element_size()
+        return 0
+
+    return sum(nbytes(v) for v in model.state_dict().values())
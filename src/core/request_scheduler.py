@@ -0,0 +1,248 @@
+"""
+Arquivo: request_scheduler.py
+Descrição: Fila de pedidos com prioridade e controle de admissão na frente do motor.
+
+Chat, API local e jobs em lote disputam a mesma CPU/GPU. Sem controle, um job
+em lote atrasa o chat do usuário e uma rajada de requisições da API divide a
+máquina entre dezenas de gerações lentas. Cada geração passa a pedir uma vaga
+ao `RequestScheduler`: no máximo `max_concurrent` rodam ao mesmo tempo e as
+demais esperam em uma fila ordenada por classe de prioridade (interativo, depois
+normal, depois segundo plano) e por ordem de chegada.
+
+A fila tem profundidade máxima e os pedidos com alguém esperando a resposta têm
+prazo de espera; nos dois casos o pedido é recusado com uma estimativa de quando
+tentar de novo (`retry_after`). Quando um pedido chega e não há vaga, a geração
+de prioridade mais baixa em andamento é pausada no próximo limite de token
+(pelo `CancellationToken`, que o loop de decodificação consulta a cada passo) e
+volta à fila na posição original, retomando quando houver vaga.
+"""
+
+import heapq
+import itertools
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Condition
+from typing import Dict, Generator, List, Optional
+import logging
+
+from .cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_NORMAL = "normal"
+PRIORITY_BACKGROUND = "background"
+# Menor valor, maior prioridade
+PRIORITIES = {PRIORITY_INTERACTIVE: 0, PRIORITY_NORMAL: 1, PRIORITY_BACKGROUND: 2}
+
+# Intervalo em que quem espera na fila confere o próprio cancelamento
+POLL_INTERVAL = 0.1
+# Estimativa de duração de uma geração antes da primeira medida (segundos)
+DEFAULT_SERVICE_SECONDS = 5.0
+
+
+class AdmissionRejected(Exception):
+    """Pedido recusado pela fila. `retry_after` é a espera sugerida, em segundos."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(AdmissionRejected):
+    """A fila já tem `max_queue_depth` pedidos à frente."""
+
+
+class QueueTimeout(AdmissionRejected):
+    """O pedido esperou mais que `queue_timeout` sem conseguir vaga."""
+
+
+class RequestCancelled(Exception):
+    """O pedido foi cancelado enquanto esperava na fila."""
+
+
+@dataclass(eq=False)
+class Ticket:
+    """Vaga (ou lugar na fila) de uma geração, com o tempo de espera e as pausas sofridas."""
+    priority: str
+    rank: int
+    seq: int
+    cancel_token: Optional[CancellationToken] = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    admitted_at: Optional[float] = None
+    wait_seconds: float = 0.0
+    preemptions: int = 0
+    preempted_seconds: float = 0.0
+    yield_requested: bool = False
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class RequestScheduler:
+    """Vagas de geração com fila de prioridade, limite de profundidade, prazo de espera e preempção."""
+
+    def __init__(self, max_concurrent: int = 1, max_queue_depth: int = 16, queue_timeout: float = 120.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue_depth = max(0, int(max_queue_depth))
+        self.queue_timeout = float(queue_timeout or 0)
+        self._cond = Condition()
+        self._waiting: List[Ticket] = []
+        self._running: List[Ticket] = []
+        self._seq = itertools.count()
+        self._service_seconds = DEFAULT_SERVICE_SECONDS
+        self.counters = {"admitted": 0, "rejected": 0, "timed_out": 0, "cancelled": 0, "preemptions": 0}
+
+    def set_max_concurrent(self, max_concurrent: int):
+        """Troca o número de vagas; com mais vagas, os primeiros da fila entram em seguida."""
+        with self._cond:
+            self.max_concurrent = max(1, int(max_concurrent))
+            self._cond.notify_all()
+
+    # --- Admissão ---
+    def admit(self, priority: str = PRIORITY_INTERACTIVE,
+              cancel_token: Optional[CancellationToken] = None) -> Ticket:
+        """
+        Espera uma vaga e a retorna. Com um token, instala nele o ponto de preempção
+        consultado a cada token gerado.
+
+        Raises:
+            ValueError: Se a prioridade não existe.
+            QueueFull: Se já há `max_queue_depth` pedidos de prioridade igual ou maior na fila.
+            QueueTimeout: Se um pedido interativo ou normal esperou mais que `queue_timeout`.
+            RequestCancelled: Se o token foi cancelado durante a espera.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade desconhecida: {priority}. Use uma de: {', '.join(PRIORITIES)}")
+        with self._cond:
+            ticket = Ticket(priority, PRIORITIES[priority], next(self._seq), cancel_token)
+            ahead = sum(1 for waiting in self._waiting if waiting.rank <= ticket.rank)
+            if self._running and len(self._running) >= self.max_concurrent and ahead >= self.max_queue_depth:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"Fila de geração cheia ({ahead} pedidos à frente).", self._retry_after(ahead + 1))
+            heapq.heappush(self._waiting, ticket)
+            # Jobs em segundo plano esperam sem prazo: o prazo vale para quem tem alguém esperando a resposta
+            timeout = self.queue_timeout if ticket.priority != PRIORITY_BACKGROUND else 0
+            self._wait_turn(ticket, timeout)
+            ticket.wait_seconds = ticket.admitted_at - ticket.enqueued_at
+            self.counters["admitted"] += 1
+        if cancel_token is not None:
+            cancel_token.set_checkpoint(lambda: self.checkpoint(ticket))
+        if ticket.wait_seconds >= 1:
+            logger.debug(f"Pedido {ticket.priority} admitido após {ticket.wait_seconds:.1f}s na fila.")
+        return ticket
+
+    def _can_run(self, ticket: Ticket) -> bool:
+        return len(self._running) < self.max_concurrent and self._waiting[0] is ticket
+
+    def _wait_turn(self, ticket: Ticket, timeout: float):
+        """Espera (com o lock) o ticket chegar à frente da fila e haver vaga, e o põe para rodar."""
+        deadline = time.perf_counter() + timeout if timeout > 0 else None
+        while not self._can_run(ticket):
+            self._request_yield()
+            if ticket.cancel_token is not None and ticket.cancel_token.is_cancelled:
+                self._leave_queue(ticket)
+                self.counters["cancelled"] += 1
+                raise RequestCancelled("Pedido cancelado enquanto esperava na fila.")
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._leave_queue(ticket)
+                    self.counters["timed_out"] += 1
+                    raise QueueTimeout(f"Nenhuma vaga de geração em {timeout:.0f}s.",
+                                       self._retry_after(len(self._waiting) + 1))
+                wait = min(wait, remaining)
+            self._cond.wait(wait)
+
+        heapq.heappop(self._waiting)
+        self._running.append(ticket)
+        if ticket.admitted_at is None:
+            ticket.admitted_at = time.perf_counter()
+        # Pode haver mais de uma vaga livre: o próximo da fila confere a sua vez
+        self._cond.notify_all()
+
+    def _leave_queue(self, ticket: Ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def _request_yield(self):
+        """Pede à geração de menor prioridade em andamento que ceda a vaga ao primeiro da fila."""
+        if not self._waiting or len(self._running) < self.max_concurrent:
+            return
+        if any(running.yield_requested for running in self._running):
+            return
+        first = self._waiting[0]
+        victims = [running for running in self._running if running.rank > first.rank]
+        if victims:
+            max(victims).yield_requested = True
+
+    def _retry_after(self, position: int) -> int:
+        """Segundos até o pedido na posição `position` da fila provavelmente ser atendido."""
+        return max(1, math.ceil(position * self._service_seconds / self.max_concurrent))
+
+    # --- Execução ---
+    def checkpoint(self, ticket: Ticket):
+        """
+        Ponto de preempção, chamado entre tokens pela geração dona do ticket. Se um
+        pedido de prioridade maior espera vaga, a geração libera a vaga, volta à fila
+        na posição original e só retorna quando for a sua vez de novo.
+        """
+        if not ticket.yield_requested:
+            return
+        with self._cond:
+            ticket.yield_requested = False
+            if not self._waiting or self._waiting[0].rank >= ticket.rank or ticket not in self._running:
+                return
+            paused_at = time.perf_counter()
+            self._running.remove(ticket)
+            heapq.heappush(self._waiting, ticket)
+            ticket.preemptions += 1
+            self.counters["preemptions"] += 1
+            logger.debug(f"Geração {ticket.priority} pausada para atender um pedido {self._waiting[0].priority}.")
+            self._cond.notify_all()
+            try:
+                self._wait_turn(ticket, 0)
+            except RequestCancelled:
+                # O loop vê o cancelamento no retorno de `record_token`; a vaga já foi devolvida
+                pass
+            finally:
+                ticket.preempted_seconds += time.perf_counter() - paused_at
+
+    def release(self, ticket: Ticket):
+        """Devolve a vaga do ticket e atualiza a estimativa de duração usada no `retry_after`."""
+        if ticket.cancel_token is not None:
+            ticket.cancel_token.set_checkpoint(None)
+        with self._cond:
+            if ticket in self._running:
+                self._running.remove(ticket)
+                if ticket.admitted_at is not None:
+                    service = time.perf_counter() - ticket.admitted_at - ticket.preempted_seconds
+                    self._service_seconds = 0.8 * self._service_seconds + 0.2 * max(service, 0.0)
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = PRIORITY_INTERACTIVE,
+             cancel_token: Optional[CancellationToken] = None) -> Generator[Ticket, None, None]:
+        """Vaga de geração durante o bloco `with`."""
+        ticket = self.admit(priority, cancel_token)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict:
+        """Gerações em andamento, fila por prioridade e contadores de admissão."""
+        with self._cond:
+            queued: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+            for ticket in self._waiting:
+                queued[ticket.priority] += 1
+            return dict(self.counters, running=len(self._running), queued=queued,
+                        max_concurrent=self.max_concurrent, max_queue_depth=self.max_queue_depth,
+                        service_seconds=round(self._service_seconds, 3))
@@ -0,0 +1,164 @@
+"""
+Arquivo: response_cache.py
+Descrição: Cache em disco de respostas para gerações determinísticas.
+
+Gerações gulosas (temperature 0 / do_sample=False) sobre os mesmos pesos,
+prompt e opções sempre produzem o mesmo texto; o cache guarda os chunks
+emitidos para que a repetição seja servida do disco, com o chunking original.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arquivos que definem o comportamento do modelo (pesos, config e tokenizer)
+FINGERPRINT_SUFFIXES = (".safetensors", ".bin", ".gguf", ".pt", ".json", ".model", ".txt")
+# Metadados e artefatos derivados do SevenX (_sevenx_info.json, _sevenx_int8.pt/.json, _sevenx_prepared/...)
+# mudam sem alterar os pesos originais
+FINGERPRINT_IGNORED_PREFIX = "_sevenx"
+
+
+def weights_fingerprint(model_dir: Path) -> str:
+    """
+    Impressão digital barata dos arquivos do modelo (nome, tamanho e data de
+    modificação), suficiente para invalidar o cache quando o modelo é trocado.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(model_dir).rglob("*")):
+        relative = path.relative_to(model_dir)
+        if (not path.is_file() or path.suffix not in FINGERPRINT_SUFFIXES
+                or any(part.startswith(FINGERPRINT_IGNORED_PREFIX) for part in relative.parts)):
+            continue
+        stat = path.stat()
+        digest.update(f"{relative.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_deterministic(options: Dict) -> bool:
+    """Indica se as opções de geração resultam em decodificação gulosa."""
+    if options.get("do_sample") is False:
+        return options.get("num_beams", 1) == 1
+    temperature = options.get("temperature")
+    return temperature is not None and temperature <= 0
+
+
+class ResponseCache:
+    """
+    Cache de respostas em disco, um arquivo JSON por entrada, com despejo LRU por tamanho.
+
+    A chave combina modelo, impressão digital dos pesos, prompt renderizado e
+    opções de geração. O índice (tamanho e último acesso de cada entrada) fica
+    em memória e é reconstruído a partir do diretório na inicialização.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 ** 2):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._index: Dict[str, List[float]] = {}  # chave -> [tamanho, último acesso]
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        for path in self.cache_dir.glob("*.json"):
+            stat = path.stat()
+            self._index[path.stem] = [stat.st_size, stat.st_mtime]
+
+    @staticmethod
+    def make_key(model_id: str, fingerprint: str, prompt, options: Dict) -> Optional[str]:
+        """Gera a chave da entrada; retorna None se as opções não forem serializáveis."""
+        try:
+            payload = json.dumps({"model_id": model_id, "fingerprint": fingerprint, "prompt": prompt,
+                                  "options": options}, sort_keys=True, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Retorna os chunks guardados para a chave, ou None."""
+        path = self.cache_dir / f"{key}.json"
+        with self._lock:
+            known = key in self._index
+        if not known:
+            self.stats["misses"] += 1
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                chunks = json.load(f)["chunks"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Entrada do cache de respostas ilegível, descartando: {e}")
+            self._delete(key)
+            self.stats["misses"] += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = now
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return chunks
+
+    def put(self, key: str, chunks: List[str], model_id: str = ""):
+        """Guarda os chunks de uma geração completa e despeja entradas antigas se preciso."""
+        data = json.dumps({"model_id": model_id, "created": time.time(), "chunks": chunks}, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        path = self.cache_dir / f"{key}.json"
+        temp_path = path.with_suffix(".tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar no cache de respostas: {e}")
+            return
+        with self._lock:
+            self._index[key] = [size, time.time()]
+        self.stats["stores"] += 1
+        self._evict()
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            self._delete(key)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return int(sum(size for size, _ in self._index.values()))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _evict(self):
+        with self._lock:
+            total = sum(size for size, _ in self._index.values())
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self._delete(key)
+            self.stats["evictions"] += 1
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._index.pop(key, None)
+        try:
+            (self.cache_dir / f"{key}.json").unlink()
+        except OSError:
+            pass
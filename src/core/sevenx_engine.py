@@ -2,13 +2,15 @@
 Arquivo: sevenx_engine.py
 Descrição: Motor de IA com suporte a modelos Transformers e GGUF (via ctransformers).
 """
-import torch
 import json
 import shutil
+import sys
+import time
 import traceback
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
-from threading import Thread
-from typing import Dict, List, Optional, Callable, Generator
+from threading import Thread, Lock, Event
+from typing import TYPE_CHECKING, Dict, List, Optional, Callable, Generator
 from dataclasses import dataclass
 from datetime import datetime
 import logging
@@ -17,17 +19,46 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from .config import Config
+from .lazy_imports import LazyModule, is_installed
+from .kv_cache import KVCacheStore
+from .model_pool import ModelPool
+from .cancellation import CancellationToken
+from .context_window import ContextWindowManager, get_context_length, read_gguf_metadata
+from .response_cache import ResponseCache, is_deterministic, weights_fingerprint
+from .batch_generation import BatchItemResult, make_length_buckets, left_pad, count_generated_tokens
+from .metrics import GenerationTracker, MetricsRing
+from .model_jobs import ModelJobManager, LoadCancelled
+from .quantization import (LOAD_MODES, cached_int8_size, load_cached_int8, quantize_dynamic_int8,
+                           save_int8, state_dict_nbytes)
+from .mmap_loading import MmapUnsupported, load_mmap_model
+from .speculative import SpeculativeCounter, speculative_report, tokenizer_incompatibility
+from .thread_tuning import ThreadConfig, ThreadTuner, apply_thread_config
+from .model_index import ModelIndex
+from .blob_store import BlobStore
+from .prepared_format import PrepareUnsupported, prepare_model, prepared_path, preparation_reason
+from .download_plan import DownloadPlan, plan_download
+from .request_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, AdmissionRejected, RequestCancelled,
+                                RequestScheduler, Ticket)
+
+# A pilha de ML só é importada quando um modelo local é carregado ou buscado
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+huggingface_hub = LazyModule("huggingface_hub")
+ctransformers = LazyModule("ctransformers")
+
+if TYPE_CHECKING:
+    from .batch_scheduler import ContinuousBatchScheduler
+
 try:
-    from huggingface_hub import list_models, model_info, hf_hub_download
-    from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
-    # Importa o carregador de modelos GGUF
-    from ctransformers import AutoModelForCausalLM as AutoModelForCausalLM_GGUF
-    HUGGINGFACE_AVAILABLE = True
-except ImportError as e:
-    logger.warning(f"Bibliotecas do Hugging Face não disponíveis: {e}")
-    HUGGINGFACE_AVAILABLE = False
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
 
-from .config import Config
+# Argumentos de `generate` que não influenciam o texto gerado
+RUNTIME_GENERATION_KWARGS = {"input_ids", "attention_mask", "past_key_values", "stopping_criteria", "streamer",
+                             "assistant_model", "prompt_lookup_num_tokens", "max_matching_ngram_size"}
 
 
 @dataclass
@@ -47,23 +78,218 @@ class SevenXEngine:
     def __init__(self, config: Config):
         self.config = config
         self.models_dir = Path(config.models_directory)
-        self.loaded_models = {}
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model_cache = {}  # Cache para modelos já carregados
-        logger.info(f"SevenXEngine inicializado. Usando device: {self.device}")
+        self._device: Optional[str] = None
+        # Modelos carregados, com orçamento de RAM/VRAM, despejo LRU e TTL de ociosidade.
+        # O orçamento automático de VRAM depende do torch e só é calculado na primeira carga.
+        self.model_pool = ModelPool(
+            ram_budget_bytes=self._memory_budget("ram"),
+            vram_budget_bytes=int(config.get("engine_settings.vram_budget_mb", 0) * 1024 ** 2),
+            idle_ttl=config.get("engine_settings.model_idle_ttl", 1800)
+        )
+        self._reaper_stop = Event()
+        self.generation_stats = {"cancelled": 0, "wasted_tokens": 0}
+        # KV cache por conversa, para não repetir o prefill do histórico a cada turno
+        self.kv_cache = KVCacheStore(max_sessions=config.get("engine_settings.kv_cache_sessions", 4))
+        # Escolhe o histórico que cabe no contexto real de cada modelo
+        self.context_window = ContextWindowManager()
+        # Respostas de gerações determinísticas, servidas do disco quando repetidas
+        self.response_cache = None
+        if config.get("engine_settings.response_cache", True):
+            self.response_cache = ResponseCache(
+                config.cache_dir / "responses",
+                max_bytes=int(config.get("engine_settings.response_cache_mb", 256) * 1024 ** 2)
+            )
+        # Melhor número de threads e afinidade de CPU por modelo nesta máquina
+        self.thread_tuner = None
+        if config.get("engine_settings.thread_autotune", True):
+            self.thread_tuner = ThreadTuner(config.cache_dir / "thread_tuning.json")
+        # Registros das últimas gerações (TTFT, tokens/s, tempo total)
+        self.metrics = MetricsRing(config.get("engine_settings.metrics_history", 256))
+        # Um escalonador de continuous batching por modelo (criado sob demanda)
+        self.batch_schedulers: Dict[str, "ContinuousBatchScheduler"] = {}
+        self._schedulers_lock = Lock()
+        # Fila de admissão: vagas de geração por prioridade, com preempção entre tokens
+        self.request_scheduler = RequestScheduler(
+            max_concurrent=self._max_concurrent_requests(),
+            max_queue_depth=config.get("engine_settings.max_queue_depth", 16),
+            queue_timeout=config.get("engine_settings.queue_timeout_seconds", 120)
+        )
+        # Um lock por modelo: cargas simultâneas do mesmo modelo esperam a primeira
+        self._load_locks: Dict[str, Lock] = {}
+        self._load_locks_guard = Lock()
+        # Carga, descarga, remoção e varredura de modelos em threads de trabalho
+        self.jobs = ModelJobManager(self, max_workers=config.get("engine_settings.model_job_workers", 2))
+        logger.info("SevenXEngine inicializado.")
         
         # Garantir que o diretório de modelos exista
         self.models_dir.mkdir(parents=True, exist_ok=True)
+        # Modelos instalados, sem varrer todos os arquivos a cada listagem
+        self.model_index = ModelIndex(self.models_dir, config.cache_dir)
+        self.blob_store = BlobStore(self.models_dir)
+
+        if self.model_pool.idle_ttl > 0:
+            Thread(target=self._idle_reaper, name="sevenx-idle-reaper", daemon=True).start()
+
+    @property
+    def device(self) -> str:
+        """Dispositivo dos modelos Transformers. Consultá-lo importa o torch."""
+        if self._device is None:
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Usando device: {self._device}")
+            if not self.model_pool.budgets["vram"]:
+                self.model_pool.budgets["vram"] = self._memory_budget("vram")
+        return self._device
+
+    @property
+    def loaded_models(self) -> ModelPool:
+        """Modelos carregados (model_id -> dados do modelo). Mantido por compatibilidade."""
+        return self.model_pool
+
+    def _memory_budget(self, kind: str) -> int:
+        """Orçamento em bytes para RAM ou VRAM. 0 no config significa automático."""
+        budget_mb = self.config.get(f"engine_settings.{kind}_budget_mb", 0)
+        if budget_mb:
+            return int(budget_mb * 1024 ** 2)
+        try:
+            if kind == "ram" and PSUTIL_AVAILABLE:
+                return int(psutil.virtual_memory().total * 0.75)
+            if kind == "vram" and torch.cuda.is_available():
+                return int(torch.cuda.get_device_properties(0).total_memory * 0.9)
+        except Exception as e:
+            logger.warning(f"Não foi possível determinar o orçamento de {kind.upper()}: {e}")
+        return 0
+
+    def _estimate_load_size(self, model_dir: Path, gguf_file_path: Optional[Path], load_mode: str = "default") -> int:
+        """Estima a memória que o modelo vai ocupar depois de carregado, a partir dos arquivos de pesos."""
+        if gguf_file_path:
+            return gguf_file_path.stat().st_size
+        if load_mode == "int8":
+            # Sem o cache INT8, o pico é o modelo em float32 antes de quantizar
+            cached_size = cached_int8_size(model_dir)
+            if cached_size:
+                return cached_size
+
+        # safetensors e .bin costumam ser cópias do mesmo checkpoint: conta só um formato
+        safetensors_size = sum(f.stat().st_size for f in model_dir.glob("*.safetensors"))
+        size = safetensors_size or sum(f.stat().st_size for f in model_dir.glob("*.bin"))
+        try:
+            with open(model_dir / "config.json", 'r', encoding='utf-8') as f:
+                stored_dtype = json.load(f).get("torch_dtype") or "float32"
+        except Exception:
+            stored_dtype = "float32"
+        stored_bytes = 2 if stored_dtype in ("float16", "bfloat16") else 4
+        target_bytes = torch.finfo(self._torch_dtype()).bits // 8
+        return int(size * target_bytes / stored_bytes)
+
+    def _measure_model_size(self, model_data: Dict, estimated: int) -> int:
+        """Memória efetivamente ocupada pelos tensores de um modelo Transformers."""
+        if model_data["type"] != "transformers":
+            return estimated
+        model = model_data["model"]
+        if model_data.get("load_mode") == "int8":
+            return state_dict_nbytes(model) or estimated
+        tensors = list(model.parameters()) + list(model.buffers())
+        storages = {t.untyped_storage().data_ptr(): t.untyped_storage().nbytes() for t in tensors}
+        return sum(storages.values()) or estimated
+
+    def _make_room(self, size_bytes: int, device: str):
+        """Descarrega os modelos menos usados recentemente até caber um novo modelo no orçamento."""
+        for victim in self.model_pool.select_victims(size_bytes, device):
+            self.unload_model(victim, reason=f"despejado (LRU) para liberar {size_bytes / (1024 ** 2):.0f} MB")
+
+    def _idle_reaper(self):
+        """Descarrega periodicamente os modelos ociosos há mais tempo que o TTL."""
+        interval = max(5.0, min(60.0, self.model_pool.idle_ttl / 2))
+        while not self._reaper_stop.wait(interval):
+            for model_id in self.model_pool.idle_models():
+                self.unload_model(model_id, reason=f"ocioso por mais de {self.model_pool.idle_ttl:.0f}s")
+
+    def get_pool_report(self) -> Dict:
+        """Relatório dos modelos em memória, orçamento e últimos eventos de carga/despejo."""
+        return self.model_pool.report()
+
+    def _torch_dtype(self) -> "torch.dtype":
+        """Tipo dos pesos Transformers: 'auto' usa float16 na GPU e float32 na CPU."""
+        name = self.config.get("engine_settings.torch_dtype", "auto")
+        if name == "auto":
+            return torch.float16 if self.device == "cuda" else torch.float32
+        return getattr(torch, name)
 
     def _find_gguf_file(self, model_dir: Path) -> Optional[Path]:
         """Encontra o primeiro arquivo .gguf em um diretório."""
         try:
-            gguf_files = list(model_dir.glob("*.gguf"))
+            gguf_files = sorted(model_dir.glob("*.gguf"))
             return gguf_files[0] if gguf_files else None
         except Exception as e:
             logger.error(f"Erro ao procurar arquivos GGUF em {model_dir}: {e}")
             return None
 
+    def _load_mode(self, model_id: str, model_dir: Path) -> str:
+        """Modo de carga do modelo (`load_mode` no _sevenx_info.json). INT8 dinâmico só vale na CPU."""
+        load_mode = self._get_model_metadata(model_dir).get("load_mode", "default")
+        if load_mode not in LOAD_MODES:
+            logger.warning(f"Modo de carga '{load_mode}' desconhecido para {model_id}; usando o padrão.")
+            return "default"
+        if load_mode == "int8" and self.device != "cpu":
+            logger.warning(f"Modo INT8 de {model_id} ignorado: a quantização dinâmica só roda na CPU.")
+            return "default"
+        return load_mode
+
+    def set_model_load_mode(self, model_id: str, load_mode: str) -> bool:
+        """Grava o modo de carga no _sevenx_info.json do modelo; vale a partir da próxima carga."""
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Modo de carga inválido: {load_mode} (use {', '.join(LOAD_MODES)})")
+        info_file = self.models_dir / model_id.replace('/', '__') / "_sevenx_info.json"
+        if not info_file.parent.exists():
+            return False
+        info = self._get_model_metadata(info_file.parent)
+        info["load_mode"] = load_mode
+        with open(info_file, 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        return True
+
+    def set_draft_model(self, model_id: str, draft_model_id: Optional[str]) -> bool:
+        """
+        Designa um modelo instalado como rascunho da decodificação especulativa de
+        `model_id` (None desfaz). Levanta ValueError se o rascunho não for compatível.
+        """
+        model_dir = self.models_dir / model_id.replace('/', '__')
+        if not model_dir.exists():
+            return False
+        if draft_model_id is not None:
+            reason = self._draft_incompatibility(model_id, model_dir, draft_model_id)
+            if reason:
+                raise ValueError(f"{draft_model_id} não pode ser rascunho de {model_id}: {reason}")
+        info = self._get_model_metadata(model_dir)
+        if draft_model_id is None:
+            info.pop("draft_model", None)
+        else:
+            info["draft_model"] = draft_model_id
+        with open(model_dir / "_sevenx_info.json", 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        if model_id in self.model_pool:
+            self.model_pool[model_id]["draft_model"] = draft_model_id
+        return True
+
+    def _draft_incompatibility(self, model_id: str, model_dir: Path, draft_model_id: str) -> Optional[str]:
+        """Motivo pelo qual o rascunho não serve para o modelo, ou None se servir."""
+        draft_dir = self.models_dir / draft_model_id.replace('/', '__')
+        if draft_model_id == model_id:
+            return "o modelo não pode ser rascunho de si mesmo"
+        if not draft_dir.exists():
+            return "o modelo de rascunho não está instalado"
+        if self._find_gguf_file(model_dir) or self._find_gguf_file(draft_dir):
+            return "a decodificação especulativa só funciona com modelos Transformers"
+        try:
+            tokenizers = []
+            for model_path in (model_dir, draft_dir):
+                tokenizers.append(transformers.AutoTokenizer.from_pretrained(
+                    str(model_path), use_fast=True, trust_remote_code=True
+                ))
+        except Exception as e:
+            return f"não foi possível carregar os tokenizers ({e})"
+        return tokenizer_incompatibility(*tokenizers)
+
     def _get_model_metadata(self, model_dir: Path) -> Dict:
         """Obtém metadados do modelo de forma otimizada."""
         try:
@@ -76,14 +302,6 @@ class SevenXEngine:
             logger.warning(f"Erro ao ler metadados do modelo: {e}")
             return {}
 
-    def _estimate_model_size(self, model_dir: Path) -> int:
-        """Estima o tamanho do modelo de forma eficiente."""
-        try:
-            return sum(f.stat().st_size for f in model_dir.rglob('*') if f.is_file())
-        except Exception as e:
-            logger.warning(f"Erro ao estimar tamanho do modelo: {e}")
-            return 0
-
     def _filter_valid_transformers_params(self, params: Dict) -> Dict:
         """Filtra apenas parâmetros válidos para Transformers."""
         valid_params = {
@@ -94,47 +312,70 @@ class SevenXEngine:
             "bad_words_ids", "force_words_ids", "renormalize_logits", 
             "constraints", "prefix_allowed_tokens_fn", "readability_penalties",
             "guidance_scale", "low_memory", "num_return_sequences", 
-            "pad_token_id", "bos_token_id", "eos_token_id"
+            "pad_token_id", "bos_token_id", "eos_token_id",
+            "prompt_lookup_num_tokens", "max_matching_ngram_size"
         }
         
-        # Filtrar apenas parâmetros válidos
-        filtered_params = {k: v for k, v in params.items() if k in valid_params}
-        
         # Mapear nomes de parâmetros para os esperados pelo Transformers
         param_mapping = {
             "max_tokens": "max_new_tokens",
             "repeat_penalty": "repetition_penalty"
         }
-        
-        # Aplicar mapeamento
+
+        # Aplicar mapeamento antes do filtro, senão os nomes alternativos seriam descartados
         mapped_params = {}
-        for key, value in filtered_params.items():
-            if key in param_mapping:
-                mapped_params[param_mapping[key]] = value
-            else:
-                mapped_params[key] = value
-                
+        for key, value in params.items():
+            mapped_key = param_mapping.get(key, key)
+            if mapped_key not in valid_params:
+                continue
+            # O nome nativo do Transformers tem precedência sobre o alternativo
+            if key != mapped_key and mapped_key in params:
+                continue
+            mapped_params[mapped_key] = value
+
         return mapped_params
 
-    def load_model(self, model_id: str, force_reload: bool = False) -> bool:
+    def load_model(self, model_id: str, force_reload: bool = False,
+                   progress_callback: Optional[Callable] = None,
+                   cancel_token: Optional[CancellationToken] = None) -> bool:
         """
         Carrega um modelo específico de forma otimizada.
         
         Args:
             model_id (str): ID do modelo a ser carregado
             force_reload (bool): Força o recarregamento mesmo se já estiver carregado
+            progress_callback (Optional[Callable]): Recebe (percentual, mensagem) a cada etapa
+                (tokenizer, pesos, transferência para o dispositivo)
+            cancel_token (Optional[CancellationToken]): Interrompe a carga entre as etapas
             
         Returns:
             bool: True se o modelo foi carregado com sucesso, False caso contrário
         """
+        with self._load_locks_guard:
+            load_lock = self._load_locks.setdefault(model_id, Lock())
+        # Outra thread carregando o mesmo modelo: espera e aproveita o resultado
+        with load_lock:
+            return self._load_model_locked(model_id, force_reload, progress_callback, cancel_token)
+
+    def _load_model_locked(self, model_id: str, force_reload: bool, progress_callback: Optional[Callable],
+                           cancel_token: Optional[CancellationToken]) -> bool:
+        def stage(progress: int, status: str):
+            if cancel_token is not None and cancel_token.is_cancelled:
+                raise LoadCancelled(status)
+            if progress_callback:
+                progress_callback(progress, status)
+
         # Verifica se já está carregado e não precisa ser recarregado
-        if model_id in self.loaded_models and not force_reload:
+        if model_id in self.model_pool and not force_reload:
+            self.model_pool.touch(model_id)
             logger.info(f"Modelo {model_id} já está carregado.")
+            if progress_callback:
+                progress_callback(100, f"Modelo {model_id} já está carregado.")
             return True
             
-        # Remove do cache se for forçar reload
-        if force_reload and model_id in self.model_cache:
-            del self.model_cache[model_id]
+        # Remove do pool se for forçar reload
+        if force_reload:
+            self.unload_model(model_id, reason="recarregamento forçado")
             
         model_dir_name = model_id.replace('/', '__')
         model_dir = self.models_dir / model_dir_name
@@ -148,7 +389,15 @@ class SevenXEngine:
         
         try:
             # Verifica se é um modelo GGUF
+            stage(5, "Verificando arquivos do modelo...")
             gguf_file_path = self._find_gguf_file(model_dir)
+            load_mode = "default" if gguf_file_path else self._load_mode(model_id, model_dir)
+            fingerprint = weights_fingerprint(model_dir)
+            estimated_size = self._estimate_load_size(model_dir, gguf_file_path, load_mode)
+            target_device = "cpu" if gguf_file_path else self.device
+            stage(10, "Liberando memória...")
+            self._make_room(estimated_size, target_device)
+
             if gguf_file_path:
                 # --- Carregamento de Modelo GGUF ---
                 logger.info(f"Arquivo GGUF detectado: {gguf_file_path.name}. Carregando com CTransformers...")
@@ -156,46 +405,58 @@ class SevenXEngine:
                 # Configurações específicas para GGUF
                 model_config = {
                     "model_type": 'llama',
-                    "context_length": self.config.get("chat_settings.max_tokens", 2048),
+                    "context_length": self._gguf_context_length(gguf_file_path),
                     "gpu_layers": self.config.get("gpu_layers", 0)  # Permite configurar camadas GPU
                 }
+                stored_threads = self.thread_tuner.lookup(model_id) if self.thread_tuner else None
+                if stored_threads:
+                    model_config["threads"] = stored_threads.threads
                 
-                # Carregamento otimizado com cache
-                if model_id in self.model_cache:
-                    model = self.model_cache[model_id]
-                else:
-                    model = AutoModelForCausalLM_GGUF.from_pretrained(
-                        str(gguf_file_path),
-                        **model_config
-                    )
-                    self.model_cache[model_id] = model
-                
-                self.loaded_models[model_id] = {"model": model, "type": "gguf"}
+                stage(20, f"Carregando pesos de {gguf_file_path.name}...")
+                model = ctransformers.AutoModelForCausalLM.from_pretrained(
+                    str(gguf_file_path),
+                    **model_config
+                )
+                model_data = {"model": model, "type": "gguf", "context_length": model_config["context_length"]}
                 logger.info(f"Modelo GGUF {model_id} carregado com sucesso.")
                 
             else:
                 # --- Carregamento de Modelo Transformers Padrão ---
                 logger.info("Carregando com a biblioteca Transformers...")
                 
+                # Formato preparado na instalação: safetensors no dtype de carga e tokenizer.json
+                source_dir = self._prepared_source(model_id, model_dir, fingerprint) or model_dir
+
                 # Carregamento otimizado do tokenizer
-                tokenizer = AutoTokenizer.from_pretrained(
-                    str(model_dir), 
+                stage(15, "Carregando tokenizer...")
+                tokenizer = transformers.AutoTokenizer.from_pretrained(
+                    str(source_dir), 
                     token=token,
                     use_fast=True,  # Usar tokenizer rápido quando disponível
                     trust_remote_code=True  # Para modelos customizados
                 )
                 
-                # Carregamento otimizado do modelo
-                model = AutoModelForCausalLM.from_pretrained(
-                    str(model_dir), 
-                    token=token, 
-                    low_cpu_mem_usage=True,
-                    torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,  # Otimização de tipo
-                    attn_implementation="sdpa" if torch.__version__ >= "2.0" else "eager"  # Otimização de atenção
-                )
-                
-                # Mover modelo para dispositivo correto
-                model.to(self.device)
+                attn_implementation = "sdpa" if torch.__version__ >= "2.0" else "eager"  # Otimização de atenção
+                mmapped = False
+                if load_mode == "int8":
+                    model = self._load_int8_model(model_dir, token, fingerprint, stage)
+                else:
+                    model = self._load_mmap_model(model_id, source_dir, attn_implementation, stage)
+                    mmapped = model is not None
+                if model is None:
+                    # Carregamento otimizado do modelo
+                    stage(25, "Carregando pesos...")
+                    model = transformers.AutoModelForCausalLM.from_pretrained(
+                        str(source_dir), 
+                        token=token, 
+                        low_cpu_mem_usage=True,
+                        torch_dtype=self._torch_dtype(),  # Otimização de tipo
+                        attn_implementation=attn_implementation
+                    )
+                    
+                    # Mover modelo para dispositivo correto
+                    stage(80, f"Transferindo para {self.device}...")
+                    model.to(self.device)
                 
                 # Configurações do tokenizer
                 if tokenizer.pad_token is None: 
@@ -203,21 +464,406 @@ class SevenXEngine:
                 if not getattr(tokenizer, 'chat_template', None): 
                     tokenizer.chat_template = None
                     
-                self.loaded_models[model_id] = {
+                model_data = {
                     "model": model, 
                     "tokenizer": tokenizer, 
-                    "type": "transformers"
+                    "type": "transformers",
+                    "load_mode": load_mode,
+                    "mmap": mmapped,
+                    "prepared": source_dir != model_dir,
+                    "draft_model": self._get_model_metadata(model_dir).get("draft_model")
                 }
-                logger.info(f"Modelo Transformers {model_id} carregado com sucesso.")
-                
+                logger.info(f"Modelo Transformers {model_id} carregado com sucesso "
+                            f"({load_mode}{', pesos mapeados' if mmapped else ''}"
+                            f"{', formato preparado' if source_dir != model_dir else ''}).")
+
+            if self.thread_tuner is not None and target_device == "cpu":
+                model_data["threads"] = self._tune_threads(model_id, model_data, stage, cancel_token)
+
+            stage(95, "Registrando modelo...")
+            # Pesos quantizados geram outro texto: o cache de respostas não pode misturar os modos
+            model_data["fingerprint"] = fingerprint if load_mode == "default" else f"{fingerprint}:{load_mode}"
+            self.model_pool.add(model_id, model_data, self._measure_model_size(model_data, estimated_size), target_device)
+            if progress_callback:
+                progress_callback(100, f"Modelo {model_id} carregado.")
             return True
+
+        except LoadCancelled as e:
+            # Os pesos já lidos são descartados junto com as variáveis locais
+            logger.info(f"Carga de {model_id} cancelada antes de: {e}")
+            if self._device == "cuda":
+                torch.cuda.empty_cache()
+            return False
             
         except Exception as e:
             logger.error(f"Erro ao carregar o modelo {model_id}: {e}")
             logger.debug(traceback.format_exc())
             return False
 
-    def generate_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None) -> Generator[str, None, None]:
+    def _prepared_source(self, model_id: str, model_dir: Path, fingerprint: str) -> Optional[Path]:
+        """Pasta do formato preparado, se existir e valer para os pesos e o dtype atuais."""
+        if not self.config.get("engine_settings.prepared_format", True):
+            return None
+        info = self._get_model_metadata(model_dir)
+        path = prepared_path(model_dir, info, self._torch_dtype(), fingerprint)
+        if path is None and info.get("prepared"):
+            logger.info(f"Formato preparado de {model_id} desatualizado (pesos ou dtype mudaram); "
+                        f"carregando os arquivos originais.")
+        return path
+
+    def prepare_model(self, model_id: str, progress_callback: Optional[Callable] = None) -> bool:
+        """
+        Converte o modelo uma vez para o formato de carga rápida (ver prepared_format.py)
+        e registra o artefato no _sevenx_info.json. Não faz nada se o checkpoint já
+        carrega pelo caminho rápido ou se o modelo for GGUF.
+        """
+        model_dir = self.models_dir / model_id.replace('/', '__')
+        if not model_dir.exists() or self._find_gguf_file(model_dir):
+            return False
+        fingerprint = weights_fingerprint(model_dir)
+        if prepared_path(model_dir, self._get_model_metadata(model_dir), self._torch_dtype(), fingerprint):
+            return True
+        reason = preparation_reason(model_dir, self._torch_dtype())
+        if reason is None:
+            logger.info(f"{model_id} já está no formato de carga rápida.")
+            return True
+
+        if progress_callback:
+            progress_callback(0, f"Preparando {model_id} para carga rápida ({reason})...")
+        try:
+            prepared = prepare_model(model_dir, self._torch_dtype(), fingerprint,
+                                     token=self.config.get("hf_token") or None)
+        except PrepareUnsupported as e:
+            logger.info(f"{model_id} não será preparado: {e}")
+            return False
+        except Exception as e:
+            logger.warning(f"Falha ao preparar {model_id}: {e}")
+            logger.debug(traceback.format_exc())
+            return False
+
+        info = self._get_model_metadata(model_dir)
+        info["prepared"] = prepared
+        with open(model_dir / "_sevenx_info.json", 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        self.model_index.refresh(model_dir)
+        logger.info(f"{model_id} preparado ({reason}): {prepared['size'] / 1024 ** 2:.1f} MB "
+                    f"em {prepared['dtype']}.")
+        if progress_callback:
+            progress_callback(100, f"{model_id} preparado para carga rápida.")
+        return True
+
+    def _load_mmap_model(self, model_id: str, model_dir: Path, attn_implementation: str, stage: Callable):
+        """
+        Carrega os pesos safetensors por mapeamento de memória, sem copiá-los para a
+        memória do processo. Retorna None quando o caminho não se aplica (GPU,
+        dtype diferente do checkpoint, chaves que não batem) para usar o from_pretrained.
+        """
+        if not self.config.get("engine_settings.mmap_weights", True) or self.device != "cpu":
+            return None
+        stage(25, "Mapeando pesos safetensors...")
+        try:
+            return load_mmap_model(model_dir, self._torch_dtype(), attn_implementation=attn_implementation)
+        except MmapUnsupported as e:
+            logger.info(f"Carga mapeada indisponível para {model_id} ({e}); copiando os pesos.")
+        except Exception as e:
+            logger.warning(f"Falha na carga mapeada de {model_id}: {e}; copiando os pesos.")
+        return None
+
+    def _load_int8_model(self, model_dir: Path, token: Optional[str], fingerprint: str, stage: Callable):
+        """Carrega o modelo com as Linear em INT8, reaproveitando os pesos quantizados salvos na pasta."""
+        stage(25, "Carregando pesos INT8 do cache...")
+        model = load_cached_int8(model_dir, fingerprint)
+        if model is not None:
+            return model
+
+        stage(30, "Carregando pesos float32 para quantizar...")
+        model = transformers.AutoModelForCausalLM.from_pretrained(
+            str(model_dir), token=token, low_cpu_mem_usage=True, torch_dtype=torch.float32
+        )
+        stage(70, "Quantizando camadas Linear para INT8...")
+        model = quantize_dynamic_int8(model)
+        stage(85, "Salvando pesos INT8...")
+        save_int8(model, model_dir, fingerprint)
+        return model
+
+    def _tune_threads(self, model_id: str, model_data: Dict, stage: Callable,
+                      cancel_token: Optional[CancellationToken]) -> Optional[ThreadConfig]:
+        """
+        Aplica a configuração de threads salva para o modelo ou, na primeira carga
+        nesta máquina, mede as candidatas com uma decodificação curta e salva a melhor.
+        """
+        stored = self.thread_tuner.lookup(model_id)
+        if stored is None:
+            stage(85, "Ajustando threads da CPU...")
+            tokens = self.config.get("engine_settings.thread_autotune_tokens", 8)
+            stored = self.thread_tuner.tune(
+                model_id, lambda threads: self._decode_speed(model_data, threads, tokens),
+                should_stop=lambda: cancel_token is not None and cancel_token.is_cancelled
+            )
+            if stored is None:
+                return None
+        apply_thread_config(stored)
+        return stored
+
+    @staticmethod
+    def _decode_speed(model_data: Dict, threads: int, tokens: int) -> float:
+        """Tokens/s de uma geração gulosa curta, usada pelo ajuste de threads."""
+        prompt = "O rápido cachorro marrom pula sobre a cerca do vizinho. " * 2
+        if model_data["type"] == "gguf":
+            model = model_data["model"]
+            started = time.perf_counter()
+            output = model(prompt, max_new_tokens=tokens, temperature=0.0, threads=threads)
+            elapsed = time.perf_counter() - started
+            return max(1, len(model.tokenize(output))) / elapsed
+
+        model, tokenizer = model_data["model"], model_data["tokenizer"]
+        inputs = tokenizer([prompt], return_tensors="pt").to(model.device)
+        with torch.inference_mode():
+            started = time.perf_counter()
+            # Só input_ids e attention_mask: o generate recusa extras como token_type_ids
+            model.generate(input_ids=inputs.input_ids, attention_mask=inputs.attention_mask,
+                           max_new_tokens=tokens, min_new_tokens=tokens, do_sample=False,
+                           pad_token_id=tokenizer.pad_token_id)
+            elapsed = time.perf_counter() - started
+        return tokens / elapsed
+
+    def _apply_threads(self, model_data: Dict):
+        """Reaplica a configuração de threads do modelo (outro modelo pode ter trocado a do processo)."""
+        if model_data.get("threads") is not None:
+            apply_thread_config(model_data["threads"])
+
+    def _gguf_context_length(self, gguf_file_path: Path) -> int:
+        """
+        Contexto a alocar para um modelo GGUF: o valor configurado ou o contexto de
+        treino gravado no arquivo, limitado para não reservar um KV cache gigante.
+        """
+        configured = self.config.get("engine_settings.gguf_context_length", 0)
+        if configured:
+            return int(configured)
+        metadata = read_gguf_metadata(gguf_file_path)
+        trained = next((v for k, v in metadata.items() if k.endswith(".context_length")), None)
+        max_context = self.config.get("engine_settings.gguf_max_context_length", 4096)
+        return min(int(trained), max_context) if trained else 2048
+
+    def _fit_context(self, model_id: str, model_data: Dict, messages: List[Dict], opts: Dict,
+                     session_id: Optional[str], count_fn: Callable[[str], int]):
+        """
+        Ajusta o histórico ao contexto do modelo, reservando espaço para a resposta.
+
+        Returns:
+            (mensagens que cabem, orçamento do prompt em tokens, max_new_tokens pedido)
+        """
+        context_length = get_context_length(model_data)
+        max_new_tokens = (opts.get("max_new_tokens") or opts.get("max_tokens")
+                          or self.config.get("chat_settings.max_tokens", 2048))
+        # Ao menos metade do contexto fica para o prompt, mesmo com max_new_tokens grande
+        budget = context_length - min(max_new_tokens, context_length // 2)
+        messages = self.context_window.fit(model_id, messages, budget, count_fn, session_id)
+        return messages, budget, max_new_tokens
+
+    @staticmethod
+    def _normalize_sampling(generation_kwargs: Dict):
+        """Temperatura zero significa decodificação gulosa (o Transformers rejeita temperature=0)."""
+        if generation_kwargs.get("temperature") is not None and generation_kwargs["temperature"] <= 0:
+            generation_kwargs.pop("temperature")
+            generation_kwargs["do_sample"] = False
+
+    def _build_prompt_text(self, tokenizer, messages: List[Dict]) -> str:
+        """Renderiza as mensagens no formato de prompt esperado pelo modelo."""
+        if tokenizer.chat_template:
+            return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        prompt_text = ""
+        for message in messages:
+            prompt_text += message["content"] + tokenizer.eos_token
+        return prompt_text
+
+    def _new_kv_cache(self, model):
+        """Cria um DynamicCache vazio compatível com o modelo."""
+        try:
+            return transformers.DynamicCache(config=model.config)
+        except TypeError:
+            # transformers < 4.56 não aceita o config
+            return transformers.DynamicCache()
+
+    def _prepare_transformers_generation(self, model_id: str, model_data: Dict, messages: List[Dict],
+                                         opts: Dict, session_id: Optional[str],
+                                         cancel_token: Optional[CancellationToken] = None) -> Dict:
+        """
+        Monta os argumentos de `model.generate` para um modelo Transformers.
+
+        O histórico é ajustado à janela de contexto do modelo (ver `ContextWindowManager`).
+        Quando `session_id` é informado, reaproveita o KV cache do turno anterior
+        da mesma conversa e só faz o prefill dos tokens novos.
+        """
+        model, tokenizer = model_data["model"], model_data["tokenizer"]
+        generation_kwargs = self._filter_valid_transformers_params(opts)
+
+        messages, budget, max_new_tokens = self._fit_context(
+            model_id, model_data, messages, generation_kwargs, session_id,
+            lambda text: len(tokenizer(text, add_special_tokens=False).input_ids)
+        )
+        prompt_text = self._build_prompt_text(tokenizer, messages)
+        inputs = tokenizer([prompt_text], return_tensors="pt").to(self.device)
+
+        input_ids, attention_mask = inputs.input_ids, inputs.attention_mask
+        if input_ids.shape[1] > budget:
+            # Só a última mensagem já não cabe: mantém o final do prompt (a pergunta e o turno do assistente)
+            logger.warning(f"Prompt com {input_ids.shape[1]} tokens excede o orçamento de {budget}; truncando o início.")
+            self.context_window.stats["truncated_messages"] += 1
+            input_ids, attention_mask = input_ids[:, -budget:], attention_mask[:, -budget:]
+
+        generation_kwargs["input_ids"] = input_ids
+        generation_kwargs["attention_mask"] = attention_mask
+        generation_kwargs["max_new_tokens"] = min(max_new_tokens, get_context_length(model_data) - input_ids.shape[1])
+        self._normalize_sampling(generation_kwargs)
+        if generation_kwargs.get("pad_token_id") is None and tokenizer.pad_token_id is not None:
+            generation_kwargs["pad_token_id"] = tokenizer.pad_token_id
+        if cancel_token is not None:
+            generation_kwargs["stopping_criteria"] = self._cancellation_criteria(cancel_token, input_ids.shape[1])
+
+        if session_id and self.config.get("engine_settings.kv_cache_reuse", True):
+            # O prefixo em cache precisa casar com os tokens que o modelo vai ver, já truncados
+            past, reused = self.kv_cache.checkout(model_id, session_id, input_ids[0].tolist())
+            generation_kwargs["past_key_values"] = past if past is not None else self._new_kv_cache(model)
+            logger.debug(f"Prefill de {input_ids.shape[1] - reused} tokens ({reused} reaproveitados do cache)")
+
+        return generation_kwargs
+
+    @staticmethod
+    def _cancellation_criteria(cancel_token: CancellationToken, prompt_length: Optional[int] = None):
+        """StoppingCriteriaList que encerra `generate` quando o token é cancelado."""
+        from .cancellation import CancellationStoppingCriteria
+        return transformers.StoppingCriteriaList([CancellationStoppingCriteria(cancel_token, prompt_length)])
+
+    def _store_kv_cache(self, model_id: str, session_id: Optional[str], generation_kwargs: Dict, sequences):
+        """Devolve o KV cache da geração ao store, associado aos tokens que ele cobre."""
+        past = generation_kwargs.get("past_key_values")
+        if not session_id or past is None or sequences is None:
+            return
+        try:
+            cached_length = past.get_seq_length()
+            self.kv_cache.checkin(model_id, session_id, sequences[0][:cached_length].tolist(), past)
+        except Exception as e:
+            logger.debug(f"Não foi possível guardar o KV cache de {model_id}: {e}")
+
+    def _response_cache_key(self, model_id: str, model_data: Dict, prompt, options: Dict) -> Optional[str]:
+        """Chave do cache de respostas, ou None se a geração não for determinística."""
+        if self.response_cache is None:
+            return None
+        if model_data["type"] != "gguf":
+            options = {k: v for k, v in options.items() if k not in RUNTIME_GENERATION_KWARGS}
+            # Como no generate(): sem do_sample nas opções vale o do generation_config; sem nenhum, é guloso
+            do_sample = options.get("do_sample")
+            if do_sample is None:
+                do_sample = getattr(model_data["model"].generation_config, "do_sample", None)
+            options["do_sample"] = bool(do_sample)
+        if not is_deterministic(options):
+            return None
+        return ResponseCache.make_key(model_id, model_data.get("fingerprint", ""), prompt, options)
+
+    def _cached_stream(self, model_id: str, cache_key: Optional[str], produce: Callable,
+                       tracker: GenerationTracker, on_hit: Optional[Callable] = None) -> Generator[str, None, None]:
+        """
+        Repete do cache de respostas os chunks de uma geração idêntica anterior ou,
+        na falta dela, repassa (e grava, se concluída) o que `produce()` gerar.
+        Também marca o primeiro token e o tempo gasto pelo consumidor em `tracker`.
+        """
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.debug(f"Resposta de {model_id} servida do cache ({len(cached)} chunks)")
+            tracker.metrics.response_cache_hit = True
+            if on_hit:
+                on_hit()
+            stream, chunks = iter(cached), None
+        else:
+            stream, chunks = produce(), []
+
+        try:
+            for chunk in stream:
+                if tracker.cancel_token.is_cancelled and chunks is None:
+                    return
+                tracker.first_token()
+                if chunks is not None:
+                    chunks.append(chunk)
+                yielded_at = time.perf_counter()
+                yield chunk
+                tracker.metrics.consumer_seconds += time.perf_counter() - yielded_at
+        finally:
+            # Propaga o fechamento para o loop de geração (cancelamento)
+            if chunks is not None:
+                stream.close()
+        if cache_key and chunks is not None and not tracker.cancel_token.is_cancelled:
+            self.response_cache.put(cache_key, chunks, model_id)
+
+    @contextmanager
+    def _speculative(self, model_id: str, model_data: Dict, generation_kwargs: Dict, tracker: GenerationTracker):
+        """
+        Liga a decodificação especulativa da geração: com o rascunho designado para
+        o modelo (passado como `assistant_model` e protegido contra despejo) ou, sem
+        ele, com a busca de n-gramas no prompt quando `prompt_lookup_num_tokens` é
+        pedido nas opções ou no config. Produz o `SpeculativeCounter` a usar em volta
+        do `generate` (ou None) e grava a taxa de aceitação no registro ao sair.
+        """
+        lookup_tokens = generation_kwargs.pop("prompt_lookup_num_tokens", None)
+        if lookup_tokens is None:
+            lookup_tokens = self.config.get("engine_settings.prompt_lookup_num_tokens", 0)
+        ngram_size = generation_kwargs.pop("max_matching_ngram_size", None)
+        if (not self.config.get("engine_settings.speculative_decoding", True)
+                or generation_kwargs.get("num_beams", 1) not in (None, 1)):
+            yield None
+            return
+
+        with ExitStack() as stack:
+            draft_id = self._pin_draft(model_id, model_data, stack)
+            if draft_id:
+                generation_kwargs["assistant_model"] = self.model_pool[draft_id]["model"]
+            elif lookup_tokens and lookup_tokens > 0:
+                generation_kwargs["prompt_lookup_num_tokens"] = int(lookup_tokens)
+                if ngram_size:
+                    generation_kwargs["max_matching_ngram_size"] = int(ngram_size)
+            else:
+                yield None
+                return
+
+            metrics = tracker.metrics
+            counter = SpeculativeCounter(model_data["model"], metrics.prompt_tokens - metrics.reused_prompt_tokens)
+            try:
+                yield counter
+            finally:
+                if counter.target_steps:
+                    counter.apply(metrics, tracker.cancel_token.generated_tokens)
+                    metrics.draft_model = draft_id
+                    metrics.prompt_lookup_tokens = 0 if draft_id else int(lookup_tokens)
+
+    def _pin_draft(self, model_id: str, model_data: Dict, stack: ExitStack) -> Optional[str]:
+        """Carrega o rascunho designado para o modelo e o protege contra despejo até o fim de `stack`."""
+        draft_id = model_data.get("draft_model")
+        if not draft_id:
+            return None
+        if draft_id not in self.model_pool and not self.load_model(draft_id):
+            logger.warning(f"Rascunho {draft_id} indisponível; gerando {model_id} sem ele.")
+            return None
+        stack.enter_context(self.model_pool.acquire(draft_id))
+        draft_data = self.model_pool.get(draft_id)
+        if draft_data is None or draft_data["type"] != "transformers":
+            return None
+        return draft_id
+
+    def get_speculative_report(self, model_id: str, mode: str = "draft") -> Dict:
+        """Taxa de aceitação dos candidatos ("draft" ou "prompt_lookup") e ganho de tok/s sobre a decodificação normal."""
+        return speculative_report(self.metrics.records(), model_id, mode)
+
+    @staticmethod
+    def _track_prompt(tracker: GenerationTracker, generation_kwargs: Dict):
+        """Registra o tamanho do prompt e quanto dele veio do KV cache da sessão."""
+        tracker.metrics.prompt_tokens = generation_kwargs["input_ids"].shape[1]
+        past = generation_kwargs.get("past_key_values")
+        tracker.metrics.reused_prompt_tokens = past.get_seq_length() if past is not None else 0
+
+    def generate_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None,
+                        session_id: Optional[str] = None,
+                        cancel_token: Optional[CancellationToken] = None,
+                        priority: str = PRIORITY_INTERACTIVE) -> Generator[str, None, None]:
         """
         Gera uma resposta em streaming a partir de um modelo carregado.
         
@@ -225,75 +871,245 @@ class SevenXEngine:
             model_id (str): ID do modelo a ser usado
             messages (List[Dict]): Lista de mensagens para o modelo
             options (Optional[Dict]): Opções adicionais para geração
+            session_id (Optional[str]): ID da conversa, usado para reaproveitar o KV cache entre turnos
+            cancel_token (Optional[CancellationToken]): Token para interromper a geração. Parar de
+                consumir o gerador também cancela a geração no próximo passo.
+            priority (str): Classe na fila de admissão ("interactive", "normal" ou "background")
             
         Yields:
             str: Partes da resposta gerada
+
+        Raises:
+            AdmissionRejected: Se a fila de admissão está cheia ou a espera passou do prazo.
         """
-        if model_id not in self.loaded_models:
+        cancel_token = cancel_token or CancellationToken()
+        ticket = self._admit(priority, cancel_token)
+        try:
+            if ticket is not None:
+                yield from self._generate_stream(model_id, messages, options, session_id, cancel_token, ticket)
+        finally:
+            if ticket is not None:
+                self.request_scheduler.release(ticket)
+            self._record_cancellation(model_id, cancel_token)
+
+    def _max_concurrent_requests(self) -> int:
+        """Vagas de geração conforme as configurações atuais (0 em max_concurrent_requests = automático)."""
+        max_concurrent = self.config.get("engine_settings.max_concurrent_requests", 0)
+        if not max_concurrent:
+            # Com continuous batching as gerações dividem os passos do modelo; sem ele, disputam a CPU
+            max_concurrent = (self.config.get("engine_settings.max_batch_size", 8)
+                              if self.config.get("engine_settings.continuous_batching", False) else 1)
+        return max_concurrent
+
+    def _admit(self, priority: str, cancel_token: CancellationToken) -> Optional[Ticket]:
+        """Espera uma vaga na fila de admissão. Retorna None se o pedido foi cancelado na espera."""
+        # As configurações podem mudar com o motor rodando (diálogo de configurações)
+        self.request_scheduler.set_max_concurrent(self._max_concurrent_requests())
+        try:
+            return self.request_scheduler.admit(priority, cancel_token)
+        except RequestCancelled:
+            return None
+
+    def _generate_stream(self, model_id: str, messages: List[Dict], options: Optional[Dict],
+                         session_id: Optional[str], cancel_token: CancellationToken,
+                         ticket: Optional[Ticket] = None) -> Generator[str, None, None]:
+        load_started = time.perf_counter()
+        if model_id not in self.model_pool:
             if not self.load_model(model_id):
+                cancel_token.fail(f"Falha ao carregar o modelo {model_id}.")
                 yield f"Erro: Falha ao carregar o modelo {model_id}."
                 return
                 
-        model_data = self.loaded_models[model_id]
+        model_data = self.model_pool[model_id]
         opts = options or {}
+        tracker = self.metrics.start(model_id, model_data["type"], cancel_token, ticket)
+        tracker.metrics.load_seconds = time.perf_counter() - load_started
+        error = None
         
         try:
-            if model_data["type"] == "gguf":
-                # --- Geração com Modelo GGUF ---
-                model = model_data["model"]
-                # CTransformers espera uma string de prompt simples
-                prompt = "\n".join([msg["content"] for msg in messages])
-                stream_generator = model(prompt, stream=True, **opts)
-                for chunk in stream_generator:
-                    yield chunk
-            else:
-                # --- Geração com Modelo Transformers ---
-                model, tokenizer = model_data["model"], model_data["tokenizer"]
-                prompt_text = ""
-                
-                if tokenizer.chat_template:
-                    prompt_text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            with self.model_pool.acquire(model_id):
+                self._apply_threads(model_data)
+                if model_data["type"] == "gguf":
+                    # --- Geração com Modelo GGUF ---
+                    model = model_data["model"]
+                    prompt, gguf_opts, tracker.metrics.prompt_tokens = self._prepare_gguf_prompt(
+                        model_id, model_data, messages, opts, session_id
+                    )
+                    cache_key = self._response_cache_key(model_id, model_data, prompt, gguf_opts)
+                    yield from self._cached_stream(
+                        model_id, cache_key,
+                        lambda: self._stream_gguf(model, prompt, gguf_opts, cancel_token, model_data.get("threads")),
+                        tracker
+                    )
                 else:
-                    for message in messages:
-                        prompt_text += message["content"] + tokenizer.eos_token
-                        
-                # Otimização de tokenização
-                inputs = tokenizer(
-                    [prompt_text], 
-                    return_tensors="pt", 
-                    padding=True, 
-                    truncation=True,
-                    max_length=self.config.get("chat_settings.max_tokens", 2048)
-                ).to(self.device)
-                
-                # Configurações de geração otimizadas
-                generation_kwargs = {
-                    "input_ids": inputs.input_ids,
-                    "attention_mask": inputs.attention_mask,
-                    "streamer": TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True),
-                    **opts
-                }
-                
-                # Filtrar parâmetros válidos para Transformers
-                filtered_opts = self._filter_valid_transformers_params(opts)
-                generation_kwargs.update(filtered_opts)
-                
-                # Configurações específicas para otimização
-                if "max_new_tokens" not in generation_kwargs:
-                    generation_kwargs["max_new_tokens"] = self.config.get("chat_settings.max_tokens", 2048)
-                
-                thread = Thread(target=model.generate, kwargs=generation_kwargs)
-                thread.start()
-                
-                for new_text in generation_kwargs["streamer"]:
-                    yield new_text
+                    # --- Geração com Modelo Transformers ---
+                    model, tokenizer = model_data["model"], model_data["tokenizer"]
+                    generation_kwargs = self._prepare_transformers_generation(
+                        model_id, model_data, messages, opts, session_id, cancel_token
+                    )
+                    self._track_prompt(tracker, generation_kwargs)
+                    input_ids = generation_kwargs["input_ids"]
+                    cache_key = self._response_cache_key(model_id, model_data, input_ids[0].tolist(), generation_kwargs)
+
+                    with self._speculative(model_id, model_data, generation_kwargs, tracker) as counter:
+                        def produce():
+                            from .batch_scheduler import supports_batching
+                            # O escalonador não faz decodificação especulativa: com rascunho, gera sozinho
+                            if (counter is None and self.config.get("engine_settings.continuous_batching", False)
+                                    and supports_batching(generation_kwargs)):
+                                return self._generate_batched(model_id, model_data, generation_kwargs, session_id, cancel_token)
+                            return self._stream_transformers(model_id, model, tokenizer, generation_kwargs,
+                                                             session_id, cancel_token, counter)
+
+                        yield from self._cached_stream(
+                            model_id, cache_key, produce, tracker,
+                            # O KV cache da sessão foi retirado do store; devolve-o sem gerar
+                            on_hit=lambda: self._store_kv_cache(model_id, session_id, generation_kwargs, input_ids)
+                        )
                     
+        except GeneratorExit:
+            # Consumidor parou de iterar: libera a CPU no próximo passo de decodificação
+            cancel_token.cancel()
+            raise
         except Exception as e:
+            error = str(e)
             logger.error(f"Erro detalhado na geração de stream: {e}")
             logger.debug(traceback.format_exc())
+            cancel_token.fail(error)
             yield f"Erro durante a geração de texto: {e}"
+        finally:
+            tracker.finish(error)
+
+    def _prepare_gguf_prompt(self, model_id: str, model_data: Dict, messages: List[Dict], opts: Dict,
+                             session_id: Optional[str]):
+        """Monta o prompt de um modelo GGUF dentro do contexto alocado pelo CTransformers."""
+        model = model_data["model"]
+        messages, budget, max_new_tokens = self._fit_context(
+            model_id, model_data, messages, opts, session_id, lambda text: len(model.tokenize(text))
+        )
+        # CTransformers espera uma string de prompt simples
+        prompt = "\n".join([msg["content"] for msg in messages])
+        tokens = model.tokenize(prompt)
+        if len(tokens) > budget:
+            logger.warning(f"Prompt com {len(tokens)} tokens excede o orçamento de {budget}; truncando o início.")
+            self.context_window.stats["truncated_messages"] += 1
+            tokens = tokens[-budget:]
+            prompt = model.detokenize(tokens)
+
+        opts = dict(opts)
+        opts["max_new_tokens"] = min(max_new_tokens, get_context_length(model_data) - len(tokens))
+        opts.pop("max_tokens", None)
+        return prompt, opts, len(tokens)
+
+    def _stream_gguf(self, model, prompt: str, opts: Dict, cancel_token: CancellationToken,
+                     thread_config: Optional[ThreadConfig] = None) -> Generator[str, None, None]:
+        """Loop de streaming do CTransformers, interrompido entre tokens quando cancelado."""
+        if thread_config is not None:
+            opts = dict(opts, threads=thread_config.threads)
+        stream_generator = model(prompt, stream=True, **opts)
+        try:
+            for chunk in stream_generator:
+                if cancel_token.record_token():
+                    break
+                yield chunk
+        finally:
+            # Fechar o gerador interrompe o loop de avaliação do CTransformers
+            stream_generator.close()
+
+    def _stream_transformers(self, model_id: str, model, tokenizer, generation_kwargs: Dict,
+                             session_id: Optional[str], cancel_token: CancellationToken,
+                             counter: Optional[SpeculativeCounter] = None) -> Generator[str, None, None]:
+        """Executa `model.generate` em uma thread e repassa o texto do streamer."""
+        from .speculative import BoundedTextIteratorStreamer
+        max_new_tokens = generation_kwargs["max_new_tokens"]
+        streamer = BoundedTextIteratorStreamer(tokenizer, max_new_tokens, skip_prompt=True, skip_special_tokens=True)
+        generation_kwargs["streamer"] = streamer
+        result = {}
+
+        def run_generation():
+            try:
+                # O contador só vê os forwards da thread que o abriu
+                with counter or nullcontext():
+                    result["sequences"] = model.generate(**generation_kwargs)
+            except Exception as e:
+                result["error"] = e
+                # Libera o consumidor, que ficaria esperando o streamer para sempre
+                streamer.end()
+
+        thread = Thread(target=run_generation)
+        thread.start()
+        exhausted = False
+        try:
+            for new_text in streamer:
+                yield new_text
+            exhausted = True
+        finally:
+            if not exhausted:
+                # Consumidor parou antes do fim: o StoppingCriteria encerra o generate no próximo passo
+                cancel_token.cancel()
+            thread.join()
+
+        if "error" in result:
+            raise result["error"]
+        sequences = result.get("sequences")
+        if sequences is not None:
+            # Pelo tamanho final: o StoppingCriteria não separa candidatos recusados dos aceitos em todas as versões
+            cancel_token.generated_tokens = min(sequences.shape[1] - generation_kwargs["input_ids"].shape[1],
+                                                max_new_tokens)
+        self._store_kv_cache(model_id, session_id, generation_kwargs, sequences)
+
+    def _record_cancellation(self, model_id: str, cancel_token: CancellationToken):
+        """Contabiliza gerações canceladas e os tokens produzidos depois do cancelamento."""
+        if not cancel_token.is_cancelled:
+            return
+        self.generation_stats["cancelled"] += 1
+        self.generation_stats["wasted_tokens"] += cancel_token.wasted_tokens
+        logger.info(f"Geração de {model_id} cancelada após {cancel_token.generated_tokens} tokens "
+                    f"({cancel_token.wasted_tokens} desperdiçados).")
 
-    def generate_response(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None) -> str:
+    def _get_batch_scheduler(self, model_id: str, model_data: Dict) -> "ContinuousBatchScheduler":
+        """Retorna o escalonador de batching do modelo, criando-o na primeira requisição."""
+        from .batch_scheduler import ContinuousBatchScheduler
+        with self._schedulers_lock:
+            scheduler = self.batch_schedulers.get(model_id)
+            if scheduler is None:
+                scheduler = ContinuousBatchScheduler(
+                    model_data["model"],
+                    model_data["tokenizer"],
+                    self.device,
+                    max_batch_size=self.config.get("engine_settings.max_batch_size", 8)
+                )
+                self.batch_schedulers[model_id] = scheduler
+            return scheduler
+
+    def _generate_batched(self, model_id: str, model_data: Dict, generation_kwargs: Dict,
+                          session_id: Optional[str], cancel_token: Optional[CancellationToken] = None) -> Generator[str, None, None]:
+        """Gera via escalonador compartilhado, decodificando junto com as outras requisições do modelo."""
+        from .batch_scheduler import SamplingParams
+        scheduler = self._get_batch_scheduler(model_id, model_data)
+        params = SamplingParams.from_options(generation_kwargs, model_data["model"].generation_config)
+        keep_cache = "past_key_values" in generation_kwargs
+        past = generation_kwargs.get("past_key_values")
+        if past is not None and past.get_seq_length() == 0:
+            past = None
+
+        request = scheduler.submit(generation_kwargs["input_ids"][0].tolist(), params, past,
+                                   keep_cache=keep_cache, cancel_token=cancel_token)
+        try:
+            for new_text in request:
+                yield new_text
+        finally:
+            # Se o consumidor parar de iterar, a linha sai do batch no próximo passo
+            if not request.finished.is_set():
+                request.cancel()
+
+        if keep_cache and request.final_cache is not None:
+            self.kv_cache.checkin(model_id, session_id, request.cache_token_ids, request.final_cache)
+
+    def generate_response(self, model_id: str, messages: List[Dict], options: Optional[Dict] = None,
+                          session_id: Optional[str] = None,
+                          cancel_token: Optional[CancellationToken] = None,
+                          priority: str = PRIORITY_INTERACTIVE) -> str:
         """
         Gera uma resposta completa (não streaming) a partir de um modelo carregado.
         
@@ -301,80 +1117,246 @@ class SevenXEngine:
             model_id (str): ID do modelo a ser usado
             messages (List[Dict]): Lista de mensagens para o modelo
             options (Optional[Dict]): Opções adicionais para geração
+            session_id (Optional[str]): ID da conversa, usado para reaproveitar o KV cache entre turnos
+            cancel_token (Optional[CancellationToken]): Token para interromper a geração
+            priority (str): Classe na fila de admissão ("interactive", "normal" ou "background")
             
         Returns:
             str: Resposta gerada
+
+        Raises:
+            AdmissionRejected: Se a fila de admissão está cheia ou a espera passou do prazo.
         """
-        if model_id not in self.loaded_models:
+        cancel_token = cancel_token or CancellationToken()
+        ticket = self._admit(priority, cancel_token)
+        try:
+            if ticket is None:
+                return ""
+            return self._generate_response(model_id, messages, options, session_id, cancel_token, ticket)
+        finally:
+            if ticket is not None:
+                self.request_scheduler.release(ticket)
+            self._record_cancellation(model_id, cancel_token)
+
+    def _generate_response(self, model_id: str, messages: List[Dict], options: Optional[Dict],
+                           session_id: Optional[str], cancel_token: CancellationToken,
+                           ticket: Optional[Ticket] = None) -> str:
+        load_started = time.perf_counter()
+        if model_id not in self.model_pool:
             if not self.load_model(model_id):
+                cancel_token.fail(f"Falha ao carregar o modelo {model_id}.")
                 return f"Erro: Falha ao carregar o modelo {model_id}."
                 
-        model_data = self.loaded_models[model_id]
+        model_data = self.model_pool[model_id]
         opts = options or {}
+        tracker = self.metrics.start(model_id, model_data["type"], cancel_token, ticket)
+        tracker.metrics.load_seconds = time.perf_counter() - load_started
+        error = None
         
         try:
-            if model_data["type"] == "gguf":
-                # --- Geração com Modelo GGUF ---
-                model = model_data["model"]
-                # CTransformers espera uma string de prompt simples
-                prompt = "\n".join([msg["content"] for msg in messages])
-                response = model(prompt, **opts)
-                return response
-            else:
-                # --- Geração com Modelo Transformers ---
-                model, tokenizer = model_data["model"], model_data["tokenizer"]
-                prompt_text = ""
-                
-                if tokenizer.chat_template:
-                    prompt_text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-                else:
-                    for message in messages:
-                        prompt_text += message["content"] + tokenizer.eos_token
-                        
-                # Otimização de tokenização
-                inputs = tokenizer(
-                    [prompt_text], 
-                    return_tensors="pt", 
-                    padding=True, 
-                    truncation=True,
-                    max_length=self.config.get("chat_settings.max_tokens", 2048)
-                ).to(self.device)
-                
-                # Configurações de geração otimizadas
-                generation_kwargs = {
-                    "input_ids": inputs.input_ids,
-                    "attention_mask": inputs.attention_mask,
-                    **opts
-                }
-                
-                # Filtrar parâmetros válidos para Transformers
-                filtered_opts = self._filter_valid_transformers_params(opts)
-                generation_kwargs.update(filtered_opts)
-                
-                # Configurações específicas para otimização
-                if "max_new_tokens" not in generation_kwargs:
-                    generation_kwargs["max_new_tokens"] = self.config.get("chat_settings.max_tokens", 2048)
-                
-                # Gerar resposta completa
-                output = model.generate(**generation_kwargs)
-                generated_text = tokenizer.decode(output[0], skip_special_tokens=True)
-                
-                # Extrair apenas a parte gerada (remover o prompt)
-                if tokenizer.chat_template:
-                    # Para modelos com chat template, temos que lidar com isso diferentemente
-                    return generated_text[len(prompt_text):].strip()
+            with self.model_pool.acquire(model_id):
+                self._apply_threads(model_data)
+                if model_data["type"] == "gguf":
+                    # --- Geração com Modelo GGUF ---
+                    model = model_data["model"]
+                    prompt, gguf_opts, tracker.metrics.prompt_tokens = self._prepare_gguf_prompt(
+                        model_id, model_data, messages, opts, session_id
+                    )
+                    cache_key = self._response_cache_key(model_id, model_data, prompt, gguf_opts)
+                    # Usa o streaming internamente para poder cancelar entre tokens
+                    return "".join(self._cached_stream(
+                        model_id, cache_key,
+                        lambda: self._stream_gguf(model, prompt, gguf_opts, cancel_token, model_data.get("threads")),
+                        tracker
+                    ))
                 else:
-                    # Para modelos tradicionais, podemos usar o prompt como base
-                    return generated_text
+                    # --- Geração com Modelo Transformers ---
+                    model, tokenizer = model_data["model"], model_data["tokenizer"]
+                    generation_kwargs = self._prepare_transformers_generation(
+                        model_id, model_data, messages, opts, session_id, cancel_token
+                    )
+                    self._track_prompt(tracker, generation_kwargs)
+                    input_ids = generation_kwargs["input_ids"]
+                    prompt_length = input_ids.shape[1]
+                    cache_key = self._response_cache_key(model_id, model_data, input_ids[0].tolist(), generation_kwargs)
+
+                    with self._speculative(model_id, model_data, generation_kwargs, tracker) as counter:
+                        def produce():
+                            # Gerar resposta completa
+                            with counter or nullcontext():
+                                output = model.generate(**generation_kwargs)
+                            self._store_kv_cache(model_id, session_id, generation_kwargs, output)
+                            # Decodificar apenas os tokens gerados (sem o prompt); no último passo, a
+                            # decodificação especulativa pode aceitar candidatos além de max_new_tokens
+                            generated = min(output.shape[1] - prompt_length, generation_kwargs["max_new_tokens"])
+                            tracker.metrics.generated_tokens = cancel_token.generated_tokens = generated
+                            yield tokenizer.decode(output[0][prompt_length:prompt_length + generated],
+                                                   skip_special_tokens=True)
+
+                        return "".join(self._cached_stream(
+                            model_id, cache_key, produce, tracker,
+                            on_hit=lambda: self._store_kv_cache(model_id, session_id, generation_kwargs, input_ids)
+                        )).strip()
                 
         except Exception as e:
+            error = str(e)
             logger.error(f"Erro detalhado na geração de resposta: {e}")
             logger.debug(traceback.format_exc())
+            cancel_token.fail(error)
             return f"Erro durante a geração de texto: {e}"
+        finally:
+            tracker.finish(error)
+
+    def generate_batch(self, model_id: str, prompts: List, options: Optional[Dict] = None,
+                       batch_size: int = 8, max_batch_tokens: Optional[int] = None,
+                       cancel_token: Optional[CancellationToken] = None) -> List[Optional[BatchItemResult]]:
+        """
+        Gera respostas para vários prompts de uma vez (avaliação offline, rotulagem de datasets).
+
+        Args:
+            model_id (str): ID do modelo a ser usado
+            prompts (List): Cada prompt é um texto (mensagem do usuário) ou uma lista de mensagens
+            options (Optional[Dict]): Opções de geração, compartilhadas por todos os prompts
+            batch_size (int): Máximo de prompts por chamada de `generate`
+            max_batch_tokens (Optional[int]): Limite de tokens (com padding) por lote
+            cancel_token (Optional[CancellationToken]): Token para interromper o job
+
+        Returns:
+            List[Optional[BatchItemResult]]: Resultados na ordem dos prompts (None para os
+            prompts não processados por cancelamento)
+        """
+        results: List[Optional[BatchItemResult]] = [None] * len(prompts)
+        for result in self.generate_batch_stream(model_id, prompts, options, batch_size, max_batch_tokens, cancel_token):
+            results[result.index] = result
+        return results
+
+    def generate_batch_stream(self, model_id: str, prompts: List, options: Optional[Dict] = None,
+                              batch_size: int = 8, max_batch_tokens: Optional[int] = None,
+                              cancel_token: Optional[CancellationToken] = None) -> Generator[BatchItemResult, None, None]:
+        """
+        Variante em streaming de `generate_batch`: produz os resultados de cada lote assim que
+        ele termina. Como os lotes seguem a ordem de comprimento, use `BatchItemResult.index`
+        para associar cada resultado ao seu prompt.
+        """
+        started = time.perf_counter()
+        if model_id not in self.model_pool and not self.load_model(model_id):
+            for index in range(len(prompts)):
+                yield BatchItemResult(index, "", 0, 0, -1, 0, 0.0, 0.0, error=f"Falha ao carregar o modelo {model_id}.")
+            return
+
+        model_data = self.model_pool[model_id]
+        conversations = [[{"role": "user", "content": p}] if isinstance(p, str) else p for p in prompts]
+        cancel_token = cancel_token or CancellationToken()
+        try:
+            with self.model_pool.acquire(model_id):
+                self._apply_threads(model_data)
+                if model_data["type"] == "gguf":
+                    # CTransformers não gera em lote: os prompts são processados em sequência
+                    model = model_data["model"]
+                    for index, messages in enumerate(conversations):
+                        if cancel_token.is_cancelled:
+                            break
+                        batch_started = time.perf_counter()
+                        # O job é dono do token e contabiliza o cancelamento uma vez, no final
+                        try:
+                            ticket = self._admit(PRIORITY_BACKGROUND, cancel_token)
+                        except AdmissionRejected as e:
+                            yield BatchItemResult(index, "", 0, 0, index, 1, batch_started - started, 0.0, error=str(e))
+                            continue
+                        if ticket is None:
+                            break
+                        try:
+                            text = self._generate_response(model_id, messages, options, None, cancel_token, ticket)
+                        finally:
+                            self.request_scheduler.release(ticket)
+                        yield BatchItemResult(index, text, 0, len(model.tokenize(text)), index, 1,
+                                              batch_started - started, time.perf_counter() - batch_started)
+                else:
+                    yield from self._generate_transformers_batches(
+                        model_id, model_data, conversations, options or {}, batch_size, max_batch_tokens,
+                        cancel_token, started
+                    )
+        finally:
+            self._record_cancellation(model_id, cancel_token)
+
+    def _generate_transformers_batches(self, model_id: str, model_data: Dict, conversations: List[List[Dict]],
+                                       options: Dict, batch_size: int, max_batch_tokens: Optional[int],
+                                       cancel_token: CancellationToken, started: float) -> Generator[BatchItemResult, None, None]:
+        """Tokeniza os prompts, agrupa por comprimento e roda um `generate` com padding à esquerda por lote."""
+        model, tokenizer = model_data["model"], model_data["tokenizer"]
+        generation_kwargs = self._filter_valid_transformers_params(options)
+        self._normalize_sampling(generation_kwargs)
+        context_length = get_context_length(model_data)
+        count_fn = lambda text: len(tokenizer(text, add_special_tokens=False).input_ids)
+
+        prompt_ids = []
+        max_new_tokens = 0
+        for messages in conversations:
+            messages, budget, max_new_tokens = self._fit_context(model_id, model_data, messages, generation_kwargs,
+                                                                 None, count_fn)
+            ids = tokenizer(self._build_prompt_text(tokenizer, messages)).input_ids
+            if len(ids) > budget:
+                self.context_window.stats["truncated_messages"] += 1
+                ids = ids[-budget:]
+            prompt_ids.append(ids)
+        if not prompt_ids:
+            return
+
+        pad_token_id = generation_kwargs.get("pad_token_id", tokenizer.pad_token_id)
+        if pad_token_id is None:
+            pad_token_id = tokenizer.eos_token_id
+        eos = generation_kwargs.get("eos_token_id", model.generation_config.eos_token_id)
+        eos_ids = list(eos) if isinstance(eos, (list, tuple)) else ([eos] if eos is not None else [])
+
+        lengths = [len(ids) for ids in prompt_ids]
+        buckets = make_length_buckets(lengths, batch_size, max_batch_tokens)
+        padded_tokens = sum(len(bucket) * max(lengths[i] for i in bucket) for bucket in buckets)
+        logger.info(f"Geração em lote de {model_id}: {len(prompt_ids)} prompts em {len(buckets)} lotes "
+                    f"({100 * (1 - sum(lengths) / padded_tokens):.1f}% de padding)")
+
+        for batch_id, bucket in enumerate(buckets):
+            if cancel_token.is_cancelled:
+                break
+            input_ids, attention_mask = left_pad([prompt_ids[i] for i in bucket], pad_token_id)
+            width = input_ids.shape[1]
+            batch_kwargs = dict(generation_kwargs)
+            batch_kwargs.update({
+                "input_ids": input_ids.to(self.device),
+                "attention_mask": attention_mask.to(self.device),
+                "max_new_tokens": min(max_new_tokens, context_length - width),
+                "pad_token_id": pad_token_id,
+                "stopping_criteria": self._cancellation_criteria(cancel_token),
+            })
+
+            batch_started = time.perf_counter()
+            output, error = None, None
+            try:
+                # Cada lote é um pedido em segundo plano: o chat passa à frente entre lotes e entre tokens
+                self.request_scheduler.set_max_concurrent(self._max_concurrent_requests())
+                with self.request_scheduler.slot(PRIORITY_BACKGROUND, cancel_token):
+                    output = model.generate(**batch_kwargs)
+            except RequestCancelled:
+                break
+            except Exception as e:
+                logger.error(f"Erro no lote {batch_id} da geração em lote: {e}")
+                logger.debug(traceback.format_exc())
+                error = str(e)
+            elapsed = time.perf_counter() - batch_started
+
+            for row, index in enumerate(bucket):
+                text, generated = "", 0
+                if output is not None:
+                    tokens = output[row, width:].tolist()
+                    generated = count_generated_tokens(tokens, eos_ids)
+                    text = tokenizer.decode(tokens[:generated], skip_special_tokens=True).strip()
+                yield BatchItemResult(index, text, lengths[index], generated, batch_id, len(bucket),
+                                      batch_started - started, elapsed, error=error)
 
     # --- Outros métodos (sem alterações significativas) ---
     def is_available(self) -> bool:
-        """Verifica se o motor de IA está disponível."""
+        """Verifica se o motor de IA está disponível, sem importar o torch antes da hora."""
+        if "torch" not in sys.modules:
+            return is_installed("torch")
         try:
             torch.tensor([1.0])
             return True
@@ -383,38 +1365,31 @@ class SevenXEngine:
             return False
 
     def list_installed_models(self) -> List[ModelInfo]:
-        """Lista todos os modelos instalados."""
-        models = []
+        """Lista todos os modelos instalados (a partir do índice, ver `ModelIndex`)."""
         try:
-            for info_file in self.models_dir.glob("**/_sevenx_info.json"):
-                model_dir = info_file.parent
-                with open(info_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    
-                size = self._estimate_model_size(model_dir)
-                model_id = config.get('model_id', model_dir.name.replace('__', '/'))
-                
-                models.append(ModelInfo(
-                    name=model_id,
-                    size=size,
-                    path=str(model_dir),
-                    modified_at=datetime.fromtimestamp(info_file.stat().st_mtime).isoformat(),
-                    details=config
-                ))
-            return models
+            return [
+                ModelInfo(
+                    name=entry["model_id"],
+                    size=entry["size"],
+                    path=entry["path"],
+                    modified_at=entry["modified_at"],
+                    details=dict(entry["info"], format=entry["format"])
+                )
+                for entry in self.model_index.list()
+            ]
         except Exception as e:
             logger.error(f"Erro ao listar modelos instalados: {e}")
             return []
 
     def search_online_models(self, query: str = "", model_type: str = "text-generation", limit: int = 50) -> List[Dict]:
         """Busca modelos online no Hugging Face."""
-        if not HUGGINGFACE_AVAILABLE:
+        if not is_installed("huggingface_hub"):
             logger.warning("Bibliotecas do Hugging Face não disponíveis para busca.")
             return []
             
         token = self.config.get("hf_token") or None
         try:
-            hf_models = list_models(
+            hf_models = huggingface_hub.list_models(
                 filter=model_type, 
                 search=query, 
                 limit=limit, 
@@ -436,16 +1411,44 @@ class SevenXEngine:
             logger.error(f"Erro ao buscar modelos no Hugging Face: {e}")
             return []
 
-    def download_model(self, model_id: str, progress_callback: Optional[Callable] = None) -> bool:
-        """Faz download de um modelo do Hugging Face."""
-        if not HUGGINGFACE_AVAILABLE:
+    def plan_download(self, model_id: str, quantization: Optional[str] = None) -> DownloadPlan:
+        """
+        Arquivos que `download_model` vai baixar e o tamanho total (ver `plan_download`
+        em download_plan.py). Sem `quantization`, repositórios GGUF usam a preferida
+        entre as que cabem no orçamento de RAM.
+
+        Raises:
+            ValueError: Se a quantização pedida não existe no repositório.
+            Exception: Erros do Hub (repositório inexistente, acesso negado).
+        """
+        repo_info = huggingface_hub.model_info(model_id, token=self.config.get("hf_token") or None,
+                                               files_metadata=True)
+        return self._plan_from_repo(repo_info, quantization)
+
+    def _plan_from_repo(self, repo_info, quantization: Optional[str]) -> DownloadPlan:
+        siblings = {sibling.rfilename: sibling.size for sibling in repo_info.siblings if sibling.rfilename}
+        return plan_download(siblings, quantization, self._memory_budget("ram"))
+
+    def download_model(self, model_id: str, progress_callback: Optional[Callable] = None,
+                       cancel_token: Optional[CancellationToken] = None,
+                       quantization: Optional[str] = None) -> bool:
+        """
+        Faz download de um modelo do Hugging Face (ver `ChunkedDownloader`).
+
+        Só os arquivos do plano (`plan_download`) são baixados: um formato de pesos
+        ou uma quantização GGUF, mais configuração e tokenizer. Os arquivos são
+        baixados em paralelo e em pedaços; se o download falhar ou for cancelado, as
+        partes ficam no diretório do modelo e a próxima chamada continua de onde parou.
+        """
+        if not is_installed("huggingface_hub"):
             if progress_callback:
                 progress_callback(100, "Erro: Bibliotecas do Hugging Face não instaladas.")
             return False
+        from .downloader import ChunkedDownloader, DownloadCancelled, DownloadError, DownloadFile
             
         token = self.config.get("hf_token") or None
         try:
-            repo_info = model_info(model_id, token=token)
+            repo_info = huggingface_hub.model_info(model_id, token=token, files_metadata=True)
         except Exception as e:
             if "GatedRepo" in str(e):
                 if progress_callback:
@@ -454,65 +1457,126 @@ class SevenXEngine:
                 if progress_callback:
                     progress_callback(100, f"Erro: Modelo {model_id} não encontrado.")
             return False
+
+        try:
+            plan = self._plan_from_repo(repo_info, quantization)
+        except ValueError as e:
+            if progress_callback:
+                progress_callback(100, f"Erro: {e}")
+            return False
+        if not plan.files:
+            if progress_callback:
+                progress_callback(100, f"Erro: Nenhum arquivo de pesos suportado em {model_id}.")
+            return False
             
         model_dir_name = model_id.replace('/', '__')
         model_dir = self.models_dir / model_dir_name
         model_dir.mkdir(parents=True, exist_ok=True)
         
+        logger.info(f"Plano de download de {model_id}: {plan.describe()}")
         if progress_callback:
-            progress_callback(0, f"Iniciando download de {model_id}...")
-            
+            progress_callback(0, f"Iniciando download de {model_id} ({plan.describe()})...")
+
+        files = [
+            DownloadFile(
+                name=sibling.rfilename,
+                url=huggingface_hub.hf_hub_url(model_id, sibling.rfilename, revision=repo_info.sha),
+                size=sibling.size,
+                sha256=sibling.lfs.sha256 if getattr(sibling, "lfs", None) else None
+            )
+            for sibling in repo_info.siblings if sibling.rfilename in plan.files
+        ]
+        downloader = ChunkedDownloader(
+            max_workers=self.config.get("engine_settings.download_workers", 4),
+            chunk_size=int(self.config.get("engine_settings.download_chunk_mb", 64) * 1024 ** 2),
+            headers={"Authorization": f"Bearer {token}"} if token else None
+        )
+
+        def on_progress(done_bytes: int, total_bytes: int, bytes_per_second: float):
+            if progress_callback:
+                progress = int(95 * done_bytes / total_bytes) if total_bytes else 0
+                progress_callback(progress, f"Baixando {model_id}: {done_bytes / 1024 ** 3:.2f} de "
+                                            f"{total_bytes / 1024 ** 3:.2f} GB a {bytes_per_second / 1024 ** 2:.1f} MB/s")
+
+        deduplicate = self.config.get("engine_settings.deduplicate_models", True)
+        if deduplicate:
+            # Arquivos que outro modelo já tem (mesmo sha256) viram hardlinks e não são baixados
+            reused = [f for f in files if f.sha256 and not (model_dir / f.name).exists()
+                      and self.blob_store.materialize(f.sha256, model_dir / f.name)]
+            if reused:
+                logger.info(f"{len(reused)} arquivos de {model_id} reaproveitados de outros modelos.")
+
         try:
-            repo_files = [f for f in repo_info.siblings if f.rfilename]
-            total_files = len(repo_files)
-            
-            for i, sibling in enumerate(repo_files):
-                filename = sibling.rfilename
-                if progress_callback:
-                    progress = int(((i + 1) / total_files) * 95)
-                    progress_callback(progress, f"Baixando {filename}...")
-                    
-                hf_hub_download(
-                    repo_id=model_id, 
-                    filename=filename, 
-                    local_dir=str(model_dir), 
-                    local_dir_use_symlinks=False, 
-                    token=token
-                )
+            downloader.download(files, model_dir, on_progress, cancel_token)
                 
             if progress_callback:
                 progress_callback(95, "Salvando metadados...")
+            if deduplicate:
+                self.blob_store.link_model(model_dir, {f.name: f.sha256 for f in files if f.sha256})
                 
-            info_data = {"model_id": model_id, "downloaded_at": datetime.now().isoformat()}
+            info_data = {"model_id": model_id, "downloaded_at": datetime.now().isoformat(),
+                         "format": plan.format, "download_size": plan.total_size}
+            if plan.quantization:
+                info_data["quantization"] = plan.quantization
             with open(model_dir / "_sevenx_info.json", 'w', encoding='utf-8') as f:
                 json.dump(info_data, f, indent=2)
+            self.model_index.refresh(model_dir)
+
+            if (plan.format != "gguf" and self.config.get("engine_settings.prepared_format", True)
+                    and is_installed("torch") and is_installed("transformers")):
+                if progress_callback:
+                    progress_callback(97, f"Preparando {model_id} para carga rápida...")
+                self.prepare_model(model_id)
                 
             if progress_callback:
                 progress_callback(100, f"Download de {model_id} concluído!")
                 
             return True
+
+        except DownloadCancelled:
+            logger.info(f"Download de {model_id} cancelado; as partes baixadas foram mantidas.")
+            if progress_callback:
+                progress_callback(100, f"Download de {model_id} cancelado. Baixe de novo para continuar.")
+            return False
             
-        except Exception as e:
+        except (DownloadError, OSError) as e:
+            # As partes já baixadas ficam no diretório: a próxima tentativa continua delas
             logger.error(f"Erro durante o download do modelo {model_id}: {e}")
             if progress_callback:
-                progress_callback(100, f"Erro ao baixar {model_id}.")
-            if model_dir.exists():
-                shutil.rmtree(model_dir)
+                progress_callback(100, f"Erro ao baixar {model_id}. Tente de novo para continuar o download.")
             return False
 
-    def unload_model(self, model_id: str) -> bool:
+    def unload_model(self, model_id: str, reason: str = "descarregado pelo usuário") -> bool:
         """Descarrega um modelo da memória."""
-        if model_id in self.loaded_models:
-            del self.loaded_models[model_id]
-            # Limpar cache do modelo específico
-            if model_id in self.model_cache:
-                del self.model_cache[model_id]
-            if self.device == "cuda":
+        if self.model_pool.remove(model_id, reason):
+            self.kv_cache.drop_model(model_id)
+            scheduler = self.batch_schedulers.pop(model_id, None)
+            if scheduler:
+                scheduler.shutdown()
+            if self._device == "cuda":
                 torch.cuda.empty_cache()
             logger.info(f"Modelo {model_id} descarregado da memória.")
             return True
         return False
 
+    def reset_session(self, session_id: str):
+        """Descarta o KV cache e o ponto de corte do histórico de uma conversa (ex.: ao iniciar uma nova conversa)."""
+        self.kv_cache.drop_session(session_id)
+        self.context_window.reset_session(session_id)
+
+    def deduplicate_models(self) -> Dict:
+        """
+        Passa os modelos instalados (inclusive os baixados antes do armazenamento por
+        conteúdo) para os blobs compartilhados. Retorna as estatísticas do armazenamento.
+        """
+        for entry in self.model_index.list():
+            try:
+                self.blob_store.link_model(Path(entry["path"]))
+            except OSError as e:
+                logger.warning(f"Não foi possível deduplicar {entry.get('model_id')}: {e}")
+        self.blob_store.collect_garbage()
+        return self.blob_store.stats()
+
     def delete_model(self, model_id: str) -> bool:
         """Remove completamente um modelo do sistema."""
         self.unload_model(model_id)
@@ -522,6 +1586,9 @@ class SevenXEngine:
         if model_dir.exists():
             try:
                 shutil.rmtree(model_dir)
+                self.model_index.remove(model_dir)
+                # Blobs que só este modelo usava ficaram sem links
+                self.blob_store.collect_garbage()
                 logger.info(f"Modelo {model_id} removido.")
                 return True
             except Exception as e:
@@ -532,8 +1599,10 @@ class SevenXEngine:
     def cleanup(self):
         """Limpa todos os recursos do motor de IA."""
         logger.info("Limpando recursos do motor de IA...")
-        for model_id in list(self.loaded_models.keys()):
-            self.unload_model(model_id)
+        self._reaper_stop.set()
+        self.jobs.shutdown()
+        for model_id in list(self.model_pool.keys()):
+            self.unload_model(model_id, reason="encerramento do motor")
         # Limpar cache completo
-        self.model_cache.clear()
+        self.kv_cache.clear()
         logger.info("Limpeza concluída.")
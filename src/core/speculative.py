@@ -0,0 +1,151 @@
+"""
+Arquivo: speculative.py
+Descrição: Decodificação especulativa (assisted generation do Transformers).
+
+Na CPU, cada passo de decodificação de um modelo grande é limitado pela leitura
+dos pesos da memória, não pelo cálculo. Alguns tokens candidatos são propostos
+e o modelo alvo verifica todos em um único forward; os aceitos saem de graça.
+Os candidatos vêm de um modelo de rascunho pequeno com o mesmo tokenizer ou,
+sem modelo extra, da busca de n-gramas no próprio prompt (prompt lookup), que
+acerta muito quando a resposta copia trechos dele (resumos, edição de texto,
+refatoração de código). A saída é a mesma da decodificação normal (idêntica na
+gulosa, mesma distribuição na amostragem); só o número de forwards do alvo cai.
+"""
+
+import threading
+from statistics import median
+from typing import Dict, List, Optional
+import logging
+
+from .metrics import GenerationMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def tokenizer_incompatibility(target_tokenizer, draft_tokenizer) -> Optional[str]:
+    """
+    Motivo pelo qual o rascunho não pode propor tokens para o alvo, ou None se
+    os dois tokenizers forem equivalentes (mesmo vocabulário e tokens especiais).
+    """
+    if target_tokenizer.get_vocab() != draft_tokenizer.get_vocab():
+        return "os vocabulários dos tokenizers são diferentes"
+    for name in ("eos_token_id", "bos_token_id", "pad_token_id"):
+        target_id, draft_id = getattr(target_tokenizer, name, None), getattr(draft_tokenizer, name, None)
+        if target_id is not None and draft_id is not None and target_id != draft_id:
+            return f"{name} diferente ({target_id} e {draft_id})"
+    return None
+
+
+class SpeculativeCounter:
+    """
+    Conta os forwards do modelo alvo feitos pela thread que chama `generate`
+    (context manager) e quantos tokens cada um recebeu. Outros usos simultâneos
+    do mesmo modelo, em outras threads, não entram na conta.
+
+    O primeiro forward recebe o prompt ainda fora do KV cache (`prefill_tokens`)
+    mais os candidatos; os seguintes, o token do passo anterior mais os candidatos.
+    """
+
+    def __init__(self, target_model, prefill_tokens: int):
+        self.target_model = target_model
+        self.prefill_tokens = prefill_tokens
+        self.target_steps = 0
+        self.fed_tokens = 0
+        self._thread_id: Optional[int] = None
+        self._handle = None
+
+    def _count(self, module, args, kwargs, output):
+        if threading.get_ident() != self._thread_id:
+            return
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        self.target_steps += 1
+        self.fed_tokens += input_ids.shape[-1] if input_ids is not None else 1
+
+    @property
+    def proposed_tokens(self) -> int:
+        return max(0, self.fed_tokens - self.prefill_tokens - max(0, self.target_steps - 1))
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._handle = self.target_model.register_forward_hook(self._count, with_kwargs=True)
+        return self
+
+    def __exit__(self, *exc):
+        if self._handle is not None:
+            self._handle.remove()
+            self._handle = None
+
+    def apply(self, metrics: GenerationMetrics, generated_tokens: int = 0):
+        """
+        Grava as contagens no registro da geração. Cada passo do alvo aceita parte
+        dos candidatos e acrescenta um token seu; o que passa disso veio dos candidatos.
+        """
+        generated_tokens = max(generated_tokens, metrics.generated_tokens)
+        metrics.target_steps = self.target_steps
+        metrics.draft_tokens = self.proposed_tokens
+        metrics.accepted_draft_tokens = max(0, min(metrics.draft_tokens, generated_tokens - self.target_steps))
+
+
+def speculative_report(records: List[GenerationMetrics], model_id: str, mode: str = "draft") -> Dict:
+    """
+    Taxa de aceitação e ganho de velocidade de um modo de decodificação
+    especulativa ("draft" ou "prompt_lookup") de um modelo, comparando a mediana
+    de tok/s com a das gerações sem especulação registradas.
+    """
+    records = [m for m in records if m.model_id == model_id and not m.response_cache_hit
+               and m.error is None and m.generated_tokens > 1]
+    assisted = [m for m in records if m.speculation == mode]
+    plain = [m for m in records if m.speculation is None]
+    report = {"model_id": model_id, "mode": mode, "assisted_generations": len(assisted),
+              "plain_generations": len(plain)}
+    if assisted:
+        proposed = sum(m.draft_tokens for m in assisted)
+        accepted = sum(m.accepted_draft_tokens for m in assisted)
+        steps = sum(m.target_steps for m in assisted)
+        if mode == "draft":
+            report["draft_model"] = assisted[-1].draft_model
+        report["acceptance_rate"] = round(accepted / proposed, 3) if proposed else 0.0
+        report["tokens_per_target_step"] = round(sum(m.generated_tokens for m in assisted) / steps, 2) if steps else 0.0
+        report["assisted_tokens_per_second"] = round(median(m.decode_tokens_per_second for m in assisted), 2)
+    if plain:
+        report["plain_tokens_per_second"] = round(median(m.decode_tokens_per_second for m in plain), 2)
+    if assisted and plain and report["plain_tokens_per_second"] > 0:
+        report["speedup"] = round(report["assisted_tokens_per_second"] / report["plain_tokens_per_second"], 2)
+    return report
+
+
+def _make_bounded_streamer_class():
+    from transformers import TextIteratorStreamer
+
+    class BoundedTextIteratorStreamer(TextIteratorStreamer):
+        """
+        TextIteratorStreamer que não repassa mais que `max_new_tokens` tokens. No último
+        passo, a decodificação especulativa pode aceitar candidatos além do limite.
+        """
+
+        def __init__(self, tokenizer, max_new_tokens: int, **kwargs):
+            super().__init__(tokenizer, **kwargs)
+            self.max_new_tokens = max_new_tokens
+            self.emitted_tokens = 0
+
+        def put(self, value):
+            if self.skip_prompt and self.next_tokens_are_prompt:
+                super().put(value)
+                return
+            if len(value.shape) > 1:
+                value = value[0]
+            value = value[:max(0, self.max_new_tokens - self.emitted_tokens)]
+            if len(value):
+                self.emitted_tokens += len(value)
+                super().put(value)
+
+    return BoundedTextIteratorStreamer
+
+
+def __getattr__(name: str):
+    # Cria a subclasse do streamer no primeiro acesso (PEP 562), sem importar o transformers antes
+    if name == "BoundedTextIteratorStreamer":
+        cls = _make_bounded_streamer_class()
+        globals()[name] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
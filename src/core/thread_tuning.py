@@ -0,0 +1,235 @@
+"""
+Arquivo: thread_tuning.py
+Descrição: Ajuste automático de threads e afinidade de CPU para os backends torch e GGUF.
+
+Os padrões das bibliotecas usam uma thread por CPU lógica: com SMT, duas threads
+disputam o mesmo núcleo físico e ainda competem com a thread da interface. Na
+primeira carga de um modelo nesta máquina, o `ThreadTuner` roda uma decodificação
+curta em algumas combinações de número de threads e afinidade (todas as CPUs,
+só um lógico por núcleo físico, cada nó NUMA) e guarda a mais rápida por host e
+modelo. As cargas seguintes só aplicam a configuração salva.
+"""
+
+import json
+import os
+import platform
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CPU_SYSFS = Path("/sys/devices/system/cpu")
+NODE_SYSFS = Path("/sys/devices/system/node")
+
+
+@dataclass
+class ThreadConfig:
+    """Número de threads e CPUs em que o processo roda."""
+    threads: int
+    affinity: str                     # "all", "physical" ou "numa<N>"
+    cpus: List[int] = field(default_factory=list)
+    tokens_per_second: float = 0.0
+
+    @property
+    def key(self):
+        return self.threads, tuple(self.cpus)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ThreadConfig":
+        return cls(int(data["threads"]), data.get("affinity", "all"), list(data.get("cpus", [])),
+                   float(data.get("tokens_per_second", 0.0)))
+
+
+def _parse_cpu_list(text: str) -> List[int]:
+    """Converte listas do sysfs ("0-3,8-11") em números de CPU."""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def _allowed_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_topology() -> Dict:
+    """
+    CPUs lógicas permitidas ao processo, um lógico por núcleo físico e as CPUs de
+    cada nó NUMA. Fora do Linux, sem sysfs, todos os lógicos contam como físicos.
+    """
+    logical = _allowed_cpus()
+    physical, seen_cores = [], set()
+    for cpu in logical:
+        topology = CPU_SYSFS / f"cpu{cpu}" / "topology"
+        try:
+            core = ((topology / "physical_package_id").read_text().strip(), (topology / "core_id").read_text().strip())
+        except OSError:
+            core = ("", str(cpu))
+        if core not in seen_cores:
+            seen_cores.add(core)
+            physical.append(cpu)
+
+    numa = {}
+    for node_dir in sorted(NODE_SYSFS.glob("node[0-9]*")):
+        try:
+            node_cpus = set(_parse_cpu_list((node_dir / "cpulist").read_text()))
+        except (OSError, ValueError):
+            continue
+        cpus = [cpu for cpu in logical if cpu in node_cpus]
+        if cpus:
+            numa[int(node_dir.name[4:])] = cpus
+    return {"logical": logical, "physical": physical, "numa": numa}
+
+
+def candidate_configs(topology: Dict) -> List[ThreadConfig]:
+    """Combinações de threads e afinidade experimentadas pelo ajuste."""
+    logical, physical = topology["logical"], topology["physical"]
+    candidates = [ThreadConfig(len(physical), "physical", physical)]
+    if len(physical) > 2:
+        # Deixa um núcleo para a thread da interface
+        candidates.append(ThreadConfig(len(physical) - 1, "physical", physical))
+    if len(physical) >= 4:
+        candidates.append(ThreadConfig(len(physical) // 2, "physical", physical))
+    if len(logical) > len(physical):
+        candidates.append(ThreadConfig(len(logical), "all", logical))
+        candidates.append(ThreadConfig(len(physical), "all", logical))
+    if len(topology["numa"]) > 1:
+        physical_set = set(physical)
+        for node, cpus in topology["numa"].items():
+            node_physical = [cpu for cpu in cpus if cpu in physical_set]
+            candidates.append(ThreadConfig(len(node_physical), f"numa{node}", node_physical))
+
+    unique = {}
+    for candidate in candidates:
+        if candidate.threads > 0:
+            unique.setdefault(candidate.key, candidate)
+    return list(unique.values())
+
+
+def host_key() -> str:
+    """Identifica a máquina: o melhor ajuste muda com o processador e o número de CPUs."""
+    cpu_model = platform.processor()
+    try:
+        match = re.search(r"^model name\s*:\s*(.+)$", Path("/proc/cpuinfo").read_text(), re.MULTILINE)
+        if match:
+            cpu_model = match.group(1).strip()
+    except OSError:
+        pass
+    return f"{platform.node()}|{cpu_model}|{len(_allowed_cpus())}"
+
+
+_applied_lock = Lock()
+_applied: Optional[tuple] = None
+
+
+def apply_thread_config(config: ThreadConfig):
+    """Aplica afinidade e número de threads do torch ao processo (não faz nada se já estiver aplicado)."""
+    global _applied
+    with _applied_lock:
+        if _applied == config.key:
+            return
+        if config.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, config.cpus)
+            except OSError as e:
+                logger.warning(f"Não foi possível fixar a afinidade em {config.affinity}: {e}")
+        # Sessões só com GGUF não importam o torch: as threads vão como opção do ctransformers
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(config.threads)
+            try:
+                # A inferência quase não usa o pool inter-op; só pode ser mudado antes do primeiro uso
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass
+        _applied = config.key
+        logger.info(f"Threads da CPU: {config.threads} em {config.affinity} ({len(config.cpus)} CPUs)")
+
+
+class ThreadTuner:
+    """Mede e guarda, por host e modelo, a melhor configuração de threads da CPU."""
+
+    def __init__(self, store_path: Path):
+        self.store_path = Path(store_path)
+        self.host = host_key()
+        self._lock = Lock()
+
+    def _read_store(self) -> Dict:
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, model_id: str) -> Optional[ThreadConfig]:
+        """Configuração salva para o modelo nesta máquina, se houver."""
+        with self._lock:
+            entry = self._read_store().get(self.host, {}).get(model_id)
+        if not entry:
+            return None
+        try:
+            config = ThreadConfig.from_dict(entry["best"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        # CPUs que deixaram de estar disponíveis (cgroup, afinidade do lançador) invalidam o ajuste
+        allowed = set(_allowed_cpus())
+        return config if all(cpu in allowed for cpu in config.cpus) else None
+
+    def save(self, model_id: str, best: ThreadConfig, results: List[ThreadConfig]):
+        with self._lock:
+            store = self._read_store()
+            store.setdefault(self.host, {})[model_id] = {
+                "best": best.to_dict(),
+                "results": [r.to_dict() for r in results],
+                "tuned_at": datetime.now().isoformat(),
+            }
+            self.store_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.store_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(store, f, indent=2)
+            tmp_path.replace(self.store_path)
+
+    def tune(self, model_id: str, run_decode: Callable[[int], float],
+             candidates: Optional[List[ThreadConfig]] = None,
+             should_stop: Optional[Callable[[], bool]] = None) -> Optional[ThreadConfig]:
+        """
+        Aplica cada candidato, mede tokens/s com `run_decode(threads)` e salva o
+        melhor. Retorna None se for interrompido antes de medir todos.
+        """
+        candidates = candidates or candidate_configs(cpu_topology())
+        results = []
+        started = time.perf_counter()
+        for candidate in candidates:
+            if should_stop and should_stop():
+                return None
+            apply_thread_config(candidate)
+            try:
+                candidate.tokens_per_second = round(run_decode(candidate.threads), 2)
+            except Exception as e:
+                logger.warning(f"Ajuste de threads de {model_id} falhou com {candidate.threads} threads: {e}")
+                continue
+            results.append(candidate)
+            logger.debug(f"{model_id}: {candidate.threads} threads em {candidate.affinity}: "
+                         f"{candidate.tokens_per_second} tok/s")
+        if not results:
+            return None
+        best = max(results, key=lambda r: r.tokens_per_second)
+        self.save(model_id, best, results)
+        logger.info(f"Ajuste de threads de {model_id} em {time.perf_counter() - started:.1f}s: "
+                    f"{best.threads} threads em {best.affinity} ({best.tokens_per_second} tok/s)")
+        return best
@@ -0,0 +1,48 @@
+"""
+Arquivo: tiny_model.py
+Descrição: Modelo Llama minúsculo com pesos aleatórios, criado na hora.
+
+Usado pelo benchmark para rodar offline (sem `--model-id`) e pela suíte de
+testes, que precisa de um modelo real do transformers sem baixar nada. O
+tokenizer é por palavras, com um vocabulário pequeno e fixo (`TINY_MODEL_WORDS`).
+"""
+
+import json
+from pathlib import Path
+
+# Vocabulário do tokenizer por palavras (separadas por espaço)
+TINY_MODEL_WORDS = ("user assistant olá como você está hoje tudo bem obrigado qual é a capital do brasil sim não "
+                    "quando onde porque muito pouco grande pequeno casa carro livro tempo dia noite").split()
+
+
+def create_tiny_model(model_dir: Path, model_id: str, hidden_size: int = 32, num_layers: int = 2,
+                      max_position_embeddings: int = 256, safe_serialization: bool = True):
+    """
+    Cria em `model_dir` um modelo Llama minúsculo com pesos aleatórios (semente fixa)
+    e tokenizer por palavras, com o _sevenx_info.json de um modelo instalado.
+    Com `safe_serialization=False`, os pesos vão em pytorch_model.bin (pickle).
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3}
+    for word in TINY_MODEL_WORDS:
+        vocab.setdefault(word, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>",
+                                   pad_token="<pad>", unk_token="<unk>")
+    fast.chat_template = ("{% for m in messages %}{{ m['role'] }} {{ m['content'] }} </s> {% endfor %}"
+                          "{% if add_generation_prompt %}assistant{% endif %}")
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fast.save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=len(vocab), hidden_size=hidden_size, intermediate_size=hidden_size * 2,
+                         num_hidden_layers=num_layers, num_attention_heads=4, num_key_value_heads=2,
+                         max_position_embeddings=max_position_embeddings,
+                         pad_token_id=0, bos_token_id=1, eos_token_id=2)
+    LlamaForCausalLM(config).save_pretrained(model_dir, safe_serialization=safe_serialization)
+    with open(model_dir / "_sevenx_info.json", 'w', encoding='utf-8') as f:
+        json.dump({"model_id": model_id}, f)
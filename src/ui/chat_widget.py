@@ -235,11 +235,10 @@ class ChatWidget(QWidget):
             self.model_combo.addItem(model.name, model.name)
 
     def on_model_selected(self, model_id):
-        """Carrega o modelo selecionado se ainda não estiver carregado."""
+        """Carrega o modelo selecionado em segundo plano se ainda não estiver carregado."""
         if model_id and not self.ai_engine.loaded_models.get(model_id):
             print(f"Modelo '{model_id}' selecionado. Carregando em segundo plano...")
-            # Idealmente, isso também seria em uma thread para não bloquear a UI
-            self.ai_engine.load_model(model_id)
+            self.ai_engine.jobs.submit_load(model_id)
 
     def send_message(self):
         """Envia a mensagem do usuário para o modelo de IA."""
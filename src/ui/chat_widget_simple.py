@@ -3,6 +3,7 @@ Arquivo: chat_widget_simple.py
 Descrição: Widget de chat com correção para o erro de runtime ao limpar a conversa.
 """
 import json
+import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, 
@@ -13,6 +14,8 @@ from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QMetaObject, Qt
 from PyQt6.QtGui import QFont, QTextCursor
 from ..core.sevenx_engine import SevenXEngine, ModelInfo
 from ..core.ollama_client import OllamaClient
+from ..core.cancellation import CancellationToken
+from ..core.request_scheduler import AdmissionRejected
 from ..core.config import Config
 import logging
 
@@ -67,15 +70,18 @@ class ChatWorker(QThread):
     error_occurred = pyqtSignal(str)
     progress_update = pyqtSignal(str)
     
-    def __init__(self, service: str, messages: List[Dict], model_id: str, config: Config, ai_engine: SevenXEngine, ollama_client: OllamaClient):
+    def __init__(self, service: str, messages: List[Dict], model_id: str, config: Config, ai_engine: SevenXEngine, ollama_client: OllamaClient, session_id: Optional[str] = None):
         super().__init__()
         self.service = service
+        self.session_id = session_id
         self.messages = messages
         self.model_id = model_id
         self.config = config
         self.ai_engine = ai_engine
         self.ollama_client = ollama_client
         self.should_stop = False
+        # Interrompe a geração no motor, e não apenas o consumo dos pedaços
+        self.cancel_token = CancellationToken()
     
     def run(self):
         try:
@@ -96,7 +102,8 @@ class ChatWorker(QThread):
                 if "top_k" in ollama_config:
                     ollama_config["top_k"] = max(1, ollama_config["top_k"])
                 
-                stream_generator = self.ollama_client.chat_stream(self.model_id, self.messages, ollama_config)
+                stream_generator = self.ollama_client.chat_stream(self.model_id, self.messages, ollama_config,
+                                                                  cancel_token=self.cancel_token)
             else: # Padrão é o SevenX Engine
                 # Para SevenX, ajustar parâmetros para Transformers
                 transformers_config = generation_config.copy()
@@ -110,7 +117,9 @@ class ChatWorker(QThread):
                 if "top_k" in transformers_config:
                     transformers_config["top_k"] = max(1, transformers_config["top_k"])
                 
-                stream_generator = self.ai_engine.generate_stream(self.model_id, self.messages, transformers_config)
+                stream_generator = self.ai_engine.generate_stream(self.model_id, self.messages, transformers_config,
+                                                                  session_id=self.session_id,
+                                                                  cancel_token=self.cancel_token)
             
             for chunk in stream_generator:
                 if self.should_stop:
@@ -121,6 +130,8 @@ class ChatWorker(QThread):
                 self.response_chunk.emit(chunk)
                 self.msleep(stream_delay)
                 
+        except AdmissionRejected as e:
+            self.error_occurred.emit(f"Motor ocupado: {e} Tente de novo em {e.retry_after}s.")
         except Exception as e:
             logger.error(f"Erro no worker: {e}")
             self.error_occurred.emit(f"Erro inesperado no worker: {e}")
@@ -129,6 +140,7 @@ class ChatWorker(QThread):
     
     def stop(self):
         self.should_stop = True
+        self.cancel_token.cancel()
 
 class ChatWidget(QWidget):
     def __init__(self, config: Config, ai_engine: SevenXEngine, ollama_client: OllamaClient):
@@ -137,6 +149,8 @@ class ChatWidget(QWidget):
         self.ai_engine = ai_engine
         self.ollama_client = ollama_client
         self.conversation_history = []
+        # Identifica a conversa para o motor reaproveitar o KV cache entre turnos
+        self.session_id = uuid.uuid4().hex
         self.current_worker = None
         self.current_response_widget = None
         self.is_generating = False
@@ -275,7 +289,8 @@ class ChatWidget(QWidget):
             model_id, 
             self.config, 
             self.ai_engine, 
-            self.ollama_client
+            self.ollama_client,
+            session_id=self.session_id
         )
         self.current_worker.response_chunk.connect(self.update_response)
         self.current_worker.response_completed.connect(self.finalize_response)
@@ -413,6 +428,8 @@ class ChatWidget(QWidget):
                 item.widget().deleteLater()
         
         self.conversation_history.clear()
+        self.ai_engine.reset_session(self.session_id)
+        self.session_id = uuid.uuid4().hex
         self.current_response_widget = None
         self.is_generating = False
         self.toggle_input_enabled(True)
@@ -5,7 +5,7 @@ Janela principal da aplicação SevenX Studio
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QSplitter, QStatusBar, QMenuBar, 
                              QToolBar, QLabel, QPushButton, QMessageBox)
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import QAction
 
 from .chat_widget_simple import ChatWidget
@@ -16,17 +16,43 @@ from ..core.config import Config
 from ..core.logger import setup_logger
 from ..core.sevenx_engine import SevenXEngine
 from ..core.ollama_client import OllamaClient
+from ..core.api_server import ApiServer
+from ..core.daemon import DaemonError, connect_daemon
+from ..core import lazy_imports
 
 class MainWindow(QMainWindow):
     """Janela principal da aplicação"""
+
+    # Resultado da varredura de modelos, vindo da thread de trabalho
+    models_scanned = pyqtSignal(object)
     
     def __init__(self, config: Config):
         super().__init__()
         self.config = config
         self.logger = setup_logger(__name__)
         
-        self.ai_engine = SevenXEngine(config)
+        self.ai_engine = None
+        if self.config.get("daemon_mode", False):
+            # Os modelos ficam no daemon: um travamento do app não perde o modelo carregado
+            try:
+                self.ai_engine = connect_daemon(config)
+            except DaemonError as e:
+                self.logger.error(f"Daemon indisponível, usando o motor no próprio app: {e}")
+        daemon_mode = self.ai_engine is not None
+        if not daemon_mode:
+            self.ai_engine = SevenXEngine(config)
         self.ollama_client = OllamaClient(config)
+        self.api_server = None
+        # No modo daemon, a API local é servida pelo próprio daemon
+        if self.config.get("api_enabled", False) and not daemon_mode:
+            # Scripts locais usam os modelos já carregados no app pela API compatível com OpenAI
+            self.api_server = ApiServer(self.ai_engine, self.ollama_client,
+                                        host=self.config.get("api_host", "127.0.0.1"),
+                                        port=self.config.get("api_port", 8080),
+                                        max_workers=self.config.get("api_workers", 8),
+                                        api_key=self.config.get("api_key", ""))
+            if not self.api_server.start():
+                self.api_server = None
         
         self.setWindowTitle("SevenX Studio - Local AI Platform")
         self.setMinimumSize(1000, 700)
@@ -42,9 +68,24 @@ class MainWindow(QMainWindow):
         self.setup_statusbar()
         self.apply_theme()
         
+        self.models_scanned.connect(self.on_models_scanned)
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self.update_statusbar_info)
         self.update_timer.start(5000)
+
+        # Disparado quando o loop de eventos começa, com a janela já visível
+        QTimer.singleShot(0, self.on_window_shown)
+
+    def on_window_shown(self):
+        """Registra o tempo de cold start e pré-carrega a pilha de ML em segundo plano."""
+        lazy_imports.mark_startup("window_shown")
+        report = lazy_imports.import_report(self.config.get("ui_settings.cold_start_target_ms"))
+        self.logger.info(f"Janela visível em {report['startup_ms']['window_shown']:.0f} ms "
+                         f"(bibliotecas pesadas já importadas: {report['heavy_modules_loaded'] or 'nenhuma'})")
+        if report.get("within_target") is False:
+            self.logger.warning(f"Cold start acima da meta de {report['target_ms']:.0f} ms")
+        if self.config.get("engine_settings.prewarm_ml_stack", True):
+            lazy_imports.prewarm()
     
     def setup_ui(self):
         central_widget = QWidget()
@@ -155,17 +196,23 @@ class MainWindow(QMainWindow):
             else:
                 self.connection_label.setText("Motor IA: Inativo")
                 self.connection_label.setStyleSheet("color: red;")
-            models = self.ai_engine.list_installed_models()
-            self.models_count_label.setText(f"{len(models)} modelos locais")
+            # A varredura do disco roda em segundo plano (pedidos repetidos reaproveitam o job)
+            self.ai_engine.jobs.submit_scan().on_done(self.models_scanned.emit)
         except Exception:
             pass
 
+    def on_models_scanned(self, job):
+        if job.status == "done":
+            self.models_count_label.setText(f"{len(job.result)} modelos locais")
+
     def show_about(self):
         QMessageBox.about(self, "Sobre SevenX Studio", "<h3>SevenX Studio v1.0.0</h3><p>Uma plataforma moderna para IA local.</p>")
 
     def closeEvent(self, event):
         self.config.set("ui_settings.window_width", self.width())
         self.config.set("ui_settings.window_height", self.height())
+        if self.api_server is not None:
+            self.api_server.stop()
         self.ai_engine.cleanup()
         self.logger.info("SevenX Studio fechado")
         event.accept()
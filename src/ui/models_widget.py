@@ -5,12 +5,20 @@ Descrição: Widget para gerenciamento de modelos de IA e ponto de entrada da ap
 import sys
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTableWidget, QTableWidgetItem, QPushButton, QLineEdit, QLabel,
-                             QProgressBar, QSplitter, QGroupBox, QHeaderView, QMessageBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                             QProgressBar, QSplitter, QGroupBox, QHeaderView, QMessageBox, QInputDialog)
+from PyQt6.QtCore import Qt, QThread, QObject, pyqtSignal
 
 # Importa as classes dos outros arquivos
 from ..core.sevenx_engine import SevenXEngine
+from ..core.model_jobs import ModelJob
+from ..core.cancellation import CancellationToken
 from ..core.huggingface_client import Config
+
+class JobSignals(QObject):
+    """Leva o progresso dos jobs de modelo (threads de trabalho) para a thread da interface."""
+    progress = pyqtSignal(object)
+    finished = pyqtSignal(object)
+
 class ModelDownloadWorker(QThread):
     """Worker em uma thread separada para não bloquear a UI durante o download."""
     progress_updated = pyqtSignal(int)
@@ -18,10 +26,17 @@ class ModelDownloadWorker(QThread):
     download_completed = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
     
-    def __init__(self, model_id: str, ai_engine: SevenXEngine):
+    def __init__(self, model_id: str, ai_engine: SevenXEngine, quantization: str = None):
         super().__init__()
         self.model_id = model_id
         self.ai_engine = ai_engine
+        self.quantization = quantization
+        self.cancel_token = CancellationToken()
+
+    def requestInterruption(self):
+        # Para as conexões abertas; as partes baixadas ficam para continuar depois
+        self.cancel_token.cancel()
+        super().requestInterruption()
     
     def run(self):
         """Executa o download do modelo."""
@@ -31,7 +46,8 @@ class ModelDownloadWorker(QThread):
                 self.progress_updated.emit(progress)
                 self.status_updated.emit(status)
             
-            success = self.ai_engine.download_model(self.model_id, progress_callback)
+            success = self.ai_engine.download_model(self.model_id, progress_callback, self.cancel_token,
+                                                    self.quantization)
             
             if self.isInterruptionRequested():
                 self.status_updated.emit("Download cancelado.")
@@ -51,6 +67,12 @@ class ModelsWidget(QWidget):
         super().__init__()
         self.ai_engine = ai_engine
         self.download_worker = None
+        self.download_request = (None, None)
+        self.current_job = None
+        self.installed_models = []
+        self.job_signals = JobSignals()
+        self.job_signals.progress.connect(self.on_job_progress)
+        self.job_signals.finished.connect(self.on_job_finished)
         
         self.setup_ui()
         self.refresh_all_models()
@@ -97,8 +119,8 @@ class ModelsWidget(QWidget):
         layout = QVBoxLayout(group)
         
         self.installed_table = QTableWidget()
-        self.installed_table.setColumnCount(5)
-        self.installed_table.setHorizontalHeaderLabels(["Nome", "Tamanho", "Status", "Ação", "Remover"])
+        self.installed_table.setColumnCount(6)
+        self.installed_table.setHorizontalHeaderLabels(["Nome", "Tamanho", "Status", "Ação", "Remover", "Rascunho"])
         self.installed_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.installed_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         layout.addWidget(self.installed_table)
@@ -106,7 +128,7 @@ class ModelsWidget(QWidget):
         return group
     
     def create_download_section(self) -> QGroupBox:
-        group = QGroupBox("Status do Download")
+        group = QGroupBox("Status das Operações")
         layout = QVBoxLayout(group)
         
         self.progress_bar = QProgressBar()
@@ -116,9 +138,9 @@ class ModelsWidget(QWidget):
         self.status_label = QLabel("Pronto.")
         layout.addWidget(self.status_label)
         
-        self.cancel_btn = QPushButton("Cancelar Download")
+        self.cancel_btn = QPushButton("Cancelar")
         self.cancel_btn.setVisible(False)
-        self.cancel_btn.clicked.connect(self.cancel_download)
+        self.cancel_btn.clicked.connect(self.cancel_operation)
         layout.addWidget(self.cancel_btn, 0, Qt.AlignmentFlag.AlignRight)
         
         return group
@@ -143,20 +165,22 @@ class ModelsWidget(QWidget):
             
         self.status_label.setText(f"{len(models)} modelos encontrados.")
 
-    def update_installed_models_table(self):
-        """Atualiza a tabela de modelos instalados."""
-        models = self.ai_engine.list_installed_models()
+    def update_installed_models_table(self, models: list):
+        """Atualiza a tabela de modelos instalados com o resultado da varredura."""
         self.installed_table.setRowCount(len(models))
         
         for row, model in enumerate(models):
             size_gb = model.size / (1024**3)
             status = "Carregado" if self.ai_engine.loaded_models.get(model.name) else "Disponível"
+            if self.ai_engine.jobs.find("load", model.name):
+                status = "Carregando..."
             
             self.installed_table.setItem(row, 0, QTableWidgetItem(model.name))
             self.installed_table.setItem(row, 1, QTableWidgetItem(f"{size_gb:.2f} GB"))
             self.installed_table.setItem(row, 2, QTableWidgetItem(status))
             
             action_btn = QPushButton("Carregar" if status == "Disponível" else "Descarregar")
+            action_btn.setEnabled(status != "Carregando...")
             action_btn.clicked.connect(lambda checked, m=model.name: self.toggle_load_model(m))
             self.installed_table.setCellWidget(row, 3, action_btn)
 
@@ -164,25 +188,61 @@ class ModelsWidget(QWidget):
             remove_btn.clicked.connect(lambda checked, m=model.name: self.remove_model(m))
             self.installed_table.setCellWidget(row, 4, remove_btn)
 
-    def start_download(self, model_id: str):
+            draft_btn = QPushButton(model.details.get("draft_model") or "Nenhum")
+            draft_btn.setToolTip("Modelo pequeno, com o mesmo tokenizer, usado na decodificação especulativa")
+            draft_btn.clicked.connect(lambda checked, m=model.name: self.choose_draft_model(m))
+            self.installed_table.setCellWidget(row, 5, draft_btn)
+
+    def start_download(self, model_id: str, quantization: str = None):
         if self.download_worker and self.download_worker.isRunning():
             QMessageBox.warning(self, "Aviso", "Um download já está em andamento.")
             return
-        
-        reply = QMessageBox.question(self, "Confirmar Download", f"Deseja baixar o modelo '{model_id}'?")
+
+        # A consulta ao Hub roda em segundo plano; o diálogo abre quando o plano chega
+        self.download_request = (model_id, quantization)
+        self.track_job(self.ai_engine.jobs.submit_plan(model_id, quantization))
+
+    def on_plan_finished(self, job: ModelJob):
+        """Pergunta a quantização e confirma o download a partir do plano consultado."""
+        model_id = job.model_id
+        self.status_label.setText("Pronto.")
+        if job.status != "done":
+            QMessageBox.critical(self, "Erro no Download", f"Não foi possível consultar o modelo '{model_id}': {job.error}")
+            return
+        plan = job.result
+        requested_quantization = self.download_request[1] if self.download_request[0] == model_id else None
+
+        if len(plan.quantizations) > 1 and requested_quantization is None:
+            # Repositório GGUF com várias quantizações: a sugerida é a que cabe na RAM
+            quants = sorted(plan.quantizations, key=lambda q: plan.quantizations[q])
+            labels = [f"{q} ({plan.quantizations[q] / 1024 ** 3:.2f} GB)" for q in quants]
+            choice, ok = QInputDialog.getItem(self, "Quantização", f"Quantização de '{model_id}':",
+                                              labels, quants.index(plan.quantization), False)
+            if not ok: return
+            chosen = quants[labels.index(choice)]
+            if chosen != plan.quantization:
+                self.start_download(model_id, chosen)
+                return
+
+        reply = QMessageBox.question(self, "Confirmar Download",
+                                     f"Deseja baixar o modelo '{model_id}'?\n\n{plan.describe()}")
         if reply != QMessageBox.StandardButton.Yes: return
         
         self.progress_bar.setVisible(True)
         self.cancel_btn.setVisible(True)
         
-        self.download_worker = ModelDownloadWorker(model_id, self.ai_engine)
+        self.download_worker = ModelDownloadWorker(model_id, self.ai_engine, plan.quantization)
         self.download_worker.progress_updated.connect(self.progress_bar.setValue)
         self.download_worker.status_updated.connect(self.status_label.setText)
         self.download_worker.download_completed.connect(self.on_download_completed)
         self.download_worker.error_occurred.connect(self.on_download_error)
         self.download_worker.start()
 
-    def cancel_download(self):
+    def cancel_operation(self):
+        if self.current_job and not self.current_job.finished:
+            self.current_job.cancel()
+            self.status_label.setText("Cancelando...")
+            return
         if self.download_worker and self.download_worker.isRunning():
             self.download_worker.requestInterruption()
             self.download_worker.wait()
@@ -205,31 +265,81 @@ class ModelsWidget(QWidget):
     def remove_model(self, model_id: str):
         reply = QMessageBox.question(self, "Confirmar Remoção", f"Tem certeza que deseja remover o modelo '{model_id}'?")
         if reply == QMessageBox.StandardButton.Yes:
-            if self.ai_engine.delete_model(model_id):
-                QMessageBox.information(self, "Sucesso", f"Modelo '{model_id}' removido.")
-                self.refresh_all_models()
-            else:
-                QMessageBox.critical(self, "Erro", f"Falha ao remover o modelo '{model_id}'.")
+            self.track_job(self.ai_engine.jobs.submit_delete(model_id))
+
+    def choose_draft_model(self, model_id: str):
+        """Escolhe o modelo de rascunho da decodificação especulativa de `model_id`."""
+        candidates = ["Nenhum"] + [m.name for m in self.installed_models if m.name != model_id]
+        choice, ok = QInputDialog.getItem(self, "Modelo de Rascunho",
+                                          f"Rascunho para '{model_id}':", candidates, 0, False)
+        if not ok:
+            return
+        # Comparar os tokenizers carrega os dois do disco; roda em segundo plano como a carga
+        self.track_job(self.ai_engine.jobs.submit_draft(model_id, None if choice == "Nenhum" else choice))
 
     def toggle_load_model(self, model_id: str):
         if self.ai_engine.loaded_models.get(model_id): # Se está carregado, descarrega
-            if self.ai_engine.unload_model(model_id):
-                self.status_label.setText(f"Modelo '{model_id}' descarregado.")
-            else:
-                self.status_label.setText(f"Falha ao descarregar '{model_id}'.")
-        else: # Se não está carregado, carrega
-            self.status_label.setText(f"Carregando '{model_id}'...")
-            QApplication.processEvents()
-            if self.ai_engine.load_model(model_id):
-                self.status_label.setText(f"Modelo '{model_id}' carregado.")
-            else:
-                self.status_label.setText(f"Falha ao carregar '{model_id}'.")
-        self.update_installed_models_table()
+            self.track_job(self.ai_engine.jobs.submit_unload(model_id))
+        else: # Se não está carregado, carrega em segundo plano
+            self.track_job(self.ai_engine.jobs.submit_load(model_id), cancellable=True)
+            self.update_installed_models_table(self.installed_models)
 
-    def refresh_all_models(self):
-        """Atualiza todas as tabelas e informações."""
-        self.update_installed_models_table()
-        self.status_label.setText("Pronto.")
+    def track_job(self, job: ModelJob, cancellable: bool = False):
+        """Acompanha um job de modelo; os sinais trazem o progresso para a thread da interface."""
+        if cancellable:
+            self.current_job = job
+            self.progress_bar.setValue(job.progress)
+            self.progress_bar.setVisible(True)
+            self.cancel_btn.setVisible(True)
+        job.on_progress(self.job_signals.progress.emit)
+        job.on_done(self.job_signals.finished.emit)
+
+    def on_job_progress(self, job: ModelJob):
+        if job.kind == "scan":
+            return
+        self.status_label.setText(job.message)
+        if job is self.current_job:
+            self.progress_bar.setValue(job.progress)
+
+    def on_job_finished(self, job: ModelJob):
+        if job is self.current_job:
+            self.current_job = None
+            self.reset_download_ui()
+
+        if job.kind == "plan":
+            self.on_plan_finished(job)
+            return
+
+        if job.kind == "scan":
+            if job.status == "done":
+                self.installed_models = job.result
+                self.update_installed_models_table(job.result)
+            if self.status_label.text() == "Procurando modelos instalados...":
+                self.status_label.setText("Pronto.")
+            return
+
+        messages = {
+            ("load", "done"): f"Modelo '{job.model_id}' carregado.",
+            ("load", "cancelled"): f"Carga de '{job.model_id}' cancelada.",
+            ("unload", "done"): f"Modelo '{job.model_id}' descarregado.",
+            ("delete", "done"): f"Modelo '{job.model_id}' removido.",
+            ("draft", "done"): f"Rascunho de '{job.model_id}': {job.result or 'nenhum'}.",
+        }
+        if job.status == "failed":
+            if job.kind == "delete":
+                QMessageBox.critical(self, "Erro", f"Falha ao remover o modelo '{job.model_id}'.")
+            elif job.kind == "draft":
+                QMessageBox.warning(self, "Rascunho Incompatível", job.error)
+            self.status_label.setText(job.error or f"Falha na operação em '{job.model_id}'.")
+        else:
+            self.status_label.setText(messages.get((job.kind, job.status), "Pronto."))
+        self.refresh_all_models(reset_status=False)
+
+    def refresh_all_models(self, reset_status: bool = True):
+        """Atualiza todas as tabelas e informações (a varredura do disco roda em segundo plano)."""
+        self.track_job(self.ai_engine.jobs.submit_scan())
+        if reset_status:
+            self.status_label.setText("Procurando modelos instalados...")
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -56,6 +56,7 @@ class SettingsWidget(QWidget):
             self.font_size_spin: "ui_settings.font_size", self.sidebar_width_spin: "ui_settings.sidebar_width",
             self.show_system_info_check: "ui_settings.show_system_info", self.lite_mode_check: "ui_settings.lite_mode",
             self.hf_token_input: "hf_token", self.ollama_host_input: "ollama_host", self.api_port_spin: "api_port",
+            self.api_enabled_check: "api_enabled", self.api_key_input: "api_key",
         }
 
     def load_settings(self):
@@ -105,4 +106,4 @@ class SettingsWidget(QWidget):
     def create_chat_tab(self) -> QWidget:
         widget = QWidget(); layout = QFormLayout(widget); layout.setSpacing(15); self.temperature_spin = QDoubleSpinBox(); self.temperature_spin.setRange(0.0, 2.0); self.temperature_spin.setSingleStep(0.1); layout.addRow("Temperatura:", self.temperature_spin); self.max_tokens_spin = QSpinBox(); self.max_tokens_spin.setRange(1, 8192); self.max_tokens_spin.setSingleStep(128); layout.addRow("Máximo de Tokens:", self.max_tokens_spin); self.top_p_spin = QDoubleSpinBox(); self.top_p_spin.setRange(0.0, 1.0); self.top_p_spin.setSingleStep(0.05); layout.addRow("Top P:", self.top_p_spin); self.top_k_spin = QSpinBox(); self.top_k_spin.setRange(0, 100); layout.addRow("Top K:", self.top_k_spin); self.repeat_penalty_spin = QDoubleSpinBox(); self.repeat_penalty_spin.setRange(1.0, 2.0); self.repeat_penalty_spin.setSingleStep(0.1); layout.addRow("Penalidade de Repetição:", self.repeat_penalty_spin); self.auto_save_check = QCheckBox("Salvar conversas automaticamente ao fechar"); layout.addRow(self.auto_save_check); return widget
     def create_advanced_tab(self) -> QWidget:
-        widget = QWidget(); layout = QFormLayout(widget); layout.setSpacing(15); self.hf_token_input = QLineEdit(); self.hf_token_input.setEchoMode(QLineEdit.EchoMode.Password); self.hf_token_input.setToolTip("Cole aqui o seu token de acesso do Hugging Face para baixar modelos protegidos."); layout.addRow("Token Hugging Face:", self.hf_token_input); self.ollama_host_input = QLineEdit(); self.ollama_host_input.setToolTip("Endereço do servidor Ollama (se utilizado). Deixe em branco se não usar."); layout.addRow("Host Ollama:", self.ollama_host_input); self.api_port_spin = QSpinBox(); self.api_port_spin.setRange(1024, 65535); self.api_port_spin.setToolTip("Porta para a API interna (se implementada)."); layout.addRow("Porta da API:", self.api_port_spin); return widget
+        widget = QWidget(); layout = QFormLayout(widget); layout.setSpacing(15); self.hf_token_input = QLineEdit(); self.hf_token_input.setEchoMode(QLineEdit.EchoMode.Password); self.hf_token_input.setToolTip("Cole aqui o seu token de acesso do Hugging Face para baixar modelos protegidos."); layout.addRow("Token Hugging Face:", self.hf_token_input); self.ollama_host_input = QLineEdit(); self.ollama_host_input.setToolTip("Endereço do servidor Ollama (se utilizado). Deixe em branco se não usar."); layout.addRow("Host Ollama:", self.ollama_host_input); self.api_port_spin = QSpinBox(); self.api_port_spin.setRange(1024, 65535); self.api_port_spin.setToolTip("Porta da API local compatível com OpenAI (http://127.0.0.1:<porta>/v1). Vale ao reiniciar o app."); layout.addRow("Porta da API:", self.api_port_spin); self.api_enabled_check = QCheckBox("Ativar a API local compatível com OpenAI"); self.api_enabled_check.setToolTip("Permite que scripts locais usem os modelos do app. Vale ao reiniciar o app."); layout.addRow(self.api_enabled_check); self.api_key_input = QLineEdit(); self.api_key_input.setEchoMode(QLineEdit.EchoMode.Password); self.api_key_input.setToolTip("Se preenchida, as requisições à API precisam do cabeçalho 'Authorization: Bearer <chave>'."); layout.addRow("Chave da API:", self.api_key_input); return widget
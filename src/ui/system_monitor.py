@@ -129,8 +129,12 @@ class SystemMonitor(QWidget):
         app_status_layout = QVBoxLayout(app_status_group)
         self.app_process_label = QLabel("Uso do App: --")
         self.model_status_label = QLabel("Motor Ativo: Nenhum")
+        self.pool_label = QLabel("Modelos em memória: --")
+        self.generation_label = QLabel("Geração: --")
         app_status_layout.addWidget(self.app_process_label)
         app_status_layout.addWidget(self.model_status_label)
+        app_status_layout.addWidget(self.pool_label)
+        app_status_layout.addWidget(self.generation_label)
         layout.addWidget(app_status_group)
 
         layout.addStretch()
@@ -163,6 +167,15 @@ class SystemMonitor(QWidget):
                 else:
                     self.model_status_label.setText("Motor Ativo: Nenhum")
 
+            pool = self.ai_engine.get_pool_report()
+            pool_text = f"Modelos em memória: {len(pool['models'])} ({pool['used_mb']['ram']:.0f} / {pool['budgets_mb']['ram']:.0f} MB RAM)"
+            if pool['budgets_mb']['vram']:
+                pool_text += f", {pool['used_mb']['vram']:.0f} / {pool['budgets_mb']['vram']:.0f} MB VRAM"
+            self.pool_label.setText(pool_text)
+            self.pool_label.setToolTip("\n".join(f"{m['model_id']}: {m['size_mb']:.0f} MB, {m['reason']}" for m in pool['models']))
+
+            self.update_generation_info()
+
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             self.update_timer.stop()
             print("Processo do App não encontrado, parando o monitor.")
@@ -170,6 +183,33 @@ class SystemMonitor(QWidget):
             self.update_timer.stop()
             print(f"Erro no monitor do sistema, desativando: {e}")
 
+    def update_generation_info(self):
+        """Mostra a velocidade das gerações em andamento e o TTFT da última geração concluída."""
+        rings = [self.ai_engine.metrics]
+        if self.ollama_client:
+            rings.append(self.ollama_client.metrics)
+
+        live_tps = sum(ring.live_tokens_per_second() for ring in rings)
+        last_records = [ring.last() for ring in rings if ring.last() is not None]
+        last = max(last_records, key=lambda m: m.started_at + m.total_seconds, default=None)
+
+        text = f"Geração: {live_tps:.1f} tok/s"
+        if last is not None and last.ttft_seconds is not None:
+            text += f", último TTFT {1000 * last.ttft_seconds:.0f} ms"
+        self.generation_label.setText(text)
+        if last is not None:
+            tooltip = (
+                f"{last.model_id} ({last.backend}): {last.prompt_tokens} tokens de prompt "
+                f"({last.reused_prompt_tokens} do KV cache), {last.generated_tokens} gerados a "
+                f"{last.decode_tokens_per_second:.1f} tok/s, total {last.total_seconds:.2f}s, "
+                f"UI {last.consumer_seconds:.2f}s"
+            )
+            if last.speculation:
+                source = f"Rascunho {last.draft_model}" if last.draft_model else "Prompt lookup"
+                tooltip += (f"\n{source}: {100 * last.draft_acceptance_rate:.0f}% dos "
+                            f"{last.draft_tokens} tokens propostos aceitos em {last.target_steps} passos")
+            self.generation_label.setToolTip(tooltip)
+
     def format_bytes(self, bytes_value: int) -> str:
         """Formata bytes em unidades legíveis (KB, MB, GB)."""
         if bytes_value < 1024: return f"{bytes_value} B"
@@ -0,0 +1,88 @@
+"""
+Fixtures compartilhadas pelos testes
+"""
+
+import pytest
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.tiny_model import create_tiny_model
+
+TINY_MODEL_ID = "test/tiny-llama"
+
+
+@pytest.fixture(autouse=True)
+def isolated_home(tmp_path, monkeypatch):
+    """
+    Diretório home temporário: o `Config()` dos testes lê e grava config, índice de
+    modelos, cache de respostas e ajuste de threads nele, e não no ~/.sevenx_studio
+    do desenvolvedor. Subprocessos herdam o ambiente e ficam isolados também.
+    """
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("USERPROFILE", str(home))
+    return home
+
+
+@pytest.fixture
+def models_dir(tmp_path) -> Path:
+    """Diretório de modelos vazio do teste."""
+    path = tmp_path / "models"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def tiny_model(models_dir):
+    """Fábrica de modelos minúsculos em `models_dir`: tiny_model(model_id, **tamanho) retorna o diretório."""
+    pytest.importorskip("transformers")
+
+    def create(model_id: str = TINY_MODEL_ID, **kwargs) -> Path:
+        model_dir = models_dir / model_id.replace('/', '__')
+        create_tiny_model(model_dir, model_id, **kwargs)
+        return model_dir
+
+    return create
+
+
+@pytest.fixture
+def make_engine(models_dir):
+    """
+    Fábrica de `SevenXEngine` sobre `models_dir`, com configurações extras em
+    `settings` (ex.: {"engine_settings.continuous_batching": True}). Os motores são
+    encerrados no fim do teste.
+    """
+    from src.core.config import Config
+    from src.core.sevenx_engine import SevenXEngine
+
+    engines = []
+
+    def make(settings: Optional[Dict] = None) -> SevenXEngine:
+        config = Config()
+        config.set("models_directory", str(models_dir))
+        # Os testes comparam gerações reais; respostas repetidas não podem vir do cache
+        config.set("engine_settings.response_cache", False)
+        for key, value in (settings or {}).items():
+            config.set(key, value)
+        engine = SevenXEngine(config)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.cleanup()
+
+
+@pytest.fixture
+def engine(tiny_model, make_engine):
+    """Motor com o modelo minúsculo `TINY_MODEL_ID` já carregado."""
+    tiny_model()
+    engine = make_engine()
+    assert engine.load_model(TINY_MODEL_ID)
+    return engine
@@ -0,0 +1,223 @@
+"""
+Testes para a API local compatível com a OpenAI
+"""
+
+import pytest
+import http.client
+import json
+import threading
+import time
+from types import SimpleNamespace
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.api_server import ApiServer, generation_options
+from src.core.request_scheduler import RequestScheduler
+
+
+class FakeEngine:
+    """Motor que devolve as palavras da última mensagem, uma por vez (até `max_tokens`); "falhe" vira erro."""
+
+    def __init__(self, delay=0.0, scheduler=None):
+        self.config = SimpleNamespace(get=lambda key, default=None: "" if key == "ollama_host" else default)
+        self.delay = delay
+        self.scheduler = scheduler
+        self.calls = []
+        self.priorities = []
+        self.cancelled = threading.Event()
+
+    def list_installed_models(self):
+        return [SimpleNamespace(name="test/tiny-llama")]
+
+    def generate_stream(self, model_id, messages, options=None, session_id=None, cancel_token=None,
+                        priority="interactive"):
+        self.calls.append((model_id, messages, options))
+        self.priorities.append(priority)
+        ticket = self.scheduler.admit(priority, cancel_token) if self.scheduler else None
+        try:
+            words = messages[-1]["content"].split()
+            if words[:1] == ["falhe"]:
+                # Como o motor: registra a falha e entrega o texto do erro
+                cancel_token.fail("modelo corrompido")
+                yield "Erro durante a geração de texto: modelo corrompido"
+                return
+            for word in words[:(options or {}).get("max_tokens") or len(words)]:
+                time.sleep(self.delay)
+                cancel_token.record_token(checkpoint=False)
+                yield word + " "
+        finally:
+            if ticket is not None:
+                self.scheduler.release(ticket)
+            if cancel_token.is_cancelled:
+                self.cancelled.set()
+
+
+@pytest.fixture
+def server():
+    engine = FakeEngine()
+    api = ApiServer(engine, port=0)
+    assert api.start()
+    yield api
+    api.stop()
+
+
+def request(api, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(api.host, api.port, timeout=10)
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers=dict({"Content-Type": "application/json"}, **(headers or {})))
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, data
+
+
+def test_generation_options():
+    """Testar a conversão dos parâmetros da OpenAI"""
+    options = generation_options({"model": "m", "temperature": 0.2, "max_completion_tokens": 5,
+                                  "top_p": None, "n": 1})
+    assert options == {"temperature": 0.2, "max_tokens": 5}
+
+
+def test_models_and_errors(server):
+    """Testar a listagem de modelos e as respostas de erro"""
+    status, data = request(server, "GET", "/v1/models")
+    assert status == 200
+    assert [m["id"] for m in json.loads(data)["data"]] == ["test/tiny-llama"]
+
+    status, data = request(server, "POST", "/v1/chat/completions",
+                           {"model": "inexistente", "messages": [{"role": "user", "content": "oi"}]})
+    assert status == 404 and json.loads(data)["error"]["type"] == "model_not_found"
+    assert request(server, "POST", "/v1/chat/completions", {"model": "test/tiny-llama"})[0] == 400
+    assert request(server, "GET", "/v1/chat/completions")[0] == 405
+    assert request(server, "GET", "/v1/outra")[0] == 404
+
+
+def test_chat_and_text_completions(server):
+    """Testar as respostas completas de chat e de texto"""
+    status, data = request(server, "POST", "/v1/chat/completions", {
+        "model": "test/tiny-llama", "max_tokens": 8,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": "olá como vai"}]}]})
+    assert status == 200
+    payload = json.loads(data)
+    assert payload["object"] == "chat.completion"
+    assert payload["choices"][0]["message"] == {"role": "assistant", "content": "olá como vai"}
+    assert server.engine.calls[-1][2] == {"max_tokens": 8}
+    assert server.engine.priorities[-1] == "normal"
+
+    status, data = request(server, "POST", "/v1/completions", {"model": "test/tiny-llama", "prompt": "era uma vez"})
+    assert status == 200 and json.loads(data)["choices"][0]["text"] == "era uma vez"
+    assert json.loads(data)["choices"][0]["finish_reason"] == "stop"
+
+    status, data = request(server, "POST", "/v1/completions", {"model": "test/tiny-llama", "prompt": "era uma vez",
+                                                               "max_tokens": 2})
+    assert json.loads(data)["choices"][0] == {"index": 0, "text": "era uma", "logprobs": None,
+                                              "finish_reason": "length"}
+
+
+def test_generation_error_returns_server_error(server):
+    """Testar que a falha do motor vira 500, e não uma resposta com o texto do erro"""
+    body = {"model": "test/tiny-llama", "messages": [{"role": "user", "content": "falhe agora"}]}
+    for stream in (False, True):
+        status, data = request(server, "POST", "/v1/chat/completions", dict(body, stream=stream))
+        assert status == 500
+        assert json.loads(data)["error"] == {"message": "modelo corrompido", "type": "server_error", "code": 500}
+
+
+def test_rejects_other_hosts_and_origins(server):
+    """Testar a proteção contra DNS rebinding e requisições de outros sites"""
+    assert request(server, "GET", "/v1/models", headers={"Host": "ataque.example:8080"})[0] == 403
+    assert request(server, "GET", "/v1/models", headers={"Origin": "https://ataque.example"})[0] == 403
+    assert request(server, "GET", "/v1/models", headers={"Origin": "null"})[0] == 403
+    assert request(server, "GET", "/v1/models", headers={"Host": "localhost:8080",
+                                                        "Origin": "http://localhost:3000"})[0] == 200
+    assert request(server, "GET", "/v1/models", headers={"Host": "[::1]:8080"})[0] == 200
+    assert server.stats["rejected"] == 3
+
+
+def test_api_key_is_required_when_configured():
+    """Testar que, com api_key, só requisições com o Bearer certo são atendidas"""
+    api = ApiServer(FakeEngine(), port=0, api_key="segredo")
+    assert api.start()
+    try:
+        status, data = request(api, "GET", "/v1/models")
+        assert status == 401 and json.loads(data)["error"]["type"] == "invalid_api_key"
+        assert request(api, "GET", "/v1/models", headers={"Authorization": "Bearer outro"})[0] == 401
+        assert request(api, "GET", "/v1/models", headers={"Authorization": "Bearer segredo"})[0] == 200
+    finally:
+        api.stop()
+
+
+def test_chat_streaming_sse(server):
+    """Testar o streaming em Server-Sent Events"""
+    status, data = request(server, "POST", "/v1/chat/completions", {
+        "model": "test/tiny-llama", "stream": True, "messages": [{"role": "user", "content": "um dois três"}]})
+    assert status == 200
+    events = [line[len("data: "):] for line in data.decode("utf-8").split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert chunks[0]["choices"][0]["delta"] == {"role": "assistant"}
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == "um dois três "
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+def test_concurrent_streams_and_disconnect():
+    """Testar várias conexões simultâneas e o cancelamento quando o cliente desconecta"""
+    engine = FakeEngine(delay=0.05)
+    api = ApiServer(engine, port=0, max_workers=4)
+    assert api.start()
+    try:
+        results = []
+        body = {"model": "test/tiny-llama", "messages": [{"role": "user", "content": "a b c d"}]}
+        threads = [threading.Thread(target=lambda: results.append(request(api, "POST", "/v1/chat/completions", body)))
+                   for _ in range(4)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [status for status, _ in results] == [200] * 4
+        # As quatro gerações correm juntas, não uma depois da outra
+        assert time.perf_counter() - started < 4 * 4 * 0.05
+
+        connection = http.client.HTTPConnection(api.host, api.port, timeout=10)
+        long_body = dict(body, stream=True, messages=[{"role": "user", "content": "x " * 200}])
+        connection.request("POST", "/v1/chat/completions", body=json.dumps(long_body))
+        response = connection.getresponse()
+        response.fp.readline()
+        connection.close()
+        response.close()
+        assert engine.cancelled.wait(5)
+    finally:
+        api.stop()
+
+
+def test_queue_rejection_returns_retry_after():
+    """Testar que a recusa da fila de admissão vira 429 com Retry-After, com e sem streaming"""
+    engine = FakeEngine(delay=0.05, scheduler=RequestScheduler(max_concurrent=1, max_queue_depth=0))
+    api = ApiServer(engine, port=0)
+    assert api.start()
+    try:
+        body = {"model": "test/tiny-llama", "messages": [{"role": "user", "content": "x " * 20}]}
+        busy = threading.Thread(target=request, args=(api, "POST", "/v1/chat/completions", body))
+        busy.start()
+        while engine.scheduler.stats()["running"] == 0:
+            time.sleep(0.01)
+
+        for stream in (False, True):
+            connection = http.client.HTTPConnection(api.host, api.port, timeout=10)
+            connection.request("POST", "/v1/chat/completions", body=json.dumps(dict(body, stream=stream)))
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            connection.close()
+            assert response.status == 429
+            assert int(response.getheader("Retry-After")) >= 1
+            assert payload["error"]["type"] == "queue_full"
+        busy.join()
+
+        status, _ = request(api, "POST", "/v1/chat/completions", dict(body, priority="urgente"))
+        assert status == 400
+    finally:
+        api.stop()
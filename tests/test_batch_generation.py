@@ -0,0 +1,63 @@
+"""
+Testes para a geração offline em lote
+"""
+
+import pytest
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.batch_generation import make_length_buckets, left_pad, count_generated_tokens
+
+
+def test_length_buckets_group_similar_lengths():
+    """Testar agrupamento por comprimento"""
+    lengths = [5, 50, 6, 48, 7, 49]
+    buckets = make_length_buckets(lengths, batch_size=3)
+    assert buckets == [[1, 5, 3], [4, 2, 0]]
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+
+
+def test_length_buckets_respect_token_limit():
+    """Testar fechamento do lote pelo limite de tokens com padding"""
+    buckets = make_length_buckets([10, 10, 10, 10], batch_size=8, max_batch_tokens=25)
+    assert [len(bucket) for bucket in buckets] == [2, 2]
+    # Um prompt maior que o limite ainda forma o seu próprio lote
+    assert make_length_buckets([100], batch_size=8, max_batch_tokens=25) == [[0]]
+
+
+def test_left_pad():
+    """Testar padding à esquerda"""
+    pytest.importorskip("torch")
+    input_ids, attention_mask = left_pad([[1, 2, 3], [4]], pad_token_id=0)
+    assert input_ids.tolist() == [[1, 2, 3], [0, 0, 4]]
+    assert attention_mask.tolist() == [[1, 1, 1], [0, 0, 1]]
+
+
+def test_count_generated_tokens():
+    """Testar contagem de tokens até o EOS"""
+    assert count_generated_tokens([5, 6, 2, 0, 0], [2]) == 3
+    assert count_generated_tokens([5, 6, 7], [2]) == 3
+
+
+def test_engine_generate_batch_matches_single_generation(engine):
+    """Testar que o lote gera o mesmo texto que a geração isolada, na ordem de entrada"""
+    prompts = ["olá", "qual é a capital do brasil hoje", "sim",
+               [{"role": "system", "content": "obrigado"}, {"role": "user", "content": "como você está"}],
+               "tudo bem"]
+    options = {"max_new_tokens": 6, "do_sample": False}
+    expected = [engine.generate_response("test/tiny-llama", p if isinstance(p, list) else
+                                         [{"role": "user", "content": p}], options) for p in prompts]
+
+    results = engine.generate_batch("test/tiny-llama", prompts, options, batch_size=2)
+    assert [r.index for r in results] == list(range(len(prompts)))
+    assert [r.text for r in results] == expected
+    assert all(r.error is None and r.generation_seconds > 0 for r in results)
+    assert len({r.batch_id for r in results}) == 3
+
+    streamed = list(engine.generate_batch_stream("test/tiny-llama", prompts, options, batch_size=2))
+    # O streaming produz os lotes do mais longo para o mais curto
+    assert streamed[0].index == 1
+    assert sorted(r.text for r in streamed) == sorted(expected)
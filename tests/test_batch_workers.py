@@ -0,0 +1,81 @@
+"""
+Testes para o pool de processos de geração em lote
+"""
+
+import pytest
+import json
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.batch_workers import partition_cpus, read_prompts_jsonl, run_jsonl
+from src.core.benchmark import compare_results
+from src.core.thread_tuning import cpu_topology
+
+# Dois nós NUMA com 4 núcleos físicos cada; 8-15 são os irmãos hyperthread
+TOPOLOGY = {"logical": list(range(16)), "physical": list(range(8)),
+            "numa": {0: [0, 1, 2, 3, 8, 9, 10, 11], 1: [4, 5, 6, 7, 12, 13, 14, 15]}}
+
+
+def test_partition_cpus():
+    """Testar que cada processo recebe CPUs disjuntas, sem atravessar nós NUMA"""
+    chunks = partition_cpus(4, TOPOLOGY)
+    assert chunks == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    # Número de processos que não divide os nós: fatias contíguas dos núcleos físicos
+    assert partition_cpus(3, TOPOLOGY) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    # Mais processos que núcleos físicos: passa a usar as CPUs lógicas
+    wide = partition_cpus(16, TOPOLOGY)
+    assert sorted(cpu for chunk in wide for cpu in chunk) == list(range(16))
+    with pytest.raises(ValueError):
+        partition_cpus(17, TOPOLOGY)
+    with pytest.raises(ValueError):
+        partition_cpus(0, TOPOLOGY)
+
+
+def test_read_prompts_jsonl():
+    """Testar a leitura de prompts em texto, objeto com prompt e objeto com mensagens"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "prompts.jsonl"
+        path.write_text('"olá"\n\n{"id": "a", "prompt": "tudo bem"}\n'
+                        '{"messages": [{"role": "user", "content": "oi"}]}\n', encoding='utf-8')
+        assert list(read_prompts_jsonl(path)) == [
+            (None, "olá"), ("a", "tudo bem"), (None, [{"role": "user", "content": "oi"}])
+        ]
+        path.write_text('{"id": 1}\n', encoding='utf-8')
+        with pytest.raises(ValueError):
+            list(read_prompts_jsonl(path))
+
+
+def test_compare_results_flags_scaling_regression():
+    """Testar que a queda de vazão na curva de escala aparece como regressão"""
+    baseline = {"scaling": [{"workers": 1, "tokens_per_second": 100.0}, {"workers": 2, "tokens_per_second": 180.0}]}
+    current = {"scaling": [{"workers": 1, "tokens_per_second": 98.0}, {"workers": 2, "tokens_per_second": 120.0}]}
+    regressions = compare_results(baseline, current, tolerance=0.1)
+    assert len(regressions) == 1
+    assert "2 processos" in regressions[0]
+
+
+def test_pool_results_in_input_order(tiny_model, models_dir, tmp_path):
+    """Testar que dois processos com o modelo minúsculo devolvem os resultados na ordem de entrada"""
+    if len(cpu_topology()["logical"]) < 2:
+        pytest.skip("São necessárias ao menos 2 CPUs")
+    tiny_model()
+    input_path = tmp_path / "prompts.jsonl"
+    with open(input_path, 'w', encoding='utf-8') as f:
+        for index in range(10):
+            f.write(json.dumps({"id": f"p{index}", "prompt": "olá " * (index + 1)}) + "\n")
+    output_path = tmp_path / "respostas.jsonl"
+
+    stats = run_jsonl(input_path, output_path, "test/tiny-llama", workers=2,
+                      options={"max_new_tokens": 3, "do_sample": False}, batch_size=2, shard_size=2,
+                      settings={"models_directory": str(models_dir)})
+    records = [json.loads(line) for line in output_path.read_text(encoding='utf-8').splitlines()]
+    assert [record["id"] for record in records] == [f"p{index}" for index in range(10)]
+    assert [record["index"] for record in records] == list(range(10))
+    assert all("error" not in record for record in records)
+    assert stats["prompts"] == 10 and stats["workers"] == 2
+    assert sum(stats["busy_seconds"]) > 0
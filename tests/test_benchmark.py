@@ -0,0 +1,59 @@
+"""
+Testes para a suíte de benchmark de inferência
+"""
+
+import pytest
+import json
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.benchmark import compare_results, percentiles
+
+
+def test_percentiles():
+    """Testar resumo estatístico com interpolação"""
+    summary = percentiles([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    assert summary["p50"] == 5.5
+    assert summary["max"] == 10
+    assert percentiles([])["p90"] == 0.0
+
+
+def test_compare_results_flags_regressions():
+    """Testar detecção de regressões entre execuções"""
+    scenario = {"dtype": "float32", "threads": 4, "batch_size": 1, "load_seconds": 1.0,
+                "ttft_ms": {"p50": 10.0}, "itl_ms": {"p50": 5.0}, "tokens_per_second": 100.0,
+                "offline_tokens_per_second": 200.0, "peak_rss_mb": 500}
+    slower = dict(scenario, tokens_per_second=70.0, ttft_ms={"p50": 10.5})
+    baseline, current = {"scenarios": [scenario]}, {"scenarios": [slower]}
+
+    regressions = compare_results(baseline, current, tolerance=0.1)
+    assert len(regressions) == 1
+    assert "tokens_per_second" in regressions[0]
+    assert compare_results(baseline, baseline) == []
+
+
+def test_benchmark_cli_writes_json():
+    """Testar uma execução curta da CLI com o modelo minúsculo"""
+    pytest.importorskip("transformers")
+    from src.core.benchmark import main
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir) / "resultado.json"
+        args = ["--batch-sizes", "1,2", "--max-new-tokens", "4", "--repeats", "1", "--prompt-words", "4",
+                "--output", str(output)]
+        assert main(args) == 0
+
+        results = json.loads(output.read_text(encoding="utf-8"))
+        assert [s["batch_size"] for s in results["scenarios"]] == [1, 2]
+        for scenario in results["scenarios"]:
+            assert "error" not in scenario
+            assert scenario["load_seconds"] > 0
+            assert scenario["ttft_ms"]["p50"] > 0
+            assert scenario["tokens_per_second"] > 0
+            assert scenario["generated_tokens"] == 4 * scenario["batch_size"]
+        assert "torch" in results["environment"]
@@ -0,0 +1,66 @@
+"""
+Testes para o armazenamento de modelos por conteúdo
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.blob_store import MANIFEST_FILE, BlobStore, file_sha256
+
+
+def make_model(models_dir: Path, model_id: str, files: dict) -> Path:
+    model_dir = models_dir / model_id.replace('/', '__')
+    for name, content in files.items():
+        (model_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        (model_dir / name).write_bytes(content)
+    (model_dir / "_sevenx_info.json").write_text(json.dumps({"model_id": model_id}))
+    return model_dir
+
+
+def test_identical_files_are_stored_once():
+    """Testar que arquivos iguais de dois modelos viram o mesmo blob e o manifesto é gravado"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        models_dir = Path(temp_dir)
+        shared = os.urandom(4096)
+        base = make_model(models_dir, "org/base", {"tokenizer.json": shared, "model.safetensors": b"a" * 1000})
+        tuned = make_model(models_dir, "org/tuned", {"tokenizer.json": shared, "model.safetensors": b"b" * 1000})
+        store = BlobStore(models_dir)
+
+        store.link_model(base)
+        manifest = store.link_model(tuned)
+        assert manifest["tokenizer.json"] == file_sha256(tuned / "tokenizer.json")
+        assert json.loads((tuned / MANIFEST_FILE).read_text()) == manifest
+        assert "_sevenx_info.json" not in manifest
+        assert os.path.samefile(base / "tokenizer.json", tuned / "tokenizer.json")
+        assert not os.path.samefile(base / "model.safetensors", tuned / "model.safetensors")
+        assert (tuned / "tokenizer.json").read_bytes() == shared
+
+        stats = store.stats()
+        assert stats["blobs"] == 3 and stats["saved_bytes"] == len(shared)
+
+        # Um arquivo já guardado pode ser recriado sem baixar
+        assert store.materialize(manifest["tokenizer.json"], models_dir / "org__outro" / "tokenizer.json")
+        assert not store.materialize("0" * 64, models_dir / "org__outro" / "config.json")
+
+
+def test_delete_model_collects_unused_blobs(models_dir, make_engine):
+    """Testar que remover um modelo apaga só os blobs que nenhum outro modelo usa"""
+    shared = os.urandom(2048)
+    make_model(models_dir, "org/base", {"tokenizer.json": shared, "model.safetensors": b"a" * 1000})
+    tuned = make_model(models_dir, "org/tuned", {"tokenizer.json": shared, "model.safetensors": b"b" * 1000})
+    engine = make_engine()
+
+    assert engine.deduplicate_models()["blobs"] == 3
+    assert engine.delete_model("org/base")
+    assert engine.blob_store.stats()["blobs"] == 2
+    assert (tuned / "tokenizer.json").read_bytes() == shared
+    assert [m.name for m in engine.list_installed_models()] == ["org/tuned"]
+
+    assert engine.delete_model("org/tuned")
+    assert engine.blob_store.stats()["blobs"] == 0
@@ -0,0 +1,107 @@
+"""
+Testes para o cancelamento cooperativo de gerações
+"""
+
+import pytest
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.cancellation import CancellationToken
+
+
+def test_token_counts_wasted_tokens():
+    """Testar contagem de tokens produzidos após o cancelamento"""
+    token = CancellationToken()
+    assert token.record_token() is False
+    token.cancel()
+    assert token.is_cancelled
+    assert token.record_token() is True
+    assert token.generated_tokens == 2
+    assert token.wasted_tokens == 1
+
+
+def test_stopping_criteria_ignores_speculative_candidates():
+    """Testar que a checagem dos candidatos (sem scores) não conta tokens, só a sequência verificada"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.core.cancellation import CancellationStoppingCriteria
+
+    token = CancellationToken()
+    criteria = CancellationStoppingCriteria(token, prompt_length=5)
+    scores = torch.zeros(1, 10)
+    assert not criteria(torch.zeros(1, 6, dtype=torch.long), scores).any()
+    # Quatro candidatos propostos, dois aceitos mais o token do alvo
+    assert not criteria(torch.zeros(1, 10, dtype=torch.long), None).any()
+    assert not criteria(torch.zeros(1, 9, dtype=torch.long), scores).any()
+    assert token.generated_tokens == 4
+    token.cancel()
+    assert criteria(torch.zeros(1, 13, dtype=torch.long), None).all()
+
+
+@pytest.mark.parametrize("batching", [False, True])
+def test_engine_stops_generation_on_cancel(batching, tiny_model, make_engine):
+    """Testar que cancelar interrompe o loop de decodificação no passo seguinte"""
+    tiny_model()
+    engine = make_engine({"engine_settings.continuous_batching": batching})
+
+    token = CancellationToken()
+    options = {"max_new_tokens": 200, "do_sample": False, "eos_token_id": -1}
+    stream = engine.generate_stream("test/tiny-llama", [{"role": "user", "content": "olá"}], options,
+                                    cancel_token=token)
+    for received, _ in enumerate(stream):
+        if received == 2:
+            token.cancel()
+            break
+    stream.close()
+
+    assert token.generated_tokens < 200
+    assert engine.generation_stats["cancelled"] == 1
+    assert engine.generation_stats["wasted_tokens"] == token.wasted_tokens
+
+
+class FakeGGUFModel:
+    """Modelo GGUF de mentira: tokens são palavras; cancela o token ou falha no passo pedido."""
+    context_length = 512
+
+    def __init__(self, cancel_token=None, cancel_at=None, fail=False):
+        self.cancel_token, self.cancel_at, self.fail = cancel_token, cancel_at, fail
+
+    def tokenize(self, text):
+        return text.split()
+
+    def detokenize(self, tokens):
+        return " ".join(tokens)
+
+    def __call__(self, prompt, stream=True, **opts):
+        if self.fail:
+            raise RuntimeError("falha no modelo")
+        for index in range(opts["max_new_tokens"]):
+            if index == self.cancel_at:
+                self.cancel_token.cancel()
+            yield "a "
+
+
+def test_cancellation_counted_once_by_token_owner(make_engine):
+    """Testar que um job em lote cancelado no meio de um prompt conta um único cancelamento"""
+    token = CancellationToken()
+    engine = make_engine()
+    engine.model_pool.add("fake/gguf", {"type": "gguf", "model": FakeGGUFModel(token, cancel_at=2)}, 0, "cpu")
+    results = engine.generate_batch("fake/gguf", ["um", "dois", "três"], {"max_new_tokens": 8}, cancel_token=token)
+    assert results[1:] == [None, None]
+    assert engine.generation_stats["cancelled"] == 1
+    assert engine.generation_stats["wasted_tokens"] == token.wasted_tokens
+
+
+def test_generation_error_is_not_a_cancellation(make_engine):
+    """Testar que um erro de geração não cancela o token nem conta como cancelamento"""
+    token = CancellationToken()
+    engine = make_engine()
+    engine.model_pool.add("fake/gguf", {"type": "gguf", "model": FakeGGUFModel(fail=True)}, 0, "cpu")
+    text = "".join(engine.generate_stream("fake/gguf", [{"role": "user", "content": "olá"}],
+                                          {"max_new_tokens": 4}, cancel_token=token))
+    assert text.startswith("Erro durante a geração de texto")
+    assert not token.is_cancelled
+    assert engine.generation_stats["cancelled"] == 0
@@ -0,0 +1,142 @@
+"""
+Testes para o gerenciamento da janela de contexto
+"""
+
+import pytest
+import struct
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.context_window import ContextWindowManager, get_context_length, read_gguf_metadata
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_conversation(turns, words_per_message=10):
+    messages = [{"role": "system", "content": "seja breve"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": " ".join([f"p{i}"] * words_per_message)})
+        messages.append({"role": "assistant", "content": " ".join([f"r{i}"] * words_per_message)})
+    messages.append({"role": "user", "content": "última pergunta"})
+    return messages
+
+
+def test_fit_keeps_system_and_latest_message():
+    """Testar que o sistema e a última mensagem sempre ficam"""
+    manager = ContextWindowManager()
+    messages = make_conversation(5)
+
+    fitted = manager.fit("m", messages, budget=40, count_fn=count_words, per_message_overhead=0)
+    assert fitted[0] == messages[0]
+    assert fitted[-1] == messages[-1]
+    assert sum(count_words(m["content"]) for m in fitted) <= 40
+    # O histórico mantido recomeça em uma mensagem do usuário
+    assert fitted[1]["role"] == "user"
+    assert manager.stats["dropped_messages"] == len(messages) - len(fitted)
+
+
+def test_fit_keeps_everything_when_it_fits():
+    """Testar que nada é descartado quando há espaço"""
+    manager = ContextWindowManager()
+    messages = make_conversation(2)
+    assert manager.fit("m", messages, budget=1000, count_fn=count_words) == messages
+
+
+def test_session_cut_point_is_stable():
+    """Testar que o início do prompt de uma sessão só muda quando o orçamento estoura"""
+    manager = ContextWindowManager(low_water=0.5)
+    messages = make_conversation(5)
+    first = manager.fit("m", messages, budget=60, count_fn=count_words, session_id="s", per_message_overhead=0)
+
+    # O turno seguinte ainda cabe graças à folga do nível baixo: mesmo corte
+    messages += [{"role": "assistant", "content": "ok"}, {"role": "user", "content": "e agora"}]
+    second = manager.fit("m", messages, budget=60, count_fn=count_words, session_id="s", per_message_overhead=0)
+    assert second[:len(first) - 1] == first[:-1]
+
+    manager.reset_session("s")
+    third = manager.fit("m", messages, budget=1000, count_fn=count_words, session_id="s")
+    assert third == messages
+
+
+def test_token_counts_are_cached():
+    """Testar que cada mensagem é tokenizada uma única vez"""
+    calls = []
+
+    def counting(text):
+        calls.append(text)
+        return count_words(text)
+
+    manager = ContextWindowManager()
+    messages = make_conversation(3)
+    manager.fit("m", messages, budget=1000, count_fn=counting)
+    manager.fit("m", messages + [{"role": "assistant", "content": "nova"}], budget=1000, count_fn=counting)
+    assert len(calls) == len(messages) + 1
+
+
+def write_gguf(path: Path, metadata):
+    """Grava um cabeçalho GGUF v3 mínimo com os metadados informados."""
+    def string(value):
+        data = value.encode("utf-8")
+        return struct.pack("<Q", len(data)) + data
+
+    body = b""
+    for key, (value_type, value) in metadata.items():
+        body += string(key) + struct.pack("<I", value_type)
+        if value_type == 8:
+            body += string(value)
+        elif value_type == 9:
+            body += struct.pack("<IQ", 5, len(value)) + b"".join(struct.pack("<i", v) for v in value)
+        else:
+            body += struct.pack("<I", value)
+    path.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, len(metadata)) + body)
+
+
+def test_read_gguf_metadata():
+    """Testar leitura do contexto de treino de um arquivo GGUF"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "model.gguf"
+        write_gguf(path, {
+            "general.architecture": (8, "llama"),
+            "tokenizer.ggml.token_type": (9, [1, 1, 3]),
+            "llama.context_length": (4, 8192),
+        })
+        metadata = read_gguf_metadata(path)
+        assert metadata == {"general.architecture": "llama", "llama.context_length": 8192}
+        assert read_gguf_metadata(Path(temp_dir) / "inexistente.gguf") == {}
+
+
+def test_get_context_length_from_config():
+    """Testar descoberta do contexto pelo config do modelo"""
+    class Model:
+        class config:
+            max_position_embeddings = 4096
+
+    assert get_context_length({"model": Model(), "type": "transformers"}) == 4096
+    assert get_context_length({"context_length": 1024}) == 1024
+    assert get_context_length({"model": object(), "type": "transformers"}, default=512) == 512
+
+
+def test_engine_fits_long_history(engine):
+    """Testar que o motor descarta turnos antigos em vez de cortar o fim do prompt"""
+    model_data = engine.loaded_models["test/tiny-llama"]
+
+    messages = [{"role": "system", "content": "sim"}]
+    for _ in range(40):
+        messages.append({"role": "user", "content": "olá como você está hoje"})
+        messages.append({"role": "assistant", "content": "tudo bem obrigado"})
+    messages.append({"role": "user", "content": "qual é a capital do brasil"})
+
+    kwargs = engine._prepare_transformers_generation("test/tiny-llama", model_data, messages,
+                                                     {"max_new_tokens": 16}, None)
+    prompt = model_data["tokenizer"].decode(kwargs["input_ids"][0])
+    assert kwargs["input_ids"].shape[1] + kwargs["max_new_tokens"] <= 256
+    assert prompt.startswith("<unk> sim </s> user")
+    assert prompt.rstrip().endswith("qual é a capital do brasil </s> assistant")
+    assert engine.context_window.stats["dropped_messages"] > 0
@@ -0,0 +1,186 @@
+"""
+Testes para o daemon de inferência e o cliente DaemonEngine
+"""
+
+import pytest
+import socket
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.cancellation import CancellationToken
+from src.core.daemon import (TOKEN, DaemonClient, DaemonEngine, DaemonError, DaemonServer, UNIX_SOCKETS,
+                             recv_frame, send_frame)
+from src.core.request_scheduler import QueueFull, RequestScheduler
+from src.core.sevenx_engine import ModelInfo
+
+
+class FakeEngine:
+    """Motor que devolve as palavras da última mensagem e registra as chamadas."""
+
+    def __init__(self):
+        self.model_pool = {}
+        self.request_scheduler = RequestScheduler()
+        self.priorities = []
+        self.cancelled = threading.Event()
+
+    def generate_stream(self, model_id, messages, options=None, session_id=None, cancel_token=None,
+                        priority="interactive"):
+        self.priorities.append(priority)
+        try:
+            for word in messages[-1]["content"].split():
+                if cancel_token.record_token():
+                    break
+                time.sleep(0.01)
+                yield word + " "
+        finally:
+            if cancel_token.is_cancelled:
+                self.cancelled.set()
+
+    def generate_response(self, model_id, messages, options=None, session_id=None, cancel_token=None,
+                          priority="interactive"):
+        raise QueueFull("Fila de geração cheia (3 pedidos à frente).", 7)
+
+    def load_model(self, model_id, force_reload=False, progress_callback=None, cancel_token=None):
+        progress_callback(50, "Carregando pesos...")
+        self.model_pool[model_id] = {}
+        return True
+
+    def get_pool_report(self):
+        return {"models": [{"model_id": model_id} for model_id in self.model_pool]}
+
+    def list_installed_models(self):
+        return [ModelInfo("test/tiny-llama", 10, "/tmp/x", "2024-01-01", {"format": "gguf"})]
+
+
+@pytest.fixture
+def daemon():
+    if not UNIX_SOCKETS:
+        pytest.skip("Sockets Unix indisponíveis")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        engine = FakeEngine()
+        server = DaemonServer(engine, os.path.join(temp_dir, "d.sock"))
+        server.start()
+        config = SimpleNamespace(get=lambda key, default=None: default)
+        client = DaemonEngine(config, address=server.address)
+        yield engine, server, client
+        client.cleanup()
+        server.stop()
+
+
+def test_stream_and_calls(daemon):
+    """Testar o streaming de tokens, chamadas com progresso e a reconstrução dos resultados"""
+    engine, server, client = daemon
+    token = CancellationToken()
+    pieces = list(client.generate_stream("test/tiny-llama", [{"role": "user", "content": "um dois três"}],
+                                         cancel_token=token, priority="normal"))
+    assert pieces == ["um ", "dois ", "três "]
+    assert token.generated_tokens == 3
+    assert engine.priorities == ["normal"]
+    assert client.metrics.last().ttft_seconds is not None
+
+    progress = []
+    assert client.load_model("test/tiny-llama", progress_callback=lambda *args: progress.append(args)) is True
+    assert progress == [(50, "Carregando pesos...")]
+    assert client.loaded_models["test/tiny-llama"]
+    models = client.list_installed_models()
+    assert isinstance(models[0], ModelInfo) and models[0].details == {"format": "gguf"}
+    assert client.status()["loaded_models"] == ["test/tiny-llama"]
+
+
+def test_remote_errors(daemon):
+    """Testar que recusas da fila chegam ao cliente com o mesmo tipo e o retry_after"""
+    _, _, client = daemon
+    with pytest.raises(QueueFull) as rejected:
+        client.generate_response("test/tiny-llama", [{"role": "user", "content": "oi"}])
+    assert rejected.value.retry_after == 7
+    with pytest.raises(DaemonError):
+        client.client.call("nao_existe")
+
+
+def test_client_disconnect_cancels_generation(daemon):
+    """Testar que parar de consumir o stream cancela a geração no daemon"""
+    engine, server, client = daemon
+    stream = client.generate_stream("test/tiny-llama", [{"role": "user", "content": "x " * 500}])
+    assert next(stream) == "x "
+    stream.close()
+    assert engine.cancelled.wait(5)
+
+    # Conexão crua: o protocolo é de quadros com tipo e tamanho
+    engine.cancelled.clear()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(server.address)
+    send_frame(sock, b"C", b'{"method": "generate_stream", "kwargs": {"model_id": "m", '
+                           b'"messages": [{"role": "user", "content": "a b c d e f g h"}]}}')
+    assert recv_frame(sock) == (TOKEN, b"a ")
+    sock.close()
+    assert engine.cancelled.wait(5)
+    assert server.stats["cancelled"] == 2
+
+
+def test_unix_socket_is_private(tmp_path):
+    """Testar que o socket e o diretório criado para ele só são acessíveis ao usuário"""
+    if not UNIX_SOCKETS:
+        pytest.skip("Sockets Unix indisponíveis")
+    path = tmp_path / "novo" / "d.sock"
+    server = DaemonServer(FakeEngine(), str(path))
+    server.start()
+    try:
+        assert path.stat().st_mode & 0o777 == 0o600
+        assert path.parent.stat().st_mode & 0o777 == 0o700
+        assert server.status()["active"] == 0
+    finally:
+        server.stop()
+
+
+def test_stale_socket_is_replaced():
+    """Testar que um socket que sobrou de um daemon encerrado é substituído e um ativo não"""
+    if not UNIX_SOCKETS:
+        pytest.skip("Sockets Unix indisponíveis")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "d.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        server = DaemonServer(FakeEngine(), path)
+        server.start()
+        try:
+            with pytest.raises(DaemonError):
+                DaemonServer(FakeEngine(), path).start()
+        finally:
+            server.stop()
+        assert not os.path.exists(path)
+
+
+def test_tcp_requires_token(tmp_path):
+    """Testar que o daemon por TCP só atende quem apresenta o token do arquivo privado"""
+    token_path = tmp_path / "daemon.token"
+    server = DaemonServer(FakeEngine(), ("127.0.0.1", 0), token_path)
+    with pytest.raises(DaemonError):
+        DaemonServer(FakeEngine(), ("127.0.0.1", 0)).start()
+    server.start()
+    try:
+        if os.name == "posix":
+            assert token_path.stat().st_mode & 0o777 == 0o600
+        config = SimpleNamespace(get=lambda key, default=None: default)
+        client = DaemonEngine(config, address=server.address, token_path=token_path)
+        assert client.client.ping()
+        assert client.load_model("test/tiny-llama")
+        client.cleanup()
+
+        for token_file in (None, tmp_path / "outro.token"):
+            if token_file is not None:
+                token_file.write_text("0" * 64)
+            intruder = DaemonClient(server.address, token_file)
+            assert not intruder.ping()
+            with pytest.raises(DaemonError):
+                intruder.call("load_model", model_id="test/tiny-llama")
+    finally:
+        server.stop()
+    assert not token_path.exists()
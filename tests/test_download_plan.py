@@ -0,0 +1,68 @@
+"""
+Testes para a escolha dos arquivos a baixar de um repositório
+"""
+
+import pytest
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.download_plan import gguf_quantization, plan_download
+
+GB = 1024 ** 3
+
+
+def test_transformers_plan_keeps_one_weights_format():
+    """Testar que só os shards safetensors, a configuração e o tokenizer são baixados"""
+    siblings = {
+        "config.json": 700, "tokenizer.json": 2_000_000, "tokenizer_config.json": 900, "README.md": 5000,
+        "model-00001-of-00002.safetensors": 5 * GB, "model-00002-of-00002.safetensors": 2 * GB,
+        "model.safetensors.index.json": 30_000, "consolidated.safetensors": 7 * GB,
+        "pytorch_model-00001-of-00002.bin": 5 * GB, "pytorch_model-00002-of-00002.bin": 2 * GB,
+        "pytorch_model.bin.index.json": 30_000, "tf_model.h5": 7 * GB, "flax_model.msgpack": 7 * GB,
+        "onnx/model.onnx": 7 * GB, "onnx/config.json": 700, "original/consolidated.00.pth": 7 * GB,
+    }
+    plan = plan_download(siblings)
+    assert plan.format == "safetensors"
+    assert set(plan.files) == {"config.json", "tokenizer.json", "tokenizer_config.json", "README.md",
+                               "model-00001-of-00002.safetensors", "model-00002-of-00002.safetensors",
+                               "model.safetensors.index.json"}
+    assert 7 * GB < plan.total_size < 7 * GB + 3_000_000
+    assert plan.skipped_size > 5 * plan.total_size
+
+    legacy = plan_download({"config.json": 1, "pytorch_model.bin": 10, "training_args.bin": 1, "tf_model.h5": 10})
+    assert legacy.format == "pytorch" and set(legacy.files) == {"config.json", "pytorch_model.bin"}
+
+
+def test_gguf_quantization_names():
+    """Testar a leitura da quantização nos nomes dos arquivos GGUF"""
+    assert gguf_quantization("llama-2-7b-chat.Q4_K_M.gguf") == "Q4_K_M"
+    assert gguf_quantization("qwen2-7b-instruct-q8_0.gguf") == "Q8_0"
+    assert gguf_quantization("Model-IQ4_XS-00001-of-00002.gguf") == "IQ4_XS"
+    assert gguf_quantization("phi-3-mini-f16.gguf") == "F16"
+    assert gguf_quantization("modelo.gguf") is None
+
+
+def test_gguf_plan_picks_one_quantization():
+    """Testar a quantização pedida, a escolha automática pela RAM e os modelos divididos"""
+    siblings = {
+        "README.md": 1000, "config.json": 500, "mmproj-model-f16.gguf": GB,
+        "model.Q2_K.gguf": 3 * GB, "model.Q4_K_M.gguf": 4 * GB, "model.Q8_0.gguf": 7 * GB,
+        "model-F16-00001-of-00002.gguf": 7 * GB, "model-F16-00002-of-00002.gguf": 7 * GB,
+    }
+    plan = plan_download(siblings, memory_budget=16 * GB)
+    assert plan.quantization == "Q4_K_M"
+    assert set(plan.files) == {"README.md", "config.json", "model.Q4_K_M.gguf"}
+    assert plan.quantizations["F16"] == 14 * GB
+
+    assert plan_download(siblings, memory_budget=4 * GB).quantization == "Q2_K"
+    too_small = plan_download(siblings, memory_budget=GB)
+    assert too_small.quantization == "Q2_K" and not too_small.fits_in_memory
+
+    chosen = plan_download(siblings, quantization="f16", memory_budget=16 * GB)
+    assert {"model-F16-00001-of-00002.gguf", "model-F16-00002-of-00002.gguf"} <= set(chosen.files)
+    assert chosen.total_size == 14 * GB + 1500 and not chosen.fits_in_memory
+    with pytest.raises(ValueError):
+        plan_download(siblings, quantization="Q5_K_M")
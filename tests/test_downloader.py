@@ -0,0 +1,141 @@
+"""
+Testes para o download paralelo e retomável em pedaços
+"""
+
+import pytest
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.cancellation import CancellationToken
+from src.core.downloader import ChunkedDownloader, DownloadCancelled, DownloadError, DownloadFile
+
+MB = 1024 * 1024
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Servidor de arquivos com HEAD e Range, que pode derrubar a conexão uma vez."""
+    files = {}
+    drop_once = set()
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status, length, extra=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, len(self.files[self.path]))
+
+    def do_GET(self):
+        data = self.files[self.path]
+        byte_range = self.headers.get("Range")
+        self.requests.append((self.path, byte_range))
+        start, end = 0, len(data)
+        if byte_range:
+            first, _, last = byte_range[len("bytes="):].partition('-')
+            start, end = int(first), int(last) + 1
+            self._send_headers(206, end - start, {"Content-Range": f"bytes {start}-{end - 1}/{len(data)}"})
+        else:
+            self._send_headers(200, len(data))
+        if (self.path, start) in self.drop_once:
+            # Manda metade do pedaço e cai
+            self.drop_once.discard((self.path, start))
+            self.wfile.write(data[start:start + (end - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:end])
+
+
+@pytest.fixture
+def server():
+    RangeHandler.files = {
+        "/model.bin": os.urandom(3 * MB + 123),
+        "/config.json": b'{"model_type": "llama"}',
+    }
+    RangeHandler.drop_once = set()
+    RangeHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def file_list(base_url, **overrides):
+    weights = RangeHandler.files["/model.bin"]
+    return [
+        DownloadFile("model.bin", f"{base_url}/model.bin", overrides.get("size", len(weights)),
+                     overrides.get("sha256", hashlib.sha256(weights).hexdigest())),
+        DownloadFile("config.json", f"{base_url}/config.json"),
+    ]
+
+
+def test_parallel_chunked_download(server):
+    """Testar o download em pedaços, o progresso em bytes e que arquivos completos são pulados"""
+    progress = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        downloader = ChunkedDownloader(max_workers=3, chunk_size=MB)
+        downloader.download(file_list(server), temp_dir, lambda *args: progress.append(args))
+
+        assert (Path(temp_dir) / "model.bin").read_bytes() == RangeHandler.files["/model.bin"]
+        assert (Path(temp_dir) / "config.json").read_bytes() == RangeHandler.files["/config.json"]
+        assert not list(Path(temp_dir).glob("*.part*"))
+        assert sum(1 for path, byte_range in RangeHandler.requests if path == "/model.bin" and byte_range) == 4
+        total = len(RangeHandler.files["/model.bin"]) + len(RangeHandler.files["/config.json"])
+        assert progress[-1][:2] == (total, total)
+
+        RangeHandler.requests.clear()
+        downloader.download(file_list(server), temp_dir)
+        assert RangeHandler.requests == []
+
+
+def test_download_resumes_after_dropped_connection(server):
+    """Testar que uma conexão derrubada é retomada e só o pedaço perdido é buscado de novo"""
+    RangeHandler.drop_once = {("/model.bin", MB)}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        downloader = ChunkedDownloader(max_workers=2, chunk_size=MB, retries=1)
+        with pytest.raises(DownloadError):
+            downloader.download(file_list(server), temp_dir)
+        assert not (Path(temp_dir) / "model.bin").exists()
+        assert (Path(temp_dir) / "model.bin.part.json").exists()
+
+        RangeHandler.requests.clear()
+        downloader.download(file_list(server), temp_dir)
+        assert (Path(temp_dir) / "model.bin").read_bytes() == RangeHandler.files["/model.bin"]
+        assert ("/model.bin", f"bytes={MB}-{2 * MB - 1}") in RangeHandler.requests
+        assert ("/model.bin", "bytes=0-1048575") not in RangeHandler.requests
+
+
+def test_sha256_mismatch_discards_file(server):
+    """Testar que um arquivo com sha256 diferente não recebe o nome final"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        downloader = ChunkedDownloader(chunk_size=MB, retries=1)
+        with pytest.raises(DownloadError, match="sha256"):
+            downloader.download(file_list(server, sha256="0" * 64), temp_dir)
+        assert not (Path(temp_dir) / "model.bin").exists()
+        assert not (Path(temp_dir) / "model.bin.part").exists()
+
+
+def test_cancelled_download(server):
+    """Testar que um token cancelado interrompe o download"""
+    token = CancellationToken()
+    token.cancel()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with pytest.raises(DownloadCancelled):
+            ChunkedDownloader(chunk_size=MB).download(file_list(server), temp_dir, cancel_token=token)
+        assert not (Path(temp_dir) / "model.bin").exists()
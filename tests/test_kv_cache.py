@@ -0,0 +1,97 @@
+"""
+Testes para o reaproveitamento do KV cache entre turnos
+"""
+
+import pytest
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.kv_cache import KVCacheStore, common_prefix_length
+
+
+class FakeCache:
+    """Cache mínimo com a mesma interface de corte do DynamicCache."""
+
+    def __init__(self, length):
+        self.length = length
+
+    def get_seq_length(self):
+        return self.length
+
+    def crop(self, max_length):
+        self.length = self.length + max_length if max_length < 0 else max_length
+
+
+def test_common_prefix_length():
+    """Testar cálculo do prefixo comum"""
+    assert common_prefix_length([1, 2, 3], [1, 2, 4]) == 2
+    assert common_prefix_length([1, 2], [1, 2, 3]) == 2
+    assert common_prefix_length([], [1]) == 0
+    assert common_prefix_length([5], [1]) == 0
+
+
+def test_store_crops_to_common_prefix():
+    """Testar que o checkout corta o cache no prefixo comum"""
+    store = KVCacheStore()
+    store.checkin("m", "s", [1, 2, 3, 4, 5], FakeCache(5))
+
+    past, reused = store.checkout("m", "s", [1, 2, 3, 9, 9])
+    assert reused == 3
+    assert past.get_seq_length() == 3
+    # O cache sai do store durante a geração
+    assert len(store) == 0
+
+
+def test_store_keeps_one_token_for_prefill():
+    """Testar que ao menos um token do prompt é reprocessado"""
+    store = KVCacheStore()
+    store.checkin("m", "s", [1, 2, 3], FakeCache(3))
+
+    past, reused = store.checkout("m", "s", [1, 2, 3])
+    assert reused == 2
+    assert past.get_seq_length() == 2
+
+
+def test_store_evicts_least_recently_used():
+    """Testar limite de sessões"""
+    store = KVCacheStore(max_sessions=2)
+    store.checkin("m", "a", [1, 2], FakeCache(2))
+    store.checkin("m", "b", [1, 2], FakeCache(2))
+    store.checkin("m", "c", [1, 2], FakeCache(2))
+
+    assert store.checkout("m", "a", [1, 2, 3]) == (None, 0)
+    assert store.checkout("m", "c", [1, 2, 3])[1] == 2
+
+
+def test_engine_reuses_cache_across_turns(engine):
+    """Testar que o segundo turno reaproveita o cache e gera o mesmo texto"""
+    options = {"max_new_tokens": 4, "do_sample": False}
+    messages = [{"role": "user", "content": "olá como você está"}]
+    first = engine.generate_response("test/tiny-llama", messages, options, session_id="conversa")
+    messages += [{"role": "assistant", "content": first}, {"role": "user", "content": "qual é a capital"}]
+
+    with_cache = "".join(engine.generate_stream("test/tiny-llama", messages, options, session_id="conversa"))
+    without_cache = "".join(engine.generate_stream("test/tiny-llama", messages, options))
+
+    assert engine.kv_cache.stats["hits"] == 1
+    assert engine.kv_cache.stats["reused_tokens"] > 0
+    assert with_cache == without_cache
+
+
+def test_engine_cache_ignored_when_prompt_is_truncated(engine):
+    """Testar que, com o prompt truncado, o cache da sessão não casa com tokens cortados do início"""
+    options = {"max_new_tokens": 4, "do_sample": False}
+    messages = [{"role": "user", "content": "olá como você está"}]
+    first = engine.generate_response("test/tiny-llama", messages, options, session_id="conversa")
+    # A última mensagem sozinha passa do contexto de 256 tokens e começa como o turno em cache
+    messages += [{"role": "assistant", "content": first}, {"role": "user", "content": "olá como você está " * 80}]
+
+    with_session = "".join(engine.generate_stream("test/tiny-llama", messages, options, session_id="conversa"))
+    without_session = "".join(engine.generate_stream("test/tiny-llama", messages, options))
+
+    assert engine.context_window.stats["truncated_messages"] == 2
+    assert engine.kv_cache.stats["hits"] == 0
+    assert with_session == without_session
@@ -0,0 +1,55 @@
+"""
+Testes para a importação sob demanda da pilha de ML
+"""
+
+import pytest
+import subprocess
+import sys
+import os
+from pathlib import Path
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core import lazy_imports
+from src.core.lazy_imports import LazyModule
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_lazy_module_imports_on_first_attribute():
+    """Testar que o módulo só é importado no primeiro acesso e o tempo é registrado"""
+    sys.modules.pop("colorsys", None)
+    colorsys = LazyModule("colorsys")
+    assert "colorsys" not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0)[0] == 0.0
+    assert "colorsys" in sys.modules
+    assert "colorsys" in lazy_imports.import_report()["imports_ms"]
+
+
+def test_missing_library_raises_on_use():
+    """Testar que uma biblioteca ausente só falha quando é usada"""
+    missing = LazyModule("sevenx_biblioteca_inexistente")
+    assert not lazy_imports.is_installed("sevenx_biblioteca_inexistente")
+    assert lazy_imports.load("sevenx_biblioteca_inexistente") is None
+    with pytest.raises(ImportError):
+        missing.qualquer_coisa
+    assert "sevenx_biblioteca_inexistente" in lazy_imports.import_report()["import_errors"]
+
+
+def test_engine_startup_does_not_import_ml_stack():
+    """Testar que importar e criar o motor não importa torch/transformers"""
+    code = (
+        "import sys, tempfile\n"
+        "from src.core.config import Config\n"
+        "from src.core.sevenx_engine import SevenXEngine\n"
+        "from src.core.cancellation import CancellationToken\n"
+        "config = Config()\n"
+        "config.set('models_directory', tempfile.mkdtemp())\n"
+        "engine = SevenXEngine(config)\n"
+        "engine.is_available()\n"
+        "print('HEAVY=' + ','.join(m for m in ('torch', 'transformers', 'ctransformers') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "HEAVY="
@@ -0,0 +1,81 @@
+"""
+Testes para as métricas por geração
+"""
+
+import pytest
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.cancellation import CancellationToken
+from src.core.metrics import GenerationMetrics, MetricsRing
+
+
+def test_decode_speed_excludes_first_token():
+    """Testar que a velocidade de decodificação desconta o prefill"""
+    metrics = GenerationMetrics("m", "gguf", 0.0, generated_tokens=11, ttft_seconds=1.0, total_seconds=3.0)
+    assert metrics.decode_seconds == pytest.approx(2.0)
+    assert metrics.decode_tokens_per_second == pytest.approx(5.0)
+    assert GenerationMetrics("m", "gguf", 0.0, generated_tokens=1, total_seconds=1.0).decode_tokens_per_second == 0.0
+
+    data = metrics.to_dict()
+    assert data["decode_tokens_per_second"] == 5.0
+    assert data["model_id"] == "m"
+
+
+def test_ring_is_bounded_and_tracks_active():
+    """Testar que o anel guarda apenas os últimos registros e as gerações em andamento"""
+    ring = MetricsRing(maxlen=2)
+    trackers = [ring.start(f"m{i}", "transformers") for i in range(3)]
+    assert ring.active_count == 3
+
+    for tracker in trackers:
+        tracker.first_token()
+        tracker.finish()
+    # Finalizar de novo não duplica o registro
+    trackers[-1].finish()
+
+    assert ring.active_count == 0
+    assert [m.model_id for m in ring.records()] == ["m1", "m2"]
+    assert ring.last().ttft_seconds is not None
+    assert ring.snapshot()["active"] == 0
+
+
+def test_tracker_reads_tokens_and_cancellation_from_token():
+    """Testar que o registro final usa a contagem e o estado do token de cancelamento"""
+    ring = MetricsRing()
+    token = CancellationToken()
+    tracker = ring.start("m", "gguf", token)
+    token.record_token(4)
+    token.cancel()
+    metrics = tracker.finish("falhou")
+
+    assert metrics.generated_tokens == 4
+    assert metrics.cancelled
+    assert metrics.error == "falhou"
+    assert metrics.ttft_seconds is None
+
+
+def test_engine_records_generation_metrics(tiny_model, make_engine):
+    """Testar que cada geração do motor produz um registro de métricas"""
+    tiny_model()
+    engine = make_engine()
+
+    messages = [{"role": "user", "content": "olá"}]
+    options = {"max_tokens": 8, "temperature": 0.0}
+    chunks = list(engine.generate_stream("test/tiny-llama", messages, options, session_id="s"))
+    assert chunks
+    list(engine.generate_stream("test/tiny-llama", messages + [{"role": "assistant", "content": "".join(chunks)},
+                                                               {"role": "user", "content": "de novo"}],
+                                options, session_id="s"))
+
+    first, second = engine.metrics.records()
+    assert first.backend == "transformers"
+    assert first.prompt_tokens > 0
+    assert first.generated_tokens > 0
+    assert first.ttft_seconds is not None and first.total_seconds >= first.ttft_seconds
+    assert first.load_seconds > 0
+    assert second.load_seconds < first.load_seconds
+    assert engine.metrics.active_count == 0
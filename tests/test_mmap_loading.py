@@ -0,0 +1,69 @@
+"""
+Testes para a carga de pesos safetensors por mapeamento de memória
+"""
+
+import pytest
+import json
+import struct
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.mmap_loading import checkpoint_dtype, read_safetensors_header, safetensors_files
+
+
+def write_safetensors(path: Path, tensors: dict):
+    """Grava um arquivo safetensors à mão: {nome: (dtype, shape, bytes)}."""
+    header, data, offset = {"__metadata__": {"format": "pt"}}, b"", 0
+    for name, (dtype, shape, raw) in tensors.items():
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + len(raw)]}
+        data += raw
+        offset += len(raw)
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (-len(encoded) % 8)
+    path.write_bytes(struct.pack("<Q", len(encoded)) + encoded + data)
+
+
+def test_header_and_checkpoint_dtype():
+    """Testar a leitura do cabeçalho e a detecção do dtype do checkpoint"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = Path(temp_dir)
+        write_safetensors(model_dir / "model.safetensors", {
+            "w": ("F16", [2, 2], b"\x00" * 8),
+            "ids": ("I64", [1], b"\x00" * 8),
+        })
+        header, data_start = read_safetensors_header(model_dir / "model.safetensors")
+        assert set(header) == {"w", "ids"}
+        assert header["w"]["data_offsets"] == [0, 8]
+        assert data_start % 8 == 0
+        assert checkpoint_dtype(safetensors_files(model_dir)) == "float16"
+
+        write_safetensors(model_dir / "model-2.safetensors", {"v": ("F32", [1], b"\x00" * 4)})
+        assert checkpoint_dtype(safetensors_files(model_dir)) is None
+
+
+def test_mmap_load_matches_copy_load(tiny_model, make_engine):
+    """Testar que a carga mapeada gera o mesmo texto que a carga normal, sem copiar os pesos"""
+    model_dir = tiny_model()
+    messages = [{"role": "user", "content": "olá"}]
+    options = {"max_tokens": 5, "temperature": 0.0}
+    outputs = {}
+
+    for mmap_weights in (False, True):
+        engine = make_engine({"engine_settings.mmap_weights": mmap_weights})
+        engine._device = "cpu"
+        assert engine.load_model("test/tiny-llama")
+        model_data = engine.model_pool["test/tiny-llama"]
+        assert model_data["mmap"] is mmap_weights
+        if mmap_weights:
+            # Todos os pesos apontam para o mesmo armazenamento: o arquivo mapeado
+            storages = {p.untyped_storage().data_ptr() for p in model_data["model"].parameters()}
+            assert len(storages) == len(safetensors_files(model_dir))
+        outputs[mmap_weights] = engine.generate_response("test/tiny-llama", messages, options)
+        engine.cleanup()
+
+    assert outputs[True] == outputs[False]
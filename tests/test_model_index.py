@@ -0,0 +1,83 @@
+"""
+Testes para o índice persistente de modelos instalados
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import sys
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.model_index import ModelIndex, detect_format
+
+
+def install(models_dir: Path, model_id: str, files: dict) -> Path:
+    model_dir = models_dir / model_id.replace('/', '__')
+    model_dir.mkdir()
+    for name, data in files.items():
+        (model_dir / name).write_bytes(data)
+    (model_dir / "_sevenx_info.json").write_text(json.dumps({"model_id": model_id}))
+    return model_dir
+
+
+def test_detect_format():
+    """Testar a detecção do formato dos pesos pelos nomes dos arquivos"""
+    assert detect_format(["config.json", "model.Q4_K_M.gguf"]) == "gguf"
+    assert detect_format(["model.safetensors", "pytorch_model.bin"]) == "safetensors"
+    assert detect_format(["pytorch_model.bin"]) == "pytorch"
+    assert detect_format(["config.json"]) == "desconhecido"
+
+
+def test_index_rescans_only_changed_models():
+    """Testar que a listagem só varre de novo os modelos cujo diretório mudou"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        models_dir, index_dir = Path(temp_dir) / "models", Path(temp_dir) / "cache"
+        models_dir.mkdir()
+        install(models_dir, "org/a", {"model.safetensors": b"x" * 10})
+        b_dir = install(models_dir, "org/b", {"model.gguf": b"y" * 5})
+
+        index = ModelIndex(models_dir, index_dir)
+        entries = {e["model_id"]: e for e in index.list()}
+        assert set(entries) == {"org/a", "org/b"}
+        assert entries["org/b"]["format"] == "gguf"
+        assert entries["org/a"]["size"] == 10 + len(json.dumps({"model_id": "org/a"}))
+        assert index.stats["model_rescans"] == 2
+
+        index.list()
+        assert index.stats["model_rescans"] == 2
+
+        # Um índice novo lê o arquivo salvo e não varre nada
+        reopened = ModelIndex(models_dir, index_dir)
+        assert len(reopened.list()) == 2
+        assert reopened.stats == {"model_rescans": 0, "dir_listings": 0}
+
+        (b_dir / "extra.bin").write_bytes(b"z")
+        reopened.list()
+        assert reopened.stats["model_rescans"] == 1
+        assert {f["name"] for f in reopened.files(b_dir)} == {"model.gguf", "extra.bin", "_sevenx_info.json"}
+
+        shutil.rmtree(b_dir)
+        assert [e["model_id"] for e in reopened.list()] == ["org/a"]
+
+
+def test_refresh_picks_up_finished_download():
+    """Testar que um download concluído entra no índice mesmo sem mudar o mtime do diretório de modelos"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        models_dir = Path(temp_dir) / "models"
+        models_dir.mkdir()
+        index = ModelIndex(models_dir, Path(temp_dir) / "cache")
+
+        partial = models_dir / "org__c"
+        partial.mkdir()
+        (partial / "model.safetensors").write_bytes(b"w")
+        assert index.list() == []
+
+        (partial / "_sevenx_info.json").write_text(json.dumps({"model_id": "org/c"}))
+        index.refresh(partial)
+        assert [e["model_id"] for e in index.list()] == ["org/c"]
+        index.remove(partial)
+        assert index.files(partial) == []
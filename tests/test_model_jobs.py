@@ -0,0 +1,224 @@
+"""
+Testes para o gerenciador de operações de modelo em segundo plano
+"""
+
+import pytest
+from threading import Event
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.model_jobs import ModelJobManager
+
+
+class FakeEngine:
+    """Motor de teste: a carga passa por etapas e pode ser segurada por um Event."""
+
+    def __init__(self):
+        self.release = Event()
+        self.started = Event()
+        self.loads = 0
+        self.deleted = []
+
+    def load_model(self, model_id, force_reload=False, progress_callback=None, cancel_token=None):
+        self.loads += 1
+        progress_callback(10, "Carregando tokenizer...")
+        self.started.set()
+        self.release.wait(5)
+        if cancel_token.is_cancelled:
+            return False
+        progress_callback(80, "Transferindo para cpu...")
+        return True
+
+    def unload_model(self, model_id):
+        return True
+
+    def delete_model(self, model_id):
+        self.deleted.append(model_id)
+        return True
+
+    def list_installed_models(self):
+        return ["a", "b"]
+
+    def plan_download(self, model_id, quantization=None):
+        if model_id == "inexistente":
+            raise ValueError("Repositório não encontrado")
+        return {"model_id": model_id, "quantization": quantization or "Q4_K_M"}
+
+    def set_draft_model(self, model_id, draft_model_id):
+        if draft_model_id == "org/outro-tokenizer":
+            raise ValueError("tokenizers diferentes")
+        return model_id != "inexistente"
+
+
+def test_concurrent_loads_of_same_model_are_deduplicated():
+    """Testar que pedidos repetidos de carga reaproveitam o job em andamento"""
+    engine = FakeEngine()
+    manager = ModelJobManager(engine)
+    stages = []
+
+    first = manager.submit_load("m")
+    first.on_progress(lambda job: stages.append(job.message))
+    second = manager.submit_load("m")
+    assert second is first
+
+    engine.release.set()
+    assert first.wait(5)
+    assert first.status == "done" and first.result is True and first.progress == 100
+    assert engine.loads == 1
+    assert stages[-1] == "Transferindo para cpu..."
+    manager.shutdown()
+
+
+def test_delete_cancels_pending_load_and_runs_after_it():
+    """Testar que remover cancela a carga em andamento e só roda depois dela"""
+    engine = FakeEngine()
+    manager = ModelJobManager(engine)
+    load = manager.submit_load("m")
+    assert engine.started.wait(5)
+
+    delete = manager.submit_delete("m")
+    assert load.cancel_token.is_cancelled
+    engine.release.set()
+
+    assert delete.wait(5)
+    assert load.status == "cancelled"
+    assert delete.status == "done"
+    assert engine.deleted == ["m"]
+    assert manager.active_jobs() == []
+    manager.shutdown()
+
+
+def test_failed_job_and_done_callback():
+    """Testar que falhas viram status 'failed' e callbacks tardios são chamados na hora"""
+    engine = FakeEngine()
+    engine.delete_model = lambda model_id: False
+    manager = ModelJobManager(engine)
+
+    job = manager.submit_delete("m")
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert "m" in job.error
+
+    seen = []
+    job.on_done(seen.append)
+    assert seen == [job]
+
+    scan = manager.submit_scan()
+    assert scan.wait(5) and scan.result == ["a", "b"]
+    manager.shutdown()
+    with pytest.raises(RuntimeError):
+        manager.submit_scan()
+
+
+def test_shutdown_cancels_queued_jobs():
+    """Testar que encerrar o gerenciador cancela os jobs que ainda esperam uma thread livre"""
+    engine = FakeEngine()
+    scans = []
+    engine.list_installed_models = lambda: scans.append(1) or []
+    manager = ModelJobManager(engine, max_workers=1)
+    load = manager.submit_load("m")
+    assert engine.started.wait(5)
+    scan = manager.submit_scan()
+
+    manager.shutdown()
+    assert scan.finished and scan.status == "cancelled"
+    engine.release.set()
+    assert load.wait(5) and load.status == "cancelled"
+    assert scans == []
+    assert manager.active_jobs() == []
+
+
+def test_plan_runs_in_background():
+    """Testar que a consulta do plano de download roda como job, com erros do Hub no status"""
+    manager = ModelJobManager(FakeEngine())
+    plan = manager.submit_plan("org/modelo", "Q8_0")
+    assert plan.wait(5)
+    assert plan.status == "done"
+    assert plan.result == {"model_id": "org/modelo", "quantization": "Q8_0"}
+
+    missing = manager.submit_plan("inexistente")
+    assert missing.wait(5)
+    assert missing.status == "failed" and "não encontrado" in missing.error
+    manager.shutdown()
+
+
+def test_plan_with_other_quantization_is_a_new_job():
+    """Testar que só pedidos de plano com a mesma quantização reaproveitam o job pendente"""
+    engine = FakeEngine()
+    manager = ModelJobManager(engine)
+    # A carga segura o modelo: os planos ficam pendentes atrás dela
+    load = manager.submit_load("org/modelo")
+    assert engine.started.wait(5)
+    q8 = manager.submit_plan("org/modelo", "Q8_0")
+    assert manager.submit_plan("org/modelo", "Q8_0") is q8
+    q4 = manager.submit_plan("org/modelo", "Q4_K_M")
+    assert q4 is not q8
+
+    engine.release.set()
+    assert load.wait(5) and q8.wait(5) and q4.wait(5)
+    assert q8.result["quantization"] == "Q8_0"
+    assert q4.result["quantization"] == "Q4_K_M"
+    manager.shutdown()
+
+
+def test_draft_runs_in_background():
+    """Testar que designar o rascunho roda como job e que a incompatibilidade vira falha"""
+    manager = ModelJobManager(FakeEngine())
+    draft = manager.submit_draft("org/modelo", "org/pequeno")
+    assert draft.wait(5)
+    assert draft.status == "done" and draft.result == "org/pequeno"
+
+    incompatible = manager.submit_draft("org/modelo", "org/outro-tokenizer")
+    assert incompatible.wait(5)
+    assert incompatible.status == "failed" and "tokenizers diferentes" in incompatible.error
+    missing = manager.submit_draft("inexistente", None)
+    assert missing.wait(5) and missing.status == "failed"
+    manager.shutdown()
+
+
+def test_new_draft_supersedes_pending_one():
+    """Testar que designar outro rascunho cancela a designação pendente em vez de reaproveitá-la"""
+    engine = FakeEngine()
+    designated = []
+    engine.set_draft_model = lambda model_id, draft_model_id: designated.append(draft_model_id) or True
+    manager = ModelJobManager(engine)
+    load = manager.submit_load("org/modelo")
+    assert engine.started.wait(5)
+    first = manager.submit_draft("org/modelo", "org/pequeno")
+    assert manager.submit_draft("org/modelo", "org/pequeno") is first
+    second = manager.submit_draft("org/modelo", "org/minusculo")
+    assert second is not first and first.cancel_token.is_cancelled
+
+    engine.release.set()
+    assert load.wait(5) and first.wait(5) and second.wait(5)
+    assert first.status == "cancelled"
+    assert second.status == "done" and designated == ["org/minusculo"]
+    manager.shutdown()
+
+
+def test_engine_load_reports_stages_and_cancels(tiny_model, make_engine):
+    """Testar a carga real em segundo plano e o cancelamento entre as etapas"""
+    from src.core.cancellation import CancellationToken
+
+    tiny_model()
+    engine = make_engine()
+    job = engine.jobs.submit_load("test/tiny-llama")
+    assert job.wait(60)
+    assert job.status == "done"
+    assert "test/tiny-llama" in engine.model_pool
+    engine.unload_model("test/tiny-llama")
+
+    stages = []
+    token = CancellationToken()
+
+    def on_stage(progress, message):
+        stages.append(message)
+        if message == "Carregando tokenizer...":
+            token.cancel()
+
+    assert not engine.load_model("test/tiny-llama", progress_callback=on_stage, cancel_token=token)
+    assert stages[-1] == "Carregando tokenizer..."
+    assert "test/tiny-llama" not in engine.model_pool
@@ -0,0 +1,76 @@
+"""
+Testes para o pool de modelos com orçamento de memória
+"""
+
+import pytest
+import time
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.model_pool import ModelPool
+
+MB = 1024 ** 2
+
+
+def test_pool_behaves_like_mapping():
+    """Testar compatibilidade com o antigo dict loaded_models"""
+    pool = ModelPool()
+    pool.add("a", {"type": "gguf"}, 10 * MB, "cpu")
+    assert "a" in pool
+    assert pool.get("a") == {"type": "gguf"}
+    assert list(pool.keys()) == ["a"]
+    assert pool.get("b") is None
+
+
+def test_select_victims_in_lru_order():
+    """Testar escolha dos modelos menos usados recentemente"""
+    pool = ModelPool(ram_budget_bytes=100 * MB)
+    pool.add("a", {}, 40 * MB, "cpu")
+    pool.add("b", {}, 40 * MB, "cpu")
+    pool.touch("a")
+
+    assert pool.select_victims(30 * MB, "cpu") == ["b"]
+    assert pool.select_victims(90 * MB, "cpu") == ["b", "a"]
+    assert pool.select_victims(10 * MB, "cpu") == []
+    # Orçamento de VRAM não é afetado por modelos em RAM
+    assert pool.select_victims(90 * MB, "cuda") == []
+
+
+def test_models_in_use_are_not_evicted():
+    """Testar que modelos gerando não são despejados"""
+    pool = ModelPool(ram_budget_bytes=100 * MB, idle_ttl=0.01)
+    pool.add("a", {}, 60 * MB, "cpu")
+    with pool.acquire("a"):
+        time.sleep(0.02)
+        assert pool.select_victims(60 * MB, "cpu") == []
+        assert pool.idle_models() == []
+    time.sleep(0.02)
+    assert pool.idle_models() == ["a"]
+
+
+def test_pool_report():
+    """Testar relatório do pool"""
+    pool = ModelPool(ram_budget_bytes=100 * MB)
+    pool.add("a", {}, 10 * MB, "cpu", reason="teste")
+    pool.remove("a", reason="fim")
+    pool.add("b", {}, 20 * MB, "cpu")
+
+    report = pool.report()
+    assert report["used_mb"]["ram"] == 20
+    assert [m["model_id"] for m in report["models"]] == ["b"]
+    assert [e["action"] for e in report["events"]] == ["carregado", "descarregado", "carregado"]
+
+
+def test_engine_evicts_to_fit_budget(tiny_model, make_engine):
+    """Testar despejo LRU no motor quando o orçamento é excedido"""
+    tiny_model("test/a")
+    tiny_model("test/b")
+    engine = make_engine({"engine_settings.ram_budget_mb": 0.05})
+
+    assert engine.load_model("test/a")
+    assert engine.load_model("test/b")
+    assert list(engine.loaded_models.keys()) == ["test/b"]
+    assert "despejado" in engine.get_pool_report()["events"][-2]["reason"]
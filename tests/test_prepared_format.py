@@ -0,0 +1,81 @@
+"""
+Testes para o formato de carga rápida preparado na instalação
+"""
+
+import pytest
+import json
+import struct
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.prepared_format import PREPARED_DIR, PREPARED_FORMAT_VERSION, prepared_path, preparation_reason
+from src.core.response_cache import weights_fingerprint
+
+
+def write_safetensors(path: Path, dtype: str):
+    header = json.dumps({"w": {"dtype": dtype, "shape": [2], "data_offsets": [0, 8]}}).encode()
+    path.write_bytes(struct.pack("<Q", len(header)) + header + b"\0" * 8)
+
+
+def test_preparation_reason():
+    """Testar quando o checkpoint ganha com a preparação"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = Path(temp_dir)
+        (model_dir / "pytorch_model.bin").write_bytes(b"pickle")
+        assert "pickle" in preparation_reason(model_dir, "float32")
+
+        write_safetensors(model_dir / "model.safetensors", "BF16")
+        assert "bfloat16" in preparation_reason(model_dir, "float32")
+        assert "tokenizer" in preparation_reason(model_dir, "bfloat16")
+        (model_dir / "tokenizer.json").write_text("{}")
+        assert preparation_reason(model_dir, "bfloat16") is None
+
+
+def test_prepared_path_requires_matching_weights_and_dtype():
+    """Testar que o artefato só vale para os mesmos pesos e o mesmo dtype"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = Path(temp_dir)
+        (model_dir / "pytorch_model.bin").write_bytes(b"pickle")
+        fingerprint = weights_fingerprint(model_dir)
+        (model_dir / PREPARED_DIR).mkdir()
+        (model_dir / PREPARED_DIR / "config.json").write_text("{}")
+        (model_dir / PREPARED_DIR / "model.safetensors").write_bytes(b"x")
+        # Os arquivos preparados não mudam a impressão digital dos pesos originais
+        assert weights_fingerprint(model_dir) == fingerprint
+
+        info = {"prepared": {"path": PREPARED_DIR, "format": PREPARED_FORMAT_VERSION,
+                             "dtype": "float32", "fingerprint": fingerprint}}
+        assert prepared_path(model_dir, info, "float32", fingerprint) == model_dir / PREPARED_DIR
+        assert prepared_path(model_dir, info, "float16", fingerprint) is None
+        assert prepared_path(model_dir, info, "float32", "outra") is None
+        assert prepared_path(model_dir, {}, "float32", fingerprint) is None
+
+
+def test_prepared_model_loads_fast_path_with_same_output(tiny_model, make_engine):
+    """Testar a preparação de um checkpoint .bin e a carga mapeada a partir dela"""
+    model_dir = tiny_model(safe_serialization=False)
+    engine = make_engine({"engine_settings.torch_dtype": "float32", "engine_settings.thread_autotune": False})
+    engine._device = "cpu"
+    messages = [{"role": "user", "content": "olá como você está"}]
+    options = {"max_tokens": 8, "temperature": 0.0}
+
+    assert engine.load_model("test/tiny-llama")
+    assert not engine.model_pool["test/tiny-llama"]["prepared"]
+    original = engine.generate_response("test/tiny-llama", messages, options)
+    engine.unload_model("test/tiny-llama")
+
+    assert engine.prepare_model("test/tiny-llama")
+    info = json.loads((model_dir / "_sevenx_info.json").read_text())
+    assert info["prepared"]["dtype"] == "float32"
+    assert list((model_dir / PREPARED_DIR).glob("*.safetensors"))
+    assert (model_dir / PREPARED_DIR / "tokenizer.json").exists()
+
+    assert engine.load_model("test/tiny-llama")
+    model_data = engine.model_pool["test/tiny-llama"]
+    assert model_data["prepared"] and model_data["mmap"]
+    assert engine.generate_response("test/tiny-llama", messages, options) == original
@@ -0,0 +1,86 @@
+"""
+Testes para o modo de carga INT8 dinâmico
+"""
+
+import pytest
+import json
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.quantization import QUANTIZED_METADATA_FILE, QUANTIZED_STATE_FILE
+from src.core.response_cache import weights_fingerprint
+
+
+def test_load_mode_is_stored_in_model_info(models_dir, make_engine):
+    """Testar que o modo de carga é gravado no _sevenx_info.json do modelo"""
+    model_dir = models_dir / "test__model"
+    model_dir.mkdir()
+    (model_dir / "_sevenx_info.json").write_text(json.dumps({"model_id": "test/model"}))
+    engine = make_engine()
+
+    assert engine.set_model_load_mode("test/model", "int8")
+    info = json.loads((model_dir / "_sevenx_info.json").read_text())
+    assert info == {"model_id": "test/model", "load_mode": "int8"}
+    with pytest.raises(ValueError):
+        engine.set_model_load_mode("test/model", "int4")
+    assert not engine.set_model_load_mode("test/inexistente", "int8")
+
+    info["load_mode"] = "desconhecido"
+    (model_dir / "_sevenx_info.json").write_text(json.dumps(info))
+    assert engine._load_mode("test/model", model_dir) == "default"
+
+
+def test_quantized_artifact_does_not_change_fingerprint():
+    """Testar que o state_dict INT8 salvo não invalida a impressão digital dos pesos"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = Path(temp_dir)
+        (model_dir / "model.safetensors").write_bytes(b"pesos")
+        before = weights_fingerprint(model_dir)
+        (model_dir / QUANTIZED_STATE_FILE).write_bytes(b"int8")
+        (model_dir / QUANTIZED_METADATA_FILE).write_text("{}")
+        assert weights_fingerprint(model_dir) == before
+
+
+def test_int8_load_quantizes_once_and_reuses_cache(monkeypatch, tiny_model, make_engine):
+    """Testar a carga INT8: quantiza na primeira vez e reaproveita o state_dict salvo depois"""
+    torch = pytest.importorskip("torch")
+    from src.core import sevenx_engine
+
+    model_dir = tiny_model()
+    engine = make_engine()
+    engine._device = "cpu"
+    engine.set_model_load_mode("test/tiny-llama", "int8")
+
+    assert engine.load_model("test/tiny-llama")
+    model_data = engine.model_pool["test/tiny-llama"]
+    assert model_data["load_mode"] == "int8"
+    assert model_data["fingerprint"].endswith(":int8")
+    assert any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in model_data["model"].modules())
+    assert json.loads((model_dir / QUANTIZED_METADATA_FILE).read_text())["fingerprint"]
+    # Só tensores comuns: o arquivo abre sem executar pickle
+    state = torch.load(model_dir / QUANTIZED_STATE_FILE, weights_only=True)
+    assert all(torch.is_tensor(value) for value in state.values())
+    assert any(value.dtype == torch.int8 for value in state.values())
+
+    messages = [{"role": "user", "content": "olá"}]
+    options = {"max_tokens": 5, "temperature": 0.0}
+    first = engine.generate_response("test/tiny-llama", messages, options)
+    engine.unload_model("test/tiny-llama")
+
+    calls = []
+    original = sevenx_engine.load_cached_int8
+
+    def tracking_load(*args):
+        model = original(*args)
+        calls.append(model is not None)
+        return model
+
+    monkeypatch.setattr(sevenx_engine, "load_cached_int8", tracking_load)
+    assert engine.load_model("test/tiny-llama")
+    assert calls == [True]
+    assert engine.generate_response("test/tiny-llama", messages, options) == first
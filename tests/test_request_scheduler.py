@@ -0,0 +1,171 @@
+"""
+Testes para a fila de pedidos com prioridade e controle de admissão
+"""
+
+import pytest
+import threading
+import time
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.cancellation import CancellationToken
+from src.core.metrics import MetricsRing
+from src.core.request_scheduler import (QueueFull, QueueTimeout, RequestCancelled, RequestScheduler)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "condição não atingida a tempo"
+        time.sleep(0.01)
+
+
+def admit_in_thread(scheduler, priority, order, cancel_token=None):
+    def run():
+        ticket = scheduler.admit(priority, cancel_token)
+        order.append(priority)
+        scheduler.release(ticket)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_priority_order():
+    """Testar que pedidos interativos passam à frente dos jobs em segundo plano na fila"""
+    scheduler = RequestScheduler(max_concurrent=1)
+    holder = scheduler.admit("normal")
+    order = []
+    background = admit_in_thread(scheduler, "background", order)
+    wait_for(lambda: scheduler.stats()["queued"]["background"] == 1)
+    interactive = admit_in_thread(scheduler, "interactive", order)
+    wait_for(lambda: scheduler.stats()["queued"]["interactive"] == 1)
+
+    scheduler.release(holder)
+    background.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "background"]
+    assert scheduler.stats()["admitted"] == 3
+
+
+def test_queue_full_and_timeout():
+    """Testar a recusa com fila cheia e com prazo de espera esgotado, ambas com retry_after"""
+    scheduler = RequestScheduler(max_concurrent=1, max_queue_depth=1, queue_timeout=0.2)
+    holder = scheduler.admit("interactive")
+    order = []
+    waiting = admit_in_thread(scheduler, "background", order)
+    wait_for(lambda: scheduler.stats()["queued"]["background"] == 1)
+
+    with pytest.raises(QueueFull) as rejected:
+        scheduler.admit("background")
+    assert rejected.value.retry_after >= 1
+    # Jobs em segundo plano na fila não contam contra pedidos de prioridade maior
+    started = time.perf_counter()
+    with pytest.raises(QueueTimeout) as timed_out:
+        scheduler.admit("interactive")
+    assert time.perf_counter() - started >= 0.2
+    assert timed_out.value.retry_after >= 1
+
+    scheduler.release(holder)
+    waiting.join(5)
+    stats = scheduler.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["running"]) == (1, 1, 0)
+    with pytest.raises(ValueError):
+        scheduler.admit("urgente")
+
+
+def test_cancelled_while_waiting():
+    """Testar que um pedido cancelado sai da fila sem ocupar vaga"""
+    scheduler = RequestScheduler(max_concurrent=1)
+    holder = scheduler.admit("interactive")
+    token = CancellationToken()
+    errors = []
+
+    def run():
+        try:
+            scheduler.admit("interactive", token)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_for(lambda: scheduler.stats()["queued"]["interactive"] == 1)
+    token.cancel()
+    thread.join(5)
+    assert len(errors) == 1
+    assert scheduler.stats()["queued"]["interactive"] == 0
+    scheduler.release(holder)
+
+
+def test_background_preempted_at_token_boundary():
+    """Testar que um job em segundo plano pausa entre tokens enquanto um pedido interativo roda"""
+    scheduler = RequestScheduler(max_concurrent=1)
+    token = CancellationToken()
+    background = scheduler.admit("background", token)
+    stop = threading.Event()
+    progress = []
+
+    def decode_loop():
+        # Loop de decodificação: consulta o token a cada passo, como o StoppingCriteria
+        while not stop.is_set() and not token.record_token():
+            progress.append(time.perf_counter())
+            time.sleep(0.005)
+
+    decoder = threading.Thread(target=decode_loop)
+    decoder.start()
+    wait_for(lambda: len(progress) > 3)
+
+    interactive = scheduler.admit("interactive")
+    assert background.preemptions == 1
+    paused_at = len(progress)
+    time.sleep(0.1)
+    # A geração em segundo plano não avança enquanto o pedido interativo tem a vaga
+    assert len(progress) <= paused_at + 1
+    scheduler.release(interactive)
+
+    wait_for(lambda: len(progress) > paused_at + 3)
+    stop.set()
+    decoder.join(5)
+    scheduler.release(background)
+    assert background.preempted_seconds >= 0.1
+    assert scheduler.stats()["preemptions"] == 1
+    # Loops que atendem várias gerações não pausam
+    assert token.record_token(checkpoint=False) is False
+
+
+def test_queue_wait_metrics():
+    """Testar que a espera na fila é registrada à parte do tempo de geração"""
+    scheduler = RequestScheduler(max_concurrent=1)
+    holder = scheduler.admit("interactive")
+    tickets = []
+    thread = threading.Thread(target=lambda: tickets.append(scheduler.admit("normal")))
+    thread.start()
+    time.sleep(0.15)
+    scheduler.release(holder)
+    thread.join(5)
+
+    ring = MetricsRing()
+    tracker = ring.start("modelo", "transformers", ticket=tickets[0])
+    metrics = tracker.finish()
+    scheduler.release(tickets[0])
+    assert metrics.priority == "normal"
+    assert metrics.queue_seconds >= 0.15
+    assert metrics.total_seconds < metrics.queue_seconds
+    assert metrics.to_dict()["queue_seconds"] == metrics.queue_seconds
+
+
+def test_max_concurrent_change_admits_waiting():
+    """Testar que aumentar as vagas com pedidos na fila os admite sem esperar uma liberação"""
+    scheduler = RequestScheduler(max_concurrent=1)
+    holder = scheduler.admit("interactive")
+    order = []
+    waiting = admit_in_thread(scheduler, "normal", order)
+    wait_for(lambda: scheduler.stats()["queued"]["normal"] == 1)
+
+    scheduler.set_max_concurrent(2)
+    waiting.join(5)
+    assert order == ["normal"]
+    assert scheduler.stats()["max_concurrent"] == 2
+    scheduler.release(holder)
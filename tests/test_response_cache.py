@@ -0,0 +1,97 @@
+"""
+Testes para o cache de respostas em disco
+"""
+
+import pytest
+import tempfile
+import time
+from pathlib import Path
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.response_cache import ResponseCache, is_deterministic, weights_fingerprint
+
+
+def test_is_deterministic():
+    """Testar detecção de decodificação gulosa"""
+    assert is_deterministic({"do_sample": False})
+    assert is_deterministic({"temperature": 0})
+    assert not is_deterministic({"temperature": 0.7})
+    assert not is_deterministic({"do_sample": True, "temperature": 0.7})
+    assert not is_deterministic({"do_sample": False, "num_beams": 4})
+
+
+def test_make_key_depends_on_every_part():
+    """Testar que modelo, pesos, prompt e opções mudam a chave"""
+    key = ResponseCache.make_key("m", "f", [1, 2], {"do_sample": False})
+    assert key == ResponseCache.make_key("m", "f", [1, 2], {"do_sample": False})
+    assert key != ResponseCache.make_key("m", "g", [1, 2], {"do_sample": False})
+    assert key != ResponseCache.make_key("m", "f", [1, 3], {"do_sample": False})
+    assert key != ResponseCache.make_key("m", "f", [1, 2], {"do_sample": False, "max_new_tokens": 5})
+    assert ResponseCache.make_key("m", "f", [1], {"fn": lambda x: x}) is None
+
+
+def test_cache_persists_and_preserves_chunking():
+    """Testar que as entradas sobrevivem a uma nova instância com o chunking original"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResponseCache(Path(temp_dir))
+        assert cache.get("k") is None
+        cache.put("k", ["Olá", ", ", "mundo"])
+
+        reopened = ResponseCache(Path(temp_dir))
+        assert reopened.get("k") == ["Olá", ", ", "mundo"]
+        assert reopened.stats["hits"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    """Testar despejo LRU ao exceder o tamanho máximo"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResponseCache(Path(temp_dir), max_bytes=250)
+        cache.put("a", ["x" * 60])
+        time.sleep(0.01)
+        cache.put("b", ["y" * 60])
+        time.sleep(0.01)
+        cache.get("a")
+        cache.put("c", ["z" * 60])
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.size_bytes() <= 250
+        assert cache.stats["evictions"] == 1
+
+
+def test_weights_fingerprint_changes_with_weights():
+    """Testar que trocar os pesos muda a impressão digital"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = Path(temp_dir)
+        (model_dir / "model.safetensors").write_bytes(b"a")
+        (model_dir / "_sevenx_info.json").write_text("{}")
+        before = weights_fingerprint(model_dir)
+        (model_dir / "_sevenx_info.json").write_text('{"novo": 1}')
+        assert weights_fingerprint(model_dir) == before
+        (model_dir / "model.safetensors").write_bytes(b"ab")
+        assert weights_fingerprint(model_dir) != before
+
+
+def test_engine_replays_deterministic_generation(tiny_model, make_engine):
+    """Testar que o motor serve gerações determinísticas repetidas do cache"""
+    tiny_model()
+    engine = make_engine({"engine_settings.response_cache": True})
+    messages = [{"role": "user", "content": "olá como você está"}]
+    options = {"max_new_tokens": 8, "temperature": 0, "eos_token_id": -1}
+
+    first = list(engine.generate_stream("test/tiny-llama", messages, options))
+    second = list(engine.generate_stream("test/tiny-llama", messages, options))
+    assert second == first
+    assert engine.response_cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+    # Amostragem não é cacheada
+    list(engine.generate_stream("test/tiny-llama", messages, {"max_new_tokens": 4, "do_sample": True, "temperature": 0.8}))
+    assert engine.response_cache.stats["stores"] == 1
+
+    response = engine.generate_response("test/tiny-llama", messages, options)
+    assert response == "".join(first).strip()
+    assert engine.response_cache.stats["hits"] == 2
@@ -0,0 +1,126 @@
+"""
+Testes para a decodificação especulativa (modelo de rascunho e prompt lookup)
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# Adicionar src ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core.metrics import GenerationMetrics
+from src.core.speculative import speculative_report, tokenizer_incompatibility
+
+
+class FakeTokenizer:
+    def __init__(self, vocab, eos_token_id=2):
+        self.vocab = vocab
+        self.eos_token_id = eos_token_id
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+
+def test_tokenizer_compatibility():
+    """Testar que só tokenizers com o mesmo vocabulário e tokens especiais são compatíveis"""
+    vocab = {"a": 0, "b": 1, "</s>": 2}
+    assert tokenizer_incompatibility(FakeTokenizer(vocab), FakeTokenizer(vocab)) is None
+    assert "vocabulários" in tokenizer_incompatibility(FakeTokenizer(vocab), FakeTokenizer({"a": 0}))
+    assert "eos_token_id" in tokenizer_incompatibility(FakeTokenizer(vocab), FakeTokenizer(vocab, eos_token_id=1))
+
+
+def test_speculative_report():
+    """Testar a taxa de aceitação e o ganho sobre as gerações sem rascunho"""
+    def record(tokens, seconds, draft=None, proposed=0, accepted=0, steps=0):
+        return GenerationMetrics(model_id="m", backend="transformers", started_at=0.0, generated_tokens=tokens,
+                                 ttft_seconds=0.0, total_seconds=seconds, draft_model=draft,
+                                 draft_tokens=proposed, accepted_draft_tokens=accepted, target_steps=steps)
+
+    records = [record(11, 1.0), record(21, 1.0, "d", proposed=20, accepted=15, steps=6),
+               GenerationMetrics(model_id="outro", backend="gguf", started_at=0.0, generated_tokens=50)]
+    report = speculative_report(records, "m")
+    assert report["assisted_generations"] == 1 and report["plain_generations"] == 1
+    assert report["draft_model"] == "d"
+    assert report["acceptance_rate"] == 0.75
+    assert report["tokens_per_target_step"] == 3.5
+    assert report["speedup"] == 2.0
+
+
+def test_set_draft_model_validation(models_dir, make_engine):
+    """Testar a designação do rascunho no _sevenx_info.json e as recusas"""
+    model_dir = models_dir / "test__model"
+    model_dir.mkdir()
+    (model_dir / "_sevenx_info.json").write_text(json.dumps({"model_id": "test/model"}))
+    engine = make_engine()
+
+    assert not engine.set_draft_model("test/inexistente", "test/model")
+    with pytest.raises(ValueError):
+        engine.set_draft_model("test/model", "test/model")
+    with pytest.raises(ValueError):
+        engine.set_draft_model("test/model", "test/rascunho")
+    assert engine.set_draft_model("test/model", None)
+    assert json.loads((model_dir / "_sevenx_info.json").read_text()) == {"model_id": "test/model"}
+
+
+def test_speculative_generation_matches_plain_decoding(tiny_model, make_engine):
+    """Testar que a geração com rascunho dá o mesmo texto guloso e registra a aceitação"""
+    tiny_model("test/tiny-llama")
+    tiny_model("test/draft-llama", num_layers=1)
+    engine = make_engine()
+    engine._device = "cpu"
+    messages = [{"role": "user", "content": "olá como você está"}]
+    options = {"max_tokens": 12, "temperature": 0.0}
+
+    plain = engine.generate_response("test/tiny-llama", messages, options)
+    plain_tokens = engine.metrics.last().generated_tokens
+    assert engine.set_draft_model("test/tiny-llama", "test/draft-llama")
+    assisted = engine.generate_response("test/tiny-llama", messages, options)
+    assert assisted == plain
+    streamed = "".join(engine.generate_stream("test/tiny-llama", messages, options))
+    assert streamed.strip() == plain
+
+    last = engine.metrics.last()
+    assert last.draft_model == "test/draft-llama"
+    assert last.target_steps > 0 and last.draft_tokens > 0
+    # Candidatos recusados não contam como tokens gerados
+    assert last.generated_tokens == plain_tokens
+    report = engine.get_speculative_report("test/tiny-llama")
+    assert report["assisted_generations"] == 2 and report["plain_generations"] == 1
+
+
+def test_prompt_lookup_report_is_separate_from_draft():
+    """Testar que o relatório separa o prompt lookup do rascunho"""
+    lookup = GenerationMetrics(model_id="m", backend="transformers", started_at=0.0, generated_tokens=9,
+                               ttft_seconds=0.0, total_seconds=1.0, prompt_lookup_tokens=10,
+                               draft_tokens=8, accepted_draft_tokens=6, target_steps=3)
+    assert lookup.speculation == "prompt_lookup"
+    assert lookup.to_dict()["draft_acceptance_rate"] == 0.75
+    assert speculative_report([lookup], "m")["assisted_generations"] == 0
+    report = speculative_report([lookup], "m", mode="prompt_lookup")
+    assert report["assisted_generations"] == 1 and report["acceptance_rate"] == 0.75
+    assert "draft_model" not in report
+
+
+def test_prompt_lookup_generation_matches_plain_decoding(tiny_model, make_engine):
+    """Testar que o prompt lookup, pedido nas opções, não muda o texto guloso"""
+    tiny_model()
+    engine = make_engine()
+    engine._device = "cpu"
+    messages = [{"role": "user", "content": "a casa grande a casa grande a casa grande a casa"}]
+    options = {"max_tokens": 12, "temperature": 0.0}
+
+    plain = engine.generate_response("test/tiny-llama", messages, options)
+    assert engine.metrics.last().speculation is None
+    plain_tokens = engine.metrics.last().generated_tokens
+    lookup = engine.generate_response("test/tiny-llama", messages, dict(options, prompt_lookup_num_tokens=4))
+    assert lookup == plain
+
+    last = engine.metrics.last()
+    assert last.speculation == "prompt_lookup" and last.prompt_lookup_tokens == 4
+    # O último passo pode aceitar candidatos além do limite; a resposta para em max_tokens
+    assert last.generated_tokens == plain_tokens <= 12
+    assert last.target_steps > 0
+    report = engine.get_speculative_report("test/tiny-llama", "prompt_lookup")
+    assert report["assisted_generations"] == 1